@@ -16,8 +16,23 @@ Writes:
 
 Requires:
   .env file with OPENROUTER_API_KEY
+
+Set INCREMENTAL = True to validate only tasks whose screenshots are new or changed since
+the last run (see gsme/incremental.py); their rows are merged into the existing files.
+Tasks whose API call failed ("API error: ..." notes) are validated again on the next run.
+
+Set PROFILE = True (or pass --profile) to time each stage per task (base64_encode, http,
+retry_sleep, parse, rate_limit_sleep); timings go to auto_annotations_<avg|app>.csv.profile.csv
+and a breakdown is printed. PROFILE_DUMP / --profile_dump adds a cProfile (.prof) or
+sampled collapsed-stack dump of the run (see gsme/profiling.py).
+
+The CONFIG values below are defaults; --team, --wave, --model, --incremental and
+--results_db override them for one run (as does `python -m gsme validate ...`).
+The API key is checked when the script runs, not on import, so 21_run_detectors.py
+and the tests can load it without one.
 """
 
+import argparse
 import os
 import sys
 import time
@@ -32,6 +47,11 @@ import pandas as pd
 import requests
 from dotenv import load_dotenv
 
+from gsme.incremental import Incremental
+from gsme.ingest import DEFAULT_PATH_COLS, ImageStore
+from gsme.profiling import StageProfiler, profile_run
+from gsme.results import DEFAULT_RESULTS_DB, record_report
+
 # ----------------------------
 # CONFIG (EDIT THESE)
 # ----------------------------
@@ -59,16 +79,28 @@ SAMPLE_APP_PATH = RESULTS_DIR / "sample_app.csv"
 AUTO_ANN_AVG_PATH = RESULTS_DIR / "auto_annotations_avg.csv"
 AUTO_ANN_APP_PATH = RESULTS_DIR / "auto_annotations_app.csv"
 
+# Study-wide results DB (see gsme/results.py); set to "" to skip
+RESULTS_DB = DEFAULT_RESULTS_DB
+
+# Only validate tasks with new/changed uploads and merge them into the existing outputs
+INCREMENTAL = False
+MANIFEST_PATH = ROOT_DIR / "uploaded_files_manifest.csv"
+
+# Per-stage timings per task (also --profile / --profile_dump on the command line)
+PROFILE = False
+PROFILE_DUMP = ""  # e.g. "auto_validate.prof" (cProfile) or "auto_validate.folded" (sampled stacks)
+
 # ----------------------------
 # Load .env file
 # ----------------------------
 load_dotenv()
 
-API_KEY = os.getenv("OPENROUTER_API_KEY")
-if not API_KEY:
-    print("Error: OPENROUTER_API_KEY not found in .env file")
-    print("Copy .env.example to .env and add your API key")
-    sys.exit(1)
+API_KEY = os.getenv("OPENROUTER_API_KEY")  # checked in main()
+
+# Screenshots are read once (hashed in main) and kept in memory until they are encoded
+IMAGES = ImageStore()
+
+PROF = StageProfiler(PROFILE, key_name="task_id")
 
 # ----------------------------
 # Helpers
@@ -90,10 +122,10 @@ def encode_image_base64(path: str) -> Optional[str]:
 
     try:
         path_obj = Path(path)
-        with open(path_obj, "rb") as f:
-            image_data = f.read()
+        with PROF.stage("base64_encode"):
+            image_data = IMAGES.read_bytes(IMAGES.hash_for(path_obj))
 
-        base64_str = base64.b64encode(image_data).decode("utf-8")
+            base64_str = base64.b64encode(image_data).decode("utf-8")
 
         # Detect mime type
         ext = path_obj.suffix.lower()
@@ -123,7 +155,8 @@ def with_retry(func, tries: int = RETRY_ATTEMPTS, base_sleep: float = 2.0, max_s
             if attempt < tries - 1:
                 sleep_time = min(max_sleep, base_sleep * (2 ** attempt)) + (0.5 * (1 if attempt % 2 == 0 else -1))
                 print(f"  Retry {attempt + 1}/{tries} after error; sleeping {sleep_time:.1f}s ...")
-                time.sleep(sleep_time)
+                with PROF.stage("retry_sleep"):
+                    time.sleep(sleep_time)
 
     raise last_error
 
@@ -131,7 +164,8 @@ def with_retry(func, tries: int = RETRY_ATTEMPTS, base_sleep: float = 2.0, max_s
 def rate_limit_sleep():
     """Sleep to respect rate limits."""
     sleep_time = 60.0 / MAX_REQUESTS_PER_MINUTE
-    time.sleep(sleep_time)
+    with PROF.stage("rate_limit_sleep"):
+        time.sleep(sleep_time)
 
 
 # ----------------------------
@@ -160,19 +194,20 @@ def call_openrouter_vision(prompt: str, image_data_urls: List[str], model: str =
     }
 
     def make_request():
-        response = requests.post(
-            url,
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://gsme-compliance.research",
-                "X-Title": "GSME Screenshot Validator"
-            },
-            json=body,
-            timeout=60
-        )
-        response.raise_for_status()
-        return response.json()
+        with PROF.stage("http"):
+            response = requests.post(
+                url,
+                headers={
+                    "Authorization": f"Bearer {API_KEY}",
+                    "Content-Type": "application/json",
+                    "HTTP-Referer": "https://gsme-compliance.research",
+                    "X-Title": "GSME Screenshot Validator"
+                },
+                json=body,
+                timeout=60
+            )
+            response.raise_for_status()
+            return response.json()
 
     result = with_retry(make_request)
 
@@ -190,7 +225,8 @@ def parse_json_response(text: str) -> Optional[Dict]:
         text = json_match.group(1)
 
     try:
-        return json.loads(text)
+        with PROF.stage("parse"):
+            return json.loads(text)
     except json.JSONDecodeError as e:
         print(f"Failed to parse JSON response: {text[:200]}")
         return None
@@ -458,10 +494,141 @@ Important:
     return base_result
 
 
+def validate_avg_row(i: int, row: Any) -> Dict[str, Any]:
+    """Validate one row of sample_avg.csv (i is its 1-based position)."""
+    # Use task_id from sample file to match human annotations
+    task_id = str(row.task_id) if hasattr(row, "task_id") else f"avg_{row.respondent_id}_{i:04d}"
+
+    return validate_avg_screenshot(
+        task_id=task_id,
+        respondent_id=str(row.respondent_id),
+        screenshot_path=str(row.total_screenshot_path) if pd.notna(row.total_screenshot_path) else "",
+        device=safe_str(row.device if hasattr(row, "device") else ""),
+        screenshot_day=safe_str(row.screenshot_day) if hasattr(row, "screenshot_day") and pd.notna(row.screenshot_day) else None,
+        android_target_date=safe_str(row.android_target_date) if hasattr(row, "android_target_date") and pd.notna(row.android_target_date) else None,
+        reported_hours=safe_int(row.total_hours if hasattr(row, "total_hours") else None),
+        reported_minutes=safe_int(row.total_minutes if hasattr(row, "total_minutes") else None)
+    )
+
+
+def validate_app_row(i: int, row: Any) -> Dict[str, Any]:
+    """Validate one row of sample_app.csv (i is its 1-based position)."""
+    # Use task_id from sample file to match human annotations
+    task_id = str(row.task_id) if hasattr(row, "task_id") else f"app_{row.respondent_id}_{i:04d}"
+
+    screenshot_paths = []
+    for col in ["app_screenshot1_path", "app_screenshot2_path", "app_screenshot3_path"]:
+        if hasattr(row, col):
+            val = getattr(row, col)
+            if pd.notna(val):
+                screenshot_paths.append(str(val))
+
+    # Gather reported values
+    reported_values = {
+        "instagram": {
+            "hours": safe_int(row.instagram_hours if hasattr(row, "instagram_hours") else None),
+            "minutes": safe_int(row.instagram_minutes if hasattr(row, "instagram_minutes") else None)
+        },
+        "facebook": {
+            "hours": safe_int(row.facebook_hours if hasattr(row, "facebook_hours") else None),
+            "minutes": safe_int(row.facebook_minutes if hasattr(row, "facebook_minutes") else None)
+        },
+        "tiktok": {
+            "hours": safe_int(row.tiktok_hours if hasattr(row, "tiktok_hours") else None),
+            "minutes": safe_int(row.tiktok_minutes if hasattr(row, "tiktok_minutes") else None)
+        },
+        "twitter": {
+            "hours": safe_int(row.twitter_hours if hasattr(row, "twitter_hours") else None),
+            "minutes": safe_int(row.twitter_minutes if hasattr(row, "twitter_minutes") else None)
+        }
+    }
+
+    return validate_app_screenshots(
+        task_id=task_id,
+        respondent_id=str(row.respondent_id),
+        screenshot_paths=screenshot_paths,
+        device=safe_str(row.device if hasattr(row, "device") else ""),
+        screenshot_day=safe_str(row.screenshot_day) if hasattr(row, "screenshot_day") and pd.notna(row.screenshot_day) else None,
+        android_target_date=safe_str(row.android_target_date) if hasattr(row, "android_target_date") and pd.notna(row.android_target_date) else None,
+        reported_values=reported_values
+    )
+
+
+RETRY_NOTES = ("API error:", "Failed to parse API response")  # annotations the next incremental run redoes
+
+
+def annotation_needs_retry(annotations: pd.DataFrame) -> pd.Series:
+    """Rows where the API call failed (no verdict, notes starting with RETRY_NOTES)."""
+    cols = annotations.reindex(columns=["screenshot_correct", "notes"]).fillna("").astype(str)
+    return (cols["screenshot_correct"] == "") & cols["notes"].str.startswith(RETRY_NOTES)
+
+
+def save_annotations(results: List[Dict[str, Any]], path: Path, inc: Optional[Incremental]) -> pd.DataFrame:
+    """Write (or, incrementally, merge) one annotations file and record it in the results DB."""
+    annotations = pd.DataFrame(results)
+    if inc is None:
+        annotations.to_csv(path, index=False)
+    else:
+        annotations = inc.write_report(annotations)
+    record_report(RESULTS_DB, "auto_validate", MODEL, path, annotations)
+    if inc is not None:
+        inc.commit()
+    return annotations
+
+
 # ----------------------------
 # Main Processing
 # ----------------------------
+def set_wave(team: str, wave: str) -> None:
+    """Point the input/output paths at data/qualtrics/<team>/<wave>/."""
+    global TEAM_SLUG, WAVE, ROOT_DIR, RESULTS_DIR, SAMPLE_AVG_PATH, SAMPLE_APP_PATH
+    global AUTO_ANN_AVG_PATH, AUTO_ANN_APP_PATH, MANIFEST_PATH
+    TEAM_SLUG, WAVE = team, wave
+    ROOT_DIR = Path("data") / "qualtrics" / TEAM_SLUG / WAVE
+    RESULTS_DIR = ROOT_DIR / "results"
+    SAMPLE_AVG_PATH = RESULTS_DIR / "sample_avg.csv"
+    SAMPLE_APP_PATH = RESULTS_DIR / "sample_app.csv"
+    AUTO_ANN_AVG_PATH = RESULTS_DIR / "auto_annotations_avg.csv"
+    AUTO_ANN_APP_PATH = RESULTS_DIR / "auto_annotations_app.csv"
+    MANIFEST_PATH = ROOT_DIR / "uploaded_files_manifest.csv"
+
+
 def main():
+    global MODEL, INCREMENTAL, RESULTS_DB
+    parser = argparse.ArgumentParser(description="OpenRouter auto-validation of the annotation samples (config above)")
+    parser.add_argument("--team", default=TEAM_SLUG, help=f"Team slug (default: {TEAM_SLUG})")
+    parser.add_argument("--wave", default=WAVE, choices=["baseline", "endline"], help=f"Wave (default: {WAVE})")
+    parser.add_argument("--model", default=MODEL, help=f"OpenRouter vision model (default: {MODEL})")
+    parser.add_argument("--incremental", action="store_true", default=INCREMENTAL,
+                        help="Only validate tasks with new or changed uploads; merge into the existing outputs")
+    parser.add_argument("--results_db", default=str(RESULTS_DB) if RESULTS_DB else "",
+                        help="Study-wide results DB to upsert the annotations into ('' to skip)")
+    parser.add_argument("--profile", action="store_true", default=PROFILE,
+                        help="Time each stage per task; writes <annotations>.profile.csv and prints a breakdown")
+    parser.add_argument("--profile_dump", default=PROFILE_DUMP,
+                        help="Also dump a whole-run profile: .prof = cProfile, other suffix = sampled collapsed stacks")
+    args = parser.parse_args()
+    if not API_KEY:
+        print("Error: OPENROUTER_API_KEY not found in .env file")
+        print("Copy .env.example to .env and add your API key")
+        sys.exit(1)
+    set_wave(args.team, args.wave)
+    MODEL, INCREMENTAL, RESULTS_DB = args.model, args.incremental, args.results_db
+    PROF.enabled = args.profile
+    with profile_run(args.profile_dump, "auto_validate"):
+        run()
+
+
+def report_profile(path: Path) -> None:
+    """Write and print the per-task timings for one annotations file, then start afresh."""
+    profile_csv = PROF.write_csv(path)
+    if profile_csv is not None:
+        print(PROF.summary("auto_validate"))
+        print(f"Per-task timings: {profile_csv}")
+        PROF.reset()
+
+
+def run():
     print("Loading sample files from country team...")
 
     if not SAMPLE_AVG_PATH.exists():
@@ -481,89 +648,56 @@ def main():
     print(f"Found {len(avg_sample)} average tasks to validate")
     print(f"Found {len(app_sample)} app tasks to validate")
 
+    # One pass over the referenced screenshots: hash, dedupe, keep bytes for encoding
+    avg_refs = IMAGES.scan(avg_sample, DEFAULT_PATH_COLS)
+    app_refs = IMAGES.scan(app_sample, DEFAULT_PATH_COLS)
+    print(f"Ingestion: {IMAGES.summary()}")
+
+    avg_inc = app_inc = None
+    avg_todo = app_todo = None
+    if INCREMENTAL:
+        avg_inc = Incremental(AUTO_ANN_AVG_PATH, MANIFEST_PATH, key_cols=("task_id",), needs_retry=annotation_needs_retry)
+        app_inc = Incremental(AUTO_ANN_APP_PATH, MANIFEST_PATH, key_cols=("task_id",), needs_retry=annotation_needs_retry)
+        avg_todo = avg_inc.pending_tasks(avg_sample, avg_refs)
+        app_todo = app_inc.pending_tasks(app_sample, app_refs)
+
     # Process average tasks
     print("\n=== Processing Average Screentime Tasks ===")
     avg_results = []
 
     for i, row in enumerate(avg_sample.itertuples(), 1):
-        # Use task_id from sample file to match human annotations
-        task_id = str(row.task_id) if hasattr(row, "task_id") else f"avg_{row.respondent_id}_{i:04d}"
-
-        result = validate_avg_screenshot(
-            task_id=task_id,
-            respondent_id=str(row.respondent_id),
-            screenshot_path=str(row.total_screenshot_path) if pd.notna(row.total_screenshot_path) else "",
-            device=safe_str(row.device if hasattr(row, "device") else ""),
-            screenshot_day=safe_str(row.screenshot_day) if hasattr(row, "screenshot_day") and pd.notna(row.screenshot_day) else None,
-            android_target_date=safe_str(row.android_target_date) if hasattr(row, "android_target_date") and pd.notna(row.android_target_date) else None,
-            reported_hours=safe_int(row.total_hours if hasattr(row, "total_hours") else None),
-            reported_minutes=safe_int(row.total_minutes if hasattr(row, "total_minutes") else None)
-        )
-
-        avg_results.append(result)
-        rate_limit_sleep()
+        if avg_todo is not None and str(row.task_id) not in avg_todo:
+            continue
+        with PROF.item(str(getattr(row, "task_id", i))):
+            result = validate_avg_row(i, row)
+            avg_results.append(result)
+            rate_limit_sleep()
 
         if i % 10 == 0:
             print(f"  Progress: {i}/{len(avg_sample)} completed")
 
-    avg_annotations = pd.DataFrame(avg_results)
-    avg_annotations.to_csv(AUTO_ANN_AVG_PATH, index=False)
+    avg_annotations = save_annotations(avg_results, AUTO_ANN_AVG_PATH, avg_inc)
     print(f"✅ Saved: {AUTO_ANN_AVG_PATH}")
+    report_profile(AUTO_ANN_AVG_PATH)
 
     # Process app-level tasks
     print("\n=== Processing App-level Screentime Tasks ===")
     app_results = []
 
     for i, row in enumerate(app_sample.itertuples(), 1):
-        # Use task_id from sample file to match human annotations
-        task_id = str(row.task_id) if hasattr(row, "task_id") else f"app_{row.respondent_id}_{i:04d}"
-
-        screenshot_paths = []
-        for col in ["app_screenshot1_path", "app_screenshot2_path", "app_screenshot3_path"]:
-            if hasattr(row, col):
-                val = getattr(row, col)
-                if pd.notna(val):
-                    screenshot_paths.append(str(val))
-
-        # Gather reported values
-        reported_values = {
-            "instagram": {
-                "hours": safe_int(row.instagram_hours if hasattr(row, "instagram_hours") else None),
-                "minutes": safe_int(row.instagram_minutes if hasattr(row, "instagram_minutes") else None)
-            },
-            "facebook": {
-                "hours": safe_int(row.facebook_hours if hasattr(row, "facebook_hours") else None),
-                "minutes": safe_int(row.facebook_minutes if hasattr(row, "facebook_minutes") else None)
-            },
-            "tiktok": {
-                "hours": safe_int(row.tiktok_hours if hasattr(row, "tiktok_hours") else None),
-                "minutes": safe_int(row.tiktok_minutes if hasattr(row, "tiktok_minutes") else None)
-            },
-            "twitter": {
-                "hours": safe_int(row.twitter_hours if hasattr(row, "twitter_hours") else None),
-                "minutes": safe_int(row.twitter_minutes if hasattr(row, "twitter_minutes") else None)
-            }
-        }
-
-        result = validate_app_screenshots(
-            task_id=task_id,
-            respondent_id=str(row.respondent_id),
-            screenshot_paths=screenshot_paths,
-            device=safe_str(row.device if hasattr(row, "device") else ""),
-            screenshot_day=safe_str(row.screenshot_day) if hasattr(row, "screenshot_day") and pd.notna(row.screenshot_day) else None,
-            android_target_date=safe_str(row.android_target_date) if hasattr(row, "android_target_date") and pd.notna(row.android_target_date) else None,
-            reported_values=reported_values
-        )
-
-        app_results.append(result)
-        rate_limit_sleep()
+        if app_todo is not None and str(row.task_id) not in app_todo:
+            continue
+        with PROF.item(str(getattr(row, "task_id", i))):
+            result = validate_app_row(i, row)
+            app_results.append(result)
+            rate_limit_sleep()
 
         if i % 10 == 0:
             print(f"  Progress: {i}/{len(app_sample)} completed")
 
-    app_annotations = pd.DataFrame(app_results)
-    app_annotations.to_csv(AUTO_ANN_APP_PATH, index=False)
+    app_annotations = save_annotations(app_results, AUTO_ANN_APP_PATH, app_inc)
     print(f"✅ Saved: {AUTO_ANN_APP_PATH}")
+    report_profile(AUTO_ANN_APP_PATH)
 
     print("\n=== Auto-validation Complete ===")
     print(f"Average tasks validated: {len(avg_annotations)}")
@@ -17,12 +17,27 @@ What it does:
 
 Dependencies:
   pip install numpy pandas opencv-python pillow pytesseract
+  (OpenCV, pytesseract and Pillow are imported when the analysis starts, so --help works without them)
 
 External:
   - Clone TruFor repo (GRIP-UNINA)
   - Install torch/torchvision + TruFor deps per their instructions
   - Download TruFor weights (this script can do it)
 
+Input files are hashed and read once through gsme.ingest.ImageStore (--memory_mb);
+identical uploads are analyzed once and the result is reported for every row.
+The report is also upserted into the study-wide results DB (--results_db, see gsme/results.py).
+With --incremental, only uploads that are new or changed since the last run (by Qualtrics
+file_id and content hash, see gsme/incremental.py) are analyzed and merged into the report.
+--profile times each stage per unique image (decode, trufor_subprocess, npz_load, ocr,
+roi_score, crop_write) into <out_csv>.profile.csv and prints the breakdown; --profile_dump
+adds a cProfile (.prof) or sampled collapsed-stack dump of the run (gsme/profiling.py).
+--forensics file_forensics_<type>.csv (from 27_file_forensics.py) analyzes the images with
+the highest forensic_score first, so a run that is stopped early has covered the likeliest
+edits; with --forensics_min_score, images scoring below it are not analyzed and are
+reported with status "skipped" (images missing from the forensics report always run;
+with --incremental, skipped rows count as done, so drop --incremental to analyze them later).
+
 Caveat:
   TruFor output .npz keys differ across versions. This script auto-detects arrays by shape/name heuristics.
 """
@@ -38,13 +53,15 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
-import cv2
 import numpy as np
 import pandas as pd
-import pytesseract
-from PIL import Image
 from urllib.request import urlretrieve
 
+from gsme.incremental import Incremental, manifest_for
+from gsme.ingest import DEFAULT_MEMORY_MB, ImageStore
+from gsme.profiling import DISABLED, StageProfiler, profile_run
+from gsme.results import DEFAULT_RESULTS_DB, record_report
+
 
 WEIGHTS_URL = "https://www.grip.unina.it/download/prog/TruFor/TruFor_weights.zip"  # official host
 # directory listing: https://www.grip.unina.it/download/prog/TruFor/  (shows TruFor_weights.zip)  # noqa
@@ -84,6 +101,17 @@ def crop(img: np.ndarray, x: int, y: int, w: int, h: int) -> np.ndarray:
     return img[y:y + h, x:x + w]
 
 
+def import_dependencies() -> None:
+    """
+    Import OpenCV, pytesseract and Pillow, raising ImportError if one is missing. The
+    analysis functions import them on first use, so --help and loading this module
+    (python -m gsme, 21_run_detectors.py) do not pay for them.
+    """
+    import cv2  # noqa: F401
+    import pytesseract  # noqa: F401
+    from PIL import Image  # noqa: F401
+
+
 def ensure_weights(weights_dir: Path) -> Path:
     """
     Ensure TruFor weights are present.
@@ -291,6 +319,10 @@ def ocr_line_boxes(img_bgr: np.ndarray, min_conf: float = 40, min_size: int = 18
     """
     Line-level OCR boxes. Focus on digit-bearing lines to target screen-time numbers.
     """
+    import cv2
+    import pytesseract
+    from PIL import Image
+
     pil_img = Image.fromarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
     ocr = pytesseract.image_to_data(pil_img, output_type=pytesseract.Output.DICT)
 
@@ -361,6 +393,8 @@ def save_crop(img_bgr: np.ndarray, roi: Box, out_path: Path, pad: int = 24) -> N
     x0, y0, w0, h0 = clamp_box(roi.x - pad, roi.y - pad, roi.w + 2 * pad, roi.h + 2 * pad, W, H)
     patch = crop(img_bgr, x0, y0, w0, h0)
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    import cv2
+
     cv2.imwrite(str(out_path), patch)
 
 
@@ -374,29 +408,40 @@ def analyze_image(
     global_thresh: float,
     roi_thresh: float,
     rel_min: float,
+    img: Optional[np.ndarray] = None,
+    prof: StageProfiler = DISABLED,
 ) -> Dict:
-    img = cv2.imread(str(image_path))
+    """Pass `img` (BGR) if already decoded; TruFor itself always reads image_path."""
+    import cv2
+
+    if img is None:
+        with prof.stage("decode"):
+            img = cv2.imread(str(image_path))
     if img is None:
         return {"status": "error", "error": "Could not read image"}
 
     H, W = img.shape[:2]
-    npz_path = run_trufor(trufor_root, image_path, out_dir, gpu=gpu)
-    outs = load_trufor_outputs(npz_path, (H, W))
+    with prof.stage("trufor_subprocess"):
+        npz_path = run_trufor(trufor_root, image_path, out_dir, gpu=gpu)
+    with prof.stage("npz_load"):
+        outs = load_trufor_outputs(npz_path, (H, W))
     score = float(outs["score"])
     loc, rel = outs["loc"], outs["rel"]
 
-    rois = ocr_line_boxes(img, min_conf=min_conf, min_size=min_size)
+    with prof.stage("ocr"):
+        rois = ocr_line_boxes(img, min_conf=min_conf, min_size=min_size)
 
     roi_rows = []
     max_roi = 0.0
     best_roi = None
 
-    for roi in rois:
-        s = roi_anomaly_score(loc, rel, roi, rel_min=rel_min)
-        roi_rows.append((roi, s))
-        if s > max_roi:
-            max_roi = s
-            best_roi = roi
+    with prof.stage("roi_score"):
+        for roi in rois:
+            s = roi_anomaly_score(loc, rel, roi, rel_min=rel_min)
+            roi_rows.append((roi, s))
+            if s > max_roi:
+                max_roi = s
+                best_roi = roi
 
     flagged = (score >= global_thresh) or (max_roi >= roi_thresh)
 
@@ -411,6 +456,62 @@ def analyze_image(
     }
 
 
+def detector_version(global_thresh: float, roi_thresh: float, rel_min: float) -> str:
+    """Version label for the results DB: flags depend on the thresholds."""
+    return f"trufor:global={global_thresh}:roi={roi_thresh}:rel={rel_min}"
+
+
+def error_row(task_id: str, col: str, img_path: Path, error: str) -> Dict:
+    return {
+        "task_id": task_id, "image_col": col, "image_path": str(img_path),
+        "status": "error", "error": error,
+        "trufor_score": np.nan, "max_roi_score": np.nan, "n_rois": 0, "npz_path": ""
+    }
+
+
+def report_row(task_id: str, col: str, img_path: Path, res: Dict, crop_path: str = "") -> Dict:
+    """One trufor_report row from an analyze_image() result."""
+    best_roi = res.get("best_roi")
+    return {
+        "task_id": task_id,
+        "image_col": col,
+        "image_path": str(img_path),
+        "status": res["status"],
+        "error": res.get("error", ""),
+        "trufor_score": res.get("trufor_score", np.nan),
+        "max_roi_score": res.get("max_roi_score", np.nan),
+        "n_rois": res.get("n_rois", 0),
+        "npz_path": res.get("npz_path", ""),
+        "best_roi_text": (best_roi.text[:80] if best_roi else ""),
+        "best_roi_conf": (best_roi.conf if best_roi else np.nan),
+        "crop_path": crop_path
+    }
+
+
+def crop_filename(task_id: str, col: str, res: Dict) -> str:
+    return f"{safe_filename(task_id)}_{safe_filename(col)}_roi{res['max_roi_score']:.3f}_g{res['trufor_score']:.3f}.png"
+
+
+def forensic_order(todo: List[Tuple[str, Path]], report_csv: Path,
+                   min_score: float) -> Tuple[List[Tuple[str, Path]], Dict[str, Dict]]:
+    """
+    (hash, path) pairs sorted by 27_file_forensics.py's forensic_score, highest first, and
+    {hash: skipped result} for those scoring below min_score. Unscored images come first.
+    """
+    report = pd.read_csv(report_csv)
+    score_of = {str(Path(str(p)).expanduser()): float(s)
+                for p, s in zip(report["image_path"], report["forensic_score"]) if pd.notna(s)}
+    keep, skipped = [], {}
+    for h, img_path in todo:
+        score = score_of.get(str(img_path))
+        if score is not None and score < min_score:
+            skipped[h] = {"status": "skipped", "error": f"File forensics: score {score:.3f} < {min_score}"}
+        else:
+            keep.append((score if score is not None else float("inf"), h, img_path))
+    keep.sort(key=lambda t: -t[0])  # stable: equal scores keep input order
+    return [(h, p) for _, h, p in keep], skipped
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--trufor_root", required=True, help="Path to cloned TruFor repo")
@@ -430,8 +531,30 @@ def main():
     ap.add_argument("--rel_min", type=float, default=0.40, help="Only count pixels with reliability >= this in ROI scoring")
 
     ap.add_argument("--path_cols", default="total_screenshot_path,app_screenshot1_path,app_screenshot2_path,app_screenshot3_path")
+    ap.add_argument("--results_db", default=str(DEFAULT_RESULTS_DB),
+                    help="Study-wide results DB to upsert this report into ('' to skip)")
+    ap.add_argument("--memory_mb", type=float, default=DEFAULT_MEMORY_MB,
+                    help="Memory budget for decoded images kept between analysis and cropping")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Only analyze new or changed uploads and merge them into the existing --out_csv")
+    ap.add_argument("--manifest", default="",
+                    help="With --incremental: uploaded_files_manifest.csv (default: the input CSV's wave)")
+    ap.add_argument("--forensics", default="",
+                    help="27_file_forensics.py report: analyze images with the highest forensic_score first")
+    ap.add_argument("--forensics_min_score", type=float, default=0.0,
+                    help="With --forensics: skip images whose forensic_score is below this (default: analyze all)")
+    ap.add_argument("--profile", action="store_true",
+                    help="Time each stage per image; writes <out_csv>.profile.csv and prints a breakdown")
+    ap.add_argument("--profile_dump", default="",
+                    help="Also dump a whole-run profile: .prof = cProfile, other suffix = sampled collapsed stacks")
 
     args = ap.parse_args()
+    with profile_run(args.profile_dump, "edge"):
+        _main(args)
+
+
+def _main(args: argparse.Namespace) -> None:
+    import_dependencies()  # fail before any work, not on the first image
 
     trufor_root = Path(args.trufor_root).expanduser().resolve()
     out_dir = Path(args.out_dir).expanduser().resolve()
@@ -445,23 +568,28 @@ def main():
     df = pd.read_csv(args.csv)
     path_cols = [c.strip() for c in args.path_cols.split(",") if c.strip()]
 
-    rows = []
-    for i, r in df.iterrows():
-        task_id = r.get("task_id", f"row_{i}")
-        for col in path_cols:
-            if col not in r or pd.isna(r[col]):
-                continue
-            img_path = Path(str(r[col])).expanduser()
-            if not img_path.exists():
-                rows.append({
-                    "task_id": task_id, "image_col": col, "image_path": str(img_path),
-                    "status": "error", "error": "File not found",
-                    "trufor_score": np.nan, "max_roi_score": np.nan, "n_rois": 0, "npz_path": ""
-                })
-                continue
-
-            try:
-                res = analyze_image(
+    prof = StageProfiler(enabled=args.profile)
+    images = ImageStore(memory_mb=args.memory_mb)
+    with prof.stage("scan"):
+        refs = images.scan(df, path_cols)
+    inc = Incremental(out_csv, args.manifest or manifest_for(args.csv)) if args.incremental else None
+    if inc is not None:
+        refs = inc.pending(df, refs)
+
+    # Identical uploads are analyzed once
+    analyzed: Dict[str, Dict] = {}
+    todo = list(images.unique(refs).items())
+    if args.forensics:
+        todo, skipped = forensic_order(todo, Path(args.forensics), args.forensics_min_score)
+        analyzed.update(skipped)
+        print(f"Forensics: {len(todo)} image(s) to analyze, most suspicious first; {len(skipped)} skipped "
+              f"(forensic_score < {args.forensics_min_score})")
+    for h, img_path in todo:
+        try:
+            with prof.item(h, image_path=str(img_path)):
+                with prof.stage("decode"):
+                    img = images.bgr(h)
+                analyzed[h] = analyze_image(
                     trufor_root=trufor_root,
                     image_path=img_path,
                     out_dir=out_dir,
@@ -471,41 +599,53 @@ def main():
                     global_thresh=args.global_thresh,
                     roi_thresh=args.roi_thresh,
                     rel_min=args.rel_min,
+                    img=img,
+                    prof=prof,
                 )
-                best_roi = res.get("best_roi")
-                crop_path = ""
-                if res["status"] == "flagged" and best_roi is not None:
-                    crop_name = f"{safe_filename(task_id)}_{safe_filename(col)}_roi{res['max_roi_score']:.3f}_g{res['trufor_score']:.3f}.png"
-                    crop_path = str((crops_dir / crop_name))
-                    img_bgr = cv2.imread(str(img_path))
-                    save_crop(img_bgr, best_roi, Path(crop_path), pad=28)
-
-                rows.append({
-                    "task_id": task_id,
-                    "image_col": col,
-                    "image_path": str(img_path),
-                    "status": res["status"],
-                    "error": res.get("error", ""),
-                    "trufor_score": res.get("trufor_score", np.nan),
-                    "max_roi_score": res.get("max_roi_score", np.nan),
-                    "n_rois": res.get("n_rois", 0),
-                    "npz_path": res.get("npz_path", ""),
-                    "best_roi_text": (best_roi.text[:80] if best_roi else ""),
-                    "best_roi_conf": (best_roi.conf if best_roi else np.nan),
-                    "crop_path": crop_path
-                })
-            except Exception as e:
-                rows.append({
-                    "task_id": task_id, "image_col": col, "image_path": str(img_path),
-                    "status": "error", "error": str(e),
-                    "trufor_score": np.nan, "max_roi_score": np.nan, "n_rois": 0, "npz_path": ""
-                })
+        except Exception as e:
+            analyzed[h] = {"status": "error", "error": str(e)}
+
+    rows = []
+    for ref in refs:
+        task_id, col, img_path = ref.task_id, ref.col, ref.path
+        res = analyzed.get(ref.content_hash) if ref.content_hash else {"status": "error", "error": ref.error}
+        if res["status"] == "skipped":
+            rows.append({**error_row(task_id, col, img_path, res["error"]), "status": "skipped"})
+            continue
+        if res["status"] == "error":
+            rows.append(error_row(task_id, col, img_path, res["error"]))
+            continue
+
+        try:
+            best_roi = res.get("best_roi")
+            crop_path = ""
+            if res["status"] == "flagged" and best_roi is not None:
+                crop_path = str((crops_dir / crop_filename(task_id, col, res)))
+                with prof.item(ref.content_hash), prof.stage("crop_write"):
+                    save_crop(images.bgr(ref.content_hash), best_roi, Path(crop_path), pad=28)
+
+            rows.append(report_row(task_id, col, img_path, res, crop_path))
+        except Exception as e:
+            rows.append(error_row(task_id, col, img_path, str(e)))
 
     out = pd.DataFrame(rows)
     out_csv.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(out_csv, index=False)
+    with prof.stage("write_report"):
+        if inc is not None:
+            out = inc.write_report(out)
+        else:
+            out.to_csv(out_csv, index=False)
+        record_report(args.results_db, "trufor", detector_version(args.global_thresh, args.roi_thresh, args.rel_min),
+                      out_csv, out)
+    if inc is not None:
+        inc.commit()
     print(f"Saved report: {out_csv}")
     print(f"Saved crops (flagged): {crops_dir}")
+    print(f"Ingestion: {images.summary()}")
+    profile_csv = prof.write_csv(out_csv)
+    if profile_csv is not None:
+        print(prof.summary("edge"))
+        print(f"Per-image timings: {profile_csv}")
 
 
 if __name__ == "__main__":
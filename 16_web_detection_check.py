@@ -28,20 +28,65 @@ Notes:
     * pages_with_matching_images: where matching images were found
     * web_entities: concepts/entities (less useful for exact match)
 - If you truly want "exact matches" only, this script flags only full_matching_images.
+- Images are sent in batch_annotate_images requests of up to 16 (--batch_size); each response
+  is mapped back to its task_id/image_col and errors are recorded per image.
+  Use --batch_size 1 for the old one-request-per-image behaviour.
+- Requests run concurrently (--max_in_flight) under a shared --qps ceiling.
+- Full web-detection responses are cached under data/cache/web_detection/ keyed by the
+  sha256 of the image bytes (--cache_ttl_days), so duplicate uploads and reruns cost no quota.
+- --shrink downsizes/re-encodes uploads (--max_side, --max_bytes, --jpeg_quality); shrunk bytes are
+  cached by source hash and the report records payload_variant/payload_bytes per image. Batches are
+  split so no request exceeds Vision's request-size limit.
+- Files are read and hashed once through gsme.ingest.ImageStore (--memory_mb), which also
+  holds the bytes until upload.
+- Match lists are written to the CSV as JSON and, one row per (image, match type, url),
+  to the web_matches table in web_detection_matches.sqlite next to the CSV (--matches_db).
+- The report is also upserted into the study-wide results DB (--results_db, see gsme/results.py).
+- --incremental only queries uploads that are new or changed since the last run (by Qualtrics
+  file_id and content hash, see gsme/incremental.py) and merges their rows into the existing
+  report and match table.
+- --profile times each stage per unique image (cache_lookup, prepare_payload, load_payload,
+  rate_limit_wait, api_call, parse, cache_write; a batch's wait and call time is shared
+  equally by its images) into <out_csv>.profile.csv and prints the breakdown. --profile_dump
+  adds a cProfile (.prof) or sampled collapsed-stack dump of the run (gsme/profiling.py).
 """
 
 import argparse
+import io
+import json
 import os
+import sqlite3
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import pandas as pd
 from dotenv import load_dotenv
 
+from gsme.cache import HashCache
+from gsme.incremental import Incremental, manifest_for
+from gsme.ingest import DEFAULT_MEMORY_MB, ImageStore
+from gsme.profiling import StageProfiler, profile_run
+from gsme.ratelimit import RateLimiter
+from gsme.results import DEFAULT_RESULTS_DB, record_report, team_wave_from_path
+
 load_dotenv()
 
 DEFAULT_SLEEP = 1.0  # seconds between requests
+MAX_BATCH_SIZE = 16  # Vision batch_annotate_images limit per request
+DEFAULT_CACHE_DIR = Path("data") / "cache" / "web_detection"
+DEFAULT_CACHE_TTL_DAYS = 30.0
+DEFAULT_PAYLOAD_CACHE_DIR = Path("data") / "cache" / "web_detection_payloads"
+
+# Vision size limits: 20 MB per image, ~10 MB per JSON request. Stay under both.
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_REQUEST_BYTES = 10 * 1024 * 1024
+
+
+def detector_version(max_results: int) -> str:
+    """Version label for the results DB; reports with different max_results are kept apart."""
+    return f"vision_web_detection:max_results={max_results}"
 
 
 def _domain_from_url(url: str) -> str:
@@ -54,6 +99,75 @@ def _domain_from_url(url: str) -> str:
         return ""
 
 
+def _empty_result(status: str = "error", error: str = "") -> Dict[str, Any]:
+    return {
+        "status": status,
+        "error": error,
+        "n_full_matches": 0,
+        "n_partial_matches": 0,
+        "n_pages": 0,
+        "full_matches": [],
+        "partial_matches": [],
+        "pages": [],
+        "top_full_match_url": "",
+        "top_full_match_domain": "",
+        "top_full_match_score": "",
+        "top_page_url": "",
+        "top_page_domain": "",
+        "top_page_score": "",
+    }
+
+
+def _web_detection_to_dict(wd: Any) -> Dict[str, Any]:
+    """Full, library-independent copy of a Vision WebDetection message (what the cache stores)."""
+    def _items(items: Any) -> List[Dict[str, Any]]:
+        return [{"url": it.url, "score": float(it.score) if it.score is not None else None} for it in (items or [])]
+
+    return {
+        "full_matching_images": _items(wd.full_matching_images),
+        "partial_matching_images": _items(wd.partial_matching_images),
+        "pages_with_matching_images": _items(wd.pages_with_matching_images),
+        "visually_similar_images": _items(getattr(wd, "visually_similar_images", None)),
+        "web_entities": [
+            {"entity_id": e.entity_id, "description": e.description, "score": float(e.score)}
+            for e in (getattr(wd, "web_entities", None) or [])
+        ],
+        "best_guess_labels": [lb.label for lb in (getattr(wd, "best_guess_labels", None) or [])],
+    }
+
+
+def _parse_web_detection(wd: Dict[str, Any], max_results: int) -> Dict[str, Any]:
+    """Turn a web-detection dict (see _web_detection_to_dict) into the flat result dict used in the report."""
+    # Collect full matching images (closest analogue to "exact match")
+    full_matches = list(wd.get("full_matching_images", []))[:max_results]
+    # Collect partial matching images (variants)
+    partial_matches = list(wd.get("partial_matching_images", []))[:max_results]
+    # Pages containing matching images
+    pages = list(wd.get("pages_with_matching_images", []))[:max_results]
+
+    top_full = full_matches[0] if full_matches else {}
+    top_page = pages[0] if pages else {}
+
+    status = "match" if len(full_matches) > 0 else "no_match"
+
+    return {
+        "status": status,
+        "error": "",
+        "n_full_matches": len(full_matches),
+        "n_partial_matches": len(partial_matches),
+        "n_pages": len(pages),
+        "full_matches": full_matches,
+        "partial_matches": partial_matches,
+        "pages": pages,
+        "top_full_match_url": top_full.get("url", ""),
+        "top_full_match_domain": _domain_from_url(top_full.get("url", "")),
+        "top_full_match_score": top_full.get("score", ""),
+        "top_page_url": top_page.get("url", ""),
+        "top_page_domain": _domain_from_url(top_page.get("url", "")),
+        "top_page_score": top_page.get("score", ""),
+    }
+
+
 def web_detect_image(client: Any, image_path: Path, max_results: int = 10) -> Dict[str, Any]:
     """
     Run Google Vision Web Detection on a local image file.
@@ -73,97 +187,236 @@ def web_detect_image(client: Any, image_path: Path, max_results: int = 10) -> Di
     try:
         from google.cloud import vision  # type: ignore
     except ImportError:
-        return {
-            "status": "error",
-            "error": "google-cloud-vision not installed. Run: pip install google-cloud-vision",
-            "n_full_matches": 0,
-            "n_partial_matches": 0,
-            "n_pages": 0,
-            "full_matches": [],
-            "partial_matches": [],
-            "pages": [],
-            "top_full_match_url": "",
-            "top_full_match_domain": "",
-            "top_full_match_score": "",
-            "top_page_url": "",
-            "top_page_domain": "",
-            "top_page_score": "",
-        }
+        return _empty_result(error="google-cloud-vision not installed. Run: pip install google-cloud-vision")
 
     try:
         content = image_path.read_bytes()
-        image = vision.Image(content=content)
+    except Exception as e:
+        return _empty_result(error=str(e))
+
+    wd, err = fetch_web_detection(client, content, max_results=max_results)
+    return _parse_web_detection(wd, max_results) if wd is not None else _empty_result(error=err)
+
 
+def fetch_web_detection(
+    client: Any, content: bytes, max_results: int = 10
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Single client.web_detection call. Returns (web_detection_dict, error)."""
+    from google.cloud import vision  # type: ignore
+
+    try:
         # Web Detection call
-        response = client.web_detection(image=image)
+        response = client.web_detection(image=vision.Image(content=content), max_results=max_results)
         if response.error and response.error.message:
             raise RuntimeError(response.error.message)
+        return _web_detection_to_dict(response.web_detection), ""
+    except Exception as e:
+        return None, str(e)
+
 
-        wd = response.web_detection
-
-        # Collect full matching images (closest analogue to "exact match")
-        full_matches = []
-        for im in (wd.full_matching_images or [])[:max_results]:
-            full_matches.append({
-                "url": im.url,
-                "score": float(im.score) if im.score is not None else None
-            })
-
-        # Collect partial matching images (variants)
-        partial_matches = []
-        for im in (wd.partial_matching_images or [])[:max_results]:
-            partial_matches.append({
-                "url": im.url,
-                "score": float(im.score) if im.score is not None else None
-            })
-
-        # Pages containing matching images
-        pages = []
-        for p in (wd.pages_with_matching_images or [])[:max_results]:
-            pages.append({
-                "url": p.url,
-                "score": float(p.score) if p.score is not None else None
-            })
-
-        top_full = full_matches[0] if full_matches else {}
-        top_page = pages[0] if pages else {}
-
-        status = "match" if len(full_matches) > 0 else "no_match"
-
-        return {
-            "status": status,
-            "error": "",
-            "n_full_matches": len(full_matches),
-            "n_partial_matches": len(partial_matches),
-            "n_pages": len(pages),
-            "full_matches": full_matches,
-            "partial_matches": partial_matches,
-            "pages": pages,
-            "top_full_match_url": top_full.get("url", ""),
-            "top_full_match_domain": _domain_from_url(top_full.get("url", "")),
-            "top_full_match_score": top_full.get("score", ""),
-            "top_page_url": top_page.get("url", ""),
-            "top_page_domain": _domain_from_url(top_page.get("url", "")),
-            "top_page_score": top_page.get("score", ""),
-        }
+def fetch_web_detection_batch(
+    client: Any, contents: List[bytes], max_results: int = 10
+) -> List[Tuple[Optional[Dict[str, Any]], str]]:
+    """
+    Send up to MAX_BATCH_SIZE images in one batch_annotate_images call.
+
+    Returns one (web_detection_dict, error) pair per input, in input order; exactly one
+    of the two is set. A failed request marks every image in the batch as an error.
+    """
+    if len(contents) > MAX_BATCH_SIZE:
+        raise ValueError(f"Vision accepts at most {MAX_BATCH_SIZE} images per batch, got {len(contents)}")
 
+    try:
+        from google.cloud import vision  # type: ignore
+    except ImportError:
+        return [(None, "google-cloud-vision not installed. Run: pip install google-cloud-vision")] * len(contents)
+
+    batch_requests = [
+        vision.AnnotateImageRequest(
+            image=vision.Image(content=content),
+            features=[vision.Feature(type_=vision.Feature.Type.WEB_DETECTION, max_results=max_results)],
+        )
+        for content in contents
+    ]
+    try:
+        batch = client.batch_annotate_images(requests=batch_requests)
     except Exception as e:
-        return {
-            "status": "error",
-            "error": str(e),
-            "n_full_matches": 0,
-            "n_partial_matches": 0,
-            "n_pages": 0,
-            "full_matches": [],
-            "partial_matches": [],
-            "pages": [],
-            "top_full_match_url": "",
-            "top_full_match_domain": "",
-            "top_full_match_score": "",
-            "top_page_url": "",
-            "top_page_domain": "",
-            "top_page_score": "",
-        }
+        return [(None, f"Batch request failed: {e}")] * len(contents)
+
+    # Responses come back in request order
+    out: List[Tuple[Optional[Dict[str, Any]], str]] = []
+    for response in batch.responses:
+        if response.error and response.error.message:
+            out.append((None, response.error.message))
+        else:
+            out.append((_web_detection_to_dict(response.web_detection), ""))
+    out += [(None, "No response returned for image in batch")] * (len(contents) - len(out))
+    return out
+
+
+def _report_row(
+    task_id: Any,
+    col: str,
+    img_path: Path,
+    result: Dict[str, Any],
+    content_hash: str = "",
+    from_cache: Any = "",
+    payload_variant: str = "",
+    payload_bytes: Any = "",
+) -> Dict[str, Any]:
+    return {
+        "task_id": task_id,
+        "image_col": col,
+        "image_path": str(img_path),
+        "status": result["status"],
+        "error": result["error"],
+        # TinEye-like "match count" field:
+        # Here, "exact match" analogue is full matching images only.
+        "n_full_matches": result["n_full_matches"],
+        "n_partial_matches": result["n_partial_matches"],
+        "n_pages": result["n_pages"],
+        "top_full_match_domain": result["top_full_match_domain"],
+        "top_full_match_url": result["top_full_match_url"],
+        "top_full_match_score": result["top_full_match_score"],
+        "top_page_domain": result["top_page_domain"],
+        "top_page_url": result["top_page_url"],
+        "top_page_score": result["top_page_score"],
+        # Full lists as JSON for auditing; the normalized copy lives in the matches DB
+        "full_matches": json.dumps(result["full_matches"]),
+        "partial_matches": json.dumps(result["partial_matches"]),
+        "pages": json.dumps(result["pages"]),
+        "content_hash": content_hash,
+        "from_cache": from_cache,
+        "payload_variant": payload_variant,
+        "payload_bytes": payload_bytes,
+    }
+
+
+def shrink_payload(content: bytes, max_side: int, max_bytes: int, quality: int = 85) -> Tuple[bytes, str]:
+    """
+    Downsize and re-encode an image for upload.
+
+    - Longest side is capped at max_side (aspect ratio kept)
+    - Re-encoded as RGB JPEG, lowering quality until it fits max_bytes
+    - Returns (payload, variant); variant is "original" when shrinking would not help
+    """
+    from PIL import Image  # only needed with --shrink
+
+    with Image.open(io.BytesIO(content)) as img:
+        img.load()
+        w, h = img.size
+        scale = min(1.0, max_side / float(max(w, h)))
+        if scale >= 1.0 and len(content) <= max_bytes and img.format == "JPEG":
+            return content, "original"
+
+        out = img.convert("RGB")
+        if scale < 1.0:
+            out = out.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+
+    q = quality
+    while True:
+        buf = io.BytesIO()
+        out.save(buf, "JPEG", quality=q, optimize=True)
+        data = buf.getvalue()
+        if len(data) <= max_bytes or q <= 40:
+            break
+        q -= 15
+
+    if len(data) >= len(content) and len(content) <= max_bytes:
+        return content, "original"
+    return data, f"jpeg_q{q}_{max(out.size)}px"
+
+
+class PayloadPreparer:
+    """
+    Decides what bytes to send for each source image (original or shrunk).
+
+    Shrunk payloads are cached by source hash + settings, so reruns do not re-encode.
+    """
+
+    def __init__(self, shrink: bool, max_side: int, max_bytes: int, quality: int, cache_dir: Path,
+                 images: ImageStore) -> None:
+        self.images = images
+        self.shrink = shrink
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.cache = HashCache(cache_dir)
+
+    def _key(self, h: str) -> str:
+        return f"{h}_{self.max_side}_{self.max_bytes}_{self.quality}"
+
+    def prepare(self, h: str) -> Tuple[str, int]:
+        """Return (variant, payload size in bytes) without keeping the shrunk payload in memory."""
+        if not self.shrink:
+            return "original", self.images.path(h).stat().st_size
+        meta = self.cache.get(self._key(h))
+        if meta is not None:
+            return meta["variant"], int(meta["bytes"])
+        content = self.images.read_bytes(h)
+        data, variant = shrink_payload(content, self.max_side, self.max_bytes, self.quality)
+        if variant != "original":
+            self.cache.put_bytes(self._key(h), data)
+        self.cache.put(self._key(h), {"variant": variant, "bytes": len(data)})
+        return variant, len(data)
+
+    def load(self, h: str, variant: str) -> bytes:
+        if variant != "original":
+            data = self.cache.get_bytes(self._key(h))
+            if data is not None:
+                return data
+            return shrink_payload(self.images.read_bytes(h), self.max_side, self.max_bytes, self.quality)[0]
+        return self.images.read_bytes(h)
+
+
+def match_records(task_id: Any, col: str, img_path: Path, result: Dict[str, Any], content_hash: str) -> List[Tuple]:
+    """One (image, match type, rank, url, score, domain) tuple per URL in a web-detection result."""
+    out = []
+    for match_type, key in (("full", "full_matches"), ("partial", "partial_matches"), ("page", "pages")):
+        for rank, m in enumerate(result.get(key) or [], 1):
+            url = m.get("url", "")
+            out.append((str(task_id), col, str(img_path), content_hash, match_type, rank,
+                        url, m.get("score"), _domain_from_url(url)))
+    return out
+
+
+def write_matches_db(db_path: Path, report: str, team: str, wave: str, records: List[Tuple],
+                     images: Optional[Iterable[Tuple[str, str]]] = None) -> None:
+    """
+    Replace this report's rows in the normalized web_matches table (only those of the given
+    (task_id, image_col) pairs when images is set).
+
+    The table is shared by every report that points at the same db file (avg/app, or all teams
+    and waves when --matches_db is a study-wide path), e.g.:
+
+        SELECT DISTINCT team, wave, task_id FROM web_matches
+        WHERE match_type = 'full' AND domain = 'i.redd.it';
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(str(db_path))
+    try:
+        with con:
+            con.execute(
+                """CREATE TABLE IF NOT EXISTS web_matches (
+                    report TEXT NOT NULL, team TEXT, wave TEXT,
+                    task_id TEXT NOT NULL, image_col TEXT NOT NULL, image_path TEXT, content_hash TEXT,
+                    match_type TEXT NOT NULL, rank INTEGER NOT NULL,
+                    url TEXT, score REAL, domain TEXT)"""
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_web_matches_domain ON web_matches (domain, match_type)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_web_matches_image ON web_matches (report, task_id, image_col)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_web_matches_hash ON web_matches (content_hash)")
+            if images is None:
+                con.execute("DELETE FROM web_matches WHERE report = ?", (report,))
+            else:
+                con.executemany("DELETE FROM web_matches WHERE report = ? AND task_id = ? AND image_col = ?",
+                                [(report, t, c) for t, c in images])
+            con.executemany(
+                "INSERT INTO web_matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(report, team, wave) + rec for rec in records],
+            )
+    finally:
+        con.close()
 
 
 def main() -> int:
@@ -175,10 +428,50 @@ def main() -> int:
         default="total_screenshot_path,app_screenshot1_path,app_screenshot2_path,app_screenshot3_path",
         help="Comma-separated column names containing image paths",
     )
-    parser.add_argument("--sleep", type=float, default=DEFAULT_SLEEP, help="Seconds between API requests")
+    parser.add_argument("--sleep", type=float, default=DEFAULT_SLEEP,
+                        help="Seconds between API requests (per batch); used as 1/--qps when --qps is not given")
+    parser.add_argument("--qps", type=float, default=None, help="Max API requests started per second (0 = no limit)")
+    parser.add_argument("--max_in_flight", type=int, default=4, help="Max concurrent API requests")
+    parser.add_argument("--cache_dir", default=str(DEFAULT_CACHE_DIR), help="Cache of web-detection responses by content hash")
+    parser.add_argument("--cache_ttl_days", type=float, default=DEFAULT_CACHE_TTL_DAYS,
+                        help="Re-query cached images older than this many days (0 = never expire)")
+    parser.add_argument("--no_cache", action="store_true", help="Ignore and do not write the response cache")
+    parser.add_argument(
+        "--matches_db",
+        default="",
+        help="SQLite file for the normalized match table (default: web_detection_matches.sqlite next to --out_csv)",
+    )
+    parser.add_argument("--memory_mb", type=float, default=DEFAULT_MEMORY_MB,
+                        help="Memory budget for image bytes kept between hashing and upload")
+    parser.add_argument("--results_db", default=str(DEFAULT_RESULTS_DB),
+                        help="Study-wide results DB to upsert this report into ('' to skip)")
     parser.add_argument("--max_results", type=int, default=10, help="Max URLs to store per result type")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only query new or changed uploads and merge them into the existing --out_csv")
+    parser.add_argument("--manifest", default="",
+                        help="With --incremental: uploaded_files_manifest.csv (default: the input CSV's wave)")
+    parser.add_argument("--shrink", action="store_true", help="Downsize/re-encode images before upload (opt-in)")
+    parser.add_argument("--max_side", type=int, default=1600, help="With --shrink: max width/height in pixels")
+    parser.add_argument("--max_bytes", type=int, default=1_500_000, help="With --shrink: max bytes per uploaded image")
+    parser.add_argument("--jpeg_quality", type=int, default=85, help="With --shrink: starting JPEG quality")
+    parser.add_argument("--payload_cache_dir", default=str(DEFAULT_PAYLOAD_CACHE_DIR), help="Cache of shrunk payloads")
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=MAX_BATCH_SIZE,
+        help=f"Images per batch_annotate_images request (1-{MAX_BATCH_SIZE}; 1 = one web_detection call per image)",
+    )
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each stage per image; writes <out_csv>.profile.csv and prints a breakdown")
+    parser.add_argument("--profile_dump", default="",
+                        help="Also dump a whole-run profile: .prof = cProfile, other suffix = sampled collapsed stacks")
 
     args = parser.parse_args()
+    with profile_run(args.profile_dump, "web_detection"):
+        return _main(args)
+
+
+def _main(args: argparse.Namespace) -> int:
 
     # Basic auth check: GOOGLE_APPLICATION_CREDENTIALS should be set for google-cloud-vision
     creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
@@ -209,67 +502,160 @@ def main() -> int:
     df = pd.read_csv(args.csv)
     path_cols = [c.strip() for c in args.path_cols.split(",") if c.strip()]
 
-    rows: List[Dict[str, Any]] = []
-    for i, r in df.iterrows():
-        task_id = r.get("task_id", f"row_{i}")
-
-        for col in path_cols:
-            if col not in r or pd.isna(r[col]):
-                continue
-
-            img_path = Path(str(r[col])).expanduser()
-            if not img_path.exists():
-                rows.append({
-                    "task_id": task_id,
-                    "image_col": col,
-                    "image_path": str(img_path),
-                    "status": "error",
-                    "error": "File not found",
-                    "n_full_matches": 0,
-                    "n_partial_matches": 0,
-                    "n_pages": 0,
-                    "top_full_match_domain": "",
-                    "top_full_match_url": "",
-                    "top_full_match_score": "",
-                    "top_page_domain": "",
-                    "top_page_url": "",
-                    "top_page_score": "",
-                })
-                continue
-
-            print(f"[web_detection] Searching: {img_path.name}")
-            result = web_detect_image(client, img_path, max_results=args.max_results)
-
-            rows.append({
-                "task_id": task_id,
-                "image_col": col,
-                "image_path": str(img_path),
-                "status": result["status"],
-                "error": result["error"],
-                # TinEye-like "match count" field:
-                # Here, "exact match" analogue is full matching images only.
-                "n_full_matches": result["n_full_matches"],
-                "n_partial_matches": result["n_partial_matches"],
-                "n_pages": result["n_pages"],
-                "top_full_match_domain": result["top_full_match_domain"],
-                "top_full_match_url": result["top_full_match_url"],
-                "top_full_match_score": result["top_full_match_score"],
-                "top_page_domain": result["top_page_domain"],
-                "top_page_url": result["top_page_url"],
-                "top_page_score": result["top_page_score"],
-                # Store full lists as JSON-ish strings for auditing (optional)
-                "full_matches": str(result["full_matches"]),
-                "partial_matches": str(result["partial_matches"]),
-                "pages": str(result["pages"]),
-            })
-
-            time.sleep(args.sleep)
+    # Report rows keep input order; API results are filled in by position.
+    # Each file is hashed once; duplicate uploads share one lookup.
+    prof = StageProfiler(enabled=args.profile)
+    images = ImageStore(memory_mb=args.memory_mb)
+    with prof.stage("scan"):
+        refs = images.scan(df, path_cols)
+    inc = Incremental(args.out_csv, args.manifest or manifest_for(args.csv)) if args.incremental else None
+    if inc is not None:
+        refs = inc.pending(df, refs)
+    rows: List[Optional[Dict[str, Any]]] = []
+    for ref in refs:
+        if ref.content_hash:
+            rows.append(None)
+            continue
+        row = _report_row(ref.task_id, ref.col, ref.path, _empty_result(error=ref.error))
+        if ref.error == "File not found":
+            for k in ("full_matches", "partial_matches", "pages"):
+                row.pop(k)
+        rows.append(row)
+    path_of_hash = images.unique(refs)
+    n_pending = sum(1 for ref in refs if ref.content_hash)
+
+    batch_size = max(1, min(args.batch_size, MAX_BATCH_SIZE))
+    qps = args.qps if args.qps is not None else (1.0 / args.sleep if args.sleep > 0 else 0.0)
+    limiter = RateLimiter(qps)
+    ttl_s = args.cache_ttl_days * 86400 if args.cache_ttl_days > 0 else None
+    cache = None if args.no_cache else HashCache(args.cache_dir, ttl_s=ttl_s)
+    t0 = time.monotonic()
+
+    web: Dict[str, Tuple[Optional[Dict[str, Any]], str]] = {}
+    cached_hashes = set()
+    cached_variant: Dict[str, str] = {}
+    to_fetch: List[Tuple[str, Path]] = []
+    for h, img_path in path_of_hash.items():
+        with prof.item(h, image_path=str(img_path)), prof.stage("cache_lookup"):
+            entry = cache.get(h) if cache is not None else None
+        if entry is not None and entry.get("max_results", 0) >= args.max_results:
+            web[h] = (entry["web_detection"], "")
+            cached_hashes.add(h)
+            cached_variant[h] = entry.get("payload_variant", "original")
+        else:
+            to_fetch.append((h, img_path))
+
+    print(f"[web_detection] {n_pending} images, {len(path_of_hash)} unique, "
+          f"{len(cached_hashes)} from cache, {len(to_fetch)} to query")
+
+    preparer = PayloadPreparer(args.shrink, args.max_side, args.max_bytes, args.jpeg_quality, Path(args.payload_cache_dir),
+                                images)
+    variant_of: Dict[str, Tuple[str, int]] = {}
+    fetchable: List[Tuple[str, Path]] = []
+    for h, img_path in to_fetch:
+        try:
+            with prof.item(h), prof.stage("prepare_payload"):
+                variant_of[h] = preparer.prepare(h)
+        except Exception as e:
+            web[h] = (None, f"Could not prepare upload: {e}")
+            continue
+        if variant_of[h][1] > MAX_IMAGE_BYTES:
+            web[h] = (None, f"Image is {variant_of[h][1]} bytes, over the {MAX_IMAGE_BYTES}-byte Vision limit (try --shrink)")
+            continue
+        fetchable.append((h, img_path))
+
+    def _fetch(chunk: List[Tuple[str, Path]]) -> List[Tuple[str, Optional[Dict[str, Any]], str]]:
+        contents: List[bytes] = []
+        sent: List[str] = []
+        out: List[Tuple[str, Optional[Dict[str, Any]], str]] = []
+        for h, img_path in chunk:
+            try:
+                with prof.item(h), prof.stage("load_payload"):
+                    contents.append(preparer.load(h, variant_of[h][0]))
+                sent.append(h)
+            except Exception as e:
+                out.append((h, None, str(e)))
+        if not contents:
+            return out
+        prof.split("rate_limit_wait", limiter.acquire(), sent)
+        t_call = time.perf_counter()
+        if batch_size == 1:
+            answers = [fetch_web_detection(client, contents[0], max_results=args.max_results)]
+        else:
+            answers = fetch_web_detection_batch(client, contents, max_results=args.max_results)
+        prof.split("api_call", time.perf_counter() - t_call, sent)
+        return out + [(h, wd, err) for h, (wd, err) in zip(sent, answers)]
+
+    # Batches hold at most batch_size images and MAX_REQUEST_BYTES of (base64-encoded) payload
+    chunks: List[List[Tuple[str, Path]]] = []
+    chunk_bytes = 0
+    for h, img_path in fetchable:
+        size = variant_of[h][1] * 4 // 3
+        if not chunks or len(chunks[-1]) >= batch_size or (chunks[-1] and chunk_bytes + size > MAX_REQUEST_BYTES):
+            chunks.append([])
+            chunk_bytes = 0
+        chunks[-1].append((h, img_path))
+        chunk_bytes += size
+
+    n_requests = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.max_in_flight)) as ex:
+        futures = [ex.submit(_fetch, chunk) for chunk in chunks]
+        for done, fut in enumerate(as_completed(futures), 1):
+            n_requests += 1
+            for h, wd, err in fut.result():
+                web[h] = (wd, err)
+                if wd is not None and cache is not None:
+                    with prof.item(h), prof.stage("cache_write"):
+                        cache.put(h, {"max_results": args.max_results, "payload_variant": variant_of[h][0],
+                                      "web_detection": wd})
+            print(f"[web_detection] Request {done}/{len(chunks)} done")
+
+    records: List[Tuple] = []
+    for pos, ref in enumerate(refs):
+        h = ref.content_hash
+        if not h:
+            continue
+        task_id, col, img_path = ref.task_id, ref.col, ref.path
+        wd, err = web.get(h, (None, "No result"))
+        with prof.item(h), prof.stage("parse"):
+            result = _parse_web_detection(wd, args.max_results) if wd is not None else _empty_result(error=err)
+        if h in cached_hashes:
+            variant, nbytes = cached_variant[h], ""
+        else:
+            variant, nbytes = variant_of.get(h, ("", ""))
+        rows[pos] = _report_row(task_id, col, img_path, result, content_hash=h, from_cache=int(h in cached_hashes),
+                                payload_variant=variant, payload_bytes=nbytes)
+        records += match_records(task_id, col, img_path, result, h)
+
+    elapsed = time.monotonic() - t0
+    hit_rate = len(cached_hashes) / len(path_of_hash) if path_of_hash else 0.0
+    sent_bytes = sum(variant_of[h][1] for h, _ in fetchable)
+    orig_bytes = sum(p.stat().st_size for h, p in fetchable)
+    print(f"[web_detection] Uploaded {sent_bytes / 1e6:.1f} MB for {len(fetchable)} images "
+          f"(originals: {orig_bytes / 1e6:.1f} MB; {sum(variant_of[h][0] != 'original' for h, _ in fetchable)} shrunk)")
+    print(f"[web_detection] Run: {n_requests} API requests for {len(to_fetch)} images, "
+          f"cache hit rate {hit_rate:.0%} ({len(cached_hashes)}/{len(path_of_hash)} unique images), "
+          f"{n_pending / elapsed if elapsed > 0 else 0:.1f} images/s over {elapsed:.1f}s")
+
+    print(f"[web_detection] Ingestion: {images.summary()}")
 
     # Save report
     out_df = pd.DataFrame(rows)
     out_path = Path(args.out_csv)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_df.to_csv(out_path, index=False)
+    with prof.stage("write_report"):
+        if inc is not None:
+            out_df = inc.write_report(out_df)
+        else:
+            out_df.to_csv(out_path, index=False)
+
+        db_path = Path(args.matches_db) if args.matches_db else out_path.parent / "web_detection_matches.sqlite"
+        team, wave = team_wave_from_path(out_path)
+        write_matches_db(db_path, out_path.as_posix(), team, wave, records,
+                         images=None if inc is None else inc.rerun | inc.dropped)
+        record_report(args.results_db, "web", detector_version(args.max_results), out_path, out_df)
+    if inc is not None:
+        inc.commit()
 
     # Summary
     n_match = int((out_df["status"] == "match").sum())
@@ -277,12 +663,18 @@ def main() -> int:
     n_err = int((out_df["status"] == "error").sum())
 
     print(f"\n[web_detection] Results saved: {out_path}")
+    print(f"[web_detection] Match table ({len(records)} rows): {db_path}")
     print(f"[web_detection] Summary: {n_match} exact-like matches, {n_no} no match, {n_err} errors")
 
     if n_match > 0:
         print(f"\n[web_detection] WARNING: {n_match} image(s) returned full matching images!")
         print("[web_detection] These should be manually inspected for compliance.")
 
+    profile_csv = prof.write_csv(out_path)
+    if profile_csv is not None:
+        print("\n" + prof.summary("web_detection"))
+        print(f"[web_detection] Per-image timings: {profile_csv}")
+
     return 0
 
 
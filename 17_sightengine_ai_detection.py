@@ -22,27 +22,104 @@ Or add to .env file:
   SIGHTENGINE_API_USER=your_api_user
   SIGHTENGINE_API_SECRET=your_api_secret
 
+Score cache and re-thresholding:
+  Raw ai_generated scores are cached under data/cache/sightengine/ keyed by the sha256 of
+  the image and --model_version, so rescans of known images cost nothing. To change the
+  threshold for every existing report (all teams and waves) without any API calls:
+
+    python 17_sightengine_ai_detection.py --rethreshold --threshold 0.7
+
+  Only the flagged column of each report changes, and the reports are upserted into
+  the results DB again (--results_db), so 18_combine_all.R sees the new flags.
+
+  Both modes print the score distribution to help choose the threshold.
+
+Local pre-filter:
+  With --prefilter, each image is first scored on the CPU (see 20_ai_prefilter.py) and
+  only images with suspicion >= --min_suspicion are sent; the rest are recorded with
+  status "skipped" and their prefilter_score (NA, not checked, in 18_combine_all.R).
+
+Full responses:
+  The complete JSON of every API response is appended, zlib-compressed, to
+  sightengine_responses.sqlite next to the report (--responses_db). The report's
+  raw_response_ref column points at the stored row ("<file>:<id>"). The score cache
+  (--cache_dir) holds only the parsed score and that pointer, not the response.
+  The report itself is also upserted into the study-wide results DB (--results_db,
+  see gsme/results.py), keyed by team, wave, task, image and --model_version.
+
+Incremental runs:
+  --incremental only scans uploads that are new or changed since the last run (by
+  Qualtrics file_id and content hash, see gsme/incremental.py) and merges their rows
+  into the existing report; --manifest defaults to the wave's uploaded_files_manifest.csv.
+
+Ingestion:
+  Files are read and hashed once through gsme.ingest.ImageStore (--memory_mb); identical
+  uploads are sent once and the result is shared by every row that references them.
+
+Rate limits:
+  Images are scanned by --workers threads over one pooled HTTP session, paced by a single
+  limiter set from --plan (requests/sec + monthly operations quota). Retry-After on 429
+  pauses every worker. Override with --rps / --monthly_quota; pass --quota_used to
+  account for operations already spent this month. Each request reserves its operation
+  before it is sent; images beyond the quota get status "deferred" (not checked, NA in
+  18_combine_all.R) and are retried by the next --incremental run.
+
+Profiling:
+  --profile times each stage per unique image (cache_lookup, prefilter, read_bytes,
+  rate_limit_wait, http, backoff_sleep, json_parse, cache_write), writes
+  <out_csv>.profile.csv next to the report and prints the aggregate breakdown.
+  --profile_dump run.prof adds a cProfile dump; any other suffix (run.folded) a sampled
+  all-threads flame graph input (gsme/profiling.py).
+
 Requirements:
   pip install requests pandas python-dotenv
 """
 
 import argparse
+import glob
 import json
 import os
+import sqlite3
+import threading
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
 import requests
 from dotenv import load_dotenv
 
+from gsme.budget import DEFERRED
+from gsme.cache import HashCache
+from gsme.incremental import Incremental, manifest_for
+from gsme.ingest import DEFAULT_MEMORY_MB, ImageStore
+from gsme.prefilter import DEFAULT_MIN_SUSPICION, suspicion_score
+from gsme.profiling import DISABLED, StageProfiler, profile_run
+from gsme.ratelimit import RateLimiter
+from gsme.results import DEFAULT_RESULTS_DB, record_report
+
 load_dotenv()
 
-DEFAULT_SLEEP = 0.5  # Sightengine allows 2 req/sec on free tier
 DEFAULT_TIMEOUT = 60
 
+# Request rate and monthly operations per Sightengine plan.
+# Check your dashboard and override with --rps / --monthly_quota if your plan differs.
+PLAN_TIERS = {
+    "free": {"rps": 2.0, "monthly_quota": 2000},
+    "starter": {"rps": 5.0, "monthly_quota": 10000},
+    "pro": {"rps": 10.0, "monthly_quota": 40000},
+    "enterprise": {"rps": 25.0, "monthly_quota": 0},  # 0 = no quota check
+}
+DEFAULT_PLAN = "free"
+
 SIGHTENGINE_ENDPOINT = "https://api.sightengine.com/1.0/check.json"
+SIGHTENGINE_MODEL = "genai"
+
+DEFAULT_CACHE_DIR = Path("data") / "cache" / "sightengine"
+DEFAULT_REPORTS_GLOB = "data/qualtrics/*/*/results/sightengine_ai_report*.csv"
 
 
 def get_api_credentials() -> tuple[str, str]:
@@ -52,6 +129,260 @@ def get_api_credentials() -> tuple[str, str]:
     return api_user, api_secret
 
 
+def _retry_after_seconds(value: Optional[str], default: float) -> float:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def _operations_used(resp_json: Dict[str, Any]) -> int:
+    try:
+        return int(resp_json.get("request", {}).get("operations", 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def quota_deferred() -> Dict[str, Any]:
+    """Result for an image not sent because the monthly quota is used up (not checked, not clean)."""
+    return {"status": DEFERRED, "http_status": "", "error": "Deferred: monthly quota reached",
+            "ai_generated_score": "", "raw_response": ""}
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """requests.Session whose connection pool fits pool_size concurrent workers."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class QuotaTracker:
+    """Thread-safe count of Sightengine operations used against the monthly plan quota."""
+
+    def __init__(self, monthly_quota: int, used: int = 0) -> None:
+        self.monthly_quota = monthly_quota
+        self.used = used
+        self._lock = threading.Lock()
+
+    def reserve(self, ops: int = 1) -> bool:
+        """
+        Book ops for a request about to be sent, if they fit. Checking and booking is one
+        step under the lock, so concurrent workers cannot all pass the check and overshoot.
+        """
+        with self._lock:
+            if self.monthly_quota > 0 and self.used + ops > self.monthly_quota:
+                return False
+            self.used += ops
+            return True
+
+    def settle(self, reserved: int, used: int) -> None:
+        """Replace a reservation by the operations the request was billed (0 if it failed)."""
+        with self._lock:
+            self.used += used - reserved
+
+
+class ResponseStore:
+    """
+    Append-only, zlib-compressed store of full Sightengine responses (SQLite).
+
+    Reports keep only a reference ("<db file name>:<row id>") in raw_response_ref, so the
+    CSV stays small however long the responses get. Read one back with get(ref), or all
+    of them with pd.read_sql on the `responses` table and zlib.decompress on `response`.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.con = sqlite3.connect(str(db_path))
+        with self.con:
+            self.con.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id TEXT, image_col TEXT, content_hash TEXT, model_version TEXT,
+                    saved_at REAL NOT NULL, response BLOB NOT NULL)"""
+            )
+            self.con.execute("CREATE INDEX IF NOT EXISTS idx_responses_task ON responses (task_id, image_col)")
+            self.con.execute("CREATE INDEX IF NOT EXISTS idx_responses_hash ON responses (content_hash, model_version)")
+
+    def _ref(self, row_id: int) -> str:
+        return f"{self.db_path.name}:{row_id}"
+
+    def append(self, task_id: str, image_col: str, content_hash: str, model_version: str, raw: str) -> str:
+        with self.con:
+            cur = self.con.execute(
+                "INSERT INTO responses (task_id, image_col, content_hash, model_version, saved_at, response) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (task_id, image_col, content_hash, model_version, time.time(), zlib.compress(raw.encode("utf-8"), 9)),
+            )
+        return self._ref(cur.lastrowid)
+
+    def find(self, content_hash: str, model_version: str) -> str:
+        """Reference to the latest stored response for this image, or ""."""
+        row = self.con.execute(
+            "SELECT id FROM responses WHERE content_hash = ? AND model_version = ? ORDER BY id DESC LIMIT 1",
+            (content_hash, model_version),
+        ).fetchone()
+        return self._ref(row[0]) if row else ""
+
+    def _raw(self, ref: str) -> Optional[str]:
+        row_id = int(str(ref).rsplit(":", 1)[-1])
+        row = self.con.execute("SELECT response FROM responses WHERE id = ?", (row_id,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def get(self, ref: str) -> Optional[Dict[str, Any]]:
+        raw = self._raw(ref)
+        return json.loads(raw) if raw is not None else None
+
+    @staticmethod
+    def read(db_path: str, ref: str) -> Optional[str]:
+        """Response text behind ref in the store at db_path (e.g. another wave's), or None."""
+        if not db_path or not ref or not Path(db_path).exists():
+            return None
+        other = ResponseStore(Path(db_path))
+        try:
+            return other._raw(ref)
+        finally:
+            other.close()
+
+    def close(self) -> None:
+        self.con.close()
+
+
+def flag_for_score(score: Any, threshold: float) -> Any:
+    """1/0 for a usable score, "" when the score is missing or not numeric."""
+    if score is None or score == "" or (isinstance(score, float) and score != score):
+        return ""
+    try:
+        return 1 if float(score) >= threshold else 0
+    except (ValueError, TypeError):
+        return ""
+
+
+def score_cache_key(content_hash: str, model_version: str) -> str:
+    return f"{content_hash}_{model_version}"
+
+
+def store_response(store: ResponseStore, result: Dict[str, Any], task_id: str, image_col: str, content_hash: str,
+                   model_version: str, cache: Optional[HashCache] = None) -> str:
+    """
+    raw_response_ref for one unique image's result, appending the full response to store.
+
+    A fresh response is appended and, with a cache, its score is cached together with the
+    pointer (responses_db + raw_response_ref) instead of the response itself. A cache hit
+    reuses the copy already in store, or copies it over from the store the entry points at.
+    """
+    if result.get("from_cache") == 1:
+        ref = store.find(content_hash, model_version)
+        if ref:
+            return ref
+        raw = result.get("raw_response") or ResponseStore.read(result.get("responses_db", ""),
+                                                               result.get("raw_response_ref", ""))
+        return store.append(task_id, image_col, content_hash, model_version, raw) if raw else ""
+    if not result.get("raw_response"):
+        return ""
+    ref = store.append(task_id, image_col, content_hash, model_version, result["raw_response"])
+    if cache is not None and result.get("status") == "ok" and result.get("ai_generated_score") != "":
+        cache.put(score_cache_key(content_hash, model_version), {
+            "ai_generated_score": result["ai_generated_score"],
+            "responses_db": str(store.db_path.resolve()),
+            "raw_response_ref": ref,
+        })
+    return ref
+
+
+def print_score_distribution(scores: pd.Series, threshold: float) -> None:
+    """Text histogram of ai_generated scores plus flag counts at candidate thresholds."""
+    scores = pd.to_numeric(scores, errors="coerce").dropna()
+    print(f"\n[sightengine] Score distribution ({len(scores)} scored images)")
+    if scores.empty:
+        return
+    bins = [i / 10 for i in range(11)]
+    counts = pd.cut(scores, bins=bins, include_lowest=True).value_counts(sort=False)
+    width = max(1, int(counts.max()))
+    for lo, hi, n in zip(bins[:-1], bins[1:], counts.tolist()):
+        bar = "#" * int(round(40 * n / width))
+        print(f"  {lo:3.1f}-{hi:3.1f} | {int(n):6d} {bar}")
+    print(f"  median={scores.median():.3f}  p90={scores.quantile(0.9):.3f}  p99={scores.quantile(0.99):.3f}")
+    for t in sorted({0.3, 0.5, 0.7, 0.9, threshold}):
+        mark = "  <- current" if t == threshold else ""
+        print(f"  threshold {t:.2f}: {int((scores >= t).sum())} flagged{mark}")
+
+
+def _number(cell: str) -> Any:
+    """A report cell read back as text, as the number it was written from ("" stays "")."""
+    for cast in (int, float):
+        try:
+            return cast(cell)
+        except ValueError:
+            pass
+    return cell
+
+
+def rethreshold_reports(report_paths: List[Path], threshold: float, cache: Optional[HashCache],
+                        model_version: str, results_db: str = "") -> pd.Series:
+    """
+    Recompute `flagged` in existing reports from stored scores (no network).
+
+    Reports are read as text and only `flagged` (and missing scores, filled from the
+    score cache when the report has a content_hash) is changed, so every other cell is
+    written back as it was. Each rewritten report is upserted into results_db, so the
+    DB and 18_combine_all.R see the new flags. Returns all scores seen, for the
+    distribution summary.
+    """
+    all_scores = []
+    for path in report_paths:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        if "ai_generated_score" not in df.columns:
+            print(f"[sightengine] Skipping (no ai_generated_score column): {path}")
+            continue
+        if cache is not None and "content_hash" in df.columns:
+            missing = (df["ai_generated_score"] == "") & (df["content_hash"] != "")
+            for idx in df.index[missing]:
+                entry = cache.get(score_cache_key(df.at[idx, "content_hash"], model_version))
+                if entry is not None and entry.get("ai_generated_score", "") != "":
+                    df.at[idx, "ai_generated_score"] = str(entry["ai_generated_score"])
+        before = int((df["flagged"] == "1").sum()) if "flagged" in df.columns else 0
+        df["flagged"] = [str(flag_for_score(v, threshold)) for v in df["ai_generated_score"]]
+        after = int((df["flagged"] == "1").sum())
+        df.to_csv(path, index=False)
+        typed = df.copy()
+        for col in ("http_status", "ai_generated_score", "flagged", "prefilter_score"):
+            if col in typed.columns:
+                typed[col] = typed[col].map(_number)
+        record_report(results_db, "sightengine", model_version, path, typed)
+        all_scores.append(df["ai_generated_score"])
+        print(f"[sightengine] Rethresholded {path}: {before} -> {after} flagged")
+    return pd.concat(all_scores, ignore_index=True) if all_scores else pd.Series(dtype=float)
+
+
+def report_row(task_id: Any, col: str, img_path: Path, result: Dict[str, Any], flagged: Any,
+               raw_response_ref: str, content_hash: str) -> Dict[str, Any]:
+    """One sightengine_ai_report row from a detect_ai_generated() (or cached) result."""
+    return {
+        "task_id": task_id,
+        "image_col": col,
+        "image_path": str(img_path),
+        "status": result.get("status", "error"),
+        "http_status": result.get("http_status", ""),
+        "error": result.get("error", ""),
+        "ai_generated_score": result.get("ai_generated_score", ""),
+        "flagged": flagged,
+        "raw_response_ref": raw_response_ref,
+        "content_hash": content_hash,
+        "from_cache": result.get("from_cache", ""),
+        "prefilter_score": result.get("prefilter_score", ""),
+    }
+
+
 def detect_ai_generated(
     image_path: Path,
     api_user: str,
@@ -59,16 +390,29 @@ def detect_ai_generated(
     endpoint: str = SIGHTENGINE_ENDPOINT,
     timeout_s: int = DEFAULT_TIMEOUT,
     max_retries: int = 2,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[RateLimiter] = None,
+    content: Optional[bytes] = None,
+    profiler: StageProfiler = DISABLED,
 ) -> Dict[str, Any]:
     """
     Submit a local image to Sightengine's AI-generated detection.
 
+    `content` sends already-loaded bytes (e.g. from gsme.ingest.ImageStore) instead of
+    reading image_path; the path then only supplies the upload's file name.
+
+    Pass a shared `session` (pooled connections) and `limiter` (plan-tier pacing) when
+    scanning concurrently; a 429 then pauses the limiter for every worker instead of
+    sleeping only in this call. `profiler` (gsme.profiling) times the request stages
+    for the image set by the caller's profiler.item().
+
     Returns a dict with:
       - status: ok|error
       - http_status
       - error
       - ai_generated_score (0-1)
-      - raw_response (truncated)
+      - raw_response (full JSON text of the API response)
+      - operations (Sightengine operations billed, from the response)
     """
     if not api_user or not api_secret:
         return {
@@ -80,7 +424,7 @@ def detect_ai_generated(
         }
 
     params = {
-        "models": "genai",
+        "models": SIGHTENGINE_MODEL,
         "api_user": api_user,
         "api_secret": api_secret,
     }
@@ -88,21 +432,31 @@ def detect_ai_generated(
     last_err = "Unknown error"
     last_http = ""
 
+    http = session if session is not None else requests
+    prof = profiler
+
     for attempt in range(max_retries + 1):
+        if limiter is not None:
+            prof.add("rate_limit_wait", limiter.acquire())
         try:
-            with image_path.open("rb") as f:
-                files = {"media": (image_path.name, f)}
-                resp = requests.post(
-                    endpoint,
-                    data=params,
-                    files=files,
-                    timeout=timeout_s,
-                )
-        except requests.RequestException as e:
+            with prof.stage("http"):
+                if content is not None:
+                    resp = http.post(endpoint, data=params, files={"media": (image_path.name, content)}, timeout=timeout_s)
+                else:
+                    with image_path.open("rb") as f:
+                        files = {"media": (image_path.name, f)}
+                        resp = http.post(
+                            endpoint,
+                            data=params,
+                            files=files,
+                            timeout=timeout_s,
+                        )
+        except (requests.RequestException, OSError) as e:
             last_err = f"Request error: {e}"
             last_http = ""
             if attempt < max_retries:
-                time.sleep(1.5 * (attempt + 1))
+                with prof.stage("backoff_sleep"):
+                    time.sleep(1.5 * (attempt + 1))
                 continue
             break
 
@@ -112,11 +466,12 @@ def detect_ai_generated(
         if resp.status_code == 429:
             last_err = f"Rate limited (HTTP 429): {resp.text[:300]}"
             if attempt < max_retries:
-                ra = resp.headers.get("Retry-After")
-                if ra and ra.isdigit():
-                    time.sleep(int(ra))
+                wait = _retry_after_seconds(resp.headers.get("Retry-After"), default=2.0 * (attempt + 1))
+                if limiter is not None:
+                    limiter.pause(wait)
                 else:
-                    time.sleep(2 * (attempt + 1))
+                    with prof.stage("backoff_sleep"):
+                        time.sleep(wait)
                 continue
             break
 
@@ -124,7 +479,8 @@ def detect_ai_generated(
         if resp.status_code in (500, 502, 503, 504):
             last_err = f"Transient HTTP {resp.status_code}: {resp.text[:300]}"
             if attempt < max_retries:
-                time.sleep(1.5 * (attempt + 1))
+                with prof.stage("backoff_sleep"):
+                    time.sleep(1.5 * (attempt + 1))
                 continue
             break
 
@@ -138,7 +494,8 @@ def detect_ai_generated(
             break
 
         try:
-            resp_json = resp.json()
+            with prof.stage("json_parse"):
+                resp_json = resp.json()
         except Exception:
             last_err = f"Non-JSON response (HTTP 200): {resp.text[:300]}"
             break
@@ -151,7 +508,7 @@ def detect_ai_generated(
                 "http_status": str(resp.status_code),
                 "error": f"API error: {error_msg}",
                 "ai_generated_score": "",
-                "raw_response": json.dumps(resp_json)[:2000],
+                "raw_response": json.dumps(resp_json),
             }
 
         # Extract ai_generated score
@@ -164,7 +521,8 @@ def detect_ai_generated(
         except (KeyError, TypeError, ValueError):
             ai_score = ""
 
-        raw = json.dumps(resp_json)[:2000]
+        with prof.stage("json_parse"):
+            raw = json.dumps(resp_json)
 
         return {
             "status": "ok",
@@ -172,6 +530,7 @@ def detect_ai_generated(
             "error": "",
             "ai_generated_score": ai_score,
             "raw_response": raw,
+            "operations": _operations_used(resp_json),
         }
 
     return {
@@ -187,8 +546,8 @@ def main() -> int:
     parser = argparse.ArgumentParser(
         description="Sightengine AI-generated image detection for screenshot compliance"
     )
-    parser.add_argument("--csv", required=True, help="Input CSV with screenshot paths")
-    parser.add_argument("--out_csv", required=True, help="Output report CSV")
+    parser.add_argument("--csv", help="Input CSV with screenshot paths (required unless --rethreshold)")
+    parser.add_argument("--out_csv", help="Output report CSV (required unless --rethreshold)")
     parser.add_argument(
         "--path_cols",
         default="total_screenshot_path,app_screenshot1_path,app_screenshot2_path,app_screenshot3_path",
@@ -201,13 +560,76 @@ def main() -> int:
         help="Score threshold for flagging as AI-generated (default: 0.5)",
     )
     parser.add_argument(
-        "--sleep", type=float, default=DEFAULT_SLEEP, help="Seconds between API requests"
+        "--plan", choices=sorted(PLAN_TIERS), default=DEFAULT_PLAN,
+        help=f"Sightengine plan tier; sets request rate and monthly quota (default: {DEFAULT_PLAN})",
+    )
+    parser.add_argument("--rps", type=float, default=None, help="Override the plan's requests per second")
+    parser.add_argument("--monthly_quota", type=int, default=None, help="Override the plan's monthly operations (0 = none)")
+    parser.add_argument("--quota_used", type=int, default=0, help="Operations already used this month")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests")
+    parser.add_argument(
+        "--sleep", type=float, default=None, help="Deprecated: seconds between requests (sets --rps to 1/sleep)"
     )
     parser.add_argument(
         "--timeout", type=int, default=DEFAULT_TIMEOUT, help="HTTP timeout (seconds)"
     )
+    parser.add_argument("--endpoint", default=SIGHTENGINE_ENDPOINT, help=argparse.SUPPRESS)
+    parser.add_argument("--cache_dir", default=str(DEFAULT_CACHE_DIR), help="Cache of raw scores by content hash")
+    parser.add_argument("--no_cache", action="store_true", help="Ignore and do not write the score cache")
+    parser.add_argument("--memory_mb", type=float, default=DEFAULT_MEMORY_MB,
+                        help="Memory budget for image bytes kept between hashing and upload")
+    parser.add_argument(
+        "--responses_db", default="",
+        help="Compressed store of full API responses (default: sightengine_responses.sqlite next to --out_csv)",
+    )
+    parser.add_argument("--results_db", default=str(DEFAULT_RESULTS_DB),
+                        help="Study-wide results DB to upsert this report into ('' to skip)")
+    parser.add_argument(
+        "--model_version", default=SIGHTENGINE_MODEL,
+        help="Label for the scoring model; cached scores are only reused for the same label",
+    )
+    parser.add_argument(
+        "--prefilter", action="store_true",
+        help="Score images locally first (gsme/prefilter.py) and only send those >= --min_suspicion",
+    )
+    parser.add_argument("--min_suspicion", type=float, default=DEFAULT_MIN_SUSPICION,
+                        help="With --prefilter: minimum local suspicion score to send to Sightengine")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only scan new or changed uploads and merge them into the existing --out_csv")
+    parser.add_argument("--manifest", default="",
+                        help="With --incremental: uploaded_files_manifest.csv (default: the input CSV's wave)")
+    parser.add_argument(
+        "--rethreshold", action="store_true",
+        help="Recompute 'flagged' in existing reports at --threshold without calling the API",
+    )
+    parser.add_argument(
+        "--reports_glob", default=DEFAULT_REPORTS_GLOB,
+        help="With --rethreshold: reports to update (default: every team and wave)",
+    )
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each stage per image; writes <out_csv>.profile.csv and prints a breakdown")
+    parser.add_argument("--profile_dump", default="",
+                        help="Also dump a whole-run profile: .prof = cProfile, other suffix = sampled collapsed stacks")
 
     args = parser.parse_args()
+    with profile_run(args.profile_dump, "sightengine"):
+        return _main(args, parser)
+
+
+def _main(args: argparse.Namespace, parser: argparse.ArgumentParser) -> int:
+    cache = None if args.no_cache else HashCache(args.cache_dir)
+
+    if args.rethreshold:
+        report_paths = sorted(Path(p) for p in glob.glob(args.reports_glob))
+        if not report_paths:
+            print(f"[sightengine] No reports match {args.reports_glob}")
+            return 1
+        scores = rethreshold_reports(report_paths, args.threshold, cache, args.model_version, args.results_db)
+        print_score_distribution(scores, args.threshold)
+        return 0
+
+    if not args.csv or not args.out_csv:
+        parser.error("--csv and --out_csv are required unless --rethreshold is given")
 
     api_user, api_secret = get_api_credentials()
     if not api_user or not api_secret:
@@ -218,74 +640,155 @@ def main() -> int:
         print("\nOr add to .env file.")
         return 1
 
+    tier = PLAN_TIERS[args.plan]
+    rps = args.rps if args.rps is not None else tier["rps"]
+    if args.sleep is not None and args.rps is None:
+        rps = 1.0 / args.sleep if args.sleep > 0 else 0.0
+    monthly_quota = args.monthly_quota if args.monthly_quota is not None else tier["monthly_quota"]
+
+    limiter = RateLimiter(rps)
+    quota = QuotaTracker(monthly_quota, used=args.quota_used)
+    session = make_session(args.workers)
+
     df = pd.read_csv(args.csv)
     path_cols = [c.strip() for c in args.path_cols.split(",") if c.strip()]
 
-    rows: List[Dict[str, Any]] = []
-    for i, r in df.iterrows():
-        task_id = r.get("task_id", f"row_{i}")
-
-        for col in path_cols:
-            if col not in r or pd.isna(r[col]):
-                continue
+    prof = StageProfiler(enabled=args.profile)
+
+    # Report rows keep input order; scan results are filled in by position
+    images = ImageStore(memory_mb=args.memory_mb)
+    with prof.stage("scan"):
+        refs = images.scan(df, path_cols)
+    inc = Incremental(args.out_csv, args.manifest or manifest_for(args.csv)) if args.incremental else None
+    if inc is not None:
+        refs = inc.pending(df, refs)
+    rows: List[Optional[Dict[str, Any]]] = []
+    for ref in refs:
+        rows.append(None if ref.content_hash else {
+            "task_id": ref.task_id,
+            "image_col": ref.col,
+            "image_path": str(ref.path),
+            "status": "error",
+            "http_status": "",
+            "error": ref.error,
+            "ai_generated_score": "",
+            "flagged": "",
+            "raw_response_ref": "",
+        })
+    unique = images.unique(refs)  # identical uploads are scanned once
+    positions: Dict[str, List[int]] = {}
+    for pos, ref in enumerate(refs):
+        if ref.content_hash:
+            positions.setdefault(ref.content_hash, []).append(pos)
+
+    def _scan(content_hash: str) -> Dict[str, Any]:
+        with prof.item(content_hash, image_path=str(unique[content_hash])):
+            return _scan_one(content_hash)
+
+    def _scan_one(content_hash: str) -> Dict[str, Any]:
+        key = score_cache_key(content_hash, args.model_version)
+        with prof.stage("cache_lookup"):
+            entry = cache.get(key) if cache is not None else None
+        if entry is not None:
+            return {**entry, "status": "ok", "http_status": "", "error": "", "content_hash": content_hash,
+                    "from_cache": 1}
+        prefilter_score = ""
+        if args.prefilter:
+            try:
+                with prof.stage("prefilter"):
+                    prefilter_score = suspicion_score(images.read_bytes(content_hash))
+            except Exception:
+                prefilter_score = ""  # undecodable locally: let Sightengine decide
+            if prefilter_score != "" and prefilter_score < args.min_suspicion:
+                return {"status": "skipped", "http_status": "", "ai_generated_score": "", "raw_response": "",
+                        "error": f"Local pre-filter: suspicion {prefilter_score:.3f} < {args.min_suspicion}",
+                        "content_hash": content_hash, "from_cache": 0, "prefilter_score": prefilter_score}
+        try:
+            with prof.stage("read_bytes"):
+                content = images.read_bytes(content_hash)
+        except OSError as e:
+            return {"status": "error", "http_status": "", "error": str(e), "ai_generated_score": "", "raw_response": ""}
+        result = _scan_remote(images.path(content_hash), content)
+        result.update(content_hash=content_hash, from_cache=0, prefilter_score=prefilter_score)
+        return result
+
+    def _scan_remote(img_path: Path, content: bytes) -> Dict[str, Any]:
+        if not quota.reserve():
+            return quota_deferred()
+        result = detect_ai_generated(
+            image_path=img_path,
+            api_user=api_user,
+            api_secret=api_secret,
+            endpoint=args.endpoint,
+            timeout_s=args.timeout,
+            session=session,
+            limiter=limiter,
+            content=content,
+            profiler=prof,
+        )
+        quota.settle(1, int(result.get("operations", 1)) if result.get("status") == "ok" else 0)
+        return result
+
+    quota_str = f"{monthly_quota}" if monthly_quota > 0 else "unlimited"
+    n_pending = sum(1 for ref in refs if ref.content_hash)
+    print(f"[sightengine] Scanning {n_pending} images ({len(unique)} unique): plan={args.plan}, {rps:g} req/s, "
+          f"{args.workers} workers, quota {quota.used}/{quota_str} ops used")
 
-            img_path = Path(str(r[col])).expanduser()
-            if not img_path.exists():
-                rows.append({
-                    "task_id": task_id,
-                    "image_col": col,
-                    "image_path": str(img_path),
-                    "status": "error",
-                    "http_status": "",
-                    "error": "File not found",
-                    "ai_generated_score": "",
-                    "flagged": "",
-                    "raw_response": "",
-                })
-                continue
+    out_path = Path(args.out_csv)
+    store = ResponseStore(Path(args.responses_db) if args.responses_db else out_path.parent / "sightengine_responses.sqlite")
 
-            print(f"[sightengine] Scanning: {img_path.name}")
-            result = detect_ai_generated(
-                image_path=img_path,
-                api_user=api_user,
-                api_secret=api_secret,
-                timeout_s=args.timeout,
-            )
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        futures = {ex.submit(_scan, h): h for h in unique}
+        for done, fut in enumerate(as_completed(futures), 1):
+            content_hash = futures[fut]
+            result = fut.result()
 
             # Determine if flagged based on threshold
-            flagged = ""
-            if result.get("ai_generated_score") != "":
-                try:
-                    score = float(result["ai_generated_score"])
-                    flagged = 1 if score >= args.threshold else 0
-                except (ValueError, TypeError):
-                    flagged = ""
-
-            rows.append({
-                "task_id": task_id,
-                "image_col": col,
-                "image_path": str(img_path),
-                "status": result.get("status", "error"),
-                "http_status": result.get("http_status", ""),
-                "error": result.get("error", ""),
-                "ai_generated_score": result.get("ai_generated_score", ""),
-                "flagged": flagged,
-                "raw_response": result.get("raw_response", ""),
-            })
-
-            time.sleep(args.sleep)
+            flagged = flag_for_score(result.get("ai_generated_score"), args.threshold)
+
+            # Full response goes to the sidecar (once per unique image); the CSV and the cache keep a reference
+            first = refs[positions[content_hash][0]]
+            with prof.item(content_hash), prof.stage("cache_write"):
+                sidecar_ref = store_response(store, result, str(first.task_id), first.col, content_hash,
+                                             args.model_version, cache)
+
+            for pos in positions[content_hash]:
+                ref = refs[pos]
+                rows[pos] = report_row(ref.task_id, ref.col, ref.path, result, flagged, sidecar_ref, content_hash)
+
+            elapsed = time.monotonic() - t0
+            print(f"[sightengine] {done}/{len(unique)} {unique[content_hash].name}: {result.get('status', 'error')} | "
+                  f"{done / elapsed if elapsed > 0 else 0:.2f} img/s | quota {quota.used}/{quota_str} ops")
+
+    store.close()
 
     out_df = pd.DataFrame(rows)
-    out_path = Path(args.out_csv)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_df.to_csv(out_path, index=False)
+    with prof.stage("write_report"):
+        if inc is not None:
+            out_df = inc.write_report(out_df)
+        else:
+            out_df.to_csv(out_path, index=False)
+        record_report(args.results_db, "sightengine", args.model_version, out_path, out_df)
+    if inc is not None:
+        inc.commit()
 
     n_ok = int((out_df["status"] == "ok").sum())
     n_err = int((out_df["status"] == "error").sum())
+    n_skipped = int((out_df["status"] == "skipped").sum())
+    n_deferred = int((out_df["status"] == DEFERRED).sum())
     n_flagged = int((out_df["flagged"] == 1).sum()) if "flagged" in out_df else 0
 
     print(f"\n[sightengine] Results saved: {out_path}")
+    print(f"[sightengine] Full responses: {store.db_path}")
+    print(f"[sightengine] Ingestion: {images.summary()}")
     print(f"[sightengine] Summary: {n_ok} ok, {n_err} errors, {n_flagged} flagged as AI-generated (threshold: {args.threshold})")
+    if n_skipped:
+        print(f"[sightengine] {n_skipped} image(s) skipped by the local pre-filter (not checked by Sightengine)")
+    if n_deferred:
+        print(f"[sightengine] {n_deferred} image(s) deferred: monthly quota reached (rerun next month or raise "
+              f"--monthly_quota)")
 
     if n_flagged > 0:
         print("\n[sightengine] WARNING: Some images flagged as potentially AI-generated. Review manually.")
@@ -293,6 +796,13 @@ def main() -> int:
         for _, row in flagged_rows.iterrows():
             print(f"  - {row['task_id']}: score={row['ai_generated_score']:.3f}")
 
+    print_score_distribution(out_df["ai_generated_score"], args.threshold)
+
+    profile_csv = prof.write_csv(out_path)
+    if profile_csv is not None:
+        print("\n" + prof.summary("sightengine"))
+        print(f"[sightengine] Per-image timings: {profile_csv}")
+
     return 0
 
 
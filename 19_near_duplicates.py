@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+19_near_duplicates.py
+
+Local perceptual-hash index for spotting re-used screenshots across respondents,
+teams and waves (no API calls).
+
+What it does:
+- Walks every uploaded_files_manifest.csv under data/qualtrics/<TEAM>/<WAVE>/
+- Computes per file: sha256 (exact), pHash and dHash (64-bit perceptual hashes)
+- Keeps a persistent hash index so reruns only decode new/changed files
+- Groups exact duplicates by sha256, then finds near duplicates with a BK-tree
+  radius search over the distinct perceptual hashes (no all-pairs comparison)
+- Writes one row per image that belongs to a duplicate cluster
+
+Usage:
+  python 19_near_duplicates.py
+  python 19_near_duplicates.py --root data/qualtrics --radius 6 --hash phash
+
+Reads:
+  data/qualtrics/<TEAM>/<WAVE>/uploaded_files_manifest.csv
+
+Writes:
+  data/qualtrics/perceptual_hash_index.csv   (reusable hash index)
+  data/qualtrics/near_duplicate_report.csv   (duplicate clusters)
+
+Requirements:
+  pip install numpy pandas pillow
+"""
+
+import argparse
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+DEFAULT_ROOT = Path("data") / "qualtrics"
+DEFAULT_RADIUS = 6  # max Hamming distance (out of 64 bits) to call two images near duplicates
+
+INDEX_COLS = ["path", "size", "mtime", "sha256", "phash", "dhash", "width", "height", "error"]
+
+
+# ----------------------------
+# Hashing
+# ----------------------------
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis (n x n), so dct2(x) = D @ x @ D.T."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    d = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    d[0, :] = np.sqrt(1.0 / n)
+    return d.astype(np.float64)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    out = 0
+    for b in bits.reshape(-1):
+        out = (out << 1) | int(bool(b))
+    return out
+
+
+def phash(img: Image.Image) -> int:
+    """64-bit DCT perceptual hash (32x32 grayscale -> 8x8 low frequencies vs median)."""
+    g = np.asarray(img.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT32 @ g @ _DCT32.T)[:8, :8]
+    med = np.median(low.reshape(-1)[1:])  # exclude the DC term from the median
+    return _bits_to_int(low > med)
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash (9x8 grayscale, left-to-right gradient sign)."""
+    g = np.asarray(img.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(g[:, 1:] > g[:, :-1])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_file(path_str: str) -> Dict[str, Any]:
+    """Compute the index row for one file. Runs in worker processes."""
+    path = Path(path_str)
+    row: Dict[str, Any] = {"path": path_str, "size": -1, "mtime": -1.0, "sha256": "",
+                           "phash": "", "dhash": "", "width": 0, "height": 0, "error": ""}
+    try:
+        st = path.stat()
+        row["size"], row["mtime"] = int(st.st_size), float(st.st_mtime)
+        row["sha256"] = sha256_file(path)
+        with Image.open(path) as img:
+            row["width"], row["height"] = img.size  # before draft(), which shrinks a JPEG's size
+            img.draft("L", (256, 256))  # JPEG: decode at reduced scale, hashes only need 32x32
+            row["phash"] = f"{phash(img):016x}"
+            row["dhash"] = f"{dhash(img):016x}"
+    except Exception as e:
+        row["error"] = str(e)
+    return row
+
+
+# ----------------------------
+# BK-tree
+# ----------------------------
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit integer hashes with Hamming distance.
+
+    Radius queries only descend into children whose edge distance d satisfies
+    |d - dist(query, node)| <= radius (triangle inequality), so a small-radius
+    lookup touches a small fraction of the tree.
+    """
+
+    def __init__(self) -> None:
+        self._root: Optional[Tuple[int, Dict[int, Any]]] = None
+        self.size = 0
+
+    def add(self, h: int) -> None:
+        if self._root is None:
+            self._root = (h, {})
+            self.size = 1
+            return
+        node_hash, children = self._root
+        while True:
+            d = hamming(h, node_hash)
+            if d == 0:
+                return  # already present
+            child = children.get(d)
+            if child is None:
+                children[d] = (h, {})
+                self.size += 1
+                return
+            node_hash, children = child
+
+    def query(self, h: int, radius: int) -> Iterator[Tuple[int, int]]:
+        """Yield (hash, distance) for every stored hash within radius of h."""
+        if self._root is None:
+            return
+        stack = [self._root]
+        while stack:
+            node_hash, children = stack.pop()
+            d = hamming(h, node_hash)
+            if d <= radius:
+                yield node_hash, d
+            lo, hi = d - radius, d + radius
+            for edge, child in children.items():
+                if lo <= edge <= hi:
+                    stack.append(child)
+
+
+class _UnionFind:
+    def __init__(self) -> None:
+        self.parent: Dict[Any, Any] = {}
+
+    def find(self, x: Any) -> Any:
+        self.parent.setdefault(x, x)
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: Any, b: Any) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+
+# ----------------------------
+# Index building
+# ----------------------------
+def load_manifests(root: Path) -> pd.DataFrame:
+    """Stack every <TEAM>/<WAVE>/uploaded_files_manifest.csv under root with team/wave columns."""
+    frames = []
+    for manifest in sorted(root.glob("*/*/uploaded_files_manifest.csv")):
+        wave_dir = manifest.parent
+        try:
+            df = pd.read_csv(manifest, dtype=str)
+        except pd.errors.EmptyDataError:
+            continue
+        if df.empty or "saved_path" not in df.columns:
+            continue
+        if "ok" in df.columns:
+            df = df[df["ok"].str.upper().eq("TRUE")]
+        df = df[df["saved_path"].notna()].copy()
+        df["team"] = wave_dir.parent.name
+        df["wave"] = wave_dir.name
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["team", "wave", "response_id", "file_id", "saved_path"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def update_index(paths: List[str], index_path: Path, workers: int) -> pd.DataFrame:
+    """Return index rows for paths, reusing cached rows whose size and mtime are unchanged."""
+    cached: Dict[str, Dict[str, Any]] = {}
+    if index_path.exists():
+        for rec in pd.read_csv(index_path, dtype={"phash": str, "dhash": str, "sha256": str}).to_dict("records"):
+            cached[rec["path"]] = rec
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    todo: List[str] = []
+    for p in paths:
+        rec = cached.get(p)
+        try:
+            st = Path(p).stat()
+        except OSError:
+            rows[p] = {**hash_file(p)}  # records the error
+            continue
+        if (rec is not None and int(rec["size"]) == st.st_size and float(rec["mtime"]) == st.st_mtime
+                and isinstance(rec.get("phash"), str) and rec["phash"]):
+            rows[p] = rec
+        else:
+            todo.append(p)
+
+    print(f"[near_dup] {len(paths)} files: {len(paths) - len(todo)} cached, {len(todo)} to hash")
+    if todo:
+        if workers > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                for rec in ex.map(hash_file, todo, chunksize=32):
+                    rows[rec["path"]] = rec
+        else:
+            for p in todo:
+                rows[p] = hash_file(p)
+
+    # Keep previously indexed files from other runs, refreshed with this run's rows
+    merged = {**cached, **rows}
+    index_df = pd.DataFrame(list(merged.values()), columns=INDEX_COLS)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    index_df.to_csv(index_path, index=False)
+    return pd.DataFrame([rows[p] for p in paths], columns=INDEX_COLS)
+
+
+# ----------------------------
+# Clustering
+# ----------------------------
+def find_clusters(images: pd.DataFrame, hash_col: str, radius: int) -> pd.DataFrame:
+    """
+    Assign cluster ids to images that are exact (sha256) or near (Hamming <= radius) duplicates.
+
+    Work is done on distinct hash values, so N copies of one screenshot cost one tree node.
+    Returns images restricted to clusters of size >= 2, with cluster columns added.
+    """
+    images = images[images[hash_col].fillna("").astype(str).str.len() > 0].copy()
+    if images.empty:
+        return images.assign(cluster_id=pd.Series(dtype=int))
+
+    images["_h"] = images[hash_col].map(lambda s: int(s, 16))
+    uf = _UnionFind()
+
+    # Exact duplicates: same bytes
+    for _, grp in images.groupby("sha256"):
+        idx = grp.index.tolist()
+        for j in idx[1:]:
+            uf.union(idx[0], j)
+
+    # Same perceptual hash: link directly
+    first_by_hash: Dict[int, Any] = {}
+    for i, h in images["_h"].items():
+        if h in first_by_hash:
+            uf.union(first_by_hash[h], i)
+        else:
+            first_by_hash[h] = i
+
+    # Near duplicates: radius search over distinct hashes
+    nearest: Dict[int, int] = {}
+    if radius > 0:
+        tree = BKTree()
+        for h in first_by_hash:
+            tree.add(h)
+        for h, i in first_by_hash.items():
+            for other, d in tree.query(h, radius):
+                if d == 0:
+                    continue
+                uf.union(i, first_by_hash[other])
+                nearest[h] = min(d, nearest.get(h, 64))
+
+    images["_root"] = [uf.find(i) for i in images.index]
+    sizes = images.groupby("_root")["_root"].transform("size")
+    images = images[sizes >= 2].copy()
+    if images.empty:
+        return images.drop(columns=["_h", "_root"]).assign(cluster_id=pd.Series(dtype=int))
+
+    roots = {r: k for k, r in enumerate(sorted(images["_root"].unique(), key=str), 1)}
+    images["cluster_id"] = images["_root"].map(roots)
+    grp = images.groupby("cluster_id")
+    images["cluster_size"] = grp["cluster_id"].transform("size")
+    images["n_respondents"] = grp["response_id"].transform("nunique")
+    images["n_teams"] = grp["team"].transform("nunique")
+    images["n_waves"] = grp["wave"].transform("nunique")
+    images["n_exact_copies"] = images.groupby(["cluster_id", "sha256"])["sha256"].transform("size")
+    images["cluster_type"] = np.where(grp["sha256"].transform("nunique") == 1, "exact", "near")
+    same_hash = images["_h"].map(images["_h"].value_counts())
+    images["nearest_distance"] = np.where(
+        (images["n_exact_copies"] > 1) | (same_hash > 1), 0, images["_h"].map(nearest).fillna(-1)
+    ).astype(int)
+    return images.drop(columns=["_h", "_root"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Perceptual-hash near-duplicate report across respondents, teams and waves")
+    parser.add_argument("--root", default=str(DEFAULT_ROOT), help="Folder containing <TEAM>/<WAVE>/uploaded_files_manifest.csv")
+    parser.add_argument("--out_csv", default="", help="Report CSV (default: <root>/near_duplicate_report.csv)")
+    parser.add_argument("--index_csv", default="", help="Hash index CSV (default: <root>/perceptual_hash_index.csv)")
+    parser.add_argument("--hash", choices=["phash", "dhash"], default="phash", help="Perceptual hash used for near matches")
+    parser.add_argument("--radius", type=int, default=DEFAULT_RADIUS, help="Max Hamming distance (0-64) for a near match")
+    parser.add_argument("--workers", type=int, default=4, help="Processes used to hash new files")
+
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    out_csv = Path(args.out_csv) if args.out_csv else root / "near_duplicate_report.csv"
+    index_csv = Path(args.index_csv) if args.index_csv else root / "perceptual_hash_index.csv"
+
+    manifest = load_manifests(root)
+    if manifest.empty:
+        print(f"[near_dup] No uploaded_files_manifest.csv rows found under {root}")
+        return 1
+
+    paths = sorted(manifest["saved_path"].unique())
+    index_df = update_index(paths, index_csv, workers=args.workers)
+    n_err = int((index_df["error"].fillna("") != "").sum())
+
+    images = manifest.merge(index_df, left_on="saved_path", right_on="path", how="left")
+    clusters = find_clusters(images, args.hash, args.radius)
+
+    cols = ["cluster_id", "cluster_type", "cluster_size", "n_respondents", "n_teams", "n_waves",
+            "team", "wave", "response_id", "file_id", "saved_path", "sha256", "phash", "dhash",
+            "width", "height", "n_exact_copies", "nearest_distance"]
+    out = clusters.reindex(columns=cols).sort_values(["cluster_id", "team", "wave", "response_id"])
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    out.to_csv(out_csv, index=False)
+
+    n_clusters = out["cluster_id"].nunique()
+    n_cross = int((out.groupby("cluster_id")["n_respondents"].first() > 1).sum()) if n_clusters else 0
+    print(f"\n[near_dup] Index saved: {index_csv}")
+    print(f"[near_dup] Report saved: {out_csv}")
+    print(f"[near_dup] Summary: {len(paths)} files, {n_err} unreadable, {n_clusters} duplicate clusters "
+          f"({n_cross} spanning more than one respondent)")
+
+    if n_cross > 0:
+        print("\n[near_dup] WARNING: identical or near-identical screenshots were uploaded by different respondents.")
+        print("[near_dup] These should be manually inspected for compliance.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+20_ai_prefilter.py
+
+Local CPU pre-filter for AI-generated / non-screenshot images, run before paying for
+Sightengine (17_). Scores each image 0-1 from cheap features (see gsme/prefilter.py):
+  - resolution vs known phone screenshot sizes
+  - file format (lossy JPEG vs PNG)
+  - palette concentration (flat UI colours)
+  - pixel noise (share of perfectly flat neighbourhoods)
+  - high-frequency spectral peaks
+
+Modes:
+  1) Score images in a sample CSV:
+     python 20_ai_prefilter.py \
+       --csv data/qualtrics/team_example/endline/results/sample_avg.csv \
+       --out_csv data/qualtrics/team_example/endline/results/ai_prefilter_report_avg.csv
+
+  2) Measure agreement with stored Sightengine scores (all teams/waves) and
+     known AI images, to choose --min_suspicion:
+     python 20_ai_prefilter.py --evaluate
+
+To use the pre-filter in a scan, pass --prefilter to 17_sightengine_ai_detection.py;
+images scoring below --min_suspicion are recorded as "skipped" instead of being sent.
+
+Requirements:
+  pip install numpy pandas pillow
+"""
+
+import argparse
+import glob
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from gsme.prefilter import DEFAULT_MIN_SUSPICION, suspicion_features
+
+DEFAULT_REPORTS_GLOB = "data/qualtrics/*/*/results/sightengine_ai_report*.csv"
+DEFAULT_KNOWN_AI_DIR = Path("data") / "test_ai_images"
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+def score_path(path: Path) -> Dict[str, Any]:
+    try:
+        return {"status": "ok", "error": "", **suspicion_features(path)}
+    except Exception as e:
+        return {"status": "error", "error": str(e), "suspicion": float("nan")}
+
+
+def score_csv(csv_path: str, path_cols: List[str]) -> pd.DataFrame:
+    df = pd.read_csv(csv_path)
+    rows = []
+    for i, r in df.iterrows():
+        task_id = r.get("task_id", f"row_{i}")
+        for col in path_cols:
+            if col not in r or pd.isna(r[col]):
+                continue
+            img_path = Path(str(r[col])).expanduser()
+            if not img_path.exists():
+                rows.append({"task_id": task_id, "image_col": col, "image_path": str(img_path),
+                             "status": "error", "error": "File not found"})
+                continue
+            rows.append({"task_id": task_id, "image_col": col, "image_path": str(img_path), **score_path(img_path)})
+    return pd.DataFrame(rows)
+
+
+def evaluate(reports_glob: str, known_ai_dir: Path, se_threshold: float, min_suspicion: float) -> pd.DataFrame:
+    """Pre-filter score next to the stored Sightengine score for every scanned image."""
+    frames = []
+    for path in sorted(glob.glob(reports_glob)):
+        rep = pd.read_csv(path)
+        if "ai_generated_score" not in rep.columns:
+            continue
+        rep = rep[pd.to_numeric(rep["ai_generated_score"], errors="coerce").notna()]
+        frames.append(rep.assign(source=path)[["source", "task_id", "image_path", "ai_generated_score"]])
+    ev = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["source", "task_id", "image_path", "ai_generated_score"])
+    ev["ai_generated_score"] = ev["ai_generated_score"].astype(float)
+    ev["known_ai"] = 0
+
+    if known_ai_dir.exists():
+        known = [p for p in sorted(known_ai_dir.iterdir()) if p.suffix.lower() in IMAGE_EXTENSIONS]
+        ev = pd.concat([ev, pd.DataFrame({"source": str(known_ai_dir), "task_id": "", "image_path": [str(p) for p in known],
+                                          "ai_generated_score": float("nan"), "known_ai": 1})], ignore_index=True)
+
+    # Each distinct file is scored once
+    scores = {p: score_path(Path(p)).get("suspicion", float("nan")) for p in ev["image_path"].unique() if Path(p).exists()}
+    ev["suspicion"] = ev["image_path"].map(scores)
+    ev = ev[ev["suspicion"].notna()].copy()
+    ev["se_flagged"] = (ev["ai_generated_score"] >= se_threshold).astype(int)
+    ev["positive"] = ((ev["se_flagged"] == 1) | (ev["known_ai"] == 1)).astype(int)
+    ev["sent"] = (ev["suspicion"] >= min_suspicion).astype(int)
+    return ev
+
+
+def print_evaluation(ev: pd.DataFrame, min_suspicion: float) -> None:
+    scored = ev[ev["ai_generated_score"].notna()]
+    print(f"[prefilter] Evaluated {len(ev)} images "
+          f"({len(scored)} with Sightengine scores, {int(ev['known_ai'].sum())} known AI)")
+    if len(scored) >= 3 and scored["ai_generated_score"].nunique() > 1:
+        # Spearman = Pearson on ranks (avoids a scipy dependency)
+        rho = scored["suspicion"].rank().corr(scored["ai_generated_score"].rank())
+        print(f"[prefilter] Spearman correlation with Sightengine score: {rho:.3f}")
+
+    print("\n  min_suspicion | sent to API | positives passed | negatives skipped")
+    pos, neg = ev[ev["positive"] == 1], ev[ev["positive"] == 0]
+    for t in sorted({0.1, 0.2, 0.3, 0.4, 0.5, 0.6, min_suspicion}):
+        sent = (ev["suspicion"] >= t).mean() if len(ev) else 0.0
+        recall = (pos["suspicion"] >= t).mean() if len(pos) else float("nan")
+        saved = (neg["suspicion"] < t).mean() if len(neg) else float("nan")
+        mark = "  <- current" if t == min_suspicion else ""
+        print(f"  {t:13.2f} | {sent:11.0%} | {recall:16.0%} | {saved:17.0%}{mark}")
+
+    missed = ev[(ev["positive"] == 1) & (ev["sent"] == 0)]
+    if len(missed) > 0:
+        print(f"\n[prefilter] WARNING: {len(missed)} positive image(s) would be skipped at {min_suspicion}:")
+        for _, r in missed.iterrows():
+            print(f"  - {r['image_path']}: suspicion={r['suspicion']:.3f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local AI-generation pre-filter for screenshots")
+    parser.add_argument("--csv", help="Input CSV with screenshot paths")
+    parser.add_argument("--out_csv", help="Output report CSV (scores, or per-image evaluation with --evaluate)")
+    parser.add_argument(
+        "--path_cols",
+        default="total_screenshot_path,app_screenshot1_path,app_screenshot2_path,app_screenshot3_path",
+        help="Comma-separated column names containing image paths",
+    )
+    parser.add_argument("--min_suspicion", type=float, default=DEFAULT_MIN_SUSPICION,
+                        help="Images at or above this score would be sent to Sightengine")
+    parser.add_argument("--evaluate", action="store_true", help="Compare against stored Sightengine reports")
+    parser.add_argument("--reports_glob", default=DEFAULT_REPORTS_GLOB, help="With --evaluate: Sightengine reports")
+    parser.add_argument("--known_ai_dir", default=str(DEFAULT_KNOWN_AI_DIR), help="With --evaluate: known AI images")
+    parser.add_argument("--se_threshold", type=float, default=0.5, help="With --evaluate: Sightengine flag threshold")
+
+    args = parser.parse_args()
+
+    if args.evaluate:
+        ev = evaluate(args.reports_glob, Path(args.known_ai_dir), args.se_threshold, args.min_suspicion)
+        if ev.empty:
+            print("[prefilter] Nothing to evaluate: no scored reports or known AI images found")
+            return 1
+        print_evaluation(ev, args.min_suspicion)
+        if args.out_csv:
+            Path(args.out_csv).parent.mkdir(parents=True, exist_ok=True)
+            ev.to_csv(args.out_csv, index=False)
+            print(f"\n[prefilter] Evaluation saved: {args.out_csv}")
+        return 0
+
+    if not args.csv or not args.out_csv:
+        parser.error("--csv and --out_csv are required unless --evaluate is given")
+
+    path_cols = [c.strip() for c in args.path_cols.split(",") if c.strip()]
+    out_df = score_csv(args.csv, path_cols)
+    out_path = Path(args.out_csv)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_df.to_csv(out_path, index=False)
+
+    n_sent = int((out_df.get("suspicion", pd.Series(dtype=float)) >= args.min_suspicion).sum())
+    n_err = int((out_df["status"] == "error").sum()) if "status" in out_df else 0
+    print(f"[prefilter] Results saved: {out_path}")
+    print(f"[prefilter] Summary: {len(out_df)} images, {n_sent} at or above {args.min_suspicion} "
+          f"(would be sent to Sightengine), {n_err} errors")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,967 @@
+#!/usr/bin/env python3
+"""
+21_run_detectors.py
+
+Runs the leadership-team detectors as one task graph instead of one script at a time:
+
+  15_ TruFor tamper triage       per image, CPU   -> trufor_report_<type>.csv (+ trufor_crops/)
+  16_ Google web detection       per image, API   -> web_detection_report_<type>.csv (+ web_detection_matches.sqlite)
+  17_ Sightengine AI detection   per image, API   -> sightengine_ai_report_<type>.csv (+ sightengine_responses.sqlite)
+  11_ OpenRouter AI validation   per task,  API   -> auto_annotations_<type>.csv
+
+for sample_avg.csv and sample_app.csv in data/qualtrics/<team>/<wave>/results/. The output
+files are the ones the individual scripts write and 18_combine_all.R reads.
+
+Usage:
+  python 21_run_detectors.py --team team_example --wave endline
+  python 21_run_detectors.py --team GB --wave baseline --wave endline \
+      --trufor_root ~/TruFor --cpu_workers 2 --skip auto_validate
+
+How it runs:
+- Every referenced screenshot is hashed once (gsme.ingest); identical uploads across rows,
+  types and waves become one (image x detector) task.
+- TruFor tasks run in a process pool (--cpu_workers) while API tasks run in a thread pool
+  (--io_workers), each API paced by its own limiter, so local and network work overlap.
+- A report is written as soon as every task it needs has finished. A task that raises
+  (e.g. TruFor crashing on one file) becomes an error row for its images; the rest of
+  the report is written as usual.
+- Resumable: each finished task is cached by content hash (16_ and 17_ reuse their own
+  caches; TruFor and AI-validation results go to data/cache/trufor and
+  data/cache/auto_validate), so an interrupted run picks up where it stopped.
+- Every report is also upserted into the study-wide results DB (--results_db).
+- --skip drops detectors; a detector whose credentials or tools are missing is skipped
+  with a message and its existing reports are left untouched.
+
+Watch mode (during fieldwork):
+  python 21_run_detectors.py --team GB --wave baseline --watch --skip web
+
+  Instead of the sample CSVs, watches data/qualtrics/<team>/<wave>/uploads/ (gsme.watch:
+  inotify, else polling) and sends every new screenshot, once it has stopped changing for
+  --settle_s, through the per-image detectors (TruFor, web detection, Sightengine; 11_ needs
+  the annotation samples and is not run). Uploads wait on a bounded queue (--queue_size)
+  for --io_workers workers; each verdict is appended to results/watch_report.csv as soon
+  as it is known, and the report is upserted into the results DB (--results_db) when the
+  watch stops. Files already present at start are skipped unless --watch_existing.
+
+Several machines (work queue):
+  python 21_run_detectors.py --team GB --wave baseline --queue /shared/gsme_queue.sqlite ...
+  python 21_run_detectors.py --queue /shared/gsme_queue.sqlite --worker ...    # on each extra node
+
+  With --queue, the (image x detector) and AI-validation tasks go into a lease-based work
+  queue (gsme.workqueue) in a SQLite file on a filesystem every node can lock, instead of
+  straight to the local pools. This run works on them too, waits until every task is done
+  or failed, then writes the reports as usual. --worker runs on other nodes (same checkout
+  and data paths, their own credentials, --trufor_root etc.): each claims tasks of the
+  detectors it has set up, renews its leases every --lease_s / 3, and exits when nothing
+  is left. Tasks of a worker that dies are picked up again once its leases expire; a
+  task that fails --max_attempts times is reported as an error. Results stay in the
+  queue, so rerunning the coordinator only redoes failed tasks or changed settings.
+  Live per-detector counts and per-node throughput: python -m gsme.workqueue status <db>
+
+Spend caps:
+  python 21_run_detectors.py --team GB --wave baseline --budget_usd 20 --team_budget_usd 5
+
+  Web detection, Sightengine and AI validation are billed per request (gsme/budget.py has
+  list prices; override with --prices web=0.0015,...). With a cap, TruFor runs first, then
+  every paid request is ranked by risk: TruFor-flagged images, images in a cross-respondent
+  near-duplicate cluster (--near_duplicates, from 19_), and tasks whose reported numbers a
+  reviewer or an earlier AI validation said do not match; files 27_file_forensics.py
+  flagged (file_forensics_<type>.csv) count a little; then by TruFor score. Requests
+  are planned in that order until the run or team cap is reached; cached results are free.
+  The rest are written to the reports with status "deferred" (AI validation: empty verdicts
+  and the reason in notes), so 18_combine_all.R reports them as not checked rather than
+  clean, and every decision goes to results/budget_plan.csv. A rerun with a higher cap
+  only pays for what was deferred.
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import ExitStack
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from gsme.budget import DEFERRED, PAID_SERVICES, Budget, RiskIndex, WorkItem, parse_prices, schedule
+from gsme.cache import HashCache, sha256_bytes
+from gsme.dag import TaskGraph
+from gsme.ingest import DEFAULT_MEMORY_MB, DEFAULT_PATH_COLS, ImageRef, ImageStore
+from gsme.ratelimit import RateLimiter
+from gsme.results import DEFAULT_RESULTS_DB, record_report, team_wave_from_path
+from gsme.scripts import load_script
+from gsme.watch import UploadWatcher
+from gsme.workqueue import DEFAULT_LEASE_S, DEFAULT_MAX_ATTEMPTS, Task, TaskFailed, Worker, WorkQueue
+
+load_dotenv()
+
+DETECTORS = ("trufor", "web", "sightengine", "auto_validate")
+QUALTRICS_DIR = Path("data") / "qualtrics"
+TYPES = ("avg", "app")
+TRUFOR_CACHE_DIR = Path("data") / "cache" / "trufor"
+AUTO_VALIDATE_CACHE_DIR = Path("data") / "cache" / "auto_validate"
+
+BUDGET_PLAN = "budget_plan.csv"
+BUDGET_PLAN_COLS = ["service", "task_id", "image_col", "image_path", "content_hash", "rank", "risk", "risk_reasons",
+                    "decision", "cost_usd", "reason"]
+
+WATCH_REPORT = "watch_report.csv"
+WATCH_COLS = ["response_id", "image_path", "content_hash", "uploaded_at", "checked_at", "latency_s", "flagged_by",
+              "trufor_status", "trufor_score", "max_roi_score", "web_status", "n_full_matches", "top_full_match_url",
+              "sightengine_status", "ai_generated_score", "ai_flagged", "error"]
+
+REPORT_NAMES = {
+    "trufor": "trufor_report_{type}.csv",
+    "web": "web_detection_report_{type}.csv",
+    "sightengine": "sightengine_ai_report_{type}.csv",
+    "auto_validate": "auto_annotations_{type}.csv",
+}
+
+
+# ----------------------------
+# Per-image / per-task work
+# ----------------------------
+def _trufor_task(trufor_root: str, image_path: str, out_dir: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs in a worker process; returns analyze_image()'s result with best_roi as a dict."""
+    edge = load_script("15_edge_anomaly.py")
+    res = edge.analyze_image(
+        trufor_root=Path(trufor_root), image_path=Path(image_path), out_dir=Path(out_dir), **params
+    )
+    roi = res.get("best_roi")
+    res["best_roi"] = asdict(roi) if roi is not None else None
+    return res
+
+
+class Detectors:
+    """Holds clients, limiters and caches for the enabled detectors; methods are graph tasks."""
+
+    def __init__(self, args: argparse.Namespace, images: ImageStore) -> None:
+        self.se = load_script("17_sightengine_ai_detection.py")
+        self.args = args
+        self.images = images
+        self.enabled: List[str] = []
+        self.skipped: Dict[str, str] = {}
+        self.from_cache: Dict[str, int] = {d: 0 for d in DETECTORS}
+        for name in DETECTORS:
+            if name in args.skip:
+                self.skipped[name] = "--skip"
+                continue
+            reason = getattr(self, f"_setup_{name}")()
+            if reason:
+                self.skipped[name] = reason
+            else:
+                self.enabled.append(name)
+
+    # -- setup: return "" when ready, else why the detector is skipped ----------------
+
+    def _setup_trufor(self) -> str:
+        if not self.args.trufor_root:
+            return "no --trufor_root"
+        try:
+            self.edge = load_script("15_edge_anomaly.py")
+            self.edge.import_dependencies()
+        except ImportError as e:
+            return f"15_edge_anomaly.py dependencies missing ({e})"
+        root = Path(self.args.trufor_root).expanduser().resolve()
+        self.edge.ensure_weights(Path(self.args.weights_dir).expanduser().resolve() if self.args.weights_dir
+                                 else root / "test_docker" / "weights")
+        self.trufor_root = root
+        self.trufor_params = {"gpu": self.args.gpu, "min_conf": self.args.min_conf, "min_size": self.args.min_size,
+                              "global_thresh": self.args.global_thresh, "roi_thresh": self.args.roi_thresh,
+                              "rel_min": self.args.rel_min}
+        self.trufor_cache = HashCache(TRUFOR_CACHE_DIR)
+        return ""
+
+    def _setup_web(self) -> str:
+        creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
+        if not creds or not Path(creds).expanduser().exists():
+            return "GOOGLE_APPLICATION_CREDENTIALS not set or missing"
+        try:
+            from google.cloud import vision  # type: ignore
+            self.vision_client = vision.ImageAnnotatorClient()
+        except Exception as e:
+            return f"Vision client unavailable ({e})"
+        self.web = load_script("16_web_detection_check.py")
+        ttl_s = self.args.web_cache_ttl_days * 86400 if self.args.web_cache_ttl_days > 0 else None
+        self.web_cache = HashCache(self.web.DEFAULT_CACHE_DIR, ttl_s=ttl_s)
+        self.web_limiter = RateLimiter(self.args.web_qps)
+        return ""
+
+    def _setup_sightengine(self) -> str:
+        self.se_user, self.se_secret = self.se.get_api_credentials()
+        if not self.se_user or not self.se_secret:
+            return "SIGHTENGINE_API_USER / SIGHTENGINE_API_SECRET not set"
+        tier = self.se.PLAN_TIERS[self.args.plan]
+        self.se_limiter = RateLimiter(tier["rps"])
+        self.se_quota = self.se.QuotaTracker(tier["monthly_quota"], used=self.args.quota_used)
+        self.se_session = self.se.make_session(self.args.io_workers)
+        self.se_cache = HashCache(self.se.DEFAULT_CACHE_DIR)
+        return ""
+
+    def _setup_auto_validate(self) -> str:
+        if not os.getenv("OPENROUTER_API_KEY"):
+            return "OPENROUTER_API_KEY not set"
+        self.av = load_script("11_auto_validate.py")
+        self.av.IMAGES = self.images  # read screenshots from the shared store
+        self.av_limiter = RateLimiter(self.av.MAX_REQUESTS_PER_MINUTE / 60.0)
+        self.av_cache = HashCache(AUTO_VALIDATE_CACHE_DIR)
+        return ""
+
+    # -- per-image tasks: keyed by content hash, return a cache-friendly dict ---------
+
+    def trufor_key(self, h: str) -> str:
+        p = self.trufor_params
+        return f"{h}_{p['min_conf']}_{p['min_size']}_{p['rel_min']}"
+
+    def trufor_cached(self, h: str) -> Optional[Dict[str, Any]]:
+        entry = self.trufor_cache.get(self.trufor_key(h))
+        if entry is not None:
+            self.from_cache["trufor"] += 1
+        return entry
+
+    def trufor_args(self, h: str, out_dir: Path) -> Tuple:
+        """_trufor_task arguments; each image gets its own npz folder so parallel runs never collide."""
+        return str(self.trufor_root), str(self.images.path(h)), str(out_dir / h[:16]), self.trufor_params
+
+    def trufor_done(self, h: str, res: Dict[str, Any]) -> None:
+        if res.get("status") != "error":
+            self.trufor_cache.put(self.trufor_key(h), res)
+
+    def trufor_flagged(self, res: Dict[str, Any]) -> bool:
+        # Thresholds apply at report time, so cached results follow the current settings
+        p = self.trufor_params
+        return res["trufor_score"] >= p["global_thresh"] or res["max_roi_score"] >= p["roi_thresh"]
+
+    def web_detect(self, h: str) -> Dict[str, Any]:
+        entry = self.web_cache.get(h)
+        if entry is not None and entry.get("max_results", 0) >= self.args.max_results:
+            self.from_cache["web"] += 1
+            return {"web_detection": entry["web_detection"], "error": "", "from_cache": 1,
+                    "payload_variant": entry.get("payload_variant", "original"), "payload_bytes": ""}
+        content = self.images.read_bytes(h)
+        self.web_limiter.acquire()
+        wd, err = self.web.fetch_web_detection(self.vision_client, content, max_results=self.args.max_results)
+        if wd is not None:
+            self.web_cache.put(h, {"max_results": self.args.max_results, "payload_variant": "original",
+                                   "web_detection": wd})
+        return {"web_detection": wd, "error": err, "from_cache": 0, "payload_variant": "original",
+                "payload_bytes": len(content)}
+
+    def sightengine(self, h: str) -> Dict[str, Any]:
+        key = self.se.score_cache_key(h, self.se.SIGHTENGINE_MODEL)
+        entry = self.se_cache.get(key)
+        if entry is not None:
+            self.from_cache["sightengine"] += 1
+            return {**entry, "status": "ok", "http_status": "", "error": "", "from_cache": 1}
+        content = self.images.read_bytes(h)
+        if not self.se_quota.reserve():
+            return {**self.se.quota_deferred(), "from_cache": 0}
+        result = self.se.detect_ai_generated(
+            self.images.path(h), self.se_user, self.se_secret,
+            endpoint=self.args.sightengine_endpoint or self.se.SIGHTENGINE_ENDPOINT, session=self.se_session,
+            limiter=self.se_limiter, content=content,
+        )
+        result["from_cache"] = 0
+        self.se_quota.settle(1, int(result.get("operations", 1)) if result.get("status") == "ok" else 0)
+        if result.get("status") == "ok":
+            if result.get("ai_generated_score") != "":
+                # write_sightengine_report adds the pointer to the stored response
+                self.se_cache.put(key, {"ai_generated_score": result["ai_generated_score"]})
+        return result
+
+    # -- per-task AI validation ----------------------------------------------------
+
+    def auto_validate_key(self, type_: str, row: Any, hashes: List[str]) -> str:
+        return sha256_bytes(json.dumps([type_, self.av.MODEL, hashes, row._asdict()], default=str).encode())
+
+    def auto_validate(self, type_: str, i: int, row: Any, hashes: List[str]) -> Dict[str, Any]:
+        key = self.auto_validate_key(type_, row, hashes)
+        entry = self.av_cache.get(key)
+        if entry is not None:
+            self.from_cache["auto_validate"] += 1
+            return entry
+        self.av_limiter.acquire()
+        result = self.av.validate_avg_row(i, row) if type_ == "avg" else self.av.validate_app_row(i, row)
+        if result.get("screenshot_correct") is not None:
+            self.av_cache.put(key, result)
+        return result
+
+
+# ----------------------------
+# Reports
+# ----------------------------
+def _write_report(det: "Detectors", detector: str, version: str, rows: List[Dict[str, Any]], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = pd.DataFrame(rows)
+    df.to_csv(path, index=False)
+    print(f"[run] Saved {path} ({len(rows)} rows)")
+    record_report(det.args.results_db, detector, version, path, df)
+
+
+def write_trufor_report(det: Detectors, refs: List[ImageRef], graph: TaskGraph, results_dir: Path, type_: str) -> Path:
+    edge, p, results = det.edge, det.trufor_params, graph.results
+    crops_dir = results_dir / "trufor_crops"
+    rows = []
+    for ref in refs:
+        res = results.get(("trufor", ref.content_hash)) if ref.content_hash else None
+        if res is None or res.get("status") == "error":
+            err = ref.error or (res or {}).get("error") or graph.errors.get(("trufor", ref.content_hash), "No result")
+            rows.append(edge.error_row(ref.task_id, ref.col, ref.path, str(err)))
+            continue
+        res = dict(res)
+        res["best_roi"] = edge.Box(**res["best_roi"]) if res.get("best_roi") else None
+        flagged = det.trufor_flagged(res)
+        res["status"] = "flagged" if flagged else "ok"
+        crop_path = ""
+        if flagged and res["best_roi"] is not None:
+            try:
+                crop_path = str(crops_dir / edge.crop_filename(ref.task_id, ref.col, res))
+                edge.save_crop(det.images.bgr(ref.content_hash), res["best_roi"], Path(crop_path), pad=28)
+            except Exception as e:
+                print(f"[run] Could not save crop for {ref.task_id}/{ref.col}: {e}")
+                crop_path = ""
+        rows.append(edge.report_row(ref.task_id, ref.col, ref.path, res, crop_path))
+    out = results_dir / REPORT_NAMES["trufor"].format(type=type_)
+    _write_report(det, "trufor", edge.detector_version(p["global_thresh"], p["roi_thresh"], p["rel_min"]), rows, out)
+    return out
+
+
+def write_web_report(det: Detectors, refs: List[ImageRef], graph: TaskGraph, results_dir: Path, type_: str) -> Path:
+    web, max_results, results = det.web, det.args.max_results, graph.results
+    rows, records = [], []
+    for ref in refs:
+        if not ref.content_hash:
+            row = web._report_row(ref.task_id, ref.col, ref.path, web._empty_result(error=ref.error))
+            if ref.error == "File not found":
+                for k in ("full_matches", "partial_matches", "pages"):
+                    row.pop(k)
+            rows.append(row)
+            continue
+        got = results.get(("web", ref.content_hash))
+        if got is None:
+            err = str(graph.errors.get(("web", ref.content_hash), "No result"))
+            rows.append(web._report_row(ref.task_id, ref.col, ref.path, web._empty_result(error=err),
+                                        content_hash=ref.content_hash))
+            continue
+        wd = got["web_detection"]
+        if wd is not None:
+            result = web._parse_web_detection(wd, max_results)
+        else:
+            result = web._empty_result(status=got.get("status", "error"), error=got["error"])
+        rows.append(web._report_row(ref.task_id, ref.col, ref.path, result, content_hash=ref.content_hash,
+                                    from_cache=got["from_cache"], payload_variant=got["payload_variant"],
+                                    payload_bytes=got["payload_bytes"]))
+        records += web.match_records(ref.task_id, ref.col, ref.path, result, ref.content_hash)
+    out = results_dir / REPORT_NAMES["web"].format(type=type_)
+    _write_report(det, "web", web.detector_version(max_results), rows, out)
+    team, wave = team_wave_from_path(out)
+    web.write_matches_db(results_dir / "web_detection_matches.sqlite", out.as_posix(), team, wave, records)
+    return out
+
+
+def write_sightengine_report(det: Detectors, refs: List[ImageRef], graph: TaskGraph, results_dir: Path,
+                             type_: str) -> Path:
+    se, results = det.se, graph.results
+    store = se.ResponseStore(results_dir / "sightengine_responses.sqlite")
+    rows = []
+    sidecar: Dict[str, str] = {}  # content hash -> raw_response_ref, one stored response per unique image
+    try:
+        for ref in refs:
+            result = results.get(("sightengine", ref.content_hash)) if ref.content_hash else None
+            if result is None:
+                err = ref.error or str(graph.errors.get(("sightengine", ref.content_hash), "No result"))
+                result = {"status": "error", "error": err}
+            sidecar_ref = ""
+            if ref.content_hash:
+                if ref.content_hash not in sidecar:
+                    sidecar[ref.content_hash] = se.store_response(store, result, str(ref.task_id), ref.col,
+                                                                  ref.content_hash, se.SIGHTENGINE_MODEL, det.se_cache)
+                sidecar_ref = sidecar[ref.content_hash]
+            flagged = se.flag_for_score(result.get("ai_generated_score"), det.args.threshold)
+            rows.append(se.report_row(ref.task_id, ref.col, ref.path, result, flagged, sidecar_ref, ref.content_hash))
+    finally:
+        store.close()
+    out = results_dir / REPORT_NAMES["sightengine"].format(type=type_)
+    _write_report(det, "sightengine", se.SIGHTENGINE_MODEL, rows, out)
+    return out
+
+
+def write_auto_annotations(det: Detectors, tasks: List[Tuple[Tuple, Any]], graph: TaskGraph, results_dir: Path,
+                           type_: str) -> Path:
+    rows = []
+    for key, row in tasks:
+        if key in graph.results:
+            rows.append(graph.results[key])
+        else:
+            err = graph.errors.get(key, "No result")
+            print(f"[run] AI validation failed for {key[2]}: {err}")
+            rows.append(failed_result(det, key, str(err), row))
+    out = results_dir / REPORT_NAMES["auto_validate"].format(type=type_)
+    _write_report(det, "auto_validate", det.av.MODEL, rows, out)
+    return out
+
+
+# ----------------------------
+# Graph
+# ----------------------------
+def auto_validate_tasks(team: str, wave: str, type_: str, df: pd.DataFrame,
+                        refs: List[ImageRef]) -> List[Tuple[Tuple, int, Any, List[str]]]:
+    """(graph key, 1-based position, row, content hashes) for each row of one sample CSV."""
+    hashes_of_row: Dict[Any, List[str]] = {}
+    for r in refs:
+        hashes_of_row.setdefault(r.row, []).append(r.content_hash)
+    return [(("auto_validate", type_, str(getattr(row, "task_id", i)), team, wave), i, row,
+             hashes_of_row.get(row.Index, []))
+            for i, row in enumerate(df.itertuples(), 1)]
+
+
+def deferred_result(det: Detectors, key: Tuple, reason: str, row: Any = None) -> Dict[str, Any]:
+    """What the report writers get for a request the budget did not cover."""
+    if key[0] == "web":
+        return {"web_detection": None, "status": DEFERRED, "error": reason, "from_cache": 0,
+                "payload_variant": "", "payload_bytes": ""}
+    if key[0] == "sightengine":
+        return {"status": DEFERRED, "error": reason, "from_cache": 0}
+    return annotation_row(det, key, reason, row)
+
+
+def failed_result(det: Detectors, key: Tuple, error: str, row: Any = None) -> Dict[str, Any]:
+    """What the report writers get for a task that failed (with --queue: --max_attempts times)."""
+    if key[0] == "web":
+        return {"web_detection": None, "status": "error", "error": error, "from_cache": 0,
+                "payload_variant": "", "payload_bytes": ""}
+    if key[0] in ("trufor", "sightengine"):
+        return {"status": "error", "error": error, "from_cache": 0}
+    return annotation_row(det, key, f"API error: {error}", row)
+
+
+def queued_result(det: Detectors, queue: WorkQueue, key: Tuple, row: Any = None) -> Dict[str, Any]:
+    """A queued task's stored result, or its error result once the queue gave up on it."""
+    try:
+        return queue.result(key)
+    except TaskFailed as e:
+        return failed_result(det, key, str(e), row)
+
+
+def annotation_row(det: Detectors, key: Tuple, notes: str, row: Any = None) -> Dict[str, Any]:
+    """An auto_annotations row without a verdict (deferred or failed), explained in notes."""
+    # Same columns as 11_'s rows; empty verdicts read as NA in 12_ and 18_
+    return {"task_id": key[2], "respondent_id": str(getattr(row, "respondent_id", "")), "reviewer": "AI_OpenRouter",
+            "screenshot_correct": None, "numbers_match": None, "notes": notes,
+            "annotated_at": datetime.now().isoformat(), "model_used": det.av.MODEL}
+
+
+def build_graph(det: Detectors, samples: Dict[Tuple[str, str, str], Tuple[pd.DataFrame, List[ImageRef]]],
+                graph: TaskGraph, queue: Optional[WorkQueue] = None, names: Optional[List[str]] = None,
+                deferred: Optional[Dict[Tuple, str]] = None) -> List[Tuple]:
+    """
+    One task per (detector, unique image) or (auto_validate, row), and one report task per sample CSV.
+
+    names limits the detectors (default: all enabled). Keys in deferred are not run; their
+    reports get deferred_result() with the given reason. With a queue, work tasks only
+    fetch their result from it (failed_result() for a task the queue gave up on); the
+    (key, detector, payload, version) tasks to enqueue are returned.
+    """
+    writers = {"trufor": write_trufor_report, "web": write_web_report, "sightengine": write_sightengine_report}
+    deferred = deferred or {}
+    queued: List[Tuple] = []
+
+    def add_work(key: Tuple, payload: Dict[str, Any], version: str, fn: Any, *args: Any, pool: str,
+                 row: Any = None) -> None:
+        if key in deferred:
+            graph.add(key, deferred_result, det, key, deferred[key], row)
+        elif queue is None:
+            graph.add(key, fn, *args, pool=pool)
+        else:
+            graph.add(key, queued_result, det, queue, key, row)
+            queued.append((key, key[0], payload, version))
+
+    for (team, wave, type_), (df, refs) in samples.items():
+        results_dir = QUALTRICS_DIR / team / wave / "results"
+        report_key = lambda name: ("report", name, team, wave, type_)  # noqa: E731
+
+        for name in names if names is not None else det.enabled:
+            if name == "auto_validate":
+                tasks = []
+                for key, i, row, hashes in auto_validate_tasks(team, wave, type_, df, refs):
+                    payload = {"csv": str(results_dir / f"sample_{type_}.csv"), "type": type_, "i": i,
+                               "hashes": hashes}
+                    add_work(key, payload, det.auto_validate_key(type_, row, hashes),
+                             det.auto_validate, type_, i, row, hashes, pool="io", row=row)
+                    tasks.append((key, row))
+                graph.add(report_key(name), write_auto_annotations, det, tasks, graph, results_dir, type_,
+                          deps=[key for key, _ in tasks], soft=True)
+                continue
+
+            deps = []
+            for h in det.images.unique(refs):
+                key = (name, h)
+                deps.append(key)
+                if key in graph.nodes:
+                    continue  # same image already queued from another sample
+                payload = {"content_hash": h, "path": str(det.images.path(h))}
+                if name == "trufor":
+                    cached = det.trufor_cached(h)
+                    if cached is not None:
+                        graph.add(key, dict, cached)
+                    else:
+                        add_work(key, {**payload, "out_dir": str(results_dir / "trufor_npz")}, det.trufor_key(h),
+                                 _trufor_task, *det.trufor_args(h, results_dir / "trufor_npz"), pool="cpu")
+                elif name == "web":
+                    add_work(key, payload, f"max_results={det.args.max_results}", det.web_detect, h, pool="io")
+                else:
+                    add_work(key, payload, det.se.SIGHTENGINE_MODEL, det.sightengine, h, pool="io")
+            # Soft: a failed image becomes an error row instead of dropping the whole report
+            graph.add(report_key(name), writers[name], det, refs, graph, results_dir, type_, deps=deps, soft=True)
+    return queued
+
+
+# ----------------------------
+# Budget
+# ----------------------------
+def plan_budget(det: Detectors, args: argparse.Namespace,
+                samples: Dict[Tuple[str, str, str], Tuple[pd.DataFrame, List[ImageRef]]], budget: Budget,
+                trufor_results: Dict[Any, Any]) -> Dict[Tuple, str]:
+    """
+    Rank the paid requests of this run by risk and plan them within the budget.
+
+    Writes results/budget_plan.csv per team and wave; returns {graph key: reason} of the
+    deferred requests.
+    """
+    risk = RiskIndex()
+    for team, wave in dict.fromkeys((team, wave) for team, wave, _ in samples):
+        risk.load_wave(QUALTRICS_DIR / team / wave / "results", team, wave, hash_for=det.images.hash_for)
+    risk.load_near_duplicates(Path(args.near_duplicates))
+    for key, res in trufor_results.items():  # this run's TruFor verdicts replace the reports'
+        if key[0] == "trufor" and res.get("status") != "error":
+            risk.add_trufor(key[1], det.trufor_flagged(res), res.get("trufor_score"))
+
+    tasks_of_hash: Dict[str, set] = {}
+    for (team, wave, _), (_, refs) in samples.items():
+        for ref in refs:
+            if ref.content_hash:
+                tasks_of_hash.setdefault(ref.content_hash, set()).add((team, wave, str(ref.task_id)))
+
+    items: List[WorkItem] = []
+    seen = set()
+    for (team, wave, type_), (df, refs) in samples.items():
+        for name in (n for n in det.enabled if n in PAID_SERVICES):
+            if name == "auto_validate":
+                for key, _, row, hashes in auto_validate_tasks(team, wave, type_, df, refs):
+                    cached = det.av_cache.get(det.auto_validate_key(type_, row, hashes)) is not None
+                    items.append(WorkItem(key, team, name, risk.risk(hashes, [(team, wave, key[2])]), cached))
+                continue
+            for h in det.images.unique(refs):
+                if (name, h) in seen:
+                    continue
+                seen.add((name, h))
+                if name == "web":
+                    entry = det.web_cache.get(h)
+                    cached = entry is not None and entry.get("max_results", 0) >= args.max_results
+                else:
+                    cached = det.se_cache.get(det.se.score_cache_key(h, det.se.SIGHTENGINE_MODEL)) is not None
+                items.append(WorkItem((name, h), team, name, risk.risk([h], tasks_of_hash.get(h, ())), cached))
+
+    decisions = schedule(items, budget)
+    item_of = {item.key: item for item in items}
+    plans: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for (team, wave, type_), (df, refs) in samples.items():
+        rows = plans.setdefault((team, wave), [])
+        for name in (n for n in det.enabled if n in PAID_SERVICES):
+            if name == "auto_validate":
+                tasks = auto_validate_tasks(team, wave, type_, df, refs)
+                plan_refs = [(key, key[2], "", "", "") for key, *_ in tasks]
+            else:
+                plan_refs = [((name, r.content_hash), r.task_id, r.col, str(r.path), r.content_hash)
+                             for r in refs if r.content_hash]
+            for key, task_id, col, path, h in plan_refs:
+                d, item = decisions[key], item_of[key]
+                rows.append({"service": name, "task_id": task_id, "image_col": col, "image_path": path,
+                             "content_hash": h, "rank": d.rank, "risk": round(item.risk.score, 4),
+                             "risk_reasons": item.risk.describe(), "decision": d.decision,
+                             "cost_usd": d.cost_usd, "reason": d.reason})
+    for (team, wave), rows in plans.items():
+        out = QUALTRICS_DIR / team / wave / "results" / BUDGET_PLAN
+        out.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(rows, columns=BUDGET_PLAN_COLS).sort_values(["rank", "service"]).to_csv(out, index=False)
+        print(f"[budget] Plan saved: {out}")
+
+    deferred = {key: d.reason for key, d in decisions.items() if d.decision == DEFERRED}
+    by_service = ", ".join(f"{n} {sum(1 for k in deferred if k[0] == n)}" for n in det.enabled if n in PAID_SERVICES)
+    print(f"[budget] {budget.summary()}; deferred: {by_service}")
+    return deferred
+
+
+# ----------------------------
+# Work queue (several machines)
+# ----------------------------
+def queue_handlers(det: Detectors, cpu_pool: Optional[Executor]) -> Dict[str, Any]:
+    """payload -> result functions for the enabled detectors, as run by a queue Worker."""
+    rows_lock = threading.Lock()
+    rows: Dict[str, List[Any]] = {}
+
+    def image(payload: Dict[str, Any]) -> str:
+        h = det.images.hash_for(payload["path"])
+        if h != payload["content_hash"]:
+            raise RuntimeError(f"{payload['path']} changed since it was queued")
+        return h
+
+    def trufor(payload: Dict[str, Any]) -> Dict[str, Any]:
+        h = image(payload)
+        res = det.trufor_cached(h)
+        if res is None:
+            args = det.trufor_args(h, Path(payload["out_dir"]))
+            res = cpu_pool.submit(_trufor_task, *args).result() if cpu_pool is not None else _trufor_task(*args)
+            det.trufor_done(h, res)
+        return res
+
+    def auto_validate(payload: Dict[str, Any]) -> Dict[str, Any]:
+        with rows_lock:
+            if payload["csv"] not in rows:
+                rows[payload["csv"]] = list(pd.read_csv(payload["csv"]).itertuples())
+            row = rows[payload["csv"]][payload["i"] - 1]
+        return det.auto_validate(payload["type"], payload["i"], row, payload["hashes"])
+
+    handlers = {"trufor": trufor, "web": lambda p: det.web_detect(image(p)),
+                "sightengine": lambda p: det.sightengine(image(p)), "auto_validate": auto_validate}
+    return {name: handlers[name] for name in det.enabled}
+
+
+def work_queue(det: Detectors, args: argparse.Namespace, queue: WorkQueue) -> Dict[str, int]:
+    """Work on the queue's tasks for the enabled detectors until none are left anywhere."""
+    io_lane = tuple(d for d in det.enabled if d != "trufor")
+    lanes = ([(("trufor",), max(1, args.cpu_workers))] if "trufor" in det.enabled else []) + \
+        ([(io_lane, max(1, args.io_workers))] if io_lane else [])
+
+    def on_done(task: Task, result: Any, error: Optional[str]) -> None:
+        if error is not None:
+            print(f"[queue] {task.detector} {task.key[1]} attempt {task.attempts} failed: {error}")
+
+    with ExitStack() as stack:
+        cpu_pool = None
+        if "trufor" in det.enabled:
+            cpu_pool = stack.enter_context(ProcessPoolExecutor(max_workers=max(1, args.cpu_workers)))
+        worker = Worker(queue, queue_handlers(det, cpu_pool), lanes=lanes)
+        print(f"[queue] Worker {worker.worker_id} on {queue.db_path} ({', '.join(det.enabled)})")
+        counts = worker.run(on_done=on_done, status_s=args.status_s)
+    det.images.save_index()
+    print(f"[queue] Worker {worker.worker_id}: {counts['done']} done, {counts['retried']} retried, "
+          f"{counts['failed']} failed, {counts['lost']} lost (lease expired while running)")
+    return counts
+
+
+def run_graph(det: Detectors, args: argparse.Namespace,
+              samples: Dict[Tuple[str, str, str], Tuple[pd.DataFrame, List[ImageRef]]], names: List[str],
+              queue: Optional[WorkQueue], t0: float, deferred: Optional[Dict[Tuple, str]] = None) -> TaskGraph:
+    """Build and run the graph for these detectors (through the queue if given); returns it."""
+    graph = TaskGraph()
+    queued = build_graph(det, samples, graph, queue, names, deferred)
+    n_work = sum(1 for k in graph.nodes if k[0] in DETECTORS)
+    print(f"[run] {n_work} tasks ({', '.join(names)}) for {len(samples)} sample file(s)")
+    if queue is not None:
+        n_new = queue.enqueue(queued)
+        print(f"[run] {len(queued)} tasks in {args.queue}, {n_new} to run (the rest finished earlier)")
+        work_queue(det, args, queue)
+        print(queue.status())
+
+    done = {"n": 0}
+
+    def on_done(key: Any, result: Any, error: Optional[BaseException]) -> None:
+        if key[0] not in DETECTORS:
+            return
+        done["n"] += 1
+        if key[0] == "trufor" and error is None:
+            det.trufor_done(key[1], result)
+        if error is not None:
+            print(f"[run] {done['n']}/{n_work} {key[0]} failed: {error}")
+        elif done["n"] % 10 == 0 or done["n"] == n_work:
+            elapsed = time.monotonic() - t0
+            print(f"[run] {done['n']}/{n_work} tasks done ({done['n'] / elapsed if elapsed > 0 else 0:.1f}/s)")
+
+    # The process pool only starts if TruFor has work
+    with ExitStack() as stack:
+        pools = {"io": stack.enter_context(ThreadPoolExecutor(max_workers=max(1, args.io_workers)))}
+        if any(n.pool == "cpu" for n in graph.nodes.values()):
+            pools["cpu"] = stack.enter_context(ProcessPoolExecutor(max_workers=max(1, args.cpu_workers)))
+        graph.run(pools, on_done=on_done)
+    return graph
+
+
+# ----------------------------
+# Watch mode
+# ----------------------------
+def check_upload(det: Detectors, path: Path, cpu_pool: Optional[Executor]) -> Dict[str, Any]:
+    """Run every enabled per-image detector on one new upload; returns its watch_report.csv row."""
+    st = path.stat()
+    row: Dict[str, Any] = {"response_id": path.parent.name, "image_path": str(path),
+                           "uploaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(st.st_mtime))}
+    flagged_by, errors = [], []
+    try:
+        h = det.images.hash_path(path)
+    except OSError as e:
+        return {**row, "error": str(e)}
+    row["content_hash"] = h
+
+    # TruFor runs in the process pool while this thread makes the API calls
+    trufor = det.trufor_cached(h) if "trufor" in det.enabled else None
+    pending = None
+    if "trufor" in det.enabled and trufor is None:
+        pending = cpu_pool.submit(_trufor_task, *det.trufor_args(h, path.parents[2] / "results" / "trufor_npz"))
+
+    if "web" in det.enabled:
+        try:
+            got = det.web_detect(h)
+            if got["web_detection"] is None:
+                raise RuntimeError(got["error"])
+            result = det.web._parse_web_detection(got["web_detection"], det.args.max_results)
+            row.update(web_status=result["status"], n_full_matches=result["n_full_matches"],
+                       top_full_match_url=result["top_full_match_url"])
+            if result["status"] == "match":
+                flagged_by.append("web")
+        except Exception as e:
+            row["web_status"] = "error"
+            errors.append(f"web: {e}")
+
+    if "sightengine" in det.enabled:
+        result = det.sightengine(h)
+        flagged = det.se.flag_for_score(result.get("ai_generated_score"), det.args.threshold)
+        row.update(sightengine_status=result.get("status", "error"), ai_generated_score=result.get("ai_generated_score", ""),
+                   ai_flagged=flagged)
+        if result.get("status") != "ok":
+            errors.append(f"sightengine: {result.get('error', '')}")
+        if flagged == 1:
+            flagged_by.append("sightengine")
+
+    if "trufor" in det.enabled:
+        try:
+            if pending is not None:
+                trufor = pending.result()
+                det.trufor_done(h, trufor)
+            if trufor.get("status") == "error":
+                raise RuntimeError(trufor.get("error", ""))
+            p = det.trufor_params
+            flagged = trufor["trufor_score"] >= p["global_thresh"] or trufor["max_roi_score"] >= p["roi_thresh"]
+            row.update(trufor_status="flagged" if flagged else "ok", trufor_score=trufor["trufor_score"],
+                       max_roi_score=trufor["max_roi_score"])
+            if flagged:
+                flagged_by.append("trufor")
+        except Exception as e:
+            row["trufor_status"] = "error"
+            errors.append(f"trufor: {e}")
+
+    row.update(flagged_by=",".join(flagged_by), error="; ".join(errors), checked_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+               latency_s=round(time.time() - st.st_mtime, 1))
+    return row
+
+
+def run_watch(det: Detectors, args: argparse.Namespace, waves: List[str]) -> int:
+    if "auto_validate" in det.enabled:
+        det.enabled.remove("auto_validate")
+        print("[watch] Skipping auto_validate: it needs the annotation samples (run without --watch)")
+    if not det.enabled:
+        print("[watch] No per-image detectors to run.")
+        return 1
+
+    roots = [QUALTRICS_DIR / team / wave / "uploads" for team in args.team for wave in waves]
+    watcher = UploadWatcher(roots, settle_s=args.settle_s, poll_s=args.poll_s)
+    n_existing = 0 if args.watch_existing else watcher.prime()
+    print(f"[watch] Watching {len(roots)} upload folder(s) with {watcher.mode} ({', '.join(det.enabled)}); "
+          f"{n_existing} existing file(s) skipped. Ctrl-C to stop.")
+
+    uploads: "queue.Queue[Optional[Path]]" = queue.Queue(maxsize=max(1, args.queue_size))
+    write_lock = threading.Lock()
+    stop = threading.Event()
+    counts = {"checked": 0, "flagged": 0}
+    reports: set = set()
+
+    def worker(cpu_pool: Optional[Executor]) -> None:
+        while True:
+            path = uploads.get()
+            if path is None:
+                return
+            try:
+                row = check_upload(det, path, cpu_pool)
+            except Exception as e:
+                row = {"response_id": path.parent.name, "image_path": str(path), "error": str(e)}
+            out = path.parents[2] / "results" / WATCH_REPORT
+            with write_lock:
+                out.parent.mkdir(parents=True, exist_ok=True)
+                pd.DataFrame([row], columns=WATCH_COLS).to_csv(out, mode="a", header=not out.exists(), index=False)
+                reports.add(out)
+                counts["checked"] += 1
+                counts["flagged"] += bool(row.get("flagged_by"))
+            print(f"[watch] {row['response_id']}/{path.name}: "
+                  f"{('FLAGGED by ' + row['flagged_by']) if row.get('flagged_by') else 'ok'}"
+                  f"{' (errors: ' + row['error'] + ')' if row.get('error') else ''} "
+                  f"| {row.get('latency_s', '?')}s after upload")
+
+    with ExitStack() as stack:
+        cpu_pool = None
+        if "trufor" in det.enabled:
+            cpu_pool = stack.enter_context(ProcessPoolExecutor(max_workers=max(1, args.cpu_workers)))
+        workers = [threading.Thread(target=worker, args=(cpu_pool,), daemon=True)
+                   for _ in range(max(1, args.io_workers))]
+        for t in workers:
+            t.start()
+        if args.watch_seconds > 0:
+            timer = threading.Timer(args.watch_seconds, stop.set)
+            timer.daemon = True
+            timer.start()
+        try:
+            for path in watcher.stable_files(stop):
+                uploads.put(path)  # blocks while the workers are behind
+        except KeyboardInterrupt:
+            print("\n[watch] Stopping after the queued uploads...")
+        finally:
+            stop.set()
+            for _ in workers:
+                uploads.put(None)
+            for t in workers:
+                t.join()
+    det.images.save_index()
+    for out in sorted(reports):
+        record_report(args.results_db, "watch", "watch:" + "+".join(det.enabled), out,
+                      pd.read_csv(out, float_precision="round_trip"))
+    print(f"[watch] {counts['checked']} upload(s) checked, {counts['flagged']} flagged")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run the per-image detectors (15_, 16_, 17_) and 11_ as one task graph")
+    ap.add_argument("--team", action="append", help="Team slug (repeatable; required unless --worker)")
+    ap.add_argument("--wave", action="append", choices=["baseline", "endline"], help="Wave (repeatable; default both)")
+    ap.add_argument("--types", default="avg,app", help="Sample types to process (avg, app)")
+    ap.add_argument("--skip", default="", help=f"Comma-separated detectors to skip: {', '.join(DETECTORS)}")
+    ap.add_argument("--cpu_workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                    help="Processes for TruFor")
+    ap.add_argument("--io_workers", type=int, default=8, help="Threads for API calls (shared by all APIs)")
+    ap.add_argument("--memory_mb", type=float, default=DEFAULT_MEMORY_MB, help="Memory budget for image bytes")
+    ap.add_argument("--results_db", default=str(DEFAULT_RESULTS_DB),
+                    help="Study-wide results DB to upsert every report into ('' to skip)")
+    # 15_ TruFor
+    ap.add_argument("--trufor_root", default="", help="Path to cloned TruFor repo (TruFor is skipped without it)")
+    ap.add_argument("--weights_dir", default="", help="Where to download TruFor weights")
+    ap.add_argument("--gpu", type=int, default=-1, help="GPU id for TruFor, -1 for CPU")
+    ap.add_argument("--min_conf", type=float, default=40)
+    ap.add_argument("--min_size", type=int, default=18)
+    ap.add_argument("--global_thresh", type=float, default=0.50)
+    ap.add_argument("--roi_thresh", type=float, default=0.22)
+    ap.add_argument("--rel_min", type=float, default=0.40)
+    # 16_ web detection
+    ap.add_argument("--web_qps", type=float, default=1.0, help="Max Vision requests per second (0 = no limit)")
+    ap.add_argument("--web_cache_ttl_days", type=float, default=30.0, help="Re-query cached web results after this")
+    ap.add_argument("--max_results", type=int, default=10, help="Max URLs to store per web result type")
+    # 17_ Sightengine
+    ap.add_argument("--plan", choices=sorted(load_script("17_sightengine_ai_detection.py").PLAN_TIERS), default="free",
+                    help="Sightengine plan tier (sets requests/sec and monthly quota)")
+    ap.add_argument("--quota_used", type=int, default=0, help="Sightengine operations already used this month")
+    ap.add_argument("--threshold", type=float, default=0.5, help="Sightengine score threshold for flagging")
+    ap.add_argument("--sightengine_endpoint", default="", help=argparse.SUPPRESS)
+    # Watch mode
+    ap.add_argument("--watch", action="store_true", help="Check new uploads as they arrive instead of the sample CSVs")
+    ap.add_argument("--watch_existing", action="store_true", help="With --watch: also check files already present")
+    ap.add_argument("--settle_s", type=float, default=2.0, help="With --watch: seconds a file must stop changing")
+    ap.add_argument("--poll_s", type=float, default=5.0, help="With --watch: polling interval without inotify")
+    ap.add_argument("--queue_size", type=int, default=32, help="With --watch: max uploads waiting for a worker")
+    ap.add_argument("--watch_seconds", type=float, default=0, help="With --watch: stop after this long (0 = never)")
+    # Work queue
+    ap.add_argument("--queue", default="", help="Shared work-queue DB, to spread the tasks over several machines")
+    ap.add_argument("--worker", action="store_true", help="With --queue: only work on queued tasks (extra nodes)")
+    ap.add_argument("--lease_s", type=float, default=DEFAULT_LEASE_S,
+                    help="With --queue: a task whose worker stops heartbeating this long is handed out again")
+    ap.add_argument("--max_attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                    help="With --queue: attempts per task before it is reported as failed")
+    ap.add_argument("--status_s", type=float, default=30.0,
+                    help="With --queue: print queue status and per-node throughput this often (0 = never)")
+    ap.add_argument("--budget_usd", type=float, default=None, help="Spend cap for paid API requests in this run")
+    ap.add_argument("--team_budget_usd", type=float, default=None, help="Spend cap for paid API requests per team")
+    ap.add_argument("--prices", default="", help="With a cap: USD per request, e.g. web=0.0015,sightengine=0.002")
+    ap.add_argument("--near_duplicates", default=str(QUALTRICS_DIR / "near_duplicate_report.csv"),
+                    help="With a cap: 19_near_duplicates.py report used to rank images by risk")
+    args = ap.parse_args()
+
+    args.skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    unknown = args.skip - set(DETECTORS)
+    if unknown:
+        ap.error(f"Unknown detector(s) in --skip: {', '.join(sorted(unknown))}")
+    if args.worker and not args.queue:
+        ap.error("--worker needs --queue")
+    if args.queue and args.watch:
+        ap.error("--queue and --watch cannot be combined")
+    if not args.team and not args.worker:
+        ap.error("--team is required (unless --worker)")
+    budget = None
+    if args.budget_usd is not None or args.team_budget_usd is not None:
+        if args.watch or args.worker:
+            ap.error("--budget_usd / --team_budget_usd apply to sample runs, not --watch or --worker")
+        try:
+            budget = Budget(args.budget_usd, args.team_budget_usd, parse_prices(args.prices))
+        except ValueError as e:
+            ap.error(f"--prices: {e}")
+    waves = args.wave or ["baseline", "endline"]
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+
+    images = ImageStore(memory_mb=args.memory_mb)
+    det = Detectors(args, images)
+    for name, reason in det.skipped.items():
+        print(f"[run] Skipping {name}: {reason}")
+    if not det.enabled:
+        print("[run] No detectors to run.")
+        return 1
+    if args.watch:
+        return run_watch(det, args, waves)
+    if args.worker:
+        with WorkQueue(args.queue, lease_s=args.lease_s, max_attempts=args.max_attempts) as queue:
+            work_queue(det, args, queue)
+            print(queue.status())
+        return 0
+
+    # One pass over storage: hash every screenshot referenced by the sample CSVs
+    samples: Dict[Tuple[str, str, str], Tuple[pd.DataFrame, List[ImageRef]]] = {}
+    for team in args.team:
+        for wave in waves:
+            for type_ in types:
+                csv_path = QUALTRICS_DIR / team / wave / "results" / f"sample_{type_}.csv"
+                if not csv_path.exists():
+                    print(f"[run] No {csv_path}, skipping")
+                    continue
+                df = pd.read_csv(csv_path)
+                samples[(team, wave, type_)] = (df, images.scan(df, DEFAULT_PATH_COLS))
+    if not samples:
+        print("[run] No sample CSVs found.")
+        return 1
+    print(f"[run] Ingestion: {images.summary()}")
+
+    queue = WorkQueue(args.queue, lease_s=args.lease_s, max_attempts=args.max_attempts) if args.queue else None
+    t0 = time.monotonic()
+    graphs: List[TaskGraph] = []
+    names = list(det.enabled)
+    if budget is not None and "trufor" in names:
+        graphs.append(run_graph(det, args, samples, ["trufor"], queue, t0))  # its verdicts rank the paid requests
+        names.remove("trufor")
+    deferred: Dict[Tuple, str] = {}
+    if budget is not None:
+        deferred = plan_budget(det, args, samples, budget, graphs[0].results if graphs else {})
+    if names:
+        graphs.append(run_graph(det, args, samples, names, queue, t0, deferred))
+    if queue is not None:
+        queue.close()
+
+    elapsed = time.monotonic() - t0
+    cached = ", ".join(f"{d} {n}" for d, n in det.from_cache.items() if d in det.enabled)
+    print(f"\n[run] Finished in {elapsed:.1f}s; results reused from cache: {cached}")
+    failed_reports = [(k, graph.errors[k]) for graph in graphs for k in graph.errors if k[0] == "report"]
+    for k, err in failed_reports:
+        print(f"[run] Report {k[1]} for {k[2]}/{k[3]}/{k[4]} failed: {err}")
+    return 1 if failed_reports else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+22_export_parquet.py
+
+Study-wide analytics export: every detector's per-image results and every
+respondent's survey/derived fields, across all teams and waves, as Hive-partitioned
+Parquet with compact dtypes.
+
+What it does:
+- Walks data/qualtrics/<TEAM>/<WAVE>/ and reads the reports written by 11_, 15_, 16_
+  and 17_ plus responses.csv, derived/*_for_annotation.csv and upload_times.csv
+- Maps every detector report onto one shared schema (status, score, flagged, ...)
+  so the whole study is one dataset, partitioned by team/wave/detector
+- Stores status/device/etc. as dictionary (categorical) columns, scores as float32,
+  counts and upload durations as int16 (out-of-range values are clipped, with a warning)
+- Rewrites only the partitions of the teams/waves it exported
+
+Usage:
+  python 22_export_parquet.py
+  python 22_export_parquet.py --teams GB,US --out_dir data/qualtrics/parquet
+
+Reading it back (filters are pushed down to the partition paths and row groups):
+  pd.read_parquet("data/qualtrics/parquet/detector_results",
+                  filters=[("detector", "==", "trufor"), ("status", "==", "flagged")])
+  pd.read_parquet("data/qualtrics/parquet/respondents", filters=[("wave", "==", "endline")])
+Pass dtype_backend="numpy_nullable" to keep int16 columns that contain nulls as Int16
+(by default pandas widens them to float64).
+
+Writes:
+  <out_dir>/detector_results/team=<TEAM>/wave=<WAVE>/detector=<DETECTOR>/*.parquet
+  <out_dir>/respondents/team=<TEAM>/wave=<WAVE>/*.parquet
+
+Requirements:
+  pip install pandas pyarrow
+"""
+
+import argparse
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+DEFAULT_ROOT = Path("data") / "qualtrics"
+TYPES = ("avg", "app")
+
+# detector -> (report prefix, score column, status that means flagged)
+DETECTOR_REPORTS: Dict[str, Tuple[str, Optional[str], Optional[str]]] = {
+    "auto_validate": ("auto_annotations", None, None),
+    "trufor": ("trufor_report", "trufor_score", "flagged"),
+    "web": ("web_detection_report", "top_full_match_score", "match"),
+    "sightengine": ("sightengine_ai_report", "ai_generated_score", None),  # has its own flagged column
+}
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+RESULT_SCHEMA = pa.schema([
+    ("type", CATEGORY),
+    ("task_id", pa.string()),
+    ("respondent_id", pa.string()),
+    ("image_col", CATEGORY),
+    ("image_path", pa.string()),
+    ("content_hash", pa.string()),
+    ("status", CATEGORY),
+    ("score", pa.float32()),
+    ("flagged", pa.int8()),
+    ("error", pa.string()),
+    # detector-specific
+    ("max_roi_score", pa.float32()),                # trufor
+    ("n_rois", pa.int16()),                         # trufor
+    ("n_full_matches", pa.int16()),                 # web
+    ("n_partial_matches", pa.int16()),              # web
+    ("n_pages", pa.int16()),                        # web
+    ("top_full_match_domain", pa.string()),         # web
+    ("screenshot_correct", CATEGORY),               # auto_validate
+    ("numbers_match", CATEGORY),                    # auto_validate
+    ("model_used", CATEGORY),                       # auto_validate
+])
+
+RESPONDENT_SCHEMA = pa.schema([
+    ("respondent_id", pa.string()),
+    ("participant_id", pa.string()),
+    ("device", CATEGORY),
+    ("end_date", pa.timestamp("s", tz="UTC")),
+    ("screenshot_day", CATEGORY),
+    ("android_target_date", pa.string()),
+    ("total_hours", pa.int16()),
+    ("total_minutes", pa.int16()),
+    ("instagram_hours", pa.int16()),
+    ("instagram_minutes", pa.int16()),
+    ("facebook_hours", pa.int16()),
+    ("facebook_minutes", pa.int16()),
+    ("tiktok_hours", pa.int16()),
+    ("tiktok_minutes", pa.int16()),
+    ("twitter_hours", pa.int16()),
+    ("twitter_minutes", pa.int16()),
+    ("finished", pa.int8()),
+    ("duration_sec", pa.int32()),  # whole-survey time; can exceed int16 (~9 hours)
+    ("avg_upload_sec", pa.int16()),
+    ("app_upload_sec", pa.int16()),
+])
+
+# Columns present in both derived files; the avg file wins, the app file fills gaps
+SHARED_DERIVED_COLS = ["participant_id", "device", "end_date", "screenshot_day_prefix", "screenshot_day",
+                       "android_target_date"]
+
+_TASK_RE = re.compile(r"^(?:avg|app)_(.+)_\d+$")
+
+
+# ----------------------------
+# Column conversion
+# ----------------------------
+def _to_arrow(s: pd.Series, typ: pa.DataType, name: str) -> pa.Array:
+    """Convert one pandas column to the schema type (NaN/"" -> null; ints clipped to range)."""
+    if pa.types.is_dictionary(typ) or pa.types.is_string(typ):
+        vals = [None if pd.isna(v) or v == "" else str(v) for v in s]
+        arr = pa.array(vals, type=pa.string())
+        return arr.dictionary_encode() if pa.types.is_dictionary(typ) else arr
+    if pa.types.is_timestamp(typ):
+        return pa.array(pd.to_datetime(s, errors="coerce", utc=True).dt.floor("s"), type=typ)
+    num = pd.to_numeric(s, errors="coerce")
+    if pa.types.is_floating(typ):
+        return pa.array(num.astype("float32"), type=typ, from_pandas=True)
+    info = np.iinfo(typ.to_pandas_dtype())
+    n_out = int(((num < info.min) | (num > info.max)).sum())
+    if n_out:
+        print(f"[parquet] WARNING: {n_out} value(s) of {name} outside {typ}; clipped")
+    num = num.round().clip(info.min, info.max)
+    return pa.array(num.astype(f"Int{info.bits}"), type=typ, from_pandas=True)
+
+
+def conform(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Table with exactly the schema's columns (missing columns all null)."""
+    cols = []
+    for field in schema:
+        s = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), dtype=object)
+        cols.append(_to_arrow(s.reset_index(drop=True), field.type, field.name))
+    return pa.Table.from_arrays(cols, names=schema.names)
+
+
+def _with_partition(table: pa.Table, **keys: str) -> pa.Table:
+    for k, v in keys.items():
+        table = table.append_column(k, pa.array([v] * len(table), type=pa.string()))
+    return table
+
+
+# ----------------------------
+# Loading
+# ----------------------------
+def _read_csv(path: Path) -> Optional[pd.DataFrame]:
+    if not path.exists():
+        return None
+    try:
+        return pd.read_csv(path, dtype={"task_id": str, "respondent_id": str, "participant_id": str,
+                                        "ResponseId": str, "content_hash": str})
+    except pd.errors.EmptyDataError:
+        return None
+
+
+def load_detector(results_dir: Path, detector: str) -> Optional[pd.DataFrame]:
+    """Both types of one detector's report in the shared layout, or None if absent."""
+    prefix, score_col, flag_status = DETECTOR_REPORTS[detector]
+    frames = []
+    for type_ in TYPES:
+        df = _read_csv(results_dir / f"{prefix}_{type_}.csv")
+        if df is None or df.empty:
+            continue
+        df = df.copy()
+        df["type"] = type_
+        if "respondent_id" not in df.columns:
+            df["respondent_id"] = df["task_id"].str.replace(_TASK_RE, r"\1", regex=True)
+        if score_col is not None:
+            df["score"] = df.get(score_col)
+        if flag_status is not None:
+            has_error = df.get("error", pd.Series(np.nan, index=df.index)).fillna("").astype(str) != ""
+            df["flagged"] = (df["status"] == flag_status).astype("Int8").mask(has_error)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def load_respondents(wave_dir: Path) -> Optional[pd.DataFrame]:
+    """One row per respondent: derived screen-time fields, survey duration and upload times."""
+    derived = [_read_csv(wave_dir / "derived" / f"{name}_screentime_for_annotation.csv")
+               for name in ("average", "app")]
+    derived = [d for d in derived if d is not None]
+    if not derived:
+        return None
+    df = derived[0]
+    for other in derived[1:]:
+        df = df.merge(other, on="respondent_id", how="outer", suffixes=("", "_other"))
+        for col in SHARED_DERIVED_COLS:
+            if col + "_other" in df.columns:
+                df[col] = df[col].combine_first(df.pop(col + "_other"))
+
+    responses = _read_csv(wave_dir / "responses.csv")
+    if responses is not None and "ResponseId" in responses.columns:
+        responses = responses.rename(columns={"ResponseId": "respondent_id", "Duration (in seconds)": "duration_sec",
+                                              "Finished": "finished"})
+        keep = [c for c in ("respondent_id", "duration_sec", "finished") if c in responses.columns]
+        df = df.merge(responses[keep].drop_duplicates("respondent_id"), on="respondent_id", how="left")
+
+    uploads = _read_csv(wave_dir / "results" / "upload_times.csv")
+    if uploads is not None:
+        keep = [c for c in ("respondent_id", "avg_upload_sec", "app_upload_sec") if c in uploads.columns]
+        df = df.merge(uploads[keep].drop_duplicates("respondent_id"), on="respondent_id", how="left")
+    return df
+
+
+def wave_dirs(root: Path, teams: Optional[List[str]] = None) -> List[Tuple[str, str, Path]]:
+    """(team, wave, dir) for every <root>/<TEAM>/<WAVE>/ with derived/ or results/."""
+    out = []
+    for wave_dir in sorted(p for p in root.glob("*/*") if p.is_dir()):
+        team, wave = wave_dir.parent.name, wave_dir.name
+        if teams and team not in teams:
+            continue
+        if (wave_dir / "derived").is_dir() or (wave_dir / "results").is_dir():
+            out.append((team, wave, wave_dir))
+    return out
+
+
+# ----------------------------
+# Export
+# ----------------------------
+def _write(tables: List[pa.Table], out_dir: Path, partitions: List[str]) -> int:
+    if not tables:
+        return 0
+    table = pa.concat_tables(tables)
+    ds.write_dataset(
+        table, out_dir, format="parquet",
+        partitioning=ds.partitioning(pa.schema([(p, pa.string()) for p in partitions]), flavor="hive"),
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+    return table.num_rows
+
+
+def export(root: Path, out_dir: Path, teams: Optional[List[str]] = None) -> Dict[str, int]:
+    """Export the given teams (all by default); returns {dataset: rows written}."""
+    results, respondents = [], []
+    for team, wave, wave_dir in wave_dirs(root, teams):
+        for detector in DETECTOR_REPORTS:
+            df = load_detector(wave_dir / "results", detector)
+            if df is not None:
+                # tighter row-group stats on status
+                df = df.sort_values([c for c in ("status", "task_id") if c in df.columns], kind="stable")
+                results.append(_with_partition(conform(df, RESULT_SCHEMA), team=team, wave=wave, detector=detector))
+        df = load_respondents(wave_dir)
+        if df is not None:
+            respondents.append(_with_partition(conform(df, RESPONDENT_SCHEMA), team=team, wave=wave))
+
+    return {
+        "detector_results": _write(results, out_dir / "detector_results", ["team", "wave", "detector"]),
+        "respondents": _write(respondents, out_dir / "respondents", ["team", "wave"]),
+    }
+
+
+def _dir_bytes(path: Path, pattern: str) -> int:
+    return sum(p.stat().st_size for p in path.rglob(pattern) if p.is_file())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export all compliance results as Hive-partitioned Parquet")
+    parser.add_argument("--root", default=str(DEFAULT_ROOT), help="Folder containing <TEAM>/<WAVE>/")
+    parser.add_argument("--out_dir", default="", help="Dataset root (default: <root>/parquet)")
+    parser.add_argument("--teams", default="", help="Comma-separated teams to (re-)export (default: all)")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    out_dir = Path(args.out_dir) if args.out_dir else root / "parquet"
+    teams = [t.strip() for t in args.teams.split(",") if t.strip()] or None
+
+    t0 = time.perf_counter()
+    counts = export(root, out_dir, teams)
+    if not any(counts.values()):
+        print(f"[parquet] Nothing to export under {root}")
+        return 1
+    for name, n in counts.items():
+        print(f"[parquet] {name}: {n} rows -> {out_dir / name}")
+
+    t1 = time.perf_counter()
+    df = pd.read_parquet(out_dir / "detector_results")
+    t_read = time.perf_counter() - t1
+    print(f"[parquet] Exported in {t_read + t1 - t0:.1f}s; detector_results reloads in {t_read:.2f}s "
+          f"({df.memory_usage(deep=True).sum() / 1e6:.1f} MB in pandas, "
+          f"{_dir_bytes(out_dir, '*.parquet') / 1e6:.1f} MB on disk vs "
+          f"{_dir_bytes(root, '*.csv') / 1e6:.1f} MB of CSVs under {root})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+23_download_uploads.py
+
+Parallel, resumable download of the screenshot uploads for one team and wave (the
+uploads half of 01_download.R, which fetches one file at a time).
+
+What it does:
+- Reads responses.csv (written by 01_download.R) and collects every Qualtrics file ID
+  (F_...) per ResponseId, exactly like 01_download.R
+- Downloads them with --workers threads over one pooled HTTP session (optionally paced
+  by --rps), retrying 429/5xx and dropped connections with exponential backoff
+- Resumes interrupted transfers: bytes land in uploads/<ResponseId>/<file_id>.part and
+  a retry (or the next run) asks only for the rest with an HTTP Range request
+- Skips files the manifest already lists as downloaded when the file on disk still has
+  the recorded size and sha256 (rows written by 01_download.R, which have neither, are
+  adopted as-is and get both filled in); failed rows are retried on every run
+- Rewrites uploaded_files_manifest.csv atomically every --flush_s while it runs, so an
+  interrupted run keeps everything downloaded so far
+
+Usage:
+  python 23_download_uploads.py --team team_example --wave baseline --survey_id SV_XXXXX
+  python 23_download_uploads.py --team GB --wave endline --survey_id SV_YYYYY --workers 16 --rps 10
+
+Auth:
+  export QUALTRICS_API_KEY="your_key"   (or QUALTRICS_API_KEY=... in .env)
+
+Writes (same layout and manifest columns as 01_download.R, plus size and sha256):
+  data/qualtrics/<TEAM>/<WAVE>/uploads/<ResponseId>/*
+  data/qualtrics/<TEAM>/<WAVE>/uploaded_files_manifest.csv
+
+Requirements:
+  pip install requests pandas python-dotenv
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+
+from gsme.ratelimit import RateLimiter
+
+load_dotenv()
+
+DEFAULT_BASE_URL = "ca1.qualtrics.com"
+QUALTRICS_DIR = Path("data") / "qualtrics"
+MANIFEST_NAME = "uploaded_files_manifest.csv"
+MANIFEST_COLS = ["response_id", "file_id", "ok", "http_status", "saved_path", "size", "sha256"]
+RESPONSE_ID_COLS = ["ResponseId", "responseid", "response_id", "responseId"]
+FILE_ID_RE = re.compile(r"^F_[A-Za-z0-9]")
+CHUNK_SIZE = 256 * 1024
+
+Key = Tuple[str, str]
+
+
+# ----------------------------
+# Inputs
+# ----------------------------
+def find_response_id_col(df: pd.DataFrame) -> str:
+    for col in RESPONSE_ID_COLS:
+        if col in df.columns:
+            return col
+    raise ValueError("Could not find a ResponseId column in responses.csv")
+
+
+def find_file_id_columns(df: pd.DataFrame) -> List[str]:
+    """Columns with at least one value like F_... (same rule as 01_download.R)."""
+    return [c for c in df.columns if df[c].dropna().astype(str).str.match(FILE_ID_RE).any()]
+
+
+def upload_jobs(df: pd.DataFrame) -> List[Key]:
+    """Unique (response_id, file_id) pairs in row order."""
+    rid_col = find_response_id_col(df)
+    file_cols = find_file_id_columns(df)
+    jobs: Dict[Key, None] = {}
+    for _, row in df.iterrows():
+        rid = row[rid_col]
+        if pd.isna(rid) or not str(rid):
+            continue
+        for col in file_cols:
+            fid = row[col]
+            if pd.notna(fid) and FILE_ID_RE.match(str(fid)):
+                jobs[(str(rid), str(fid))] = None
+    return list(jobs)
+
+
+def parse_content_disposition_filename(cd: Optional[str]) -> str:
+    """Bare file name from a Content-Disposition header, or "" (never a path)."""
+    if not cd:
+        return ""
+    m = re.search(r'filename\*?="?([^";]+)"?', cd, flags=re.IGNORECASE)
+    if not m:
+        return ""
+    name = m.group(1)
+    if name.lower().startswith("utf-8''"):
+        name = requests.utils.unquote(name[len("utf-8''"):])
+    return Path(name.replace("\\", "/")).name.strip()
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ----------------------------
+# Manifest
+# ----------------------------
+class Manifest:
+    """
+    uploaded_files_manifest.csv held in memory, one row per (response_id, file_id).
+
+    update() is thread-safe; the file is rewritten atomically at most every flush_s
+    seconds (and by flush()), with rows in job order followed by any rows
+    from an earlier run that are no longer in responses.csv.
+    """
+
+    def __init__(self, path: Path, flush_s: float = 2.0) -> None:
+        self.path = path
+        self.flush_s = flush_s
+        self.rows: Dict[Key, Dict[str, str]] = {}
+        if path.exists() and path.stat().st_size > 0:
+            df = pd.read_csv(path, dtype=str, keep_default_na=False)
+            for row in df.reindex(columns=MANIFEST_COLS, fill_value="").to_dict("records"):
+                self.rows[(row["response_id"], row["file_id"])] = row
+        self.order: List[Key] = []
+        self._claims: Dict[Path, Key] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def claim(self, path: Path, key: Key) -> Path:
+        """path, or <file_id>_<name> if another upload of the response already uses it."""
+        with self._lock:
+            taken = {Path(r["saved_path"]): k for k, r in self.rows.items() if r["saved_path"]}
+            taken.update(self._claims)
+            if taken.get(path, key) != key:
+                path = path.with_name(f"{key[1]}_{path.name}")
+            self._claims[path] = key
+        return path
+
+    def update(self, row: Dict[str, str]) -> None:
+        with self._lock:
+            self.rows[(row["response_id"], row["file_id"])] = row
+            due = time.monotonic() - self._last_flush >= self.flush_s
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            in_order = set(self.order)
+            keys = [k for k in self.order if k in self.rows] + [k for k in self.rows if k not in in_order]
+            out = pd.DataFrame([self.rows[k] for k in keys], columns=MANIFEST_COLS)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".tmp_")
+            os.close(fd)
+            out.to_csv(tmp, index=False)
+            os.replace(tmp, self.path)
+            self._last_flush = time.monotonic()
+
+
+def is_current(row: Optional[Dict[str, str]]) -> bool:
+    """True if the manifest row is a successful download whose file still matches it."""
+    if not row or row.get("ok", "").upper() not in ("TRUE", "1", "T"):
+        return False
+    path = Path(row.get("saved_path") or "")
+    if not row.get("saved_path") or not path.is_file():
+        return False
+    if not row.get("size") or not row.get("sha256"):
+        return True  # written by 01_download.R: adopted, size/sha256 filled in by the caller
+    return str(path.stat().st_size) == row["size"] and file_sha256(path) == row["sha256"]
+
+
+# ----------------------------
+# Download
+# ----------------------------
+def _content_range_start(value: Optional[str]) -> Optional[int]:
+    m = re.match(r"bytes (\d+)-", value or "")
+    return int(m.group(1)) if m else None
+
+
+class Downloader:
+    """Fetches one uploaded file at a time per calling thread; all threads share session and limiter."""
+
+    def __init__(self, api_root: str, survey_id: str, token: str, out_dir: Path, manifest: Manifest,
+                 session: requests.Session, limiter: RateLimiter, tries: int = 6,
+                 retry_sleep_s: float = 1.0, timeout: float = 120.0) -> None:
+        self.api_root = api_root.rstrip("/")
+        self.survey_id = survey_id
+        self.token = token
+        self.out_dir = out_dir
+        self.manifest = manifest
+        self.session = session
+        self.limiter = limiter
+        self.tries = tries
+        self.retry_sleep_s = retry_sleep_s
+        self.timeout = timeout
+        self.n_resumed = 0
+        self._lock = threading.Lock()
+
+    def url(self, response_id: str, file_id: str) -> str:
+        return f"{self.api_root}/surveys/{self.survey_id}/responses/{response_id}/uploaded-files/{file_id}"
+
+    def _backoff(self, attempt: int) -> None:
+        time.sleep(min(30.0, self.retry_sleep_s * (2 ** attempt)) + random.uniform(0, self.retry_sleep_s / 2))
+
+    def fetch(self, response_id: str, file_id: str) -> Dict[str, str]:
+        key = (response_id, file_id)
+        resp_dir = self.out_dir / "uploads" / response_id
+        resp_dir.mkdir(parents=True, exist_ok=True)
+        part = resp_dir / f"{file_id}.part"
+        row = {"response_id": response_id, "file_id": file_id, "ok": "FALSE", "http_status": "",
+               "saved_path": "", "size": "", "sha256": ""}
+
+        for attempt in range(self.tries):
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {"X-API-TOKEN": self.token, "Accept": "*/*"}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+            self.limiter.acquire()
+            try:
+                with self.session.get(self.url(response_id, file_id), headers=headers, stream=True,
+                                      timeout=self.timeout) as resp:
+                    row["http_status"] = str(resp.status_code)
+                    if resp.status_code == 416:  # stale .part longer than the file: start over
+                        part.unlink(missing_ok=True)
+                        continue
+                    if resp.status_code == 429 or resp.status_code >= 500:
+                        if resp.status_code == 429:
+                            self.limiter.pause(self.retry_sleep_s * (2 ** attempt))
+                        self._backoff(attempt)
+                        continue
+                    if resp.status_code >= 400:
+                        part.unlink(missing_ok=True)
+                        return row
+                    resumed = resp.status_code == 206 and _content_range_start(resp.headers.get("Content-Range")) == offset
+                    if resumed:
+                        with self._lock:
+                            self.n_resumed += 1
+                    else:
+                        offset = 0
+                    expected = offset + int(resp.headers["Content-Length"]) if "Content-Length" in resp.headers else None
+                    # Keep whatever arrives before a dropped connection; the length check below catches it
+                    resp.raw.enforce_content_length = False
+                    with open(part, "ab" if resumed else "wb") as f:
+                        for chunk in resp.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                    if expected is not None and part.stat().st_size != expected:
+                        raise requests.ConnectionError(f"incomplete transfer ({part.stat().st_size} of {expected} bytes)")
+                    filename = parse_content_disposition_filename(resp.headers.get("Content-Disposition"))
+            except (requests.RequestException, OSError) as e:
+                print(f"  Retry {attempt + 1}/{self.tries} for {response_id}/{file_id}: {e}")
+                row["http_status"] = ""
+                self._backoff(attempt)
+                continue
+
+            final = self.manifest.claim(resp_dir / (filename or f"{file_id}.bin"), key)
+            os.replace(part, final)
+            row.update(ok="TRUE", saved_path=final.as_posix(), size=str(final.stat().st_size), sha256=file_sha256(final))
+            return row
+        return row
+
+
+def download_all(jobs: List[Key], downloader: Downloader, manifest: Manifest, workers: int,
+                 force: bool = False) -> Dict[str, int]:
+    """Download every job not already current in the manifest; returns counts by outcome."""
+    manifest.order = list(jobs)
+    counts = {"skipped": 0, "downloaded": 0, "failed": 0}
+    todo = []
+    for key in jobs:
+        row = manifest.rows.get(key)
+        if not force and is_current(row):
+            if not row.get("sha256"):
+                path = Path(row["saved_path"])
+                manifest.update({**row, "size": str(path.stat().st_size), "sha256": file_sha256(path)})
+            counts["skipped"] += 1
+        else:
+            todo.append(key)
+    print(f"[download] {len(jobs)} uploads: {counts['skipped']} already on disk, {len(todo)} to fetch "
+          f"with {workers} workers")
+
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(downloader.fetch, *key): key for key in todo}
+        for i, fut in enumerate(as_completed(futures), 1):
+            row = fut.result()
+            manifest.update(row)
+            counts["downloaded" if row["ok"] == "TRUE" else "failed"] += 1
+            if row["ok"] != "TRUE":
+                print(f"  [failed] {row['response_id']}/{row['file_id']} (HTTP {row['http_status'] or 'n/a'})")
+            if i % 50 == 0 or i == len(todo):
+                rate = i / max(time.time() - t0, 1e-9)
+                print(f"[download] {i}/{len(todo)} ({rate:.1f} files/s)")
+    manifest.flush()
+    return counts
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Parallel, resumable download of Qualtrics file uploads")
+    ap.add_argument("--team", required=True, help="Team slug (TEAM_SLUG in 01_download.R)")
+    ap.add_argument("--wave", required=True, choices=["baseline", "endline"])
+    ap.add_argument("--survey_id", required=True, help="Qualtrics survey ID (SV_...)")
+    ap.add_argument("--base_url", default=DEFAULT_BASE_URL, help="Qualtrics data center host")
+    ap.add_argument("--api_root", default="", help="API root URL (default https://<base_url>/API/v3)")
+    ap.add_argument("--out_dir", default="", help="Wave folder (default data/qualtrics/<team>/<wave>)")
+    ap.add_argument("--responses_csv", default="", help="Default <out_dir>/responses.csv")
+    ap.add_argument("--workers", type=int, default=8, help="Concurrent downloads (and pooled connections)")
+    ap.add_argument("--rps", type=float, default=0, help="Max requests per second across workers (0 = no limit)")
+    ap.add_argument("--tries", type=int, default=6, help="Attempts per file before recording it as failed")
+    ap.add_argument("--retry_sleep_s", type=float, default=1.0, help="First retry delay (doubles each retry)")
+    ap.add_argument("--timeout", type=float, default=120.0, help="Seconds per request")
+    ap.add_argument("--flush_s", type=float, default=2.0, help="Rewrite the manifest at most this often")
+    ap.add_argument("--force", action="store_true", help="Re-download files already on disk")
+    args = ap.parse_args()
+
+    token = (os.getenv("QUALTRICS_API_KEY") or "").strip()
+    if not token:
+        print("Missing QUALTRICS_API_KEY. Set it in the environment or in .env.")
+        return 2
+
+    out_dir = Path(args.out_dir) if args.out_dir else QUALTRICS_DIR / args.team / args.wave
+    responses_csv = Path(args.responses_csv) if args.responses_csv else out_dir / "responses.csv"
+    if not responses_csv.exists():
+        print(f"[download] {responses_csv} not found; run 01_download.R first to fetch the responses")
+        return 2
+
+    df = pd.read_csv(responses_csv, dtype=str, low_memory=False)
+    jobs = upload_jobs(df)
+    if not jobs:
+        print("No file-upload IDs detected in this dataset. Nothing to download.")
+        return 0
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, args.workers))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    manifest = Manifest(out_dir / MANIFEST_NAME, flush_s=args.flush_s)
+    downloader = Downloader(
+        args.api_root or f"https://{args.base_url}/API/v3", args.survey_id, token, out_dir, manifest,
+        session, RateLimiter(args.rps), tries=args.tries, retry_sleep_s=args.retry_sleep_s, timeout=args.timeout,
+    )
+    t0 = time.time()
+    counts = download_all(jobs, downloader, manifest, args.workers, force=args.force)
+    print(f"[download] done in {time.time() - t0:.1f}s: {counts['downloaded']} downloaded "
+          f"({downloader.n_resumed} resumed), {counts['skipped']} skipped, {counts['failed']} failed")
+    print(f"  - {manifest.path}")
+    print(f"  - {out_dir / 'uploads'}")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+24_ingest_bundles.py
+
+Ingest the result bundles country teams send back (bundle_<team>_<wave>_<timestamp>.zip
+from 04_bundle_results.R) straight from the zip files, without unzipping them by hand.
+
+What it does:
+- Opens every bundle (in parallel, --workers) and reads bundle_manifest.txt for the
+  team, wave and creation time; members are streamed and hashed, never extracted whole
+- Checks members against FILES_INCLUDED: listed files missing from the zip, corrupt
+  members (CRC errors) and members over --max_member_mb reject the bundle; members that
+  are not listed are ignored with a warning
+- Takes only the sample/annotation CSVs and the screenshots (uploads/<ResponseId>/<file>)
+  that the bundle's sample CSVs reference
+- With several bundles for one wave, each file comes from the newest bundle holding it;
+  a file whose content hash matches what is already on disk is not written, a local copy
+  modified after the bundle was created is kept, and a screenshot whose content already
+  exists elsewhere is hard-linked instead of copied (one copy on disk, however many
+  bundles or paths reference it)
+- Hashes of the screenshots it writes go to the shared ingest index (gsme.ingest), so the
+  detectors do not re-read them to hash them
+- With --run_detectors, runs 21_run_detectors.py on every team/wave that changed
+
+Usage:
+  python 24_ingest_bundles.py                          # every zip in data/bundles/
+  python 24_ingest_bundles.py ~/Downloads/bundle_GB_*.zip --run_detectors
+  python 24_ingest_bundles.py --dry_run
+  python 24_ingest_bundles.py --run_detectors --detector_args "--skip web --trufor_root ~/TruFor"
+
+Writes:
+  data/qualtrics/<TEAM>/<WAVE>/results/{sample,annotations}_{avg,app}.csv
+  the screenshot paths referenced by the sample CSVs (uploads/<ResponseId>/...)
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from gsme.ingest import DEFAULT_PATH_COLS, ImageStore
+
+QUALTRICS_DIR = Path("data") / "qualtrics"
+DEFAULT_INBOX = Path("data") / "bundles"
+MANIFEST_MEMBER = "bundle_manifest.txt"
+RESULT_CSVS = ("sample_avg.csv", "sample_app.csv", "annotations_avg.csv", "annotations_app.csv")
+BUNDLE_NAME_RE = re.compile(r"^bundle_(.+)_(baseline|endline)_(\d{8}_\d{6})\.zip$")
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class Member:
+    name: str          # name inside the zip
+    target: Path       # where it belongs on disk
+    content_hash: str
+    size: int
+    is_image: bool
+
+
+@dataclass
+class Bundle:
+    path: Path
+    team: str = ""
+    wave: str = ""
+    created_at: Optional[pd.Timestamp] = None
+    members: List[Member] = field(default_factory=list)
+    problems: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def parse_manifest(text: str) -> Tuple[Dict[str, str], List[str]]:
+    """({TEAM_SLUG, WAVE, CREATED_AT, ...}, FILES_INCLUDED) from bundle_manifest.txt."""
+    fields, files = {}, []
+    in_files = False
+    for line in text.splitlines():
+        if line.strip() == "FILES_INCLUDED:":
+            in_files = True
+        elif in_files and line.lstrip().startswith("- "):
+            files.append(line.lstrip()[2:].strip())
+        elif ":" in line and not in_files:
+            k, v = line.split(":", 1)
+            fields[k.strip()] = v.strip()
+    return fields, files
+
+
+def _hash_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    """sha256 of a member, streamed; zipfile raises BadZipFile on a CRC mismatch."""
+    h = hashlib.sha256()
+    with zf.open(info) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _referenced_paths(zf: zipfile.ZipFile, names: Set[str]) -> List[Path]:
+    """Screenshot paths in the *_path columns of the bundle's sample CSVs."""
+    paths = []
+    for csv_name in ("sample_avg.csv", "sample_app.csv"):
+        if csv_name in names:
+            with zf.open(csv_name) as f:
+                df = pd.read_csv(f, dtype=str)
+            for col in DEFAULT_PATH_COLS:
+                if col in df.columns:
+                    paths += [Path(p) for p in df[col].dropna() if p]
+    return paths
+
+
+def inspect_bundle(path: Path, root: Path, max_member_bytes: int) -> Bundle:
+    """Validate one bundle and hash the members worth ingesting (reads, never writes)."""
+    bundle = Bundle(path)
+    try:
+        with zipfile.ZipFile(path) as zf:
+            infos = {i.filename: i for i in zf.infolist() if not i.is_dir()}
+            if MANIFEST_MEMBER not in infos:
+                bundle.problems.append(f"no {MANIFEST_MEMBER}")
+                return bundle
+            fields, listed = parse_manifest(zf.read(MANIFEST_MEMBER).decode("utf-8", "replace"))
+            m = BUNDLE_NAME_RE.match(path.name)
+            bundle.team = fields.get("TEAM_SLUG") or (m.group(1) if m else "")
+            bundle.wave = fields.get("WAVE") or (m.group(2) if m else "")
+            created = fields.get("CREATED_AT") or (m.group(3) if m else "")
+            bundle.created_at = pd.to_datetime(created, format="%Y%m%d_%H%M%S" if m and created == m.group(3) else None,
+                                               errors="coerce")
+            if not bundle.team or bundle.wave not in ("baseline", "endline"):
+                bundle.problems.append(f"manifest has no usable TEAM_SLUG/WAVE ({bundle.team!r}, {bundle.wave!r})")
+                return bundle
+            if pd.isna(bundle.created_at):
+                bundle.created_at = pd.Timestamp.fromtimestamp(path.stat().st_mtime)
+
+            missing = [n for n in listed if n not in infos]
+            if missing:
+                bundle.problems.append(f"listed but missing from the zip: {', '.join(missing)}")
+            unlisted = sorted(set(infos) - set(listed) - {MANIFEST_MEMBER})
+            if unlisted:
+                bundle.warnings.append(f"ignored {len(unlisted)} unlisted member(s): {', '.join(unlisted[:5])}")
+
+            results_dir = root / bundle.team / bundle.wave / "results"
+            listed = [n for n in listed if n in infos]
+            wanted: Dict[str, Tuple[Path, bool]] = {n: (results_dir / n, False) for n in listed if n in RESULT_CSVS}
+            refs = _referenced_paths(zf, set(listed))
+            for n in listed:
+                parts = PurePosixPath(n).parts
+                if len(parts) < 3 or parts[-3] != "uploads" or ".." in parts:
+                    continue
+                if any(ref.parts[-3:] == parts[-3:] for ref in refs):
+                    # Rebuilt under this wave's uploads/, whatever prefix the team's paths had
+                    wanted[n] = (results_dir.parent / "uploads" / parts[-2] / parts[-1], True)
+            for n in sorted(set(listed) - set(wanted)):
+                bundle.warnings.append(f"{n}: not a sample/annotation CSV or a referenced screenshot, ignored")
+
+            for name, (target, is_image) in wanted.items():
+                info = infos[name]
+                if info.file_size > max_member_bytes:
+                    bundle.problems.append(f"{name}: {info.file_size / 1e6:.0f} MB exceeds --max_member_mb")
+                    continue
+                bundle.members.append(Member(name, target, _hash_member(zf, info), info.file_size, is_image))
+    except (zipfile.BadZipFile, OSError, ValueError) as e:
+        bundle.problems.append(f"unreadable: {e}")
+    return bundle
+
+
+def plan(bundles: List[Bundle]) -> Dict[Path, Tuple[Bundle, Member]]:
+    """Target path -> (bundle, member) from the newest valid bundle that contains it."""
+    chosen: Dict[Path, Tuple[Bundle, Member]] = {}
+    for bundle in sorted((b for b in bundles if b.ok), key=lambda b: (b.created_at, b.path.name)):
+        for member in bundle.members:
+            chosen[member.target] = (bundle, member)
+    return chosen
+
+
+class Extractor:
+    """Writes planned members to disk, at most once per content hash."""
+
+    def __init__(self, images: ImageStore, dry_run: bool = False) -> None:
+        self.images = images
+        self.dry_run = dry_run
+        self.counts = {"written": 0, "linked": 0, "unchanged": 0, "kept_local": 0}
+        self._written: Dict[str, Path] = {}
+        self._hash_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _current_hash(self, path: Path, is_image: bool) -> str:
+        if not path.exists():
+            return ""
+        if is_image:
+            return self.images.hash_path(path)
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+
+    def _copy_out(self, bundle: Bundle, member: Member) -> None:
+        member.target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=member.target.parent, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as out, zipfile.ZipFile(bundle.path) as zf, zf.open(member.name) as src:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    out.write(chunk)
+            os.replace(tmp, member.target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _link(self, source: Path, target: Path) -> bool:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".tmp_link_{target.name}")
+        try:
+            tmp.unlink(missing_ok=True)
+            os.link(source, tmp)
+            os.replace(tmp, target)
+            return True
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return False  # e.g. different filesystem: fall back to a copy
+
+    def extract(self, bundle: Bundle, member: Member) -> str:
+        """Bring one member to its target; returns what was done."""
+        with self._lock:
+            hash_lock = self._hash_locks.setdefault(member.content_hash, threading.Lock())
+        with hash_lock:  # the first of several identical members is written, the rest link to it
+            outcome = self._extract(bundle, member)
+        with self._lock:
+            self.counts[outcome] += 1
+        return outcome
+
+    def _extract(self, bundle: Bundle, member: Member) -> str:
+        if self._current_hash(member.target, member.is_image) == member.content_hash:
+            return "unchanged"
+        if (member.target.exists() and not member.is_image
+                and pd.Timestamp.fromtimestamp(member.target.stat().st_mtime) > bundle.created_at):
+            return "kept_local"
+        if self.dry_run:
+            return "written"
+        if not member.is_image:
+            self._copy_out(bundle, member)
+            # Stamp the CSV with the bundle's time: a newer bundle replaces it, a local edit does not
+            t = bundle.created_at.to_pydatetime().timestamp()
+            os.utime(member.target, (t, t))
+            return "written"
+        source = self._written.get(member.content_hash) or self.images.find(member.content_hash)
+        if source is not None and source != member.target and self._link(source, member.target):
+            outcome = "linked"
+        else:
+            self._copy_out(bundle, member)
+            outcome = "written"
+        self.images.remember(member.target, member.content_hash)
+        self._written.setdefault(member.content_hash, member.target)
+        return outcome
+
+
+def find_bundles(paths: List[str]) -> List[Path]:
+    out: Dict[Path, None] = {}
+    for p in paths:
+        if Path(p).is_dir():
+            out.update((z, None) for z in sorted(Path(p).glob("*.zip")))
+        else:
+            out.update((Path(z), None) for z in sorted(glob.glob(os.path.expanduser(p))))
+    return list(out)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Ingest country-team result bundles straight from the zip files")
+    ap.add_argument("bundles", nargs="*", help=f"Bundle zips, globs or folders (default {DEFAULT_INBOX}/)")
+    ap.add_argument("--root", default=str(QUALTRICS_DIR), help="Folder holding <TEAM>/<WAVE>/")
+    ap.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 2), help="Bundles read in parallel")
+    ap.add_argument("--max_member_mb", type=float, default=200, help="Reject bundles with larger members")
+    ap.add_argument("--dry_run", action="store_true", help="Check and plan only; write nothing")
+    ap.add_argument("--run_detectors", action="store_true", help="Run 21_run_detectors.py on changed team/waves")
+    ap.add_argument("--detector_args", default="", help="Extra arguments for 21_run_detectors.py (one string)")
+    args = ap.parse_args()
+
+    paths = find_bundles(args.bundles or [str(DEFAULT_INBOX)])
+    if not paths:
+        print(f"[bundles] No bundle zips found in {', '.join(args.bundles) or DEFAULT_INBOX}")
+        return 1
+    root = Path(args.root)
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        bundles = list(pool.map(lambda p: inspect_bundle(p, root, int(args.max_member_mb * 1024 * 1024)), paths))
+    for b in bundles:
+        status = "OK" if b.ok else "REJECTED"
+        print(f"[bundles] {b.path.name}: {status} {b.team}/{b.wave} created {b.created_at}, {len(b.members)} member(s)")
+        for msg in b.problems:
+            print(f"  [problem] {msg}")
+        for msg in b.warnings:
+            print(f"  [warning] {msg}")
+
+    chosen = plan(bundles)
+    images = ImageStore()
+    extractor = Extractor(images, dry_run=args.dry_run)
+    changed: Dict[Tuple[str, str], None] = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        outcomes = list(pool.map(lambda bm: extractor.extract(*bm), chosen.values()))
+    for (bundle, member), outcome in zip(chosen.values(), outcomes):
+        if outcome != "unchanged":
+            print(f"  [{outcome}] {member.target}  (from {bundle.path.name})")
+        if outcome in ("written", "linked"):
+            changed[(bundle.team, bundle.wave)] = None
+    if not args.dry_run:
+        images.save_index()
+
+    n_rejected = sum(not b.ok for b in bundles)
+    c = extractor.counts
+    print(f"[bundles] {len(bundles)} bundle(s), {n_rejected} rejected; {c['written']} written, {c['linked']} "
+          f"hard-linked, {c['unchanged']} unchanged, {c['kept_local']} kept (local copy newer)"
+          + (" [dry run]" if args.dry_run else ""))
+
+    if args.run_detectors and changed and not args.dry_run:
+        for wave in sorted({w for _, w in changed}):
+            teams = [t for t, w in changed if w == wave]
+            cmd = [sys.executable, "21_run_detectors.py", "--wave", wave]
+            for team in teams:
+                cmd += ["--team", team]
+            cmd += shlex.split(args.detector_args)
+            print(f"[bundles] Running: {' '.join(shlex.quote(x) for x in cmd)}")
+            if subprocess.run(cmd).returncode != 0:
+                return 1
+    elif args.run_detectors:
+        print("[bundles] Nothing changed; detectors not run.")
+    return 1 if n_rejected else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+25_benchmark.py
+
+Micro- and macro-benchmarks for the hot paths of the leadership scripts, saved as
+JSON so runs can be compared across commits.
+
+What it covers:
+- micro (per call, auto-calibrated loops):
+    11_ encode_image_base64, parse_json_response
+    15_ ocr_line_boxes, _pick_array, load_trufor_outputs, roi_anomaly_score
+- macro (whole main() runs on --images generated screenshots, offline):
+    15_ against a stand-in TruFor checkout (gsme.standins.write_fake_trufor)
+    16_ against gsme.standins.FakeVisionClient (needs google-cloud-vision installed)
+    17_ against gsme.standins.FakeSightengine (--latency per request)
+
+Inputs are rendered with gsme.synth at real device resolutions (iPhone 1170x2532 PNG,
+Android 1080x2400 JPEG) in a scratch directory, so nothing under data/ is read or written apart from the
+results file. Benchmarks whose dependencies are missing (cv2, pytesseract + tesseract,
+google-cloud-vision) are recorded as skipped with the reason.
+
+Usage:
+  python 25_benchmark.py                                   # all, writes data/benchmarks/<time>_<commit>.json
+  python 25_benchmark.py --only 17.main,11. --images 48
+  python 25_benchmark.py --compare last --threshold 0.10   # vs the newest earlier result file
+  python 25_benchmark.py --compare data/benchmarks/20260101_120000_ab12cd3.json
+
+Regressions:
+  With --compare, each benchmark's median is compared with the baseline's; a slowdown of
+  more than --threshold (fraction, default 0.15) is reported as a regression and the script
+  exits 1. Compare runs from the same machine: results record platform and CPU count.
+
+Requirements:
+  pip install numpy pandas pillow requests   (+ opencv-python pytesseract google-cloud-vision for 15_/16_)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gsme.scripts import REPO_ROOT, load_script
+from gsme.standins import FakeSightengine, FakeVisionClient, write_fake_trufor
+from gsme.synth import random_spec, render_shot
+
+DEFAULT_OUT_DIR = Path("data") / "benchmarks"
+DEFAULT_THRESHOLD = 0.15
+MIN_SAMPLE_S = 0.05  # micro-benchmark loops are sized so one sample takes at least this long
+
+# name -> (width, height, format); the two most common upload resolutions
+DEVICES: Dict[str, Tuple[int, int, str]] = {
+    "iphone_1170x2532": (1170, 2532, "PNG"),
+    "android_1080x2400": (1080, 2400, "JPEG"),
+}
+
+
+class Skip(Exception):
+    """Raised by a benchmark's setup when it cannot run here."""
+
+
+@dataclass
+class Bench:
+    name: str
+    group: str  # "micro" or "macro"
+    setup: Callable[["Workdir"], Tuple[Callable[[], Any], int]]  # -> (run once, items per run)
+
+
+# ----------------------------
+# Inputs
+# ----------------------------
+class Workdir:
+    """Scratch directory with generated screenshots, per-benchmark folders and cleanups."""
+
+    def __init__(self, root: Path, n_images: int, latency_s: float) -> None:
+        self.root = root
+        self.n_images = n_images
+        self.latency_s = latency_s
+        self.stack = contextlib.ExitStack()  # stand-ins and patches live until the run ends
+
+    def setenv(self, key: str, value: str) -> None:
+        old = os.environ.get(key)
+        os.environ[key] = value
+
+        def restore() -> None:
+            if old is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = old
+        self.stack.callback(restore)
+
+    def setattr(self, obj: Any, name: str, value: Any) -> None:
+        old = getattr(obj, name)
+        setattr(obj, name, value)
+        self.stack.callback(setattr, obj, name, old)
+
+    def screenshot(self, device: str, seed: int = 0) -> Path:
+        w, h, fmt = DEVICES[device]
+        path = self.root / "uploads" / f"{device}_{seed:05d}.{'png' if fmt == 'PNG' else 'jpg'}"
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os_name = "iOS" if device.startswith("iphone") else "Android"
+            path.write_bytes(render_shot(random_spec(seed, os_name, w, h, fmt, target_date="2026-01-09"))[0])
+        return path
+
+    def sample_csv(self) -> Path:
+        """sample_avg.csv-like input with n_images distinct screenshots, devices alternating."""
+        path = self.root / f"sample_{self.n_images}.csv"
+        if not path.exists():
+            devices = list(DEVICES)
+            paths = [self.screenshot(devices[i % len(devices)], seed=i) for i in range(self.n_images)]
+            pd.DataFrame({"task_id": [f"avg_R_{i}_{i:04d}" for i in range(len(paths))],
+                          "total_screenshot_path": [str(p) for p in paths]}).to_csv(path, index=False)
+        return path
+
+    def dir(self, name: str) -> Path:
+        path = self.root / name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+
+def _script(filename: str):
+    try:
+        return load_script(filename)
+    except ImportError as e:
+        raise Skip(f"{filename}: {e}")
+
+
+def _auto_validate():
+    # 11_ exits at import without an API key; the benchmarked helpers never call the API
+    added = "OPENROUTER_API_KEY" not in os.environ
+    if added:
+        os.environ["OPENROUTER_API_KEY"] = "benchmark-no-calls"
+    try:
+        return _script("11_auto_validate.py")
+    finally:
+        if added:
+            os.environ.pop("OPENROUTER_API_KEY", None)
+
+
+def _run_main(mod: Any, argv: List[str]) -> None:
+    old = sys.argv
+    sys.argv = argv
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            rc = mod.main()
+    finally:
+        sys.argv = old
+    if rc not in (None, 0):
+        raise RuntimeError(f"{argv[0]} exited {rc}: {out.getvalue()[-500:]}")
+
+
+def _trufor_maps(device: str) -> Tuple[np.ndarray, np.ndarray]:
+    w, h, _ = DEVICES[device]
+    rng = np.random.default_rng(0)
+    return rng.random((h, w), dtype=np.float32), rng.random((h, w), dtype=np.float32)
+
+
+def _npz(wd: Workdir, device: str) -> Path:
+    path = wd.dir("npz") / f"{device}.npz"
+    if not path.exists():
+        loc, rel = _trufor_maps(device)
+        np.savez(path, score=np.float32(0.3), map=loc, conf=rel)
+    return path
+
+
+# ----------------------------
+# Benchmarks
+# ----------------------------
+def bench_encode(device: str) -> Bench:
+    def setup(wd: Workdir):
+        av = _auto_validate()
+        path = str(wd.screenshot(device))
+        av.IMAGES.scan(pd.DataFrame({"p": [path]}), ["p"])  # as in 11_'s main: bytes come from the store
+        return (lambda: av.encode_image_base64(path)), 1
+    return Bench(f"11.encode_image_base64[{device}]", "micro", setup)
+
+
+def bench_parse_json() -> Bench:
+    reply = {"screenshot_correct": "Yes", "numbers_match": "No", "extracted_hours": 4, "extracted_minutes": 32,
+             "apps": {a: {"hours": 1, "minutes": 12} for a in ("instagram", "facebook", "tiktok", "twitter")},
+             "notes": "Screen Time, Last Week's Average, Week tab selected; reported 4h 30m. " * 3}
+    text = "Here is my assessment:\n```json\n" + json.dumps(reply, indent=2) + "\n```\n"
+
+    def setup(wd: Workdir):
+        av = _auto_validate()
+        return (lambda: av.parse_json_response(text)), 1
+    return Bench("11.parse_json_response[fenced]", "micro", setup)
+
+
+def bench_ocr(device: str) -> Bench:
+    def setup(wd: Workdir):
+        edge = _script("15_edge_anomaly.py")
+        try:
+            edge.pytesseract.get_tesseract_version()
+        except Exception as e:
+            raise Skip(f"tesseract: {e}")
+        img = edge.cv2.imread(str(wd.screenshot(device)))
+        return (lambda: edge.ocr_line_boxes(img)), 1
+    return Bench(f"15.ocr_line_boxes[{device}]", "micro", setup)
+
+
+def bench_pick_array(device: str) -> Bench:
+    def setup(wd: Workdir):
+        edge = _script("15_edge_anomaly.py")
+        w, h, _ = DEVICES[device]
+        npz = np.load(_npz(wd, device))
+        return (lambda: edge._pick_array(npz, "loc", h, w)), 1
+    return Bench(f"15._pick_array[{device}]", "micro", setup)
+
+
+def bench_load_trufor(device: str) -> Bench:
+    def setup(wd: Workdir):
+        edge = _script("15_edge_anomaly.py")
+        w, h, _ = DEVICES[device]
+        path = _npz(wd, device)
+        return (lambda: edge.load_trufor_outputs(path, (h, w))), 1
+    return Bench(f"15.load_trufor_outputs[{device}]", "micro", setup)
+
+
+def bench_roi_score(device: str, n_rois: int = 40) -> Bench:
+    def setup(wd: Workdir):
+        edge = _script("15_edge_anomaly.py")
+        w, h, _ = DEVICES[device]
+        loc, rel = _trufor_maps(device)
+        rng = np.random.default_rng(1)
+        rois = [edge.Box(x=int(rng.integers(0, w - 400)), y=int(rng.integers(0, h - 60)),
+                         w=int(rng.integers(80, 400)), h=int(rng.integers(24, 60)), text="4h 32m", conf=90.0)
+                for _ in range(n_rois)]
+        return (lambda: [edge.roi_anomaly_score(loc, rel, r) for r in rois]), n_rois
+    return Bench(f"15.roi_anomaly_score[{device},{n_rois}rois]", "micro", setup)
+
+
+def bench_edge_main() -> Bench:
+    def setup(wd: Workdir):
+        edge = _script("15_edge_anomaly.py")
+        try:
+            edge.pytesseract.get_tesseract_version()
+        except Exception as e:
+            raise Skip(f"tesseract: {e}")
+        csv = wd.sample_csv()
+        trufor = write_fake_trufor(wd.root / "trufor", latency_s=wd.latency_s)
+        out = wd.dir("edge")
+        argv = ["15_edge_anomaly.py", "--trufor_root", str(trufor), "--csv", str(csv),
+                "--out_csv", str(out / "trufor_report.csv"), "--out_dir", str(out / "npz"),
+                "--crops_dir", str(out / "crops"), "--path_cols", "total_screenshot_path", "--results_db", ""]
+        return (lambda: _run_main(edge, argv)), wd.n_images
+    return Bench("15.main[{n} images]", "macro", setup)
+
+
+def bench_web_main() -> Bench:
+    def setup(wd: Workdir):
+        web = _script("16_web_detection_check.py")
+        try:
+            from google.cloud import vision  # type: ignore
+        except ImportError as e:
+            raise Skip(f"google-cloud-vision: {e}")
+        csv = wd.sample_csv()
+        creds = wd.root / "service_account.json"
+        creds.write_text("{}")
+        wd.setenv("GOOGLE_APPLICATION_CREDENTIALS", str(creds))
+        wd.setattr(vision, "ImageAnnotatorClient", lambda *a, **k: FakeVisionClient(latency_s=wd.latency_s))
+        out = wd.dir("web")
+        argv = ["16_web_detection_check.py", "--csv", str(csv), "--out_csv", str(out / "web_detection_report.csv"),
+                "--path_cols", "total_screenshot_path", "--results_db", "", "--no_cache", "--qps", "0"]
+        return (lambda: _run_main(web, argv)), wd.n_images
+    return Bench("16.main[{n} images]", "macro", setup)
+
+
+def bench_sightengine_main() -> Bench:
+    def setup(wd: Workdir):
+        se = _script("17_sightengine_ai_detection.py")
+        csv = wd.sample_csv()
+        out = wd.dir("sightengine")
+        fake = wd.stack.enter_context(FakeSightengine(fixtures={}, auth=("bench_user", "bench_secret"),
+                                                      latency_s=wd.latency_s))
+        wd.setenv("SIGHTENGINE_API_USER", "bench_user")
+        wd.setenv("SIGHTENGINE_API_SECRET", "bench_secret")
+        argv = ["17_sightengine_ai_detection.py", "--csv", str(csv), "--out_csv", str(out / "sightengine_ai_report.csv"),
+                "--path_cols", "total_screenshot_path", "--endpoint", fake.endpoint, "--rps", "0", "--no_cache",
+                "--results_db", ""]
+        return (lambda: _run_main(se, argv)), wd.n_images
+    return Bench("17.main[{n} images]", "macro", setup)
+
+
+def all_benches() -> List[Bench]:
+    benches = [bench_encode(d) for d in DEVICES] + [bench_parse_json()]
+    for d in DEVICES:
+        benches += [bench_ocr(d), bench_pick_array(d), bench_load_trufor(d), bench_roi_score(d)]
+    return benches + [bench_edge_main(), bench_web_main(), bench_sightengine_main()]
+
+
+# ----------------------------
+# Running and comparing
+# ----------------------------
+def time_bench(run: Callable[[], Any], repeat: int, loops: Optional[int]) -> Tuple[List[float], int]:
+    """Seconds per call for `repeat` samples; loops=None sizes each sample to MIN_SAMPLE_S."""
+    if loops is None:
+        t0 = time.perf_counter()
+        run()  # also the warm-up
+        one = time.perf_counter() - t0
+        loops = max(1, min(100_000, int(MIN_SAMPLE_S / max(one, 1e-9))))
+    else:
+        run()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append((time.perf_counter() - t0) / loops)
+    return samples, loops
+
+
+def run_benches(benches: List[Bench], wd: Workdir, repeat: int, macro_repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    for b in benches:
+        name = b.name.format(n=wd.n_images)
+        row: Dict[str, Any] = {"name": name, "group": b.group, "status": "ok", "reason": ""}
+        try:
+            run, items = b.setup(wd)
+            samples, loops = time_bench(run, repeat if b.group == "micro" else macro_repeat,
+                                        None if b.group == "micro" else 1)
+        except Skip as e:
+            row.update(status="skipped", reason=str(e))
+        except Exception as e:
+            row.update(status="error", reason=f"{type(e).__name__}: {e}")
+        else:
+            median = statistics.median(samples)
+            row.update(n=len(samples), loops=loops, items=items, median_s=median, min_s=min(samples),
+                       mean_s=statistics.fmean(samples),
+                       stdev_s=statistics.stdev(samples) if len(samples) > 1 else 0.0,
+                       items_per_s=items / median if median > 0 else None)
+        print(f"[bench] {name}: " + (f"{1000 * row['median_s']:.3f} ms median ({row['n']}x{row['loops']})"
+                                     if row["status"] == "ok" else f"{row['status']} ({row['reason']})"))
+        results.append(row)
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> pd.DataFrame:
+    """One row per benchmark run ok in both: medians, change (fraction) and verdict."""
+    base = {r["name"]: r for r in baseline.get("results", []) if r.get("status") == "ok"}
+    rows = []
+    for r in current["results"]:
+        b = base.get(r["name"])
+        if r.get("status") != "ok" or b is None:
+            continue
+        change = r["median_s"] / b["median_s"] - 1 if b["median_s"] > 0 else 0.0
+        verdict = "REGRESSION" if change > threshold else ("faster" if change < -threshold else "ok")
+        rows.append({"name": r["name"], "baseline_ms": round(1000 * b["median_s"], 3),
+                     "current_ms": round(1000 * r["median_s"], 3), "change": f"{change:+.1%}", "verdict": verdict})
+    return pd.DataFrame(rows, columns=["name", "baseline_ms", "current_ms", "change", "verdict"])
+
+
+def git_commit() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return sha + ("-dirty" if dirty else "")
+
+
+def previous_result(out_dir: Path, exclude: Path) -> Optional[Path]:
+    paths = sorted(p for p in out_dir.glob("*.json") if p.resolve() != exclude.resolve())
+    return paths[-1] if paths else None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of 11_/15_/16_/17_ and save JSON results")
+    parser.add_argument("--only", default="", help="Comma-separated name prefixes to run (e.g. 17.main,11.)")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    parser.add_argument("--images", type=int, default=24, help="Screenshots per macro-benchmark run")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated API/TruFor latency per call (seconds)")
+    parser.add_argument("--repeat", type=int, default=7, help="Samples per micro-benchmark")
+    parser.add_argument("--macro_repeat", type=int, default=3, help="Samples per macro-benchmark")
+    parser.add_argument("--out", default="", help=f"Results JSON (default: {DEFAULT_OUT_DIR}/<time>_<commit>.json)")
+    parser.add_argument("--compare", default="", help="Baseline results JSON, or 'last' for the newest earlier file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="With --compare: slowdown (fraction of the baseline median) reported as a regression")
+    args = parser.parse_args()
+
+    prefixes = [p.strip() for p in args.only.split(",") if p.strip()]
+    benches = [b for b in all_benches() if not prefixes or any(b.name.startswith(p) for p in prefixes)]
+    if args.list or not benches:
+        for b in all_benches():
+            print(f"{b.group:6s} {b.name.format(n=args.images)}")
+        return 0 if args.list else 1
+
+    commit = git_commit()
+    started = datetime.now()
+    out_path = Path(args.out) if args.out else DEFAULT_OUT_DIR / f"{started:%Y%m%d_%H%M%S}_{commit}.json"
+    out_path = out_path.resolve()
+    baseline_path = None
+    if args.compare:
+        baseline_path = previous_result(out_path.parent, out_path) if args.compare == "last" else Path(args.compare)
+        if baseline_path is None or not baseline_path.exists():
+            print(f"[bench] No baseline to compare with: {args.compare}")
+            return 1
+        baseline_path = baseline_path.resolve()
+
+    print(f"[bench] {len(benches)} benchmark(s) at {commit}: {args.images} images per macro run, "
+          f"{args.latency:g}s simulated latency")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="gsme_bench_") as tmp:
+        os.chdir(tmp)  # scripts keep their caches/indexes under ./data; keep them out of the repo
+        wd = Workdir(Path(tmp), args.images, args.latency)
+        try:
+            with wd.stack:
+                results = run_benches(benches, wd, args.repeat, args.macro_repeat)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "commit": commit,
+        "created_at": started.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {k: getattr(args, k) for k in ("images", "latency", "repeat", "macro_repeat")},
+        "results": results,
+    }
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\n[bench] Results saved: {out_path}")
+    ok = [r for r in results if r["status"] == "ok"]
+    if ok:
+        table = pd.DataFrame(ok)
+        print(pd.DataFrame({"name": table["name"], "median_ms": (1000 * table["median_s"]).round(3),
+                            "stdev_ms": (1000 * table["stdev_s"]).round(3),
+                            "items_per_s": table["items_per_s"].round(1)}).to_string(index=False))
+    n_err = sum(r["status"] == "error" for r in results)
+
+    if baseline_path is None:
+        return 1 if n_err else 0
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    diff = compare(report, baseline, args.threshold)
+    print(f"\n[bench] Against {baseline_path.name} ({baseline.get('commit', '?')}), threshold {args.threshold:.0%}:")
+    print(diff.to_string(index=False) if len(diff) else "  no benchmarks in common")
+    if baseline.get("cpu_count") != report["cpu_count"] or baseline.get("platform") != report["platform"]:
+        print("[bench] WARNING: baseline was recorded on a different machine; timings may not be comparable")
+    n_reg = int((diff["verdict"] == "REGRESSION").sum()) if len(diff) else 0
+    if n_reg:
+        print(f"[bench] {n_reg} regression(s) above {args.threshold:.0%}")
+    return 1 if n_reg or n_err else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
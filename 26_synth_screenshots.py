@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+26_synth_screenshots.py
+
+Generate a synthetic team/wave of screen-time screenshots with known values, so every
+detector (11_, 15_, 16_, 17_, 19_, 20_) can be load-tested and scored offline on as many
+images as needed (10k+), without real participant data.
+
+What it does:
+- Creates --n respondents (R_.../P001...), each with an iOS or Android device at a common
+  screenshot resolution, a survey end date and (Android) the day-of-week prefix and
+  target date, exactly as 02_wrangle.R derives them
+- Renders one average screenshot (iOS "Last Week's Average" / Android Digital Wellbeing
+  Dashboard for the target day) and one per-app screenshot (iOS Most Used list / Android
+  "App activity details") per respondent with gsme.synth, light or dark, PNG or JPEG
+- With --tamper_rate, edits a share of the images after rendering: the total (or one
+  study app's time) is painted over and re-drawn with a lower value, and the reported
+  value matches the edited image; with --misreport_rate, a share of the untampered rows
+  report a value different from what the screenshot shows
+- Renders in a process pool (--workers) and writes the CSVs the pipeline expects, so the
+  wave can go straight into 11_auto_validate.py / 21_run_detectors.py
+
+Usage:
+  python 26_synth_screenshots.py                                   # 100 respondents, team_synth/baseline
+  python 26_synth_screenshots.py --n 6000 --tamper_rate 0.1 --workers 8
+  python 26_synth_screenshots.py --team synth_big --wave endline --seed 3 --font ~/fonts/Roboto-Regular.ttf
+  python 21_run_detectors.py --team team_synth --wave baseline     # then score the reports against the truth
+
+Writes (under data/qualtrics/<TEAM>/<WAVE>/):
+  uploads/<ResponseId>/*                                           the screenshots
+  uploaded_files_manifest.csv                                      as 23_download_uploads.py (size, sha256)
+  derived/{average,app}_screentime_for_annotation.csv             as 02_wrangle.R
+  results/sample_{avg,app}.csv                                     as 03_run_app.R (with task_id)
+  results/synth_truth.csv                                          one row per image: true, shown and
+                                                                   reported minutes, tamper field/mode/box
+
+Refuses to write into a wave folder that it did not create (no results/synth_truth.csv),
+so real data is never overwritten; --force replaces an earlier synthetic wave.
+
+Requirements:
+  pip install pillow numpy pandas
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gsme.synth import (ANDROID_RESOLUTIONS, APPS, IOS_RESOLUTIONS, TAMPER_MODES, ShotSpec, Tamper,
+                        random_values, render_shot)
+
+QUALTRICS_DIR = Path("data") / "qualtrics"
+TRUTH_CSV = "synth_truth.csv"
+MANIFEST_COLS = ["response_id", "file_id", "ok", "http_status", "saved_path", "size", "sha256"]
+BASE_COLS = ["respondent_id", "participant_id", "device", "end_date", "screenshot_day_prefix", "screenshot_day",
+             "android_target_date"]
+AVG_COLS = BASE_COLS + ["total_hours", "total_minutes", "total_screenshot_file_id", "total_screenshot_path"]
+APP_COLS = BASE_COLS + [f"{a}_{u}" for a in APPS for u in ("hours", "minutes")] + \
+    [f"app_screenshot{k}_{c}" for k in (1, 2, 3) for c in ("file_id", "path")]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+ID_CHARS = string.ascii_letters + string.digits
+
+
+@dataclass
+class Job:
+    path: str
+    spec: ShotSpec
+    truth: Dict[str, object]
+
+
+def qualtrics_id(rng: np.random.Generator, prefix: str) -> str:
+    return prefix + "".join(rng.choice(list(ID_CHARS), size=15))
+
+
+def android_target_date(end: datetime, prefix: int) -> datetime:
+    """Most recent day before end with ISO weekday `prefix` (1 = Monday); 02_wrangle.R's rule."""
+    days_back = (end.isoweekday() - prefix) % 7 or 7
+    return end - timedelta(days=days_back)
+
+
+def _edit(rng: np.random.Generator, minutes: int) -> int:
+    """The lower value a respondent edits a screenshot to show."""
+    return int(max(1, min(minutes - 5, round(minutes * rng.uniform(0.3, 0.8)))))
+
+
+def _misreport(rng: np.random.Generator, minutes: int) -> int:
+    return int(max(0, minutes + rng.choice([-1, 1]) * rng.integers(5, 61)))
+
+
+def plan_wave(n: int, seed: int, wave_dir: Path, end_date: datetime, android_share: float, jpeg_rate: float,
+              tamper_rate: float, misreport_rate: float) -> Tuple[List[Dict], List[Dict], List[Job]]:
+    """Respondent rows for the avg/app CSVs and one render job per screenshot."""
+    rng = np.random.default_rng(seed)
+    ios_res, android_res = list(IOS_RESOLUTIONS.values()), list(ANDROID_RESOLUTIONS.values())
+    avg_rows, app_rows, jobs = [], [], []
+    for i in range(n):
+        rid = qualtrics_id(rng, "R_")
+        device = "Android" if rng.random() < android_share else "iOS"
+        end = end_date - timedelta(seconds=int(rng.integers(0, 7 * 86400)))
+        base = {"respondent_id": rid, "participant_id": f"P{i + 1:03d}", "device": device,
+                "end_date": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "screenshot_day_prefix": None, "screenshot_day": None, "android_target_date": None}
+        target = None
+        if device == "Android":
+            prefix = int(rng.integers(1, 8))
+            target = android_target_date(end, prefix).strftime("%Y-%m-%d")
+            base.update(screenshot_day_prefix=prefix, screenshot_day=WEEKDAYS[prefix - 1], android_target_date=target)
+        resolutions = android_res if device == "Android" else ios_res
+        w, h = resolutions[int(rng.integers(len(resolutions)))]
+        dark = bool(rng.random() < 0.5)
+        total, apps = random_values(rng)
+
+        for kind in ("avg", "app"):
+            fmt = "JPEG" if rng.random() < jpeg_rate else "PNG"
+            ext = "jpg" if fmt == "JPEG" else "png"
+            shot_time = end - timedelta(minutes=int(rng.integers(1, 600)))
+            name = (f"Screenshot_{shot_time:%Y%m%d_%H%M%S}.{ext}" if device == "Android"
+                    else f"IMG_{int(rng.integers(1000, 10000))}.{ext}")
+            file_id = qualtrics_id(rng, "F_")
+            path = wave_dir / "uploads" / rid / name
+            true = {"total": total} if kind == "avg" else dict(apps)
+            shown, tamper = dict(true), None
+            if rng.random() < tamper_rate:
+                fields = [f for f, m in true.items() if m > 5]
+                if fields:
+                    fld = str(rng.choice(fields))
+                    tamper = Tamper(field=fld, new_minutes=_edit(rng, true[fld]), mode=str(rng.choice(TAMPER_MODES)))
+                    shown[fld] = tamper.new_minutes
+            reported = dict(shown)
+            if tamper is None and rng.random() < misreport_rate:
+                fld = str(rng.choice(list(reported)))
+                reported[fld] = _misreport(rng, reported[fld])
+
+            # rendered with the true values; the tamper re-draws the edited one
+            spec = ShotSpec(kind=kind, device=device, width=w, height=h, total_minutes=total, app_minutes=apps,
+                            target_date=target, dark=dark, fmt=fmt, quality=int(rng.integers(80, 96)),
+                            seed=int(rng.integers(2 ** 31)), tamper=tamper,
+                            editor_tag=bool(tamper is not None and rng.random() < 0.5))
+            if kind == "avg":
+                task_id = f"avg_{rid}_{len(avg_rows) + 1:04d}"
+                avg_rows.append({**base, "total_hours": reported["total"] // 60,
+                                 "total_minutes": reported["total"] % 60,
+                                 "total_screenshot_file_id": file_id, "total_screenshot_path": str(path),
+                                 "task_id": task_id})
+            else:
+                task_id = f"app_{rid}_{len(app_rows) + 1:04d}"
+                app_rows.append({**base, **{f"{a}_{u}": v for a in APPS
+                                            for u, v in zip(("hours", "minutes"), divmod(reported[a], 60))},
+                                 "app_screenshot1_file_id": file_id, "app_screenshot1_path": str(path),
+                                 "task_id": task_id})
+            truth = {"task_id": task_id, "kind": kind, "respondent_id": rid, "file_id": file_id, "path": str(path),
+                     "device": device, "width": w, "height": h, "format": fmt, "dark": dark}
+            for fld in true:
+                truth.update({f"true_{fld}_minutes": true[fld], f"shown_{fld}_minutes": shown[fld],
+                              f"reported_{fld}_minutes": reported[fld]})
+            truth.update({"tampered": tamper is not None, "tamper_field": tamper.field if tamper else None,
+                          "tamper_mode": tamper.mode if tamper else None,
+                          "misreported": reported != shown})
+            jobs.append(Job(path=str(path), spec=spec, truth=truth))
+    return avg_rows, app_rows, jobs
+
+
+def render_job(job: Job, font_path: Optional[str] = None) -> Dict[str, object]:
+    """Render and write one screenshot (runs in a worker process); returns size, sha256, tamper box."""
+    data, info = render_shot(job.spec, font_path)
+    path = Path(job.path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    box = info["tamper_box"]
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest(), "software": info["software"] or None,
+            **dict(zip(("tamper_x", "tamper_y", "tamper_w", "tamper_h"), box or (None,) * 4))}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Generate a synthetic wave of screen-time screenshots with known values")
+    ap.add_argument("--team", default="team_synth", help="Team slug for the synthetic wave")
+    ap.add_argument("--wave", default="baseline", choices=["baseline", "endline"])
+    ap.add_argument("--root", default=str(QUALTRICS_DIR), help="Folder holding <TEAM>/<WAVE>/")
+    ap.add_argument("--n", type=int, default=100, help="Respondents (two screenshots each)")
+    ap.add_argument("--seed", type=int, default=0, help="Same seed, same wave (values, IDs and pixels)")
+    ap.add_argument("--end_date", default="2026-01-12", help="Surveys end in the 7 days before this date")
+    ap.add_argument("--android_share", type=float, default=0.5, help="Share of Android respondents")
+    ap.add_argument("--jpeg_rate", type=float, default=0.15, help="Share of screenshots saved as JPEG")
+    ap.add_argument("--tamper_rate", type=float, default=0.05, help="Share of screenshots with an edited value")
+    ap.add_argument("--misreport_rate", type=float, default=0.1, help="Share of untampered rows reporting another value")
+    ap.add_argument("--font", default="", help="TrueType font to draw with (default: Pillow's built-in font)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Render processes")
+    ap.add_argument("--force", action="store_true", help="Replace an earlier synthetic wave in the same folder")
+    args = ap.parse_args()
+
+    wave_dir = Path(args.root) / args.team / args.wave
+    truth_csv = wave_dir / "results" / TRUTH_CSV
+    if wave_dir.exists() and any(wave_dir.iterdir()):
+        if not truth_csv.exists():
+            print(f"[synth] {wave_dir} holds data this script did not create; choose another --team.")
+            return 1
+        if not args.force:
+            print(f"[synth] {wave_dir} already holds a synthetic wave; pass --force to replace it.")
+            return 1
+        shutil.rmtree(wave_dir / "uploads", ignore_errors=True)
+
+    end_date = datetime.fromisoformat(args.end_date).replace(tzinfo=timezone.utc)
+    avg_rows, app_rows, jobs = plan_wave(args.n, args.seed, wave_dir, end_date, args.android_share,
+                                         args.jpeg_rate, args.tamper_rate, args.misreport_rate)
+    print(f"[synth] Rendering {len(jobs)} screenshot(s) for {len(avg_rows)} respondent(s) "
+          f"into {wave_dir} with {args.workers} worker(s)")
+
+    t0 = time.perf_counter()
+    results = []
+    step = max(1, len(jobs) // 10)
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for k, res in enumerate(pool.map(partial(render_job, font_path=args.font or None), jobs,
+                                         chunksize=max(1, min(64, len(jobs) // (4 * max(1, args.workers))))), 1):
+            results.append(res)
+            if k % step == 0 or k == len(jobs):
+                elapsed = time.perf_counter() - t0
+                print(f"  [render] {k}/{len(jobs)}  {k / elapsed:.1f} img/s")
+    elapsed = time.perf_counter() - t0
+
+    truth = pd.DataFrame([{**job.truth, **res} for job, res in zip(jobs, results)])
+    manifest = pd.DataFrame({"response_id": truth["respondent_id"], "file_id": truth["file_id"], "ok": "TRUE",
+                             "http_status": 200, "saved_path": truth["path"], "size": truth["size"],
+                             "sha256": truth["sha256"]}, columns=MANIFEST_COLS)
+    avg = pd.DataFrame(avg_rows).reindex(columns=AVG_COLS + ["task_id"])
+    app = pd.DataFrame(app_rows).reindex(columns=APP_COLS + ["task_id"])
+    for df in (avg, app):  # NA for iOS; keep the Android prefixes integers
+        df["screenshot_day_prefix"] = df["screenshot_day_prefix"].astype("Int64")
+    int_cols = [c for c in truth if c.endswith("_minutes") or c in ("tamper_x", "tamper_y", "tamper_w", "tamper_h")]
+    truth[int_cols] = truth[int_cols].astype("Int64")
+
+    (wave_dir / "derived").mkdir(parents=True, exist_ok=True)
+    (wave_dir / "results").mkdir(parents=True, exist_ok=True)
+    manifest.to_csv(wave_dir / "uploaded_files_manifest.csv", index=False)
+    avg[AVG_COLS].to_csv(wave_dir / "derived" / "average_screentime_for_annotation.csv", index=False, na_rep="NA")
+    app[APP_COLS].to_csv(wave_dir / "derived" / "app_screentime_for_annotation.csv", index=False, na_rep="NA")
+    avg.to_csv(wave_dir / "results" / "sample_avg.csv", index=False, na_rep="NA")
+    app.to_csv(wave_dir / "results" / "sample_app.csv", index=False, na_rep="NA")
+    truth.to_csv(truth_csv, index=False)
+
+    print(f"[synth] {len(jobs)} image(s) in {elapsed:.1f}s ({len(jobs) / max(elapsed, 1e-9):.1f} img/s), "
+          f"{truth['size'].sum() / 1e6:.1f} MB; {int(truth['tampered'].sum())} tampered, "
+          f"{int(truth['misreported'].sum())} misreported")
+    print(f"[synth] Truth: {truth_csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+27_file_forensics.py
+
+Cheap first-pass tamper signals from the screenshot files themselves (no decoding, no API).
+
+- Reads only PNG chunk headers / JPEG segments before the image data (gsme/forensics.py):
+  editor Software / CreatorTool tags in PNG tEXt/iTXt/zTXt, EXIF and XMP, XMP edit
+  history and Photoshop/Adobe markers, JPEG quantization tables (estimated quality, and
+  whether they are libjpeg's standard tables), progressive JPEG, EXIF dimensions that
+  differ from the image, PNG tIME chunks, and dimensions that are not a native
+  screenshot size for the respondent's reported device.
+- Combines the flags into forensic_score (0-1); status is "flagged" at >= --flag_score.
+- Files are inspected by a process pool (--workers); a few KB are read per file, so
+  thousands of files per second is typical.
+
+Usage:
+  python 27_file_forensics.py \
+    --csv data/qualtrics/team_example/baseline/results/sample_avg.csv \
+    --out_csv data/qualtrics/team_example/baseline/results/file_forensics_avg.csv
+
+Then let TruFor look at the most suspicious files first:
+  python 15_edge_anomaly.py ... --forensics data/qualtrics/team_example/baseline/results/file_forensics_avg.csv
+
+Not covered: a JPEG that was decoded, edited and saved again with the same standard
+tables and no metadata looks like any other JPEG from its header; that is TruFor's job.
+The report is also upserted into the study-wide results DB (--results_db, see gsme/results.py).
+
+Requirements:
+  pip install pandas pillow
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+from gsme.forensics import DEFAULT_FLAG_SCORE, FLAG_WEIGHTS, REPORT_COLS, inspect_file, inspect_task
+from gsme.ingest import DEFAULT_PATH_COLS, image_refs
+from gsme.results import DEFAULT_RESULTS_DB, record_report
+
+FORENSICS_VERSION = "file_forensics:v1"
+
+
+def inspect_all(jobs: List[Tuple[str, str]], workers: int) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """{(path, device): inspect_file row} for each unique job, in a process pool when workers > 1."""
+    jobs = list(dict.fromkeys(jobs))
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            rows = list(ex.map(inspect_task, jobs, chunksize=max(1, min(256, len(jobs) // (4 * workers)))))
+    else:
+        rows = [inspect_file(*job) for job in jobs]
+    return dict(zip(jobs, rows))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Header and metadata forensics for screenshot files")
+    ap.add_argument("--csv", required=True, help="Input CSV with screenshot paths (sample_avg.csv / sample_app.csv)")
+    ap.add_argument("--out_csv", required=True, help="Output report CSV (file_forensics_<type>.csv)")
+    ap.add_argument("--path_cols", default=",".join(DEFAULT_PATH_COLS), help="Comma-separated image path columns")
+    ap.add_argument("--device_col", default="device", help="Column with the reported device (iOS / Android)")
+    ap.add_argument("--flag_score", type=float, default=DEFAULT_FLAG_SCORE,
+                    help=f"Report status 'flagged' at or above this forensic_score (default: {DEFAULT_FLAG_SCORE})")
+    ap.add_argument("--workers", type=int, default=4, help="Processes reading file headers")
+    ap.add_argument("--results_db", default=str(DEFAULT_RESULTS_DB),
+                    help="Study-wide results DB to upsert this report into ('' to skip)")
+    args = ap.parse_args()
+
+    df = pd.read_csv(args.csv)
+    path_cols = [c.strip() for c in args.path_cols.split(",") if c.strip()]
+    refs = image_refs(df, path_cols)
+    devices = df[args.device_col].fillna("").astype(str) if args.device_col in df.columns else pd.Series("", df.index)
+    jobs = [(str(ref.path), devices[ref.row]) for ref in refs]
+
+    t0 = time.monotonic()
+    found = inspect_all(jobs, args.workers)
+    elapsed = time.monotonic() - t0
+
+    rows = []
+    for ref, job in zip(refs, jobs):
+        res = found[job]
+        status = "error" if res["error"] else ("flagged" if res["forensic_score"] >= args.flag_score else "ok")
+        rows.append({"task_id": ref.task_id, "image_col": ref.col, "image_path": str(ref.path), "device": job[1],
+                     "status": status, **res})
+    out = pd.DataFrame(rows, columns=["task_id", "image_col", "image_path", "device", "status"] + REPORT_COLS)
+    out_path = Path(args.out_csv)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out.to_csv(out_path, index=False)
+    record_report(args.results_db, "forensics", FORENSICS_VERSION, out_path, out)
+
+    n_files = len(found)
+    kb = out.drop_duplicates("image_path")["bytes_read"].sum() / 1024
+    print(f"[forensics] {n_files} files in {elapsed:.2f}s ({n_files / elapsed if elapsed > 0 else 0:.0f} files/s, "
+          f"{kb:.0f} KB of headers read, {args.workers} worker(s))")
+    print(f"[forensics] Results saved: {out_path}")
+    counts = out["status"].value_counts()
+    print(f"[forensics] Summary: {counts.get('flagged', 0)} flagged, {counts.get('ok', 0)} ok, "
+          f"{counts.get('error', 0)} errors (flag score >= {args.flag_score})")
+    flag_counts = out["flags"].fillna("").str.split(";").explode().value_counts()
+    for flag in FLAG_WEIGHTS:
+        if flag_counts.get(flag, 0):
+            print(f"  {flag:<20} {flag_counts[flag]}")
+
+    if counts.get("flagged", 0):
+        print("\n[forensics] WARNING: some files carry editing traces. Run 15_edge_anomaly.py --forensics on this "
+              "report to check them first, and review manually.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,10 @@
+"""
+gsme
+
+Shared helpers for the leadership-team Python scripts (11_, 15_, 16_, 17_, 19_).
+
+The numbered scripts stay runnable on their own from the repository root
+(`python 16_web_detection_check.py ...`); this package only holds code that
+several of them need, such as API pacing and on-disk result caches. `python -m gsme
+<command>` runs them by name (gsme/cli.py).
+"""
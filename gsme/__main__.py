@@ -0,0 +1,8 @@
+"""python -m gsme <command> [args]: see gsme/cli.py."""
+
+import sys
+
+from gsme.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
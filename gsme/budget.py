@@ -0,0 +1,211 @@
+"""
+gsme/budget.py
+
+Spend caps for the paid per-image checks (Google Vision web detection, Sightengine,
+OpenRouter AI validation) and the risk ranking that decides which images get them first.
+
+    risk = RiskIndex()
+    risk.load_wave(results_dir, team, wave, hash_for=images.hash_for)
+    risk.load_near_duplicates(QUALTRICS_DIR / "near_duplicate_report.csv")
+    budget = Budget(cap_usd=25, team_cap_usd=5)
+    decisions = schedule(items, budget)   # {key: Decision}, highest risk first
+
+Risk signals, all from files the pipeline already writes (no API calls):
+- TruFor flagged the image (trufor_report_<type>.csv, or a result of this run)
+- the image is in a near-duplicate cluster spanning several respondents (19_near_duplicates.py)
+- a reviewer (annotations_<type>.csv) or an earlier AI validation (auto_annotations_<type>.csv)
+  said the reported numbers do not match the screenshot
+- the file carries editing traces (file_forensics_<type>.csv, 27_file_forensics.py)
+
+Images with no signal are ordered by TruFor score, so the budget runs out on the least
+suspicious ones. Cached results cost nothing and are never deferred.
+"""
+
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+# Approximate list price per request in USD; override with parse_prices("web=0.0015,...").
+# Vision web detection: $3.50 / 1000 units; Sightengine genai: ~$29 / 10000 operations on the
+# starter plan; OpenRouter: one vision prompt with 1-3 screenshots to the model in 11_.
+DEFAULT_PRICES_USD = {
+    "web": 0.0035,
+    "sightengine": 0.003,
+    "auto_validate": 0.012,
+}
+PAID_SERVICES = tuple(DEFAULT_PRICES_USD)
+
+RISK_WEIGHTS = {
+    "trufor_flagged": 4.0,
+    "near_duplicate": 2.0,
+    "numbers_mismatch": 2.0,
+    "file_forensics": 1.0,
+}
+
+DEFERRED = "deferred"  # report status of an image or task the budget did not cover
+
+
+def parse_prices(spec: str) -> Dict[str, float]:
+    """'web=0.0015,sightengine=0.002' -> DEFAULT_PRICES_USD with those services replaced."""
+    prices = dict(DEFAULT_PRICES_USD)
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        name, sep, value = part.partition("=")
+        if not sep or name.strip() not in prices:
+            raise ValueError(f"Expected service=usd with service in {', '.join(PAID_SERVICES)}: {part!r}")
+        prices[name.strip()] = float(value)
+    return prices
+
+
+@dataclass(frozen=True)
+class Risk:
+    score: float
+    reasons: Tuple[str, ...] = ()
+
+    def describe(self) -> str:
+        return "+".join(self.reasons) or "none"
+
+
+@dataclass
+class RiskIndex:
+    """Risk signals by content hash and by (team, wave, task_id)."""
+
+    image_signals: Dict[str, Set[str]] = field(default_factory=dict)
+    task_signals: Dict[Tuple[str, str, str], Set[str]] = field(default_factory=dict)
+    trufor_scores: Dict[str, float] = field(default_factory=dict)
+
+    def add_trufor(self, content_hash: str, flagged: bool, score: Any) -> None:
+        if flagged:
+            self.image_signals.setdefault(content_hash, set()).add("trufor_flagged")
+        try:
+            score = float(score)
+        except (TypeError, ValueError):
+            return
+        if not math.isnan(score):
+            self.trufor_scores[content_hash] = max(score, self.trufor_scores.get(content_hash, 0.0))
+
+    def load_wave(self, results_dir: Path, team: str, wave: str,
+                  hash_for: Callable[[str], str]) -> None:
+        """TruFor, file forensics and numbers_match verdicts of one wave; hash_for maps an image path to its hash."""
+        for path in sorted(results_dir.glob("file_forensics*.csv")):
+            df = pd.read_csv(path)
+            for image_path in df.loc[df["status"] == "flagged", "image_path"].drop_duplicates():
+                try:
+                    h = hash_for(str(image_path))
+                except OSError:
+                    continue
+                self.image_signals.setdefault(h, set()).add("file_forensics")
+        for path in sorted(results_dir.glob("trufor_report*.csv")):
+            df = pd.read_csv(path)
+            for rec in df.to_dict("records"):
+                if rec.get("status") not in ("ok", "flagged"):
+                    continue
+                try:
+                    h = hash_for(str(rec["image_path"]))
+                except OSError:
+                    continue  # image moved or deleted since the report was written
+                self.add_trufor(h, rec["status"] == "flagged", rec.get("trufor_score"))
+        for pattern in ("annotations_*.csv", "auto_annotations_*.csv"):
+            for path in sorted(results_dir.glob(pattern)):
+                df = pd.read_csv(path, dtype=str)
+                if not {"task_id", "numbers_match"} <= set(df.columns):
+                    continue
+                mismatch = df["numbers_match"].str.strip().str.lower() == "no"
+                for task_id in df.loc[mismatch, "task_id"]:
+                    self.task_signals.setdefault((team, wave, str(task_id)), set()).add("numbers_mismatch")
+
+    def load_near_duplicates(self, report_csv: Path) -> None:
+        """Images in a 19_near_duplicates.py cluster shared by more than one respondent."""
+        if not report_csv.exists():
+            return
+        df = pd.read_csv(report_csv, dtype={"sha256": str})
+        for h in df.loc[df["n_respondents"] > 1, "sha256"].dropna():
+            self.image_signals.setdefault(h, set()).add("near_duplicate")
+
+    def risk(self, hashes: Iterable[str], tasks: Iterable[Tuple[str, str, str]] = ()) -> Risk:
+        """Risk of a unit of work covering these images and tasks (one image, or one 11_ task)."""
+        hashes = [h for h in hashes if h]
+        signals: Set[str] = set()
+        for h in hashes:
+            signals |= self.image_signals.get(h, set())
+        for t in tasks:
+            signals |= self.task_signals.get(t, set())
+        reasons = tuple(s for s in RISK_WEIGHTS if s in signals)
+        score = sum(RISK_WEIGHTS[s] for s in reasons)
+        score += max((self.trufor_scores.get(h, 0.0) for h in hashes), default=0.0)
+        return Risk(score, reasons)
+
+
+class Budget:
+    """Run-wide and per-team spend caps (None = no cap)."""
+
+    def __init__(self, cap_usd: Optional[float] = None, team_cap_usd: Optional[float] = None,
+                 prices: Optional[Dict[str, float]] = None) -> None:
+        self.cap_usd = cap_usd
+        self.team_cap_usd = team_cap_usd
+        self.prices = dict(prices or DEFAULT_PRICES_USD)
+        self.spent = 0.0
+        self.spent_by_team: Dict[str, float] = {}
+        self.spent_by_service: Dict[str, float] = {}
+
+    def charge(self, team: str, service: str) -> str:
+        """Book one request if it fits; returns "" or why it was deferred."""
+        cost = self.prices[service]
+        if self.cap_usd is not None and self.spent + cost > self.cap_usd + 1e-9:
+            return f"Deferred: run budget ${self.cap_usd:g} reached"
+        team_spent = self.spent_by_team.get(team, 0.0)
+        if self.team_cap_usd is not None and team_spent + cost > self.team_cap_usd + 1e-9:
+            return f"Deferred: budget ${self.team_cap_usd:g} for team {team} reached"
+        self.spent += cost
+        self.spent_by_team[team] = team_spent + cost
+        self.spent_by_service[service] = self.spent_by_service.get(service, 0.0) + cost
+        return ""
+
+    def summary(self) -> str:
+        cap = f"${self.cap_usd:g}" if self.cap_usd is not None else "no cap"
+        services = ", ".join(f"{s} ${v:.3f}" for s, v in sorted(self.spent_by_service.items())) or "nothing"
+        return f"${self.spent:.3f} of {cap} planned ({services})"
+
+
+@dataclass(frozen=True)
+class WorkItem:
+    key: Hashable
+    team: str
+    service: str
+    risk: Risk
+    cached: bool = False
+
+
+@dataclass(frozen=True)
+class Decision:
+    decision: str  # "cached", "run" or DEFERRED
+    reason: str
+    cost_usd: float
+    rank: int
+
+
+def schedule(items: List[WorkItem], budget: Budget) -> Dict[Hashable, Decision]:
+    """
+    Decide every item, highest risk first; equal risks keep their input order.
+
+    A deferred item does not stop the walk: a cheaper service or another team's
+    images may still fit.
+    """
+    decisions: Dict[Hashable, Decision] = {}
+    order = sorted(range(len(items)), key=lambda i: -items[i].risk.score)
+    for rank, i in enumerate(order, 1):
+        item = items[i]
+        if item.cached:
+            decisions[item.key] = Decision("cached", "", 0.0, rank)
+            continue
+        reason = budget.charge(item.team, item.service)
+        if reason:
+            decisions[item.key] = Decision(DEFERRED, f"{reason} (risk {item.risk.score:.2f}: {item.risk.describe()})",
+                                           0.0, rank)
+        else:
+            decisions[item.key] = Decision("run", "", budget.prices[item.service], rank)
+    return decisions
@@ -0,0 +1,96 @@
+"""
+gsme/cache.py
+
+Small on-disk cache of JSON results keyed by image content hash.
+
+Layout: <root>/<key[:2]>/<key>.json, each file holding {"saved_at": <epoch>, "value": ...},
+plus raw <key>.bin entries for derived bytes (e.g. downsized images).
+Writes go through a temp file + os.replace, so concurrent writers never leave a
+half-written entry behind.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional, Union
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class HashCache:
+    """
+    JSON cache keyed by content hash with an optional time-to-live.
+
+    ttl_s=None keeps entries forever; expired entries are treated as misses
+    and overwritten on the next put().
+    """
+
+    def __init__(self, root: Union[str, Path], ttl_s: Optional[float] = None) -> None:
+        self.root = Path(root)
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str, suffix: str = ".json") -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self.ttl_s is not None and time.time() - float(entry.get("saved_at", 0)) > self.ttl_s:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.get("value")
+
+    def put(self, key: str, value: Any) -> None:
+        self._atomic_write(self._path(key), json.dumps({"saved_at": time.time(), "value": value}).encode("utf-8"))
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """Binary entries (<key>.bin) have no TTL; they are derived from content that never changes."""
+        try:
+            data = self._path(key, ".bin").read_bytes()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        self._atomic_write(self._path(key, ".bin"), data)
+
+    def _atomic_write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,77 @@
+"""
+gsme/cli.py
+
+One entry point for the numbered scripts, run from the repository root:
+
+    python -m gsme --help                       # the commands; imports none of them
+    python -m gsme trufor --help                # 15_edge_anomaly.py's own options
+    python -m gsme validate --team GB --wave baseline
+    python -m gsme sightengine --csv ... --out_csv ...
+    python -m gsme combine GB                   # Rscript 18_combine_all.R GB
+
+A command runs the script's main() with the remaining arguments, exactly as
+`python <script> ...` would; the script is only imported once its command is chosen,
+and the scripts import their heavy dependencies (OpenCV, pytesseract, the Vision client)
+only when the work starts, so --help and dry runs return quickly.
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from gsme.scripts import REPO_ROOT, load_script
+
+# command -> (script in the repository root, one-line description)
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "validate": ("11_auto_validate.py", "AI validation of the annotation samples (OpenRouter)"),
+    "trufor": ("15_edge_anomaly.py", "TruFor tamper detection with OCR regions"),
+    "web": ("16_web_detection_check.py", "Google Vision web detection (screenshot found online)"),
+    "sightengine": ("17_sightengine_ai_detection.py", "Sightengine AI-generated image detection"),
+    "combine": ("18_combine_all.R", "Combine all reports, one row per respondent (Rscript; team slug)"),
+    "near-duplicates": ("19_near_duplicates.py", "Near-duplicate screenshots across respondents"),
+    "prefilter": ("20_ai_prefilter.py", "Local AI-generation pre-filter before Sightengine"),
+    "run": ("21_run_detectors.py", "Run trufor, web, sightengine and validate as one task graph"),
+    "export": ("22_export_parquet.py", "Export all results as Hive-partitioned Parquet"),
+    "download": ("23_download_uploads.py", "Download Qualtrics file uploads"),
+    "ingest": ("24_ingest_bundles.py", "Ingest team result bundles"),
+    "benchmark": ("25_benchmark.py", "Benchmark the detector hot paths"),
+    "synth": ("26_synth_screenshots.py", "Synthetic team/wave of screenshots"),
+    "forensics": ("27_file_forensics.py", "Header and metadata forensics (no decoding, no API)"),
+}
+
+
+def run(command: str, args: List[str]) -> int:
+    """Run one command's script with args; returns its exit code."""
+    script = COMMANDS[command][0]
+    if script.endswith(".R"):
+        rscript = shutil.which("Rscript")
+        if rscript is None:
+            print(f"[gsme] {command}: Rscript not found; install R to run {script}")
+            return 1
+        return subprocess.call([rscript, str(REPO_ROOT / script), *args])
+
+    argv = sys.argv
+    sys.argv = [f"python -m gsme {command}", *args]  # argparse usage lines name the command
+    try:
+        rc = load_script(script).main()
+    except ModuleNotFoundError as e:
+        print(f"[gsme] {command}: {script} needs the '{e.name}' package (see the Requirements in its header)")
+        return 1
+    finally:
+        sys.argv = argv
+    return rc if isinstance(rc, int) else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    width = max(len(c) for c in COMMANDS)
+    ap = argparse.ArgumentParser(
+        prog="python -m gsme", description="Screenshot compliance checks (run from the repository root)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {c:<{width}}  {d} [{s}]" for c, (s, d) in COMMANDS.items())
+               + "\n\n`python -m gsme <command> --help` lists a command's options.")
+    ap.add_argument("command", choices=COMMANDS, metavar="command", help="one of the commands below")
+    ap.add_argument("args", nargs=argparse.REMAINDER, help="passed on to the command's script")
+    args = ap.parse_args(argv)
+    return run(args.command, args.args)
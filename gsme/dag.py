@@ -0,0 +1,122 @@
+"""
+gsme/dag.py
+
+Minimal task graph: each node runs on a named executor once its dependencies finish.
+
+    graph = TaskGraph()
+    graph.add("hash", ingest, pool="io")
+    graph.add("trufor:abc", analyze, path, pool="cpu", deps=["hash"])
+    graph.add("report", write_report, deps=["trufor:abc"], soft=True)   # pool="main": run inline
+    results = graph.run({"io": thread_pool, "cpu": process_pool})
+
+Nodes on different pools run at the same time, so CPU-bound work in a process pool
+overlaps with network-bound work in a thread pool. A node whose dependency raised is
+not run; it fails with DependencyError. A soft node (e.g. a report over many images)
+runs once its dependencies have settled either way and reads the failures from
+graph.errors. Failures never stop unrelated nodes.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+MAIN = "main"  # pseudo-pool: run in the calling thread
+
+
+class DependencyError(RuntimeError):
+    pass
+
+
+@dataclass
+class Node:
+    key: Hashable
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...]
+    pool: str
+    deps: List[Hashable] = field(default_factory=list)
+    soft: bool = False  # run even if a dependency failed
+
+
+class TaskGraph:
+    def __init__(self) -> None:
+        self.nodes: Dict[Hashable, Node] = {}
+        self.results: Dict[Hashable, Any] = {}
+        self.errors: Dict[Hashable, BaseException] = {}
+
+    def add(self, key: Hashable, fn: Callable[..., Any], *args: Any, pool: str = MAIN,
+            deps: Iterable[Hashable] = (), soft: bool = False) -> Hashable:
+        if key in self.nodes:
+            raise ValueError(f"Duplicate task key: {key!r}")
+        self.nodes[key] = Node(key, fn, args, pool, list(deps), soft)
+        return key
+
+    def _check(self) -> Dict[Hashable, List[Hashable]]:
+        """Validate dependencies; return {node: dependents}."""
+        dependents: Dict[Hashable, List[Hashable]] = {k: [] for k in self.nodes}
+        for node in self.nodes.values():
+            for d in node.deps:
+                if d not in self.nodes:
+                    raise ValueError(f"Task {node.key!r} depends on unknown task {d!r}")
+                dependents[d].append(node.key)
+        # Kahn's algorithm: every node must be reachable from the roots
+        remaining = {k: len(n.deps) for k, n in self.nodes.items()}
+        ready = [k for k, n in remaining.items() if n == 0]
+        seen = 0
+        while ready:
+            k = ready.pop()
+            seen += 1
+            for d in dependents[k]:
+                remaining[d] -= 1
+                if remaining[d] == 0:
+                    ready.append(d)
+        if seen != len(self.nodes):
+            raise ValueError("Task graph has a cycle")
+        return dependents
+
+    def run(self, pools: Dict[str, Executor],
+            on_done: Optional[Callable[[Hashable, Any, Optional[BaseException]], None]] = None) -> Dict[Hashable, Any]:
+        """
+        Run every node; returns {key: result} for the nodes that succeeded.
+
+        on_done(key, result, error) is called in this thread as each node settles.
+        """
+        dependents = self._check()
+        waiting = {k: len(n.deps) for k, n in self.nodes.items()}
+        running: Dict[Future, Hashable] = {}
+        ready = [k for k, n in waiting.items() if n == 0]
+
+        def settle(key: Hashable, result: Any, error: Optional[BaseException]) -> None:
+            if error is None:
+                self.results[key] = result
+            else:
+                self.errors[key] = error
+            if on_done is not None:
+                on_done(key, result, error)
+            for d in dependents[key]:
+                waiting[d] -= 1
+                if waiting[d] == 0:
+                    ready.append(d)
+
+        while ready or running:
+            while ready:
+                node = self.nodes[ready.pop(0)]
+                failed = [] if node.soft else [d for d in node.deps if d in self.errors]
+                if failed:
+                    settle(node.key, None, DependencyError(f"{node.key!r}: dependency {failed[0]!r} failed"))
+                elif node.pool == MAIN:
+                    try:
+                        result = node.fn(*node.args)
+                    except Exception as e:
+                        settle(node.key, None, e)
+                    else:
+                        settle(node.key, result, None)
+                else:
+                    running[pools[node.pool].submit(node.fn, *node.args)] = node.key
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                key = running.pop(fut)
+                err = fut.exception()
+                settle(key, None if err is not None else fut.result(), err)
+        return self.results
@@ -0,0 +1,312 @@
+"""
+gsme/forensics.py
+
+File-format forensics from headers and metadata only: the PNG chunk list (IDAT is skipped
+with a seek, never read) or the JPEG segments before the first scan. A few hundred bytes
+to a few KB are read per file, so this runs at thousands of files per second and is a
+cheap first pass before TruFor.
+
+    row = inspect_file(path, device="iOS")
+    row["flags"], row["forensic_score"]   # e.g. "editor_software;size_not_ios", 0.76
+
+Flags (weights in FLAG_WEIGHTS, combined as 1 - prod(1 - w)):
+- editor_software      Software / CreatorTool / XMP history names an image editor
+- edit_history         XMP edit history, Photoshop resources or an Adobe JPEG marker
+- size_not_ios         reported iOS, but not a native iPhone/iPad screenshot size
+- size_unusual         not a known screenshot size and not a phone aspect ratio
+- exif_size_mismatch   EXIF pixel dimensions differ from the image (resized or cropped after capture)
+- png_time_chunk       PNG tIME chunk (written by editors and converters, not by phones)
+- progressive_jpeg     progressive JPEG (phones write baseline)
+- nonstandard_qtables  JPEG quantization tables that are not libjpeg's scaled standard tables
+"""
+
+import re
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+from PIL import Image
+
+from gsme.prefilter import ANDROID_RESOLUTIONS, IPHONE_RESOLUTIONS
+
+IPAD_RESOLUTIONS = {
+    (1536, 2048), (1488, 2266), (1620, 2160), (1640, 2360), (1668, 2224), (1668, 2388), (2048, 2732),
+}
+IOS_RESOLUTIONS = IPHONE_RESOLUTIONS | IPAD_RESOLUTIONS
+PHONE_ASPECT = (1.6, 2.4)  # height / width of portrait phone screens
+
+EDITOR_PATTERN = re.compile(
+    r"photoshop|lightroom|gimp|snapseed|picsart|canva|pixelmator|affinity|paint\.net|facetune|meitu|"
+    r"photodirector|polarr|vsco|fotor|photopea|picmonkey|befunky|krita|imagemagick|graphicsmagick",
+    re.IGNORECASE,
+)
+
+FLAG_WEIGHTS = {
+    "editor_software": 0.6,
+    "edit_history": 0.5,
+    "size_not_ios": 0.4,
+    "exif_size_mismatch": 0.4,
+    "png_time_chunk": 0.2,
+    "size_unusual": 0.15,
+    "progressive_jpeg": 0.15,
+    "nonstandard_qtables": 0.15,
+}
+DEFAULT_FLAG_SCORE = 0.5  # forensic_score at or above this is reported as "flagged"
+
+REPORT_COLS = ["format", "width", "height", "forensic_score", "flags", "software", "jpeg_quality", "jpeg_qtables",
+               "has_exif", "has_xmp", "png_chunks", "bytes_read", "error"]
+
+MAX_METADATA_BYTES = 1 << 20  # text/EXIF/XMP chunks larger than this are skipped, not read
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME")
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+PROGRESSIVE_SOF = {0xC2, 0xC6, 0xCA, 0xCE}
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+
+# libjpeg's standard luminance table (natural order) and DQT's zigzag order
+_STD_LUMA = [
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55, 14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62, 18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+]
+_ZIGZAG = [
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5, 12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14,
+    21, 28, 35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51, 58, 59, 52, 45, 38, 31, 39, 46, 53,
+    60, 61, 54, 47, 55, 62, 63,
+]
+
+
+def _scaled_table(quality: int) -> Tuple[int, ...]:
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    return tuple(min(255, max(1, (v * scale + 50) // 100)) for v in _STD_LUMA)
+
+
+_STD_TABLES = {q: _scaled_table(q) for q in range(1, 101)}
+
+
+def jpeg_quality(luma: List[int]) -> Tuple[int, bool]:
+    """(closest libjpeg quality, whether the table is exactly libjpeg's) for a natural-order luminance table."""
+    best = min(_STD_TABLES, key=lambda q: sum(abs(a - b) for a, b in zip(_STD_TABLES[q], luma)))
+    return best, tuple(luma) == _STD_TABLES[best]
+
+
+def _portrait(w: int, h: int) -> Tuple[int, int]:
+    return (min(w, h), max(w, h))
+
+
+def size_flags(width: int, height: int, device: str) -> List[str]:
+    """Dimension flags for a screenshot reported as taken on device ("iOS", "Android" or "")."""
+    if not width or not height:
+        return []
+    size = _portrait(width, height)
+    if device.strip().lower() in ("ios", "iphone", "ipad"):
+        return [] if size in IOS_RESOLUTIONS else ["size_not_ios"]
+    if size in IOS_RESOLUTIONS or size in ANDROID_RESOLUTIONS:
+        return []
+    lo, hi = PHONE_ASPECT
+    return [] if lo <= size[1] / size[0] <= hi else ["size_unusual"]
+
+
+def _exif_fields(blob: bytes) -> Dict[str, Any]:
+    exif = Image.Exif()
+    exif.load(blob)
+    sub = exif.get_ifd(0x8769)
+    return {
+        "software": " / ".join(str(exif[t]).strip("\x00 ") for t in (0x0131, 0x000B) if exif.get(t)),
+        "exif_size": (sub.get(0xA002), sub.get(0xA003)) if sub.get(0xA002) and sub.get(0xA003) else None,
+    }
+
+
+def _xmp_fields(xmp: str) -> Dict[str, Any]:
+    tools = re.findall(r"(?:CreatorTool|softwareAgent)(?:=\"|>)([^\"<]+)", xmp)
+    history = "stEvt:" in xmp or "photoshop:" in xmp
+    return {"tools": tools, "history": history}
+
+
+def _png_text(ctype: bytes, data: bytes) -> Tuple[str, str]:
+    key, _, rest = data.partition(b"\x00")
+    if ctype == b"tEXt":
+        return key.decode("latin-1"), rest.decode("latin-1")
+    if ctype == b"zTXt":
+        return key.decode("latin-1"), zlib.decompress(rest[1:]).decode("latin-1")
+    compressed, rest = rest[:1] == b"\x01", rest[2:]  # iTXt: flag, method, language\0, translated key\0, text
+    _, _, rest = rest.partition(b"\x00")
+    _, _, text = rest.partition(b"\x00")
+    return key.decode("latin-1"), (zlib.decompress(text) if compressed else text).decode("utf-8", "replace")
+
+
+def _read_png(f: Any, out: Dict[str, Any], meta: Dict[str, Any]) -> None:
+    chunks: List[str] = []
+    while True:
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            break
+        length, ctype = struct.unpack(">I4s", hdr)
+        if ctype == b"IHDR":
+            out["width"], out["height"] = struct.unpack(">II", f.read(length)[:8])
+            f.seek(4, 1)
+        elif ctype in PNG_TEXT_CHUNKS and length <= MAX_METADATA_BYTES:
+            data = f.read(length)
+            f.seek(4, 1)
+            if ctype == b"eXIf":
+                meta["exif"] = data
+            elif ctype == b"tIME":
+                meta["time_chunk"] = True
+            else:
+                key, text = _png_text(ctype, data)
+                if key == "XML:com.adobe.xmp":
+                    meta["xmp"] = text
+                elif key in ("Software", "Creator", "Comment"):
+                    meta["text"].append(text)
+        else:
+            f.seek(length + 4, 1)
+        if ctype == b"IEND":
+            break
+        if not chunks or chunks[-1] != ctype.decode("latin-1"):
+            chunks.append(ctype.decode("latin-1"))
+    out["png_chunks"] = ",".join(chunks)
+
+
+def _read_jpeg(f: Any, out: Dict[str, Any], meta: Dict[str, Any]) -> None:
+    while True:
+        b = f.read(1)
+        if not b:
+            break
+        if b != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            break
+        m = marker[0]
+        if m in (0x01, 0xD8) or 0xD0 <= m <= 0xD7:
+            continue
+        if m in (0xD9, 0xDA):  # EOI, or SOS: entropy-coded data follows
+            break
+        length = struct.unpack(">H", f.read(2))[0] - 2
+        if m in SOF_MARKERS:
+            data = f.read(length)
+            out["height"], out["width"] = struct.unpack(">HH", data[1:5])
+            meta["progressive"] = m in PROGRESSIVE_SOF
+        elif m == 0xDB:
+            data = f.read(length)
+            while data:
+                precision, table_id = data[0] >> 4, data[0] & 0x0F
+                n = 128 if precision else 64
+                values = (struct.unpack(">64H", data[1:1 + n]) if precision else tuple(data[1:1 + n]))
+                if table_id == 0:
+                    natural = [0] * 64
+                    for i, v in enumerate(values):
+                        natural[_ZIGZAG[i]] = v
+                    meta["luma"] = natural
+                data = data[1 + n:]
+        elif m in (0xE1, 0xED, 0xEE) and length <= MAX_METADATA_BYTES:
+            data = f.read(length)
+            if m == 0xE1 and data.startswith(b"Exif\x00\x00"):
+                meta["exif"] = data
+            elif m == 0xE1 and data.startswith(XMP_HEADER):
+                meta["xmp"] = data[len(XMP_HEADER):].decode("utf-8", "replace")
+            elif m == 0xED and data.startswith(b"Photoshop 3.0"):
+                meta["adobe"] = True
+            elif m == 0xEE and data.startswith(b"Adobe"):
+                meta["adobe"] = True
+        elif m == 0xFE and length <= MAX_METADATA_BYTES:
+            meta["text"].append(f.read(length).decode("latin-1"))
+        else:
+            f.seek(length, 1)
+
+
+class _CountingReader:
+    """File wrapper that counts the bytes actually read (seeks over image data are free)."""
+
+    def __init__(self, f: Any) -> None:
+        self.f = f
+        self.n_read = 0
+
+    def read(self, n: int) -> bytes:
+        data = self.f.read(n)
+        self.n_read += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.f.seek(offset, whence)
+
+
+def inspect_file(path: Union[str, Path], device: str = "") -> Dict[str, Any]:
+    """One report row (REPORT_COLS) for a PNG or JPEG screenshot. Runs in worker processes."""
+    out: Dict[str, Any] = {"format": "", "width": 0, "height": 0, "forensic_score": 0.0, "flags": "",
+                           "software": "", "jpeg_quality": "", "jpeg_qtables": "", "has_exif": 0, "has_xmp": 0,
+                           "png_chunks": "", "bytes_read": 0, "error": ""}
+    meta: Dict[str, Any] = {"text": []}
+    try:
+        with open(path, "rb") as raw:
+            f = _CountingReader(raw)
+            head = f.read(8)
+            if head == PNG_SIGNATURE:
+                out["format"] = "PNG"
+                _read_png(f, out, meta)
+            elif head[:2] == b"\xff\xd8":
+                out["format"] = "JPEG"
+                f.seek(2)
+                _read_jpeg(f, out, meta)
+            else:
+                out["format"] = "other"
+            out["bytes_read"] = f.n_read
+    except (OSError, struct.error, zlib.error) as e:
+        out["error"] = str(e) or type(e).__name__
+        return out
+    out.update(score_metadata(out, meta, device))
+    return out
+
+
+def score_metadata(out: Dict[str, Any], meta: Dict[str, Any], device: str) -> Dict[str, Any]:
+    """Flags, score and metadata columns from what _read_png / _read_jpeg collected."""
+    flags: List[str] = []
+    software: List[str] = list(meta["text"])
+    extra: Dict[str, Any] = {}
+    if "exif" in meta:
+        extra["has_exif"] = 1
+        try:
+            fields = _exif_fields(meta["exif"])
+        except Exception:
+            fields = {"software": "", "exif_size": None}
+        if fields["software"]:
+            software.append(fields["software"])
+        if fields["exif_size"] and _portrait(*fields["exif_size"]) != _portrait(out["width"], out["height"]):
+            flags.append("exif_size_mismatch")
+    if "xmp" in meta:
+        extra["has_xmp"] = 1
+        xmp = _xmp_fields(meta["xmp"])
+        software += xmp["tools"]
+        if xmp["history"]:
+            meta["adobe"] = True
+    if any(EDITOR_PATTERN.search(s) for s in software):
+        flags.append("editor_software")
+    if meta.get("adobe"):
+        flags.append("edit_history")
+    flags += size_flags(out["width"], out["height"], device)
+    if meta.get("time_chunk"):
+        flags.append("png_time_chunk")
+    if meta.get("progressive"):
+        flags.append("progressive_jpeg")
+    if "luma" in meta:
+        quality, standard = jpeg_quality(meta["luma"])
+        extra["jpeg_quality"] = quality
+        extra["jpeg_qtables"] = "standard" if standard else "nonstandard"
+        if not standard:
+            flags.append("nonstandard_qtables")
+
+    clean = 1.0
+    for flag in flags:
+        clean *= 1.0 - FLAG_WEIGHTS[flag]
+    extra.update(forensic_score=round(1.0 - clean, 4), flags=";".join(flags),
+                 software="; ".join(dict.fromkeys(s.strip() for s in software if s.strip()))[:200])
+    return extra
+
+
+def inspect_task(args: Tuple[str, str]) -> Dict[str, Any]:
+    """inspect_file((path, device)) for ProcessPoolExecutor.map."""
+    return inspect_file(*args)
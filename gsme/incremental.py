@@ -0,0 +1,201 @@
+"""
+gsme/incremental.py
+
+"Only new uploads" mode for the detector scripts (--incremental in 15_/16_/17_,
+INCREMENTAL in 11_).
+
+    inc = Incremental(out_csv, manifest_for(csv))
+    refs = inc.pending(df, images.scan(df, path_cols))   # new or changed uploads only
+    ... run the detector on refs ...
+    out_df = inc.write_report(pd.DataFrame(rows))        # merged into the existing report
+    inc.commit()
+
+The watermark (<report>.watermark.csv next to the report) records, per report row, the
+upload it was computed from: the Qualtrics file_id (from the <prefix>_file_id input
+column, else looked up in the wave's uploaded_files_manifest.csv by saved_path) and the
+content hash. A row is rerun only when that pair changes or the row is missing from
+the report. Rows that ended with status "error" (HTTP 429/5xx, a failed batch or TruFor
+run) or "deferred" (a spend cap or monthly quota) get no mark, so the next run retries
+them; reports without a status column pass their own needs_retry (11_ retries its
+"API error" annotations). Existing rows are carried over verbatim; when all new rows
+belong at the end, they are appended to the CSV instead of rewriting it.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import pandas as pd
+
+from gsme.ingest import ImageRef
+
+WATERMARK_SUFFIX = ".watermark.csv"
+WATERMARK_COLS = ["task_id", "image_col", "file_id", "content_hash"]
+MANIFEST_NAME = "uploaded_files_manifest.csv"
+RETRY_STATUSES = ("error", "deferred")  # rows left out of the watermark
+
+Key = Tuple[str, ...]
+
+
+def manifest_for(csv_path: Union[str, Path]) -> Path:
+    """The wave's manifest for an input CSV in <WAVE>/results/ or <WAVE>/derived/."""
+    return Path(csv_path).resolve().parent.parent / MANIFEST_NAME
+
+
+def load_manifest(path: Union[str, Path]) -> pd.DataFrame:
+    """Manifest rows that downloaded successfully (response_id, file_id, saved_path)."""
+    path = Path(path)
+    if not path.exists():
+        return pd.DataFrame(columns=["response_id", "file_id", "saved_path"])
+    m = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if "ok" in m.columns:
+        m = m[m["ok"].str.upper().isin(["TRUE", "1", "T"])]
+    return m[["response_id", "file_id", "saved_path"]]
+
+
+def status_needs_retry(report: pd.DataFrame) -> pd.Series:
+    """Rows whose status is one of RETRY_STATUSES (all False without a status column)."""
+    if "status" not in report.columns:
+        return pd.Series(False, index=report.index)
+    return report["status"].astype(str).isin(RETRY_STATUSES)
+
+
+def _atomic_to_csv(df: pd.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+    os.close(fd)
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+class Incremental:
+    """
+    Watermark for one report.
+
+    key_cols are the report columns identifying a row: ("task_id", "image_col") for
+    the per-image reports of 15_/16_/17_, ("task_id",) for 11_'s per-task annotations.
+    needs_retry maps the written report to a boolean mask of rows to leave unmarked.
+    """
+
+    def __init__(self, report_path: Union[str, Path], manifest_path: Optional[Union[str, Path]] = None,
+                 key_cols: Sequence[str] = ("task_id", "image_col"),
+                 needs_retry: Callable[[pd.DataFrame], pd.Series] = status_needs_retry) -> None:
+        self.report_path = Path(report_path)
+        self.path = self.report_path.with_name(self.report_path.name + WATERMARK_SUFFIX)
+        self.key_cols = tuple(key_cols)
+        self.needs_retry = needs_retry
+        manifest = load_manifest(manifest_path) if manifest_path else load_manifest("")
+        self._file_id_of_path = {str(Path(p).resolve()): f for p, f in zip(manifest["saved_path"], manifest["file_id"])}
+        self._manifest_ids = set(manifest["file_id"])
+
+        self.existing = self._read_report()
+        self.existing_keys: List[Key] = (
+            [tuple(k) for k in self.existing[list(self.key_cols)].itertuples(index=False)]
+            if self.existing is not None and set(self.key_cols) <= set(self.existing.columns) else []
+        )
+        self.marks: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        if self.existing is not None and self.path.exists():
+            wm = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+            self.marks = {(t, c): (f, h) for t, c, f, h in wm[WATERMARK_COLS].itertuples(index=False)}
+
+        self.order: List[Key] = []    # report keys in current input order
+        self.rerun: Set[Key] = set()  # keys recomputed this run
+        self._current: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._errored: Set[Key] = set()  # report keys whose row needs_retry
+
+    def _read_report(self) -> Optional[pd.DataFrame]:
+        if not self.report_path.exists():
+            return None
+        try:
+            # strings throughout, so carried-over rows are written back exactly as they were
+            return pd.read_csv(self.report_path, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            return None
+
+    def file_id(self, df: pd.DataFrame, ref: ImageRef) -> str:
+        col = ref.col[: -len("_path")] + "_file_id" if ref.col.endswith("_path") else ""
+        if col in df.columns and pd.notna(df.at[ref.row, col]) and str(df.at[ref.row, col]):
+            return str(df.at[ref.row, col])
+        return self._file_id_of_path.get(str(ref.path.resolve()), "")
+
+    def _key(self, task_id: Any, image_col: str) -> Key:
+        return (str(task_id), image_col)[: len(self.key_cols)]
+
+    def _diff(self, df: pd.DataFrame, refs: List[ImageRef]) -> List[ImageRef]:
+        have = set(self.existing_keys)
+        changed = []
+        for ref in refs:
+            mark = (self.file_id(df, ref), ref.content_hash)
+            self._current[(str(ref.task_id), ref.col)] = mark
+            if self.marks.get((str(ref.task_id), ref.col)) != mark:
+                changed.append(ref)
+        if len(self.key_cols) == 1:  # one row per task, including tasks without images
+            order = [(str(r.get("task_id", f"row_{i}")),) for i, r in df.iterrows()]
+        else:
+            order = [self._key(r.task_id, r.col) for r in refs]
+        self.order = list(dict.fromkeys(order))
+        self.rerun = {self._key(r.task_id, r.col) for r in changed} | {k for k in self.order if k not in have}
+
+        seen_ids = {f for f, _ in self.marks.values()}
+        n_new_uploads = len(self._manifest_ids - seen_ids) if self.marks else len(self._manifest_ids)
+        print(f"[incremental] {self.report_path.name}: {len(self.rerun)} of {len(self.order)} rows new or changed "
+              f"({n_new_uploads} manifest uploads not yet processed)")
+        return changed
+
+    def pending(self, df: pd.DataFrame, refs: List[ImageRef]) -> List[ImageRef]:
+        """The refs whose report rows must be (re)computed, in input order."""
+        self._diff(df, refs)
+        return [r for r in refs if self._key(r.task_id, r.col) in self.rerun]
+
+    def pending_tasks(self, df: pd.DataFrame, refs: List[ImageRef]) -> Set[str]:
+        """For per-task reports: task_ids with any new or changed image, or no report row."""
+        self._diff(df, refs)
+        return {k[0] for k in self.rerun}
+
+    @property
+    def dropped(self) -> Set[Key]:
+        """Report rows no longer referenced by the input (removed on write)."""
+        return set(self.existing_keys) - set(self.order)
+
+    def write_report(self, new_rows: pd.DataFrame) -> pd.DataFrame:
+        """Merge new_rows into the report on disk; returns the full report as re-read from it."""
+        keep_existing = self.existing is not None and bool(self.existing_keys)
+        if not keep_existing:
+            merged = new_rows
+            appended = False
+        else:
+            replace = self.rerun | self.dropped
+            kept = self.existing[[k not in replace for k in self.existing_keys]]
+            kept_keys = [k for k in self.existing_keys if k not in replace]
+            new_keys = [tuple(str(v) for v in k) for k in new_rows[list(self.key_cols)].itertuples(index=False)] \
+                if len(new_rows) else []
+            pos = {k: i for i, k in enumerate(self.order)}
+            merged = pd.concat([kept, new_rows], ignore_index=True)
+            all_keys = kept_keys + new_keys
+            order = sorted(range(len(merged)), key=lambda i: pos.get(all_keys[i], len(pos)))
+            merged = merged.iloc[order].reset_index(drop=True)
+            # Only new rows, all after the existing ones: append instead of rewriting
+            appended = (len(kept) == len(self.existing) and order[: len(kept)] == list(range(len(kept)))
+                        and set(new_rows.columns) <= set(self.existing.columns))
+            if appended and len(new_rows):
+                new_rows.reindex(columns=self.existing.columns).to_csv(
+                    self.report_path, mode="a", header=False, index=False)
+        if not appended:
+            _atomic_to_csv(merged, self.report_path)
+        self._errored = self._error_keys(merged)
+        print(f"[incremental] {self.report_path.name}: {len(new_rows)} rows written, "
+              f"{len(merged) - len(new_rows)} carried over" + (" (appended)" if appended and len(new_rows) else ""))
+        return pd.read_csv(self.report_path, float_precision="round_trip")
+
+    def _error_keys(self, report: pd.DataFrame) -> Set[Key]:
+        if not set(self.key_cols) <= set(report.columns):
+            return set()
+        errored = report[self.needs_retry(report).to_numpy(dtype=bool)]
+        return {tuple(str(v) for v in k) for k in errored[list(self.key_cols)].itertuples(index=False)}
+
+    def commit(self) -> None:
+        """Advance the watermark to this run's inputs (call after the report is written); errored rows stay pending."""
+        out = pd.DataFrame([(t, c, f, h) for (t, c), (f, h) in self._current.items()
+                            if self._key(t, c) not in self._errored], columns=WATERMARK_COLS)
+        _atomic_to_csv(out, self.path)
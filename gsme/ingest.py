@@ -0,0 +1,274 @@
+"""
+gsme/ingest.py
+
+One content-hash-addressed view of the screenshots referenced by the sample/derived CSVs.
+
+    store = ImageStore()
+    refs = store.scan(df, path_cols)           # one ImageRef per (row, path column)
+    for h, path in store.unique(refs).items():  # identical uploads collapse to one hash
+        data = store.read_bytes(h)              # raw bytes, from the LRU when possible
+        img = store.image(h)                    # decoded PIL RGB image (shared, do not modify)
+
+Each file is read once per run: scanning hashes the bytes and keeps them in a
+memory-budgeted LRU (--memory_mb) together with any decoded copies the detectors ask
+for. Hashes are also saved to data/cache/ingest_index.csv keyed by path, size and
+mtime, so the next script (or rerun) over the same uploads does not re-read files
+just to hash them.
+"""
+
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from gsme.cache import sha256_bytes
+
+DEFAULT_PATH_COLS = ("total_screenshot_path", "app_screenshot1_path", "app_screenshot2_path", "app_screenshot3_path")
+DEFAULT_INDEX_PATH = Path("data") / "cache" / "ingest_index.csv"
+DEFAULT_MEMORY_MB = 256
+
+
+@dataclass
+class ImageRef:
+    row: int
+    task_id: Any
+    col: str
+    path: Path
+    content_hash: str = ""  # "" when the file is missing or unreadable
+    error: str = ""
+
+
+class LRUCache:
+    """Thread-safe LRU of values with a caller-supplied size, evicting past budget_bytes."""
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Any, value: Any, size: int) -> None:
+        if size > self.budget_bytes:
+            return  # would evict everything else and still not fit
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old[1]
+            self._items[key] = (value, size)
+            self.used_bytes += size
+            while self.used_bytes > self.budget_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.used_bytes -= evicted
+                self.evictions += 1
+
+
+def image_refs(df: pd.DataFrame, path_cols: Iterable[str]) -> List[ImageRef]:
+    """One ImageRef per non-empty path cell, in row then column order (not yet hashed)."""
+    refs = []
+    for i, r in df.iterrows():
+        task_id = r.get("task_id", f"row_{i}")
+        for col in path_cols:
+            if col not in r or pd.isna(r[col]) or not str(r[col]):
+                continue
+            refs.append(ImageRef(row=i, task_id=task_id, col=col, path=Path(str(r[col])).expanduser()))
+    return refs
+
+
+class ImageStore:
+    """
+    Content-hash-addressed access to screenshot files.
+
+    memory_mb bounds everything kept in memory (raw bytes and decoded images);
+    index_path=None disables the on-disk hash index.
+    """
+
+    def __init__(self, memory_mb: float = DEFAULT_MEMORY_MB,
+                 index_path: Optional[Union[str, Path]] = DEFAULT_INDEX_PATH) -> None:
+        self.lru = LRUCache(int(memory_mb * 1024 * 1024))
+        self.index_path = Path(index_path) if index_path else None
+        self.bytes_read = 0
+        self.files_read = 0
+        self._paths: Dict[str, Path] = {}
+        self._hash_of_path: Dict[Path, str] = {}
+        self._index: Dict[str, Tuple[int, int, str]] = self._load_index()
+        self._index_dirty = False
+        self._lock = threading.Lock()
+
+    # -- hash index ------------------------------------------------------------------
+
+    def _load_index(self) -> Dict[str, Tuple[int, int, str]]:
+        if self.index_path is None or not self.index_path.exists():
+            return {}
+        try:
+            idx = pd.read_csv(self.index_path, dtype={"path": str, "content_hash": str})
+        except (OSError, ValueError, pd.errors.EmptyDataError):
+            return {}
+        return {p: (int(s), int(m), h) for p, s, m, h in
+                zip(idx["path"], idx["size"], idx["mtime_ns"], idx["content_hash"])}
+
+    def save_index(self) -> None:
+        """Merge this run's hashes into the on-disk index (atomic replace)."""
+        if self.index_path is None or not self._index_dirty:
+            return
+        merged = {**self._load_index(), **self._index}
+        out = pd.DataFrame(
+            [(p, s, m, h) for p, (s, m, h) in merged.items()],
+            columns=["path", "size", "mtime_ns", "content_hash"],
+        )
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.index_path.parent, prefix=".tmp_")
+        os.close(fd)
+        out.to_csv(tmp, index=False)
+        os.replace(tmp, self.index_path)
+        self._index_dirty = False
+
+    # -- scanning --------------------------------------------------------------------
+
+    def hash_path(self, path: Path) -> str:
+        """Content hash of one file; reads it only if the index has no fresh entry."""
+        st = path.stat()
+        key = str(path.resolve())
+        entry = self._index.get(key)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            h = entry[2]
+        else:
+            data = self._read_file(path)
+            h = sha256_bytes(data)
+            self.lru.put(("bytes", h), data, len(data))
+            with self._lock:
+                self._index[key] = (st.st_size, st.st_mtime_ns, h)
+                self._index_dirty = True
+        with self._lock:
+            self._paths.setdefault(h, path)
+            self._hash_of_path[path] = h
+        return h
+
+    def remember(self, path: Path, h: str) -> None:
+        """Record the hash of a file the caller just wrote (and hashed) without reading it back."""
+        st = path.stat()
+        with self._lock:
+            self._index[str(path.resolve())] = (st.st_size, st.st_mtime_ns, h)
+            self._index_dirty = True
+            self._paths.setdefault(h, path)
+            self._hash_of_path[path] = h
+
+    def find(self, h: str) -> Optional[Path]:
+        """A file on disk with content hash h (from this run or the index, if unchanged since), or None."""
+        with self._lock:
+            candidates = [self._paths[h]] if h in self._paths else []
+            candidates += [Path(p) for p, (_, _, ph) in self._index.items() if ph == h]
+        for path in candidates:
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entry = self._index.get(str(path.resolve()))
+            if entry is None or (entry[0], entry[1]) == (st.st_size, st.st_mtime_ns):
+                return path
+        return None
+
+    def hash_for(self, path: Union[str, Path]) -> str:
+        """Content hash of a path, reusing the result of an earlier scan()."""
+        path = Path(path).expanduser()
+        h = self._hash_of_path.get(path)
+        return h if h is not None else self.hash_path(path)
+
+    def scan(self, df: pd.DataFrame, path_cols: Iterable[str]) -> List[ImageRef]:
+        """Hash every referenced file once; missing or unreadable files get ref.error set."""
+        refs = image_refs(df, path_cols)
+        by_path: Dict[Path, Tuple[str, str]] = {}
+        for ref in refs:
+            if ref.path not in by_path:
+                if not ref.path.exists():
+                    by_path[ref.path] = ("", "File not found")
+                else:
+                    try:
+                        by_path[ref.path] = (self.hash_path(ref.path), "")
+                    except OSError as e:
+                        by_path[ref.path] = ("", str(e))
+            ref.content_hash, ref.error = by_path[ref.path]
+        self.save_index()
+        return refs
+
+    def scan_csvs(self, csv_paths: Iterable[Union[str, Path]],
+                  path_cols: Iterable[str] = DEFAULT_PATH_COLS) -> Dict[Path, List[ImageRef]]:
+        """scan() over several CSVs sharing this store; files referenced twice are hashed once."""
+        path_cols = list(path_cols)
+        return {Path(p): self.scan(pd.read_csv(p), path_cols) for p in csv_paths}
+
+    @staticmethod
+    def unique(refs: Iterable[ImageRef]) -> Dict[str, Path]:
+        """{content_hash: first path} over the readable refs, in first-seen order."""
+        out: Dict[str, Path] = {}
+        for ref in refs:
+            if ref.content_hash:
+                out.setdefault(ref.content_hash, ref.path)
+        return out
+
+    # -- content ---------------------------------------------------------------------
+
+    def path(self, h: str) -> Path:
+        return self._paths[h]
+
+    def _read_file(self, path: Path) -> bytes:
+        data = path.read_bytes()
+        with self._lock:
+            self.bytes_read += len(data)
+            self.files_read += 1
+        return data
+
+    def read_bytes(self, h: str) -> bytes:
+        data = self.lru.get(("bytes", h))
+        if data is None:
+            data = self._read_file(self._paths[h])
+            self.lru.put(("bytes", h), data, len(data))
+        return data
+
+    def image(self, h: str) -> Any:
+        """Decoded PIL image in RGB. Shared between callers: copy before modifying."""
+        img = self.lru.get(("rgb", h))
+        if img is None:
+            from PIL import Image
+
+            with Image.open(io.BytesIO(self.read_bytes(h))) as src:
+                img = src.convert("RGB")
+            self.lru.put(("rgb", h), img, img.width * img.height * 3)
+        return img
+
+    def bgr(self, h: str) -> Optional[Any]:
+        """Decoded OpenCV BGR array (read-only), or None if OpenCV cannot decode it."""
+        arr = self.lru.get(("bgr", h))
+        if arr is None:
+            import cv2
+            import numpy as np
+
+            arr = cv2.imdecode(np.frombuffer(self.read_bytes(h), dtype=np.uint8), cv2.IMREAD_COLOR)
+            if arr is None:
+                return None
+            arr.setflags(write=False)
+            self.lru.put(("bgr", h), arr, arr.nbytes)
+        return arr
+
+    def summary(self) -> str:
+        return (f"{len(self._paths)} unique images, {self.files_read} file reads "
+                f"({self.bytes_read / 1e6:.1f} MB), memory cache {self.lru.hits} hits / "
+                f"{self.lru.misses} misses, {self.lru.used_bytes / 1e6:.1f} MB held")
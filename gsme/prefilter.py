@@ -0,0 +1,118 @@
+"""
+gsme/prefilter.py
+
+Cheap local "does this look like a genuine phone screenshot?" score, used to decide
+which images are worth sending to Sightengine's paid genai model.
+
+Genuine screenshots are rendered, not photographed or generated: exact device
+resolutions, lossless PNG, large areas of perfectly flat colour, and no sensor or
+diffusion noise. Each feature below is scored 0 (screenshot-like) to 1 (suspicious)
+and combined into a weighted suspicion score in [0, 1].
+"""
+
+import io
+from pathlib import Path
+from typing import Any, Dict, Union
+
+import numpy as np
+from PIL import Image
+
+# Native screenshot sizes (width x height, portrait) for common iPhones and Android phones
+IPHONE_RESOLUTIONS = {
+    (640, 1136), (750, 1334), (828, 1792), (1080, 1920), (1080, 2340), (1125, 2436),
+    (1170, 2532), (1179, 2556), (1206, 2622), (1242, 2208), (1242, 2688), (1284, 2778),
+    (1290, 2796), (1320, 2868),
+}
+ANDROID_RESOLUTIONS = {
+    (720, 1280), (720, 1520), (720, 1600), (720, 1612), (1080, 2160), (1080, 2220),
+    (1080, 2280), (1080, 2310), (1080, 2340), (1080, 2376), (1080, 2400), (1080, 2408),
+    (1080, 2412), (1080, 2436), (1080, 2460), (1116, 2484), (1220, 2712), (1224, 2700),
+    (1240, 2772), (1260, 2800), (1280, 2800), (1344, 2992), (1440, 2560), (1440, 2960),
+    (1440, 3040), (1440, 3088), (1440, 3120), (1440, 3200),
+}
+DEVICE_RESOLUTIONS = IPHONE_RESOLUTIONS | ANDROID_RESOLUTIONS
+
+FEATURE_WEIGHTS = {
+    "resolution": 0.20,  # not a known device size
+    "format": 0.10,      # lossy JPEG rather than PNG/WebP-lossless
+    "palette": 0.25,     # few pixels in the dominant flat UI colours
+    "noise": 0.30,       # few perfectly flat neighbourhoods (sensor/generator noise)
+    "spectral": 0.15,    # periodic high-frequency peaks (upsampling artefacts)
+}
+
+DEFAULT_MIN_SUSPICION = 0.30  # check against stored Sightengine scores with 20_ai_prefilter.py --evaluate
+ANALYSIS_SIDE = 512  # features are computed on a downscaled copy, longest side in pixels
+
+
+def _resolution_feature(size: tuple) -> float:
+    w, h = size
+    portrait = (min(w, h), max(w, h))
+    return 0.0 if portrait in DEVICE_RESOLUTIONS else 1.0
+
+
+def _format_feature(fmt: str) -> float:
+    return 1.0 if (fmt or "").upper() in ("JPEG", "MPO") else 0.0
+
+
+def _palette_feature(rgb: np.ndarray) -> float:
+    """1 - share of pixels covered by the 8 most common exact colours."""
+    packed = (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+    _, counts = np.unique(packed.reshape(-1), return_counts=True)
+    top = np.sort(counts)[-8:].sum()
+    return float(1.0 - top / packed.size)
+
+
+def _noise_feature(gray: np.ndarray) -> float:
+    """1 - share of pixels whose 4-neighbour Laplacian is exactly zero."""
+    g = gray.astype(np.int16)
+    lap = 4 * g[1:-1, 1:-1] - g[:-2, 1:-1] - g[2:, 1:-1] - g[1:-1, :-2] - g[1:-1, 2:]
+    return float(1.0 - (lap == 0).mean())
+
+
+def _spectral_feature(gray: np.ndarray) -> float:
+    """Peakiness of the high-frequency spectrum, squashed to [0, 1]."""
+    g = gray.astype(np.float32)
+    g -= g.mean()
+    mag = np.log1p(np.abs(np.fft.fftshift(np.fft.fft2(g))))
+    h, w = mag.shape
+    yy, xx = np.ogrid[:h, :w]
+    r = np.hypot((yy - h / 2) / (h / 2), (xx - w / 2) / (w / 2))
+    band = mag[(r > 0.5) & (r < 0.95)]
+    if band.size == 0:
+        return 0.0
+    peak = (np.percentile(band, 99.9) - np.median(band)) / (np.std(band) + 1e-6)
+    return float(np.clip((peak - 3.0) / 6.0, 0.0, 1.0))
+
+
+def suspicion_features(image: Union[str, Path, bytes]) -> Dict[str, Any]:
+    """Compute per-feature scores and the combined suspicion score for one image."""
+    src = io.BytesIO(image) if isinstance(image, bytes) else Path(image)
+    with Image.open(src) as img:
+        fmt = img.format or ""
+        size = img.size
+        img.draft("RGB", (ANALYSIS_SIDE, ANALYSIS_SIDE))
+        small = img.convert("RGB")
+    # Nearest-neighbour keeps flat regions exactly flat (no interpolation noise)
+    small.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE), Image.NEAREST)
+    rgb = np.asarray(small)
+    gray = np.asarray(small.convert("L"))
+
+    feats = {
+        "resolution": _resolution_feature(size),
+        "format": _format_feature(fmt),
+        "palette": _palette_feature(rgb),
+        "noise": _noise_feature(gray),
+        "spectral": _spectral_feature(gray),
+    }
+    score = sum(FEATURE_WEIGHTS[k] * v for k, v in feats.items())
+    return {
+        "suspicion": round(float(score), 4),
+        "width": size[0],
+        "height": size[1],
+        "format": fmt,
+        **{f"f_{k}": round(float(v), 4) for k, v in feats.items()},
+    }
+
+
+def suspicion_score(image: Union[str, Path, bytes]) -> float:
+    return suspicion_features(image)["suspicion"]
@@ -0,0 +1,226 @@
+"""
+gsme/profiling.py
+
+Per-stage timing for the detector scripts (--profile in 15_/16_/17_ and 11_).
+
+    prof = StageProfiler(enabled=args.profile)
+    with prof.item(content_hash, image_path=str(path)):   # per image (thread-local)
+        with prof.stage("http"):
+            resp = session.post(...)
+        prof.add("rate_limit_wait", limiter.acquire())     # time measured elsewhere
+    prof.write_csv(out_csv)         # <report>.profile.csv: one row per image, seconds per stage
+    print(prof.summary())           # total / mean / p95 / share per stage
+
+Disabled profilers return a shared no-op context, so the instrumented code paths cost
+nothing measurable when --profile is off. Time spent outside any item (hashing the
+inputs, writing the report) is kept as run-level stages and shown in the summary only.
+
+For a whole-run dump, profile_run(path) wraps the run in cProfile (path ending in .prof;
+main thread only, open with `python -m pstats` or snakeviz) or in a sampling profiler
+that sees every thread (any other suffix; collapsed stacks, one "frame;frame;... count"
+line per stack, for speedscope or flamegraph.pl).
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+
+PROFILE_SUFFIX = ".profile.csv"
+RUN_KEY = "(run)"
+
+_NULL = nullcontext()
+
+
+def profile_path_for(report_path: Union[str, Path]) -> Path:
+    report_path = Path(report_path)
+    return report_path.with_name(report_path.name + PROFILE_SUFFIX)
+
+
+class StageProfiler:
+    """Thread-safe accumulator of seconds per (item, stage)."""
+
+    def __init__(self, enabled: bool = False, key_name: str = "content_hash") -> None:
+        self.enabled = enabled
+        self.key_name = key_name
+        self.reset()
+
+    def reset(self) -> None:
+        self._times: Dict[Any, Dict[str, float]] = {}
+        self._labels: Dict[Any, Dict[str, Any]] = {}
+        self._stages: Dict[str, None] = {}  # first-seen order, for the CSV columns
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.perf_counter()
+
+    @property
+    def current(self) -> Any:
+        return getattr(self._local, "key", RUN_KEY)
+
+    @contextmanager
+    def _item(self, key: Any, labels: Dict[str, Any]) -> Iterator[None]:
+        prev = self.current
+        self._local.key = key
+        with self._lock:
+            self._times.setdefault(key, {})
+            self._labels.setdefault(key, {}).update(labels)
+        try:
+            yield
+        finally:
+            self._local.key = prev
+
+    def item(self, key: Any, **labels: Any):
+        """Attribute stages timed in this thread to `key` (labels become extra CSV columns)."""
+        return self._item(key, labels) if self.enabled else _NULL
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def stage(self, name: str):
+        return self._stage(name) if self.enabled else _NULL
+
+    def add(self, name: str, seconds: float, key: Any = None) -> None:
+        if not self.enabled:
+            return
+        key = self.current if key is None else key
+        with self._lock:
+            self._stages.setdefault(name, None)
+            row = self._times.setdefault(key, {})
+            row[name] = row.get(name, 0.0) + seconds
+
+    def split(self, name: str, seconds: float, keys: Sequence[Any]) -> None:
+        """Share one measurement (e.g. a batched API call) equally between keys."""
+        if self.enabled and keys:
+            for key in keys:
+                self.add(name, seconds / len(keys), key=key)
+
+    def frame(self) -> pd.DataFrame:
+        """One row per item: key, labels, <stage>_s columns and total_s."""
+        with self._lock:
+            stages = list(self._stages)
+            rows = []
+            for key, times in self._times.items():
+                if key == RUN_KEY:
+                    continue
+                row = {self.key_name: key, **self._labels.get(key, {})}
+                row.update({f"{s}_s": round(times.get(s, 0.0), 6) for s in stages})
+                row["total_s"] = round(sum(times.values()), 6)
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def write_csv(self, report_path: Union[str, Path]) -> Optional[Path]:
+        """Write <report>.profile.csv next to the report; returns its path (None when disabled)."""
+        if not self.enabled:
+            return None
+        path = profile_path_for(report_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.frame().to_csv(path, index=False)
+        return path
+
+    def summary(self, title: str = "profile") -> str:
+        """Aggregate breakdown across items, plus run-level stages and wall time."""
+        wall = time.perf_counter() - self.started
+        with self._lock:
+            per_stage: Dict[str, List[float]] = {s: [] for s in self._stages}
+            run_level = dict(self._times.get(RUN_KEY, {}))
+            n_items = sum(1 for k in self._times if k != RUN_KEY)
+            for key, times in self._times.items():
+                if key != RUN_KEY:
+                    for s, v in times.items():
+                        per_stage[s].append(v)
+        total = sum(sum(v) for v in per_stage.values()) + sum(run_level.values())
+        lines = [f"[{title}] {n_items} item(s), wall {wall:.2f}s; stage times summed over items "
+                 f"(they overlap when work runs in parallel)",
+                 f"  {'stage':<22}{'items':>7}{'total_s':>10}{'mean_ms':>10}{'p95_ms':>10}{'share':>8}"]
+        rows = [(s, v) for s, v in per_stage.items() if v]
+        rows += [(f"{s} (run)", [v]) for s, v in run_level.items()]
+        for name, values in sorted(rows, key=lambda r: -sum(r[1])):
+            s = pd.Series(values)
+            lines.append(f"  {name:<22}{len(values):>7}{s.sum():>10.3f}{1000 * s.mean():>10.1f}"
+                         f"{1000 * s.quantile(0.95):>10.1f}{s.sum() / total if total else 0:>8.1%}")
+        return "\n".join(lines)
+
+
+DISABLED = StageProfiler(enabled=False)  # default for functions that take an optional profiler
+
+
+class StackSampler:
+    """Samples every thread's Python stack every interval_s; dumps collapsed stacks."""
+
+    def __init__(self, interval_s: float = 0.005) -> None:
+        self.interval_s = interval_s
+        self.counts: Counter = Counter()
+        self.n_samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.counts[";".join(reversed(stack))] += 1
+            self.n_samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: Union[str, Path]) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+@contextmanager
+def profile_run(dump_path: Union[str, Path, None], title: str = "profile") -> Iterator[None]:
+    """cProfile (.prof) or stack-sampling (any other suffix) dump of the enclosed run; no-op for ""."""
+    if not dump_path:
+        yield
+        return
+    dump_path = Path(dump_path)
+    if dump_path.suffix == ".prof":
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            dump_path.parent.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(str(dump_path))
+            print(f"[{title}] cProfile dump (main thread): {dump_path}")
+            pstats.Stats(prof).sort_stats("cumulative").print_stats(15)
+    else:
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.dump(dump_path)
+            print(f"[{title}] {sampler.n_samples} stack samples (all threads), collapsed: {dump_path}")
@@ -0,0 +1,40 @@
+"""
+gsme/ratelimit.py
+
+Thread-safe request pacing shared by the API-calling scripts.
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Spaces calls so that at most `rate` start per second across all threads.
+
+    Each acquire() reserves the next free slot and sleeps until it arrives, so
+    concurrent workers share one ceiling instead of each sleeping on its own.
+    rate <= 0 disables pacing.
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.rate = float(rate)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until the caller may send a request. Returns seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            if self.rate > 0:
+                self._next = slot + 1.0 / self.rate
+            wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return max(0.0, wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for `seconds` (e.g. after a Retry-After header)."""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + max(0.0, seconds))
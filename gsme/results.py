@@ -0,0 +1,258 @@
+"""
+gsme/results.py
+
+Study-wide SQLite store of detector results (data/qualtrics/results.sqlite).
+
+Every detector report (auto_annotations_*, trufor_report_*, web_detection_report_*,
+sightengine_ai_report_*, file_forensics_*, and 21_'s watch_report.csv) is also upserted here, one
+row per report row, keyed by (detector, team, wave, report, task_id, image_col, content_hash,
+detector_version).
+The full row is kept as JSON together with the report's column order, so
+
+    python -m gsme.results export --out_root data/qualtrics
+
+rewrites the CSVs byte-for-byte as the scripts wrote them. For analysis, the v_<detector>
+views expose the commonly used columns of the latest version of every report, e.g.
+
+    python -m gsme.results query "SELECT team, wave, COUNT(*) FROM v_sightengine
+                                  WHERE flagged = 1 GROUP BY team, wave"
+"""
+
+import argparse
+import json
+import math
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+DEFAULT_RESULTS_DB = Path("data") / "qualtrics" / "results.sqlite"
+
+# detector -> report file prefix (reports are <prefix>_<type>.csv)
+DETECTOR_REPORTS = {
+    "auto_validate": "auto_annotations",
+    "trufor": "trufor_report",
+    "web": "web_detection_report",
+    "sightengine": "sightengine_ai_report",
+    "forensics": "file_forensics",
+    "watch": "watch_report",
+}
+
+# Columns standing in for (task_id, image_col) in the key of reports that have neither
+ROW_KEYS = {
+    "watch": ("response_id", "image_path"),
+}
+
+# Columns promoted out of the row JSON in the v_<detector> views
+VIEW_COLUMNS = {
+    "auto_validate": ["respondent_id", "screenshot_correct", "numbers_match", "notes", "model_used"],
+    "trufor": ["image_path", "status", "trufor_score", "max_roi_score", "crop_path"],
+    "web": ["image_path", "status", "n_full_matches", "n_partial_matches", "top_full_match_domain"],
+    "sightengine": ["image_path", "status", "ai_generated_score", "flagged", "error"],
+    "forensics": ["image_path", "status", "forensic_score", "flags", "software"],
+    "watch": ["response_id", "image_path", "flagged_by", "latency_s", "error"],
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    detector TEXT NOT NULL, team TEXT NOT NULL, wave TEXT NOT NULL, report TEXT NOT NULL,
+    detector_version TEXT NOT NULL, columns TEXT NOT NULL, n_rows INTEGER NOT NULL, updated_at REAL NOT NULL,
+    PRIMARY KEY (detector, team, wave, report, detector_version)
+);
+CREATE TABLE IF NOT EXISTS results (
+    detector TEXT NOT NULL, team TEXT NOT NULL, wave TEXT NOT NULL, report TEXT NOT NULL,
+    task_id TEXT NOT NULL, image_col TEXT NOT NULL, content_hash TEXT NOT NULL,
+    detector_version TEXT NOT NULL, row_order INTEGER NOT NULL, row TEXT NOT NULL, updated_at REAL NOT NULL,
+    PRIMARY KEY (detector, team, wave, report, task_id, image_col, content_hash, detector_version)
+);
+CREATE INDEX IF NOT EXISTS idx_results_task ON results (team, wave, task_id);
+CREATE INDEX IF NOT EXISTS idx_results_hash ON results (content_hash, detector);
+CREATE VIEW IF NOT EXISTS latest_reports AS
+    SELECT r.* FROM reports r
+    WHERE r.updated_at = (SELECT MAX(updated_at) FROM reports x WHERE x.detector = r.detector
+                          AND x.team = r.team AND x.wave = r.wave AND x.report = r.report);
+"""
+
+
+def _view_sql(detector: str) -> str:
+    cols = ",\n    ".join(f"json_extract(res.row, '$.{c}') AS {c}" for c in VIEW_COLUMNS[detector])
+    return f"""CREATE VIEW IF NOT EXISTS v_{detector} AS SELECT
+    res.team, res.wave, res.report, res.task_id, res.image_col, res.content_hash, res.detector_version,
+    {cols}
+FROM results res JOIN latest_reports lr
+  ON lr.detector = res.detector AND lr.team = res.team AND lr.wave = res.wave
+ AND lr.report = res.report AND lr.detector_version = res.detector_version
+WHERE res.detector = '{detector}'"""
+
+
+def team_wave_from_path(path: Path) -> Tuple[str, str]:
+    """(team, wave) for paths laid out as .../qualtrics/<TEAM>/<WAVE>/..., else ("", "")."""
+    parts = path.resolve().parts
+    if "qualtrics" in parts:
+        i = len(parts) - 1 - parts[::-1].index("qualtrics")
+        if i + 2 < len(parts):
+            return parts[i + 1], parts[i + 2]
+    return "", ""
+
+
+def _plain(value: Any) -> Any:
+    """JSON-safe copy of a cell: numpy scalars to Python, NaN to None (strict JSON for R/jsonlite)."""
+    if hasattr(value, "item") and not isinstance(value, (list, dict, str, bytes)):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class ResultStore:
+    def __init__(self, db_path: Union[str, Path] = DEFAULT_RESULTS_DB) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.con = sqlite3.connect(str(self.db_path), timeout=60)
+        with self.con:
+            self.con.executescript(_SCHEMA)
+            for detector in DETECTOR_REPORTS:
+                self.con.execute(_view_sql(detector))
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def upsert_report(self, detector: str, detector_version: str, report_path: Union[str, Path],
+                      df: pd.DataFrame, team: str = "", wave: str = "") -> int:
+        """
+        Store one report as written to report_path (team/wave default to its location).
+
+        Rows are upserted on the primary key; rows of the same report and version that are
+        no longer present are removed, so export_report() returns exactly this DataFrame.
+        """
+        report_path = Path(report_path)
+        if not team or not wave:
+            team, wave = team_wave_from_path(report_path)
+        report = report_path.name
+        now = time.time()
+        records = []
+        task_col, image_col = ROW_KEYS.get(detector, ("task_id", "image_col"))
+        for order, row in enumerate(df.to_dict("records")):
+            row = {k: _plain(v) for k, v in row.items()}
+            key = (str(row.get(task_col, "")), str(row.get(image_col) or ""), str(row.get("content_hash") or ""))
+            records.append((detector, team, wave, report, *key, detector_version, order,
+                            json.dumps(row, allow_nan=False), now))
+        with self.con:
+            self.con.executemany(
+                """INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (detector, team, wave, report, task_id, image_col, content_hash, detector_version)
+                   DO UPDATE SET row_order = excluded.row_order, row = excluded.row, updated_at = excluded.updated_at""",
+                records,
+            )
+            self.con.execute(
+                "DELETE FROM results WHERE detector = ? AND team = ? AND wave = ? AND report = ? "
+                "AND detector_version = ? AND updated_at < ?",
+                (detector, team, wave, report, detector_version, now),
+            )
+            self.con.execute(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (detector, team, wave, report, detector_version, json.dumps([str(c) for c in df.columns]),
+                 len(df), now),
+            )
+        return len(records)
+
+    def reports(self) -> pd.DataFrame:
+        """Latest version of every stored report."""
+        return pd.read_sql_query(
+            "SELECT detector, team, wave, report, detector_version, n_rows, updated_at FROM latest_reports "
+            "ORDER BY team, wave, report", self.con)
+
+    def load_report(self, detector: str, team: str, wave: str, report: str,
+                    detector_version: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """A stored report as a DataFrame (latest version unless given), or None."""
+        sql = "SELECT detector_version, columns FROM reports WHERE detector = ? AND team = ? AND wave = ? AND report = ?"
+        params: List[Any] = [detector, team, wave, report]
+        if detector_version is not None:
+            sql += " AND detector_version = ?"
+            params.append(detector_version)
+        meta = self.con.execute(sql + " ORDER BY updated_at DESC LIMIT 1", params).fetchone()
+        if meta is None:
+            return None
+        version, columns = meta[0], json.loads(meta[1])
+        rows = [json.loads(r[0]) for r in self.con.execute(
+            "SELECT row FROM results WHERE detector = ? AND team = ? AND wave = ? AND report = ? "
+            "AND detector_version = ? ORDER BY row_order",
+            (detector, team, wave, report, version),
+        )]
+        return pd.DataFrame(rows, columns=columns)
+
+    def export_report(self, detector: str, team: str, wave: str, report: str, out_path: Union[str, Path],
+                      detector_version: Optional[str] = None) -> bool:
+        df = self.load_report(detector, team, wave, report, detector_version)
+        if df is None:
+            return False
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(out_path, index=False)
+        return True
+
+    def export_all(self, out_root: Union[str, Path]) -> List[Path]:
+        """Write every stored report to <out_root>/<team>/<wave>/results/<report>."""
+        written = []
+        for r in self.reports().itertuples():
+            out = Path(out_root) / r.team / r.wave / "results" / r.report
+            if self.export_report(r.detector, r.team, r.wave, r.report, out, r.detector_version):
+                written.append(out)
+        return written
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> pd.DataFrame:
+        return pd.read_sql_query(sql, self.con, params=list(params))
+
+
+def record_report(results_db: Union[str, Path], detector: str, detector_version: str,
+                  report_path: Union[str, Path], df: pd.DataFrame) -> None:
+    """Upsert one written report into the results DB; a no-op when results_db is empty."""
+    if not results_db:
+        return
+    with ResultStore(results_db) as store:
+        n = store.upsert_report(detector, detector_version, report_path, df)
+    print(f"[results] {n} rows of {Path(report_path).name} stored in {results_db}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Query or export the study-wide detector results DB")
+    ap.add_argument("--db", default=str(DEFAULT_RESULTS_DB), help="Results DB")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="List stored reports")
+    ex = sub.add_parser("export", help="Rewrite report CSVs from the DB")
+    ex.add_argument("--out_root", default=str(Path("data") / "qualtrics"), help="Root for <team>/<wave>/results/")
+    q = sub.add_parser("query", help="Run one SQL query and print (or save) the result")
+    q.add_argument("sql")
+    q.add_argument("--out_csv", default="", help="Save the result here instead of printing it")
+    args = ap.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"[results] No results DB at {args.db}")
+        return 1
+    with ResultStore(args.db) as store:
+        if args.cmd == "list":
+            print(store.reports().to_string(index=False))
+        elif args.cmd == "export":
+            for path in store.export_all(args.out_root):
+                print(f"[results] Wrote {path}")
+        else:
+            df = store.query(args.sql)
+            if args.out_csv:
+                df.to_csv(args.out_csv, index=False)
+                print(f"[results] {len(df)} rows -> {args.out_csv}")
+            else:
+                print(df.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""
+gsme/scripts.py
+
+Import the numbered scripts (e.g. 17_sightengine_ai_detection.py) as modules.
+
+Their file names are not valid identifiers, so they are loaded from the repository
+root by path. Each is registered in sys.modules under its stem, so dataclasses and
+functions defined there pickle across process pools, and loaded only once.
+"""
+
+import sys
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from pathlib import Path
+from types import ModuleType
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_script(filename: str) -> ModuleType:
+    name = "gsme_script_" + Path(filename).stem
+    mod = sys.modules.get(name)
+    if mod is None:
+        spec = spec_from_loader(name, SourceFileLoader(name, str(REPO_ROOT / filename)))
+        mod = module_from_spec(spec)
+        sys.modules[name] = mod
+        try:
+            spec.loader.exec_module(mod)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    return mod
@@ -0,0 +1,402 @@
+"""
+gsme/standins.py
+
+Local stand-ins for the paid APIs, for offline tests and benchmarks.
+
+FakeSightengine replays recorded responses (data/test_fixtures/sightengine_responses.json,
+keyed by the sha256 of the uploaded image) from a real HTTP server on 127.0.0.1, with
+optional simulated latency and bursts of HTTP 429.
+
+    with FakeSightengine(latency_s=0.05, burst_429=(3, 2)) as fake:
+        detect_ai_generated(path, "u", "s", endpoint=fake.endpoint)
+
+FakeQualtricsFiles serves uploaded files the way Qualtrics' file-download endpoint does
+(X-API-TOKEN auth, Content-Disposition filename), with Range support and transfers that
+can be cut off part-way.
+
+    with FakeQualtricsFiles({("R_1", "F_1"): ("shot.png", data)}, token="t") as fake:
+        requests.get(fake.url("SV_1", "R_1", "F_1"), headers={"X-API-TOKEN": "t"})
+
+FakeVisionClient answers batch_annotate_images / web_detection in-process like a
+google.cloud.vision.ImageAnnotatorClient (fake_vision_module() stands in for the package
+itself where google-cloud-vision is not installed), and write_fake_trufor() lays out a TruFor
+checkout whose inference script writes random maps, so 16_ and 15_ can run end to end offline.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+SIGHTENGINE_FIXTURES = Path("data") / "test_fixtures" / "sightengine_responses.json"
+
+
+def load_sightengine_fixtures(path: Union[str, Path] = SIGHTENGINE_FIXTURES) -> Dict[str, Dict[str, Any]]:
+    """{sha256: {"file", "source", "response"}} as stored in the fixture file."""
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+class FakeSightengine:
+    """
+    Threaded HTTP stand-in for https://api.sightengine.com/1.0/check.json.
+
+    - latency_s: delay added to every response
+    - burst_429: (every, length) -> requests number k*every+1 .. k*every+length get 429
+    - retry_after: Retry-After header value sent with 429s
+    - auth: (api_user, api_secret) accepted; anything else gets 401
+    Unknown images get a success response with ai_generated=unknown_score.
+    """
+
+    def __init__(
+        self,
+        fixtures: Optional[Dict[str, Dict[str, Any]]] = None,
+        latency_s: float = 0.0,
+        burst_429: Optional[Tuple[int, int]] = None,
+        retry_after: str = "0.1",
+        auth: Tuple[str, str] = ("test_user", "test_secret"),
+        unknown_score: float = 0.01,
+    ) -> None:
+        self.fixtures = fixtures if fixtures is not None else load_sightengine_fixtures()
+        self.latency_s = latency_s
+        self.burst_429 = burst_429
+        self.retry_after = retry_after
+        self.auth = auth
+        self.unknown_score = unknown_score
+        self.n_requests = 0
+        self.n_429 = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/1.0/check.json"
+
+    def _respond(self, body: bytes, form: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        with self._lock:
+            self.n_requests += 1
+            n = self.n_requests
+        if (form.get("api_user"), form.get("api_secret")) != self.auth:
+            err = {"status": "failure", "error": {"type": "credentials_error", "message": "Incorrect API user or secret"}}
+            return 401, {}, json.dumps(err).encode()
+        if self.burst_429:
+            every, length = self.burst_429
+            if (n - 1) % every < length:
+                with self._lock:
+                    self.n_429 += 1
+                return 429, {"Retry-After": self.retry_after}, b'{"status": "failure", "error": {"message": "rate limit"}}'
+        media = _multipart_file(body)
+        entry = self.fixtures.get(hashlib.sha256(media).hexdigest())
+        if entry is not None:
+            resp = entry["response"]
+        else:
+            resp = {"status": "success", "request": {"id": "req_standin", "timestamp": time.time(), "operations": 1},
+                    "type": {"ai_generated": self.unknown_score}}
+        return 200, {"Content-Type": "application/json"}, json.dumps(resp).encode()
+
+    def __enter__(self) -> "FakeSightengine":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                with fake._lock:
+                    fake._in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake._in_flight)
+                try:
+                    body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                    if fake.latency_s:
+                        time.sleep(fake.latency_s)
+                    status, headers, out = fake._respond(body, _multipart_fields(body))
+                    self.send_response(status)
+                    for k, v in headers.items():
+                        self.send_header(k, v)
+                    self.send_header("Content-Length", str(len(out)))
+                    self.end_headers()
+                    self.wfile.write(out)
+                finally:
+                    with fake._lock:
+                        fake._in_flight -= 1
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeQualtricsFiles:
+    """
+    Threaded HTTP stand-in for GET /API/v3/surveys/<sid>/responses/<rid>/uploaded-files/<fid>.
+
+    - files: {(response_id, file_id): (filename, bytes)}; anything else gets 404
+    - token: X-API-TOKEN accepted; anything else gets 401
+    - cut_after: {file_id: n} -> the first request for that file sends only n bytes of
+      the body (with the full Content-Length) and drops the connection
+    - fail_first: file_ids whose first request gets a 503
+    - latency_s: delay added to every response
+    Honours "Range: bytes=<start>-" with a 206. Counters: n_requests, n_range_requests,
+    bytes_sent, max_in_flight.
+    """
+
+    def __init__(
+        self,
+        files: Dict[Tuple[str, str], Tuple[str, bytes]],
+        token: str = "test_token",
+        cut_after: Optional[Dict[str, int]] = None,
+        fail_first: Optional[Set[str]] = None,
+        latency_s: float = 0.0,
+    ) -> None:
+        self.files = files
+        self.token = token
+        self.cut_after = dict(cut_after or {})
+        self.fail_first = set(fail_first or ())
+        self.latency_s = latency_s
+        self.n_requests = 0
+        self.n_range_requests = 0
+        self.bytes_sent = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_root(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/API/v3"
+
+    def url(self, survey_id: str, response_id: str, file_id: str) -> str:
+        return f"{self.api_root}/surveys/{survey_id}/responses/{response_id}/uploaded-files/{file_id}"
+
+    def _respond(self, path: str, headers: Any) -> Tuple[int, Dict[str, str], bytes, Optional[int]]:
+        """(status, headers, body, bytes to send before dropping the connection or None)."""
+        with self._lock:
+            self.n_requests += 1
+        if headers.get("X-API-TOKEN") != self.token:
+            return 401, {}, b'{"meta": {"httpStatus": "401 - Unauthorized"}}', None
+        m = re.fullmatch(r"/API/v3/surveys/[^/]+/responses/([^/]+)/uploaded-files/([^/]+)", path)
+        entry = self.files.get((m.group(1), m.group(2))) if m else None
+        if entry is None:
+            return 404, {}, b'{"meta": {"httpStatus": "404 - Not Found"}}', None
+        file_id = m.group(2)
+        with self._lock:
+            if file_id in self.fail_first:
+                self.fail_first.discard(file_id)
+                return 503, {}, b'{"meta": {"httpStatus": "503 - Service Unavailable"}}', None
+            cut = self.cut_after.pop(file_id, None)
+        filename, data = entry
+        out_headers = {"Content-Type": "application/octet-stream",
+                       "Content-Disposition": f'attachment; filename="{filename}"', "Accept-Ranges": "bytes"}
+        rng = re.fullmatch(r"bytes=(\d+)-", headers.get("Range", "") or "")
+        if rng is None:
+            return 200, out_headers, data, cut
+        with self._lock:
+            self.n_range_requests += 1
+        start = int(rng.group(1))
+        if start >= len(data):
+            return 416, {"Content-Range": f"bytes */{len(data)}"}, b"", None
+        out_headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+        return 206, out_headers, data[start:], cut
+
+    def __enter__(self) -> "FakeQualtricsFiles":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                with fake._lock:
+                    fake._in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake._in_flight)
+                try:
+                    if fake.latency_s:
+                        time.sleep(fake.latency_s)
+                    status, headers, out, cut = fake._respond(self.path, self.headers)
+                    self.send_response(status)
+                    for k, v in headers.items():
+                        self.send_header(k, v)
+                    self.send_header("Content-Length", str(len(out)))
+                    if cut is not None:
+                        self.send_header("Connection", "close")
+                    self.end_headers()
+                    body = out if cut is None else out[:cut]
+                    self.wfile.write(body)
+                    with fake._lock:
+                        fake.bytes_sent += len(body)
+                    if cut is not None:
+                        self.wfile.flush()
+                        self.close_connection = True
+                finally:
+                    with fake._lock:
+                        fake._in_flight -= 1
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _multipart_parts(body: bytes):
+    boundary = body.split(b"\r\n", 1)[0]
+    for part in body.split(boundary)[1:]:
+        if b"\r\n\r\n" not in part:
+            continue
+        head, content = part.split(b"\r\n\r\n", 1)
+        yield head, content[:-2] if content.endswith(b"\r\n") else content
+
+
+def _multipart_fields(body: bytes) -> Dict[str, str]:
+    fields = {}
+    for head, content in _multipart_parts(body):
+        m = re.search(rb'name="([^"]+)"', head)
+        if m and b"filename=" not in head:
+            fields[m.group(1).decode()] = content.decode("utf-8", "replace")
+    return fields
+
+
+def _multipart_file(body: bytes) -> bytes:
+    for head, content in _multipart_parts(body):
+        if b"filename=" in head:
+            return content
+    return b""
+
+
+class FakeVisionClient:
+    """
+    In-process stand-in for google.cloud.vision.ImageAnnotatorClient (web detection only).
+
+    - matches: {sha256 of image bytes: [full-match URLs]}; other images have no matches
+    - errors: {sha256 of image bytes: message}; those images get a per-image error response
+    - latency_s: delay added to every call (one per batch)
+    Responses carry the attributes 16_ reads from the real messages, at most max_results
+    URLs per list. Counters: n_requests, n_images, max_in_flight; max_results holds the
+    limit each image was sent with.
+    """
+
+    def __init__(self, matches: Optional[Dict[str, List[str]]] = None, latency_s: float = 0.0,
+                 errors: Optional[Dict[str, str]] = None) -> None:
+        self.matches = matches or {}
+        self.errors = errors or {}
+        self.max_results: List[Optional[int]] = []
+        self.latency_s = latency_s
+        self.n_requests = 0
+        self.n_images = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _response(self, content: bytes, max_results: Optional[int] = None) -> SimpleNamespace:
+        digest = hashlib.sha256(content).hexdigest()
+        if digest in self.errors:
+            return SimpleNamespace(error=SimpleNamespace(message=self.errors[digest]), web_detection=None)
+        urls = self.matches.get(digest, [])[:max_results]
+        items = [SimpleNamespace(url=u, score=0.9) for u in urls]
+        pages = [SimpleNamespace(url=f"https://example.org/page{i}", score=0.5) for i in range(len(urls))]
+        wd = SimpleNamespace(full_matching_images=items, partial_matching_images=[], pages_with_matching_images=pages,
+                             visually_similar_images=[], web_entities=[], best_guess_labels=[])
+        return SimpleNamespace(error=SimpleNamespace(message=""), web_detection=wd)
+
+    def _call(self, contents: List[bytes], max_results: Optional[List[Optional[int]]] = None) -> List[SimpleNamespace]:
+        max_results = max_results or [None] * len(contents)
+        with self._lock:
+            self.n_requests += 1
+            self.n_images += len(contents)
+            self.max_results += max_results
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            return [self._response(c, n) for c, n in zip(contents, max_results)]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def batch_annotate_images(self, requests: List[Any]) -> SimpleNamespace:
+        return SimpleNamespace(responses=self._call([r.image.content for r in requests],
+                                                    [r.features[0].max_results for r in requests]))
+
+    def web_detection(self, image: Any, max_results: Optional[int] = None) -> SimpleNamespace:
+        return self._call([image.content], [max_results])[0]
+
+
+def fake_vision_module() -> ModuleType:
+    """
+    Stand-in for the google.cloud.vision module: the request types 16_ builds (Image,
+    Feature, AnnotateImageRequest) as plain attribute holders, and ImageAnnotatorClient =
+    FakeVisionClient. Install it as sys.modules["google.cloud.vision"] for the test.
+    """
+    vision = ModuleType("google.cloud.vision")
+
+    class Feature(SimpleNamespace):
+        Type = SimpleNamespace(WEB_DETECTION="WEB_DETECTION")
+
+    vision.Image = type("Image", (SimpleNamespace,), {})
+    vision.AnnotateImageRequest = type("AnnotateImageRequest", (SimpleNamespace,), {})
+    vision.Feature = Feature
+    vision.ImageAnnotatorClient = FakeVisionClient
+    return vision
+
+
+_FAKE_TRUFOR_SCRIPT = """\
+# Stand-in for TruFor's test_docker/src/trufor_test.py (see gsme/standins.py)
+import argparse, hashlib, time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ap = argparse.ArgumentParser()
+ap.add_argument("-gpu", default="-1")
+ap.add_argument("-in", dest="inp", required=True)
+ap.add_argument("-out", required=True)
+ap.add_argument("--save_np", action="store_true")
+args = ap.parse_args()
+time.sleep({latency_s!r})
+src = Path(args.inp)
+W, H = Image.open(src).size
+rng = np.random.default_rng(int(hashlib.sha256(src.read_bytes()).hexdigest()[:8], 16))
+out = Path(args.out)
+out.mkdir(parents=True, exist_ok=True)
+np.savez(out / (src.name + ".npz"), score=np.float32(rng.random()),
+         map=rng.random((H, W), dtype=np.float32), conf=rng.random((H, W), dtype=np.float32))
+"""
+
+
+def write_fake_trufor(root: Union[str, Path], latency_s: float = 0.0) -> Path:
+    """
+    Lay out a TruFor checkout under root that 15_ can run: test_docker/src/trufor_test.py
+    writes seeded random score/map/conf arrays at the image's size after latency_s, and
+    test_docker/weights holds a placeholder so no weights are downloaded. Returns root.
+    """
+    root = Path(root)
+    src = root / "test_docker" / "src"
+    src.mkdir(parents=True, exist_ok=True)
+    (src / "trufor_test.py").write_text(_FAKE_TRUFOR_SCRIPT.format(latency_s=latency_s), encoding="utf-8")
+    weights = root / "test_docker" / "weights"
+    weights.mkdir(parents=True, exist_ok=True)
+    (weights / "trufor.pth.tar").write_bytes(b"placeholder")
+    return root
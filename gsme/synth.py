@@ -0,0 +1,411 @@
+"""
+gsme/synth.py
+
+Synthetic screen-time screenshots with known values, for load and accuracy tests
+(26_synth_screenshots.py renders whole waves with it; 25_benchmark.py renders inputs).
+
+    spec = ShotSpec(kind="avg", device="iOS", width=1170, height=2532, total_minutes=430,
+                    app_minutes={"instagram": 35, ...}, seed=7,
+                    tamper=Tamper(field="total", new_minutes=250))
+    data, info = render_shot(spec)      # encoded PNG/JPEG bytes; info["tamper_box"] = (x, y, w, h)
+
+Screens:
+- iOS avg: Screen Time "Week" view with "Last Week's Average", the weekly bar chart,
+  categories and the Most Used list (total_minutes is the daily average shown)
+- iOS app: the Most Used list further down the same view (app_minutes are shown per app)
+- Android avg: Digital Wellbeing Dashboard for target_date (total_minutes for that day)
+- Android app: "App activity details" for target_date
+The four study apps (APPS) appear with their minutes when > 0, mixed with filler apps.
+
+Tampering re-draws one value (the total or an app's time) with new_minutes after
+rendering: "retype" covers the digits with the local background and redraws them aligned
+like the original, "shifted" redraws them 1-3 px off with a slightly different size and
+colour. Edited JPEGs are compressed twice (once before and once after the edit), and an
+edited PNG can carry an editor "Software" tag, as files re-saved by photo editors do.
+
+Drawn with Pillow's built-in scalable font unless font_path points to a TrueType font
+(e.g. SF Pro or Roboto, for closer OCR behaviour).
+"""
+
+import io
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, PngImagePlugin
+
+APPS = ("instagram", "facebook", "tiktok", "twitter")
+APP_LABELS = {"instagram": "Instagram", "facebook": "Facebook", "tiktok": "TikTok", "twitter": "X"}
+FILLER_APPS = ("WhatsApp", "YouTube", "Safari", "Chrome", "Messages", "Gmail", "Maps", "Spotify", "Netflix", "Books")
+APP_COLORS = {"Instagram": (225, 48, 108), "Facebook": (24, 119, 242), "TikTok": (20, 20, 20), "X": (15, 15, 15),
+              "WhatsApp": (37, 211, 102), "YouTube": (255, 0, 0), "Safari": (0, 122, 255), "Chrome": (66, 133, 244),
+              "Messages": (52, 199, 89), "Gmail": (234, 67, 53), "Maps": (52, 168, 83), "Spotify": (30, 215, 96),
+              "Netflix": (229, 9, 20), "Books": (255, 149, 0)}
+
+# Common screenshot resolutions (portrait, pixels)
+IOS_RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "iPhone 12-14": (1170, 2532),
+    "iPhone 14 Pro/15": (1179, 2556),
+    "iPhone 14 Plus/15 Plus": (1284, 2778),
+    "iPhone 15 Pro Max": (1290, 2796),
+    "iPhone X/11 Pro": (1125, 2436),
+    "iPhone XR/11": (828, 1792),
+    "iPhone SE": (750, 1334),
+}
+ANDROID_RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "FHD+ 20:9": (1080, 2400),
+    "FHD+ 19.5:9": (1080, 2340),
+    "FHD+ 18.5:9": (1080, 2220),
+    "QHD+ 20:9": (1440, 3200),
+    "HD+ 20:9": (720, 1600),
+}
+
+TAMPER_MODES = ("retype", "shifted")
+EDITOR_SOFTWARE = ("Adobe Photoshop 25.0", "Snapseed", "PicsArt", "GIMP 2.10.36")
+
+Box = Tuple[int, int, int, int]  # x, y, w, h
+
+
+@dataclass
+class Tamper:
+    field: str  # "total" or one of APPS
+    new_minutes: int
+    mode: str = "retype"
+
+
+@dataclass
+class ShotSpec:
+    kind: str  # "avg" or "app"
+    device: str  # "iOS" or "Android"
+    width: int
+    height: int
+    total_minutes: int = 0
+    app_minutes: Dict[str, int] = field(default_factory=dict)
+    target_date: Optional[str] = None  # Android: the day shown (YYYY-MM-DD)
+    dark: bool = False
+    fmt: str = "PNG"
+    quality: int = 92
+    seed: int = 0
+    tamper: Optional[Tamper] = None
+    editor_tag: bool = False
+
+
+def random_values(rng: np.random.Generator) -> Tuple[int, Dict[str, int]]:
+    """Plausible (total minutes, {app: minutes}); about 30% of study apps are unused (0)."""
+    total = int(np.clip(rng.lognormal(np.log(240), 0.5), 10, 960))
+    apps = {a: int(np.clip(rng.lognormal(np.log(35), 0.8), 1, total)) if rng.random() < 0.7 else 0 for a in APPS}
+    return total, apps
+
+
+def random_spec(seed: int, device: str, width: int, height: int, fmt: str = "PNG", kind: str = "avg",
+                target_date: Optional[str] = None) -> ShotSpec:
+    """Untampered ShotSpec with random values and theme, reproducible from seed."""
+    rng = np.random.default_rng([seed, 1])
+    total, apps = random_values(rng)
+    return ShotSpec(kind=kind, device=device, width=width, height=height, total_minutes=total, app_minutes=apps,
+                    target_date=target_date, dark=bool(rng.random() < 0.5), fmt=fmt, seed=seed)
+
+
+# ----------------------------
+# Value formats
+# ----------------------------
+def ios_duration(minutes: int) -> str:
+    h, m = divmod(int(minutes), 60)
+    return f"{h}h {m}m" if h and m else (f"{h}h" if h else f"{m}m")
+
+
+def android_duration(minutes: int, long_minutes: bool = False) -> str:
+    h, m = divmod(int(minutes), 60)
+    if not h:
+        return f"{m} minute{'s' if m != 1 else ''}" if long_minutes else f"{m} min"
+    return f"{h} hr, {m} min" if m else f"{h} hr"
+
+
+@lru_cache(maxsize=256)
+def _font(size: int, font_path: Optional[str] = None) -> ImageFont.ImageFont:
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1: fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+class _Canvas:
+    """ImageDraw plus a point scale and a record of where each value was drawn."""
+
+    def __init__(self, spec: ShotSpec, pt_width: float, bg: Tuple[int, int, int], font_path: Optional[str]) -> None:
+        self.img = Image.new("RGB", (spec.width, spec.height), bg)
+        self.draw = ImageDraw.Draw(self.img)
+        self.u = spec.width / pt_width
+        self.font_path = font_path
+        self.values: Dict[str, Tuple[Box, str, int, Tuple[int, int, int], str]] = {}  # field -> box, text, size, fill, anchor
+
+    def font(self, pt: float) -> ImageFont.ImageFont:
+        return _font(max(6, int(round(pt * self.u))), self.font_path)
+
+    def text(self, x: float, y: float, s: str, pt: float, fill, anchor: str = "l", value: Optional[str] = None) -> None:
+        """Draw s with its top at y; anchor l/c/r says whether x is its left, centre or right edge."""
+        u = self.u
+        font = self.font(pt)
+        w = self.draw.textlength(s, font=font)
+        x0 = x * u - (w / 2 if anchor == "c" else w if anchor == "r" else 0)
+        self.draw.text((x0, y * u), s, fill=fill, font=font)
+        if value is not None:
+            l, t, r, b = self.draw.textbbox((x0, y * u), s, font=font)
+            self.values[value] = ((int(l), int(t), int(r - l), int(b - t)), s, max(6, int(round(pt * u))), fill, anchor)
+
+    def rect(self, x0: float, y0: float, x1: float, y1: float, fill, radius: float = 0) -> None:
+        u = self.u
+        if radius:
+            self.draw.rounded_rectangle([x0 * u, y0 * u, x1 * u, y1 * u], radius=radius * u, fill=fill)
+        else:
+            self.draw.rectangle([x0 * u, y0 * u, x1 * u, y1 * u], fill=fill)
+
+    def circle(self, cx: float, cy: float, r: float, fill) -> None:
+        u = self.u
+        self.draw.ellipse([(cx - r) * u, (cy - r) * u, (cx + r) * u, (cy + r) * u], fill=fill)
+
+
+def _app_rows(spec: ShotSpec, rng: np.random.Generator, n_slots: int) -> List[Tuple[str, str, int]]:
+    """(label, field or "", minutes) sorted by minutes: study apps with minutes > 0, fillers in the remaining slots."""
+    rows = [(APP_LABELS[a], a, int(spec.app_minutes.get(a, 0))) for a in APPS if spec.app_minutes.get(a, 0) > 0]
+    fillers = [f for f in FILLER_APPS if not (spec.device == "iOS" and f == "Chrome")
+               and not (spec.device == "Android" and f in ("Safari", "Messages", "Books"))]
+    for name in rng.choice(fillers, size=min(max(0, n_slots - len(rows)), len(fillers)), replace=False):
+        rows.append((str(name), "", int(rng.integers(1, 240))))
+    return sorted(rows, key=lambda r: -r[2])
+
+
+def _day_bars(rng: np.random.Generator, mean_minutes: float) -> List[float]:
+    return [float(max(5.0, mean_minutes * rng.uniform(0.5, 1.5))) for _ in range(7)]
+
+
+# ----------------------------
+# iOS
+# ----------------------------
+def _ios_palette(dark: bool) -> Dict[str, Tuple[int, int, int]]:
+    if dark:
+        return {"bg": (0, 0, 0), "card": (28, 28, 30), "text": (255, 255, 255), "sub": (142, 142, 147),
+                "seg": (44, 44, 46), "sel": (99, 99, 102), "grid": (58, 58, 60), "track": (72, 72, 74)}
+    return {"bg": (242, 242, 247), "card": (255, 255, 255), "text": (0, 0, 0), "sub": (110, 110, 115),
+            "seg": (227, 227, 232), "sel": (255, 255, 255), "grid": (215, 215, 220), "track": (210, 210, 215)}
+
+
+def _ios_list(c: _Canvas, p, rows, y: float, rng: np.random.Generator, max_y: float) -> None:
+    blue = (10, 132, 255)
+    c.text(24, y, "MOST USED", 13, p["sub"])
+    c.text(366, y, "SHOW CATEGORIES", 13, blue, anchor="r")
+    y += 22
+    n = max(1, min(len(rows), int((max_y - y) // 64)))
+    c.rect(16, y, 374, y + 64 * n + 4, p["card"], radius=12)
+    top = rows[0][2] if rows else 1
+    for label, fld, minutes in rows[:n]:
+        c.rect(28, y + 14, 64, y + 50, APP_COLORS.get(label, tuple(int(v) for v in rng.integers(40, 220, 3))), radius=9)
+        c.text(78, y + 12, label, 18, p["text"])
+        bar = 170 * minutes / max(top, 1)
+        c.rect(78, y + 40, 78 + max(bar, 6), y + 45, p["track"], radius=2)
+        c.text(84 + max(bar, 6), y + 35, ios_duration(minutes), 14, p["sub"], value=fld or None)
+        c.text(354, y + 22, ">", 18, p["sub"])
+        y += 64
+
+
+def _render_ios(spec: ShotSpec, rng: np.random.Generator, font_path: Optional[str]) -> _Canvas:
+    p = _ios_palette(spec.dark)
+    c = _Canvas(spec, 390, p["bg"], font_path)
+    max_y = spec.height / c.u - 20
+    blue, teal, orange, green = (10, 132, 255), (90, 200, 250), (255, 159, 10), (48, 209, 88)
+    c.text(32, 14, f"{int(rng.integers(8, 23))}:{int(rng.integers(0, 60)):02d}", 16, p["text"])
+    c.rect(16, 50, 374, 82, p["seg"], radius=9)
+    c.rect(18, 52, 194, 80, p["sel"], radius=8)
+    c.text(106, 57, "Week", 15, p["text"], anchor="c")
+    c.text(284, 57, "Day", 15, p["text"], anchor="c")
+    if spec.kind == "app":
+        rows = _app_rows(spec, rng, n_slots=min(8, int((max_y - 172) // 64)))
+        c.text(24, 100, "Screen Time", 28, p["text"])
+        _ios_list(c, p, rows, 150, rng, max_y)
+        return c
+
+    rows = _app_rows(spec, rng, n_slots=8)  # the list starts below the chart; study apps may be cut off
+    c.text(24, 100, "SCREEN TIME", 13, p["sub"])
+    c.text(366, 100, "SHOW THIS WEEK", 13, blue, anchor="r")
+    c.rect(16, 122, 374, 492, p["card"], radius=12)
+    c.text(32, 136, "Last Week's Average", 17, p["sub"])
+    c.text(32, 160, ios_duration(spec.total_minutes), 40, p["text"], value="total")
+    c.text(358, 170, f"{int(rng.integers(1, 40))}% from last week", 15, p["sub"], anchor="r")
+    bars = _day_bars(rng, spec.total_minutes)
+    shares = rng.dirichlet([3, 2, 2])
+    top = max(60.0, np.ceil(max(bars + [spec.total_minutes]) / 300) * 300)
+    y0, y1 = 225.0, 340.0
+    for k, lab in enumerate(("10h" if top == 600 else ios_duration(int(top)), "", "0")):
+        yy = y0 + (y1 - y0) * k / 2
+        c.rect(32, yy, 330, yy + 0.6, p["grid"])
+        if lab:
+            c.text(336, yy - 8, lab, 12, p["sub"])
+    for d, lab in enumerate("MTWTFSS"):
+        x = 40 + d * 41
+        h = (y1 - y0) * bars[d] / top
+        split = rng.dirichlet(shares * 40)
+        yy = y1
+        for frac, col in zip(split, (blue, teal, orange)):
+            c.rect(x, yy - h * frac, x + 26, yy, col)
+            yy -= h * frac
+        c.text(x + 13, y1 + 6, lab, 12, p["sub"], anchor="c")
+    avg_y = y1 - (y1 - y0) * spec.total_minutes / top
+    for xx in range(32, 330, 8):
+        c.rect(xx, avg_y, xx + 4, avg_y + 1, green)
+    c.text(336, avg_y - 8, "avg", 12, green)
+    week = spec.total_minutes * 7
+    for k, (name, col) in enumerate((("Social", blue), ("Other", teal), ("Productivity", orange))):
+        c.text(32 + k * 112, 372, name, 16, col)
+        c.text(32 + k * 112, 394, ios_duration(int(week * shares[k])), 16, p["text"])
+    c.rect(32, 428, 358, 428.6, p["grid"])
+    c.text(32, 446, "Total Screen Time", 17, p["text"])
+    c.text(358, 446, ios_duration(week), 17, p["sub"], anchor="r")
+    c.text(24, 506, f"Updated today at {int(rng.integers(1, 13))}:{int(rng.integers(0, 60)):02d} PM", 13, p["sub"])
+    _ios_list(c, p, rows, 540, rng, max_y)
+    return c
+
+
+# ----------------------------
+# Android (Digital Wellbeing)
+# ----------------------------
+def _android_palette(dark: bool) -> Dict[str, Tuple[int, int, int]]:
+    if dark:
+        return {"bg": (18, 18, 20), "head": (30, 30, 34), "text": (236, 236, 240), "sub": (170, 170, 178),
+                "chip": (60, 56, 74), "bar": (80, 80, 88), "sel": (208, 188, 255), "grid": (60, 60, 66)}
+    return {"bg": (251, 248, 253), "head": (240, 238, 244), "text": (28, 27, 31), "sub": (96, 94, 102),
+            "chip": (232, 222, 248), "bar": (200, 198, 205), "sel": (70, 66, 80), "grid": (218, 216, 222)}
+
+
+def _android_rows(c: _Canvas, p, rows, y: float, step: float, max_y: float) -> None:
+    for label, fld, minutes in rows:
+        if y + step > max_y:
+            break
+        c.circle(44, y + step / 2 - 4, 20, APP_COLORS.get(label, (120, 120, 120)))
+        c.text(84, y + 8, label, 21, p["text"])
+        c.text(84, y + 36, android_duration(minutes, long_minutes=True), 16, p["sub"], value=fld or None)
+        c.rect(330, y + 6, 331, y + step - 16, p["grid"])
+        cx, cy = 366, y + step / 2 - 4
+        c.draw.polygon([((cx - 7) * c.u, (cy - 10) * c.u), ((cx + 7) * c.u, (cy - 10) * c.u), (cx * c.u, cy * c.u)],
+                       outline=p["sub"], width=max(1, int(c.u * 1.5)))
+        c.draw.polygon([(cx * c.u, cy * c.u), ((cx - 7) * c.u, (cy + 10) * c.u), ((cx + 7) * c.u, (cy + 10) * c.u)],
+                       outline=p["sub"], width=max(1, int(c.u * 1.5)))
+        y += step
+
+
+def _render_android(spec: ShotSpec, rng: np.random.Generator, font_path: Optional[str]) -> _Canvas:
+    p = _android_palette(spec.dark)
+    c = _Canvas(spec, 412, p["bg"], font_path)
+    max_y = spec.height / c.u - 24
+    day = date.fromisoformat(spec.target_date) if spec.target_date else date(2026, 1, 9)
+    rows = _app_rows(spec, rng, n_slots=7 if spec.kind == "avg" else min(9, int((max_y - 250) // 96)))
+    clock = f"{int(rng.integers(7, 23)):02d}:{int(rng.integers(0, 60)):02d}"
+    if spec.kind == "app":
+        c.rect(0, 0, 412, 184, p["head"])
+        c.text(28, 14, clock, 16, p["text"])
+        c.circle(40, 132, 24, p["chip"])
+        c.text(40, 120, "<", 22, p["text"], anchor="c")
+        c.text(84, 116, "App activity details", 26, p["text"])
+        c.text(206, 194, f"{day:%a} {day.day} {day:%b}", 19, p["text"], anchor="c")
+        c.text(60, 194, "<", 19, p["sub"])
+        c.text(352, 194, ">", 19, p["sub"], anchor="r")
+        _android_rows(c, p, rows, 250, 96, max_y)
+        return c
+
+    c.text(28, 14, clock, 16, p["text"])
+    c.text(22, 62, "<-", 20, p["text"])
+    c.text(388, 62, ":", 22, p["text"], anchor="r")
+    c.text(28, 160, "Dashboard", 36, p["text"])
+    c.rect(130, 220, 282, 256, p["chip"], radius=18)
+    c.text(206, 228, "Screen time  v", 16, p["text"], anchor="c")
+    c.text(206, 282, android_duration(spec.total_minutes), 30, p["text"], anchor="c", value="total")
+    c.text(206, 326, f"{day:%a}, {day:%b} {day.day}", 16, p["sub"], anchor="c")
+    bars = _day_bars(rng, spec.total_minutes)
+    sel = (day.weekday() + 1) % 7  # chart runs Sun..Sat
+    bars[sel] = float(spec.total_minutes)
+    top = max(60.0, np.ceil(max(bars) / 60) * 60)
+    y0, y1 = 370.0, 450.0
+    for k in range(3):
+        yy = y0 + (y1 - y0) * k / 2
+        c.rect(24, yy, 360, yy + 0.6, p["grid"])
+        c.text(366, yy - 8, f"{int(top * (2 - k) / 2 / 60)}h", 12, p["sub"])
+    for d, lab in enumerate(("Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat")):
+        x = 34 + d * 47
+        h = (y1 - y0) * bars[d] / top
+        c.rect(x, y1 - h, x + 26, y1, p["sel"] if d == sel else p["bar"], radius=2)
+        c.text(x + 13, y1 + 6, lab, 13, p["sub"], anchor="c")
+    c.text(206, 500, f"{day:%a}, {day:%b} {day.day}", 17, p["text"], anchor="c")
+    c.text(72, 500, "<", 17, p["sub"])
+    c.text(340, 500, ">", 17, p["sub"], anchor="r")
+    _android_rows(c, p, rows, 540, 80, max_y)
+    return c
+
+
+# ----------------------------
+# Tampering and encoding
+# ----------------------------
+def _tamper(c: _Canvas, spec: ShotSpec, rng: np.random.Generator) -> Optional[Box]:
+    t = spec.tamper
+    if t is None or t.field not in c.values:
+        return None
+    (x, y, w, h), _, size, fill, anchor = c.values[t.field]
+    if t.field == "total":
+        text = ios_duration(t.new_minutes) if spec.device == "iOS" else android_duration(t.new_minutes)
+    else:
+        text = ios_duration(t.new_minutes) if spec.device == "iOS" else android_duration(t.new_minutes, True)
+    pad = max(2, size // 8)
+    bg = c.img.getpixel((max(0, x - pad - 1), min(c.img.height - 1, y + h // 2)))
+    c.draw.rectangle([x - pad, y - pad, x + w + pad, y + h + pad], fill=bg)
+    font = _font(size, c.font_path)
+    if t.mode == "shifted":
+        font = _font(size + int(rng.choice([-1, 1])), c.font_path)
+        fill = tuple(int(np.clip(v + rng.integers(-18, 19), 0, 255)) for v in fill)
+        dx, dy = (int(v) for v in rng.integers(1, 4, 2) * rng.choice([-1, 1], 2))
+        x0 = x + dx
+    else:
+        dy = 0
+        new_w = c.draw.textlength(text, font=font)
+        x0 = x + (w - new_w) / 2 if anchor == "c" else x + w - new_w if anchor == "r" else x
+    # textbbox is offset from the draw origin by the font's top bearing; keep the glyph tops where they were
+    l, top, r, b = c.draw.textbbox((0, 0), text, font=font)
+    c.draw.text((x0 - l, y - top + dy), text, fill=fill, font=font)
+    nl, nt, nr, nb = c.draw.textbbox((x0 - l, y - top + dy), text, font=font)
+    bx0, by0 = min(x - pad, int(nl)), min(y - pad, int(nt))
+    bx1, by1 = max(x + w + pad, int(nr)), max(y + h + pad, int(nb))
+    return (int(bx0), int(by0), int(bx1 - bx0), int(by1 - by0))
+
+
+def _encode(img: Image.Image, fmt: str, quality: int, software: str = "") -> bytes:
+    out = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(out, format="JPEG", quality=quality, **({"exif": _exif_software(software)} if software else {}))
+    else:
+        info = None
+        if software:
+            info = PngImagePlugin.PngInfo()
+            info.add_text("Software", software)
+        img.save(out, format="PNG", pnginfo=info)
+    return out.getvalue()
+
+
+def _exif_software(software: str) -> bytes:
+    exif = Image.Exif()
+    exif[0x0131] = software  # Software
+    return exif.tobytes()
+
+
+def render_shot(spec: ShotSpec, font_path: Optional[str] = None) -> Tuple[bytes, Dict[str, object]]:
+    """Encoded screenshot for spec, and info: tamper_box (x, y, w, h) or None, software tag."""
+    rng = np.random.default_rng(spec.seed)
+    c = _render_ios(spec, rng, font_path) if spec.device == "iOS" else _render_android(spec, rng, font_path)
+    if spec.tamper is not None and spec.fmt == "JPEG":
+        # the editor opened a JPEG the phone (or the upload) had already compressed
+        c.img = Image.open(io.BytesIO(_encode(c.img, "JPEG", int(rng.integers(85, 96))))).convert("RGB")
+        c.draw = ImageDraw.Draw(c.img)
+    box = _tamper(c, spec, rng)
+    software = str(rng.choice(EDITOR_SOFTWARE)) if spec.editor_tag else ""
+    return _encode(c.img, spec.fmt, spec.quality, software), {"tamper_box": box, "software": software,
+                                                              "values": {k: v[0] for k, v in c.values.items()}}
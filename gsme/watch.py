@@ -0,0 +1,218 @@
+"""
+gsme/watch.py
+
+Notice screenshots as they land in upload folders (data/qualtrics/<team>/<wave>/uploads/).
+
+    watcher = UploadWatcher(roots, settle_s=2.0)
+    watcher.prime()                              # optional: ignore files already there
+    for path in watcher.stable_files(stop):      # blocks until stop is set
+        queue.put(path)
+
+On Linux the folders (and every <response_id>/ folder created under them) are watched
+with inotify, so a new file is seen within milliseconds; elsewhere, or if inotify is
+unavailable, they are polled every poll_s. A full rescan also runs every rescan_s to
+catch anything inotify missed. A file is only yielded once its size and mtime have not
+changed for settle_s and, for PNG/JPEG, it ends with the format's end marker (a stalled
+upload is given incomplete_grace_s before it is yielded anyway, so the detectors record
+it as broken). A file rewritten later is yielded again.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".heic", ".bmp", ".tif", ".tiff"}
+
+# inotify(7) constants
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_Q_OVERFLOW = 0x4000
+_IN_ISDIR = 0x40000000
+_IN_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT = struct.Struct("iIII")
+
+# Trailers a complete file ends with (a stalled upload that is still open has none yet)
+_TRAILERS = {".png": b"IEND\xaeB`\x82", ".jpg": b"\xff\xd9", ".jpeg": b"\xff\xd9"}
+
+
+def looks_complete(path: Path) -> bool:
+    """False for PNG/JPEG files missing their end marker; True otherwise."""
+    trailer = _TRAILERS.get(path.suffix.lower())
+    if trailer is None:
+        return True
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 64))
+            return trailer in f.read()
+    except OSError:
+        return False
+
+
+class Inotify:
+    """Minimal libc inotify: watch directories, read back the paths that changed."""
+
+    def __init__(self) -> None:
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is Linux-only")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, Path] = {}
+        self.overflowed = False
+
+    def add(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), _IN_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._dirs[wd] = directory
+
+    def read(self, timeout: float) -> Tuple[List[Path], List[Path]]:
+        """(changed files, new directories) seen within timeout seconds."""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return [], []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return [], []
+        files, dirs = [], []
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, _, name_len = _EVENT.unpack_from(data, pos)
+            name = data[pos + _EVENT.size: pos + _EVENT.size + name_len].rstrip(b"\0")
+            pos += _EVENT.size + name_len
+            if mask & _IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None or not name:
+                continue
+            path = parent / os.fsdecode(name)
+            (dirs if mask & _IN_ISDIR else files).append(path)
+        return files, dirs
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class UploadWatcher:
+    def __init__(self, roots: Iterable[Union[str, Path]], settle_s: float = 2.0, poll_s: float = 5.0,
+                 rescan_s: float = 60.0, incomplete_grace_s: float = 120.0,
+                 suffixes: Iterable[str] = IMAGE_SUFFIXES, use_inotify: bool = True) -> None:
+        self.roots = [Path(r) for r in roots]
+        self.settle_s = settle_s
+        self.incomplete_grace_s = incomplete_grace_s
+        self.poll_s = poll_s
+        self.rescan_s = rescan_s
+        self.suffixes = {s.lower() for s in suffixes}
+        self.seen: Dict[Path, Tuple[int, int]] = {}  # yielded files -> (size, mtime_ns) at the time
+        self._pending: Dict[Path, Tuple[int, int, float]] = {}  # (size, mtime_ns, unchanged since)
+        self._watched: Set[Path] = set()
+        self.inotify: Optional[Inotify] = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError):
+                self.inotify = None
+        self.mode = "inotify" if self.inotify is not None else "poll"
+
+    def _wanted(self, path: Path) -> bool:
+        return path.suffix.lower() in self.suffixes and not path.name.startswith(".")
+
+    def _watch_tree(self, directory: Path) -> List[Path]:
+        """Add inotify watches under directory; returns the files already in it."""
+        files = []
+        for dirpath, _, filenames in os.walk(directory):
+            d = Path(dirpath)
+            if self.inotify is not None and d not in self._watched:
+                try:
+                    self.inotify.add(d)
+                    self._watched.add(d)
+                except OSError:
+                    pass  # e.g. out of watches: the periodic rescan still covers it
+            files += [d / f for f in filenames]
+        return files
+
+    def scan(self) -> List[Path]:
+        """Every wanted file under the roots (also (re)arms inotify watches)."""
+        files = []
+        for root in self.roots:
+            if root.is_dir():
+                files += self._watch_tree(root)
+        return [f for f in files if self._wanted(f)]
+
+    def prime(self) -> int:
+        """Treat the files present now as already processed; returns how many."""
+        for path in self.scan():
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            self.seen[path] = (st.st_size, st.st_mtime_ns)
+        return len(self.seen)
+
+    def check(self, paths: Iterable[Path], now: float) -> List[Path]:
+        """The given files that are new or changed and have been stable for settle_s."""
+        ready = []
+        for path in set(paths):
+            if not self._wanted(path):
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                self._pending.pop(path, None)  # deleted or renamed away
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if self.seen.get(path) == sig:
+                self._pending.pop(path, None)
+                continue
+            prev = self._pending.get(path)
+            if prev is None or prev[:2] != sig:
+                self._pending[path] = (*sig, now)
+            elif sig[0] > 0 and now - prev[2] >= self.settle_s and (
+                    now - prev[2] >= self.incomplete_grace_s or looks_complete(path)):
+                del self._pending[path]
+                self.seen[path] = sig
+                ready.append(path)
+        return sorted(ready)
+
+    def stable_files(self, stop: threading.Event) -> Iterator[Path]:
+        last_rescan = 0.0
+        try:
+            while not stop.is_set():
+                now = time.monotonic()
+                if now - last_rescan >= (self.rescan_s if self.inotify is not None else self.poll_s):
+                    candidates = self.scan()
+                    last_rescan = now
+                elif self.inotify is not None:
+                    timeout = min(self.settle_s if self._pending else self.poll_s, 0.5)
+                    files, dirs = self.inotify.read(timeout)
+                    for d in dirs:
+                        files += self._watch_tree(d)  # files may land before the watch is added
+                    if self.inotify.overflowed:
+                        self.inotify.overflowed = False
+                        last_rescan = 0.0
+                    candidates = files
+                else:
+                    stop.wait(min(self.settle_s if self._pending else self.poll_s, 0.5))
+                    candidates = []
+                for path in self.check(list(candidates) + list(self._pending), time.monotonic()):
+                    yield path
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
@@ -0,0 +1,459 @@
+"""
+gsme/workqueue.py
+
+Lease-based work queue in one SQLite file, so detector workers on several machines can
+share one team's workload (21_run_detectors.py --queue).
+
+    q = WorkQueue("/shared/gsme_queue.sqlite")
+    q.enqueue([(("trufor", h), "trufor", {"path": "...", "content_hash": h}, version), ...])
+    Worker(q, {"trufor": run_trufor, "web": run_web},
+           lanes=[(("trufor",), 2), (("web",), 8)]).run()          # on every node
+    q.result(("trufor", h))                                         # result, or raises TaskFailed
+
+How it stays consistent with many workers:
+- claim() moves a pending task to "leased" inside one write transaction (BEGIN IMMEDIATE),
+  with an owner and an expiry, and counts the attempt
+- each Worker renews the leases of the tasks it is running every lease_s / 3 (heartbeat);
+  a worker that dies stops renewing, and once its leases expire the tasks are claimed by
+  someone else (or fail, after max_attempts)
+- complete() and fail() only apply while the caller still holds the lease, so a worker
+  that was given up for dead cannot overwrite the result of the task's new owner
+- a handler exception is retried until max_attempts, then the task is "failed" with the
+  last error; enqueueing the same key again resets failed tasks and tasks whose version
+  (the parameters the result depends on) changed, and keeps the others' results
+
+The DB has to be on a filesystem every node can lock (a local disk, or NFSv4 / SMB with
+working byte-range locks). It uses the rollback journal, not WAL: WAL needs memory
+shared between the processes and does not work across machines.
+
+Live view of a running queue (per detector and per node, tasks/min over the last minute):
+
+    python -m gsme.workqueue status /shared/gsme_queue.sqlite --watch 10
+"""
+
+import argparse
+import json
+import math
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import pandas as pd
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+DEFAULT_LEASE_S = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    key TEXT PRIMARY KEY, detector TEXT NOT NULL, payload TEXT NOT NULL, version TEXT NOT NULL,
+    state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,
+    owner TEXT, lease_expires REAL, result TEXT, error TEXT,
+    enqueued_at REAL NOT NULL, started_at REAL, finished_at REAL, seconds REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks (state, detector, enqueued_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks (finished_at);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY, node TEXT NOT NULL, pid INTEGER NOT NULL, detectors TEXT NOT NULL,
+    started_at REAL NOT NULL, heartbeat_at REAL NOT NULL, stopped_at REAL
+);
+"""
+
+
+class TaskFailed(RuntimeError):
+    """The task ran out of attempts (or was never run); the message is its last error."""
+
+
+@dataclass
+class Task:
+    key: Tuple
+    detector: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+def _encode_key(key: Hashable) -> str:
+    return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+
+def _decode_key(text: str) -> Any:
+    value = json.loads(text)
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _plain(value: Any) -> Any:
+    """json.dumps default: numpy scalars/arrays to Python, anything else to str."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _nan_to_none(value: Any) -> Any:
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _nan_to_none(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_nan_to_none(v) for v in value]
+    return value
+
+
+class WorkQueue:
+    def __init__(self, db_path: Union[str, Path], lease_s: float = DEFAULT_LEASE_S,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, timeout_s: float = 60.0) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        # One connection per process, shared by its worker threads under self._lock
+        self.con = sqlite3.connect(str(self.db_path), timeout=timeout_s, isolation_level=None,
+                                   check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self.con.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self) -> "WorkQueue":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction; takes the DB lock up front so concurrent claims never interleave."""
+        with self._lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.con
+            except BaseException:
+                self.con.execute("ROLLBACK")
+                raise
+            self.con.execute("COMMIT")
+
+    def _read(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        with self._lock:
+            return self.con.execute(sql, list(params)).fetchall()
+
+    def _frame(self, sql: str, params: Sequence[Any] = ()) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self.con, params=list(params))
+
+    # -- producer --------------------------------------------------------------------
+
+    def enqueue(self, tasks: Iterable[Tuple[Hashable, str, Dict[str, Any], str]]) -> int:
+        """
+        Add (key, detector, payload, version) tasks; returns how many will (re)run.
+
+        Existing keys keep their state and result unless they failed or their version
+        changed, in which case they are reset to pending with a fresh attempt count.
+        """
+        now = time.time()
+        rows = [(_encode_key(k), d, json.dumps(p, default=_plain), str(v), PENDING, self.max_attempts, now)
+                for k, d, p, v in tasks]
+        with self._tx() as con:
+            before = con.total_changes
+            con.executemany(
+                """INSERT INTO tasks (key, detector, payload, version, state, max_attempts, enqueued_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET
+                       payload = excluded.payload, version = excluded.version, state = excluded.state,
+                       attempts = 0, max_attempts = excluded.max_attempts, owner = NULL, lease_expires = NULL,
+                       result = NULL, error = NULL, enqueued_at = excluded.enqueued_at,
+                       started_at = NULL, finished_at = NULL, seconds = NULL
+                   WHERE tasks.state = 'failed' OR tasks.version != excluded.version""",
+                rows,
+            )
+            return con.total_changes - before
+
+    # -- worker side -----------------------------------------------------------------
+
+    def register(self, worker_id: str, detectors: Sequence[str]) -> None:
+        now = time.time()
+        with self._tx() as con:
+            con.execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?, ?, NULL)",
+                        (worker_id, socket.gethostname(), os.getpid(), ",".join(detectors), now, now))
+
+    def _expire(self, con: sqlite3.Connection, now: float) -> None:
+        """Leases past their expiry go back to pending, or to failed when out of attempts."""
+        con.execute(
+            """UPDATE tasks SET
+                   state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                   error = 'Lease expired: worker ' || owner || ' stopped heartbeating',
+                   finished_at = CASE WHEN attempts >= max_attempts THEN ? END,
+                   owner = NULL, lease_expires = NULL
+               WHERE state = 'leased' AND lease_expires < ?""",
+            (now, now),
+        )
+
+    def claim(self, worker_id: str, detectors: Sequence[str], n: int = 1) -> List[Task]:
+        """Lease up to n pending tasks of the given detectors (oldest first)."""
+        now = time.time()
+        marks = ",".join("?" * len(detectors))
+        with self._tx() as con:
+            self._expire(con, now)
+            rows = con.execute(
+                f"SELECT key, detector, payload, attempts FROM tasks WHERE state = 'pending' "
+                f"AND detector IN ({marks}) ORDER BY enqueued_at, rowid LIMIT ?",
+                (*detectors, n),
+            ).fetchall()
+            con.executemany(
+                "UPDATE tasks SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                "started_at = ? WHERE key = ?",
+                [(worker_id, now + self.lease_s, now, r[0]) for r in rows],
+            )
+        return [Task(_decode_key(k), d, json.loads(p), a + 1) for k, d, p, a in rows]
+
+    def heartbeat(self, worker_id: str, keys: Iterable[Hashable]) -> Set[Any]:
+        """Renew this worker's leases; returns the keys it no longer holds."""
+        keys = list(keys)
+        now = time.time()
+        with self._tx() as con:
+            con.execute("UPDATE workers SET heartbeat_at = ? WHERE worker_id = ?", (now, worker_id))
+            lost = set()
+            for key in keys:
+                cur = con.execute("UPDATE tasks SET lease_expires = ? WHERE key = ? AND owner = ? AND state = 'leased'",
+                                  (now + self.lease_s, _encode_key(key), worker_id))
+                if cur.rowcount == 0:
+                    lost.add(key)
+        return lost
+
+    def complete(self, worker_id: str, key: Hashable, result: Any, seconds: float = 0.0) -> bool:
+        """Store the result; False (and nothing stored) if the lease was lost meanwhile."""
+        payload = json.dumps(_nan_to_none(result), default=_plain, allow_nan=False)
+        with self._tx() as con:
+            cur = con.execute(
+                "UPDATE tasks SET state = 'done', result = ?, error = NULL, finished_at = ?, seconds = ?, "
+                "lease_expires = NULL WHERE key = ? AND owner = ? AND state = 'leased'",
+                (payload, time.time(), seconds, _encode_key(key), worker_id),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, worker_id: str, key: Hashable, error: str, seconds: float = 0.0) -> bool:
+        """Record a failed attempt: back to pending, or failed once max_attempts are used."""
+        with self._tx() as con:
+            cur = con.execute(
+                """UPDATE tasks SET
+                       state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                       finished_at = CASE WHEN attempts >= max_attempts THEN ? END,
+                       error = ?, seconds = ?, lease_expires = NULL,
+                       owner = CASE WHEN attempts >= max_attempts THEN owner END
+                   WHERE key = ? AND owner = ? AND state = 'leased'""",
+                (time.time(), error, seconds, _encode_key(key), worker_id),
+            )
+            return cur.rowcount == 1
+
+    def release(self, worker_id: str) -> int:
+        """On a clean stop: hand this worker's leases back without using up an attempt."""
+        with self._tx() as con:
+            cur = con.execute(
+                "UPDATE tasks SET state = 'pending', owner = NULL, lease_expires = NULL, attempts = attempts - 1 "
+                "WHERE owner = ? AND state = 'leased'", (worker_id,))
+            con.execute("UPDATE workers SET stopped_at = ? WHERE worker_id = ?", (time.time(), worker_id))
+            return cur.rowcount
+
+    # -- results and monitoring -------------------------------------------------------
+
+    def outstanding(self, detectors: Optional[Sequence[str]] = None) -> int:
+        """Pending or leased tasks (of the given detectors)."""
+        sql = "SELECT COUNT(*) FROM tasks WHERE state IN ('pending', 'leased')"
+        params: List[Any] = []
+        if detectors is not None:
+            sql += f" AND detector IN ({','.join('?' * len(detectors))})"
+            params = list(detectors)
+        return self._read(sql, params)[0][0]
+
+    def result(self, key: Hashable) -> Any:
+        """The stored result of a done task; raises TaskFailed otherwise."""
+        rows = self._read("SELECT state, result, error FROM tasks WHERE key = ?", (_encode_key(key),))
+        if not rows:
+            raise TaskFailed(f"{key!r} is not in the queue")
+        state, result, error = rows[0]
+        if state != DONE:
+            raise TaskFailed(error or f"{key!r} is still {state}")
+        return json.loads(result)
+
+    def counts(self) -> pd.DataFrame:
+        """Tasks per detector and state."""
+        df = self._frame("SELECT detector, state, COUNT(*) AS n FROM tasks GROUP BY detector, state")
+        table = df.pivot_table(index="detector", columns="state", values="n", fill_value=0, aggfunc="sum")
+        return table.reindex(columns=[PENDING, LEASED, DONE, FAILED], fill_value=0).astype(int)
+
+    def nodes(self, window_s: float = 60.0) -> pd.DataFrame:
+        """Per worker: node, detectors, alive, running leases, totals and tasks/min over window_s."""
+        now = time.time()
+        workers = self._frame("SELECT * FROM workers")
+        if workers.empty:
+            return workers
+        done = self._frame("SELECT owner AS worker_id, COUNT(*) AS done, SUM(finished_at >= ?) AS recent, "
+                           "AVG(seconds) AS mean_s FROM tasks WHERE state = 'done' GROUP BY owner", [now - window_s])
+        running = self._frame("SELECT owner AS worker_id, COUNT(*) AS running FROM tasks "
+                              "WHERE state = 'leased' GROUP BY owner")
+        failed = self._frame("SELECT owner AS worker_id, COUNT(*) AS failed FROM tasks "
+                             "WHERE state = 'failed' GROUP BY owner")
+        df = workers.merge(done, how="left").merge(running, how="left").merge(failed, how="left")
+        for col in ("done", "recent", "running", "failed"):
+            df[col] = df[col].fillna(0).astype(int)
+        # tasks/min over the part of the window the worker was running
+        span = (df["stopped_at"].fillna(now) - df["started_at"].clip(lower=now - window_s)).clip(lower=1.0)
+        df["per_min"] = (60.0 * df["recent"] / span).round(1)
+        df["heartbeat_age_s"] = (now - df["heartbeat_at"]).round(0).astype(int)
+        df["alive"] = df["stopped_at"].isna() & (df["heartbeat_age_s"] <= self.lease_s)
+        df["mean_s"] = df["mean_s"].round(2)
+        return df[["node", "worker_id", "detectors", "alive", "running", "done", "failed", "per_min", "mean_s",
+                   "heartbeat_age_s"]].sort_values(["node", "worker_id"])
+
+    def status(self, window_s: float = 60.0) -> str:
+        counts = self.counts()
+        totals = counts.sum()
+        lines = [f"[queue] {self.db_path}: {int(totals.sum())} task(s): " +
+                 ", ".join(f"{int(totals[s])} {s}" for s in (DONE, FAILED, LEASED, PENDING))]
+        if not counts.empty:
+            lines.append(counts.to_string())
+        nodes = self.nodes(window_s)
+        if not nodes.empty:
+            live = nodes[nodes["alive"]]
+            lines.append(f"[queue] {len(live)} live worker(s) on {live['node'].nunique()} node(s), "
+                         f"{live['per_min'].sum():.1f} tasks/min over the last {window_s:.0f}s")
+            lines.append(nodes.to_string(index=False))
+        return "\n".join(lines)
+
+
+class Worker:
+    """
+    Threads that claim tasks and run handlers[detector](payload), plus a heartbeat thread.
+
+    lanes: [(detectors, n_threads), ...]; each lane's threads only claim those detectors,
+    so e.g. CPU-bound TruFor gets as many threads as there are processes for it.
+    """
+
+    def __init__(self, queue: WorkQueue, handlers: Dict[str, Callable[[Dict[str, Any]], Any]],
+                 lanes: Optional[List[Tuple[Sequence[str], int]]] = None, worker_id: str = "",
+                 poll_s: float = 2.0) -> None:
+        self.queue = queue
+        self.handlers = handlers
+        self.lanes = lanes or [(tuple(handlers), 1)]
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.poll_s = poll_s
+        self.counts = {"done": 0, "failed": 0, "retried": 0, "lost": 0}
+        self._running: Set[Any] = set()
+        self._lock = threading.Lock()
+
+    def _lane(self, detectors: Sequence[str], stop: threading.Event, until_drained: bool,
+              on_done: Optional[Callable[[Task, Any, Optional[str]], None]]) -> None:
+        while not stop.is_set():
+            tasks = self.queue.claim(self.worker_id, detectors, 1)
+            if not tasks:
+                if until_drained and self.queue.outstanding(detectors) == 0:
+                    return
+                stop.wait(self.poll_s)  # others hold the remaining leases; take over if they expire
+                continue
+            task = tasks[0]
+            with self._lock:
+                self._running.add(task.key)
+            t0 = time.perf_counter()
+            try:
+                result, error = self.handlers[task.detector](task.payload), None
+            except Exception as e:
+                result, error = None, f"{type(e).__name__}: {e}"
+            seconds = time.perf_counter() - t0
+            with self._lock:
+                self._running.discard(task.key)
+            if error is None:
+                kept = self.queue.complete(self.worker_id, task.key, result, seconds)
+            else:
+                kept = self.queue.fail(self.worker_id, task.key, error, seconds)
+            with self._lock:
+                if not kept:
+                    self.counts["lost"] += 1
+                elif error is None:
+                    self.counts["done"] += 1
+                elif task.attempts >= self.queue.max_attempts:
+                    self.counts["failed"] += 1
+                else:
+                    self.counts["retried"] += 1
+            if kept and on_done is not None:
+                on_done(task, result, error)
+
+    def _heartbeat(self, stop: threading.Event) -> None:
+        while not stop.wait(max(0.05, self.queue.lease_s / 3)):
+            with self._lock:
+                keys = list(self._running)
+            self.queue.heartbeat(self.worker_id, keys)
+
+    def run(self, stop: Optional[threading.Event] = None, until_drained: bool = True,
+            on_done: Optional[Callable[[Task, Any, Optional[str]], None]] = None,
+            status_s: float = 0.0) -> Dict[str, int]:
+        """Work until stop is set or (until_drained) no task of these detectors is left anywhere."""
+        stop = stop or threading.Event()
+        detectors = [d for lane, _ in self.lanes for d in lane]
+        self.queue.register(self.worker_id, detectors)
+        beat_stop = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(beat_stop,), name="queue-heartbeat", daemon=True)
+        beat.start()
+        threads = [threading.Thread(target=self._lane, args=(tuple(lane), stop, until_drained, on_done),
+                                    name=f"queue-{'+'.join(lane)}-{i}", daemon=True)
+                   for lane, n in self.lanes for i in range(max(1, n))]
+        for t in threads:
+            t.start()
+        next_status = time.monotonic() + status_s
+        try:
+            while any(t.is_alive() for t in threads):
+                next(t for t in threads if t.is_alive()).join(timeout=0.5)
+                if status_s and time.monotonic() >= next_status:
+                    print(self.queue.status())
+                    next_status += status_s
+        except KeyboardInterrupt:
+            print(f"\n[queue] Stopping {self.worker_id}; its leased tasks go back to the queue...")
+            stop.set()
+            for t in threads:
+                t.join()
+        finally:
+            beat_stop.set()
+            beat.join()
+            self.queue.release(self.worker_id)
+        return dict(self.counts)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Inspect a gsme work queue (21_run_detectors.py --queue)")
+    ap.add_argument("cmd", choices=["status", "failed"], help="status: live counts and per-node throughput; "
+                                                              "failed: list failed tasks and their last error")
+    ap.add_argument("db", help="Queue DB")
+    ap.add_argument("--watch", type=float, default=0, help="With status: refresh every this many seconds")
+    ap.add_argument("--window_s", type=float, default=60.0, help="Throughput window")
+    args = ap.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"[queue] No queue DB at {args.db}")
+        return 1
+    with WorkQueue(args.db) as q:
+        if args.cmd == "failed":
+            df = q._frame("SELECT key, detector, attempts, owner, error FROM tasks WHERE state = 'failed' "
+                          "ORDER BY detector, key")
+            print(df.to_string(index=False) if len(df) else "[queue] No failed tasks")
+            return 0
+        try:
+            while True:
+                print(q.status(args.window_s))
+                if not args.watch:
+                    break
+                time.sleep(args.watch)
+                print()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+test_benchmark.py
+
+Offline checks for 25_benchmark.py: results JSON and regression detection.
+
+Usage:
+  python -m pytest test_benchmark.py
+"""
+
+import json
+import sys
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+
+from gsme.scripts import load_script
+from gsme.standins import FakeVisionClient
+
+spec = spec_from_loader("benchmark", SourceFileLoader("benchmark", "25_benchmark.py"))
+benchmark = module_from_spec(spec)
+spec.loader.exec_module(benchmark)
+
+
+def test_results_json_and_regression_flag(monkeypatch, tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"commit": "abc1234", "results": [
+        {"name": "17.main[3 images]", "status": "ok", "median_s": 1e-6},    # far faster than possible
+        {"name": "11.parse_json_response[fenced]", "status": "ok", "median_s": 10.0},
+    ]}))
+    out = tmp_path / "current.json"
+    monkeypatch.setattr(sys, "argv", [
+        "25_benchmark.py", "--only", "11.parse_json_response,17.main", "--images", "3", "--latency", "0.01",
+        "--repeat", "2", "--macro_repeat", "1", "--out", str(out), "--compare", str(baseline),
+    ])
+    assert benchmark.main() == 1  # the 17.main "regression"
+
+    report = json.loads(out.read_text())
+    results = {r["name"]: r for r in report["results"]}
+    assert set(results) == {"11.parse_json_response[fenced]", "17.main[3 images]"}
+    assert all(r["status"] == "ok" and r["median_s"] > 0 for r in results.values())
+    assert results["17.main[3 images]"]["items"] == 3
+
+    verdicts = dict(benchmark.compare(report, json.loads(baseline.read_text()), 0.15)[["name", "verdict"]].values)
+    assert verdicts == {"17.main[3 images]": "REGRESSION", "11.parse_json_response[fenced]": "faster"}
+
+
+def test_fake_vision_client_matches_by_content():
+    web = load_script("16_web_detection_check.py")
+    fake = FakeVisionClient(matches={"2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824":
+                                     ["https://example.com/a.png"]})
+    hit, miss = (web._web_detection_to_dict(fake._call([c])[0].web_detection) for c in (b"hello", b"other"))
+    assert web._parse_web_detection(hit, 10)["status"] == "match"
+    assert web._parse_web_detection(miss, 10)["status"] == "no_match"
+    assert fake.n_requests == 2
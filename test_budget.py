@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+test_budget.py
+
+Offline checks for gsme/budget.py and 21_run_detectors.py --budget_usd: paid requests are
+planned highest risk first, cached results are free, and what the cap leaves out is
+reported as deferred rather than clean.
+
+Usage:
+  python -m pytest test_budget.py
+"""
+
+import sys
+
+import pandas as pd
+
+from gsme.budget import DEFERRED, Budget, Risk, RiskIndex, WorkItem, parse_prices, schedule
+from gsme.scripts import load_script
+from gsme.standins import FakeSightengine
+
+
+def test_schedule_by_risk_and_caps():
+    risk = RiskIndex()
+    risk.add_trufor("a", flagged=False, score=0.3)
+    risk.add_trufor("b", flagged=True, score=0.9)
+    risk.image_signals.setdefault("c", set()).add("near_duplicate")
+    risk.task_signals[("GB", "baseline", "avg_1")] = {"numbers_mismatch"}
+    assert risk.risk(["b"]) == Risk(4.9, ("trufor_flagged",))
+    assert risk.risk(["d"], [("GB", "baseline", "avg_1")]).reasons == ("numbers_mismatch",)
+
+    items = [WorkItem(("sightengine", h), team, "sightengine", risk.risk([h]), cached=(h == "e"))
+             for h, team in (("a", "GB"), ("b", "GB"), ("c", "KE"), ("d", "KE"), ("e", "KE"))]
+    budget = Budget(cap_usd=3.0, team_cap_usd=1.0, prices=parse_prices("sightengine=1"))
+    decisions = schedule(items, budget)
+    assert {k[1]: d.decision for k, d in decisions.items()} == {"a": DEFERRED, "b": "run", "c": "run",
+                                                               "d": DEFERRED, "e": "cached"}
+    assert [decisions[("sightengine", h)].rank for h in "bcade"] == [1, 2, 3, 4, 5]
+    assert decisions[("sightengine", "a")].reason == "Deferred: budget $1 for team GB reached (risk 0.30: none)"
+    assert budget.spent == 2.0 and budget.spent_by_team == {"GB": 1.0, "KE": 1.0}
+    assert Budget(cap_usd=0.005).charge("GB", "web") == ""
+    assert Budget(cap_usd=0.005).charge("GB", "auto_validate") == "Deferred: run budget $0.005 reached"
+
+
+def test_run_detectors_defers_low_risk_images(monkeypatch, tmp_path, capsys):
+    run = load_script("21_run_detectors.py")
+    synth = load_script("26_synth_screenshots.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--n", "4", "--workers", "1"])
+    assert synth.main() == 0
+
+    results = tmp_path / "data" / "qualtrics" / "team_synth" / "baseline" / "results"
+    sample = pd.read_csv(results / "sample_avg.csv")
+    manifest = pd.read_csv(tmp_path / "data" / "qualtrics" / "team_synth" / "baseline" / "uploaded_files_manifest.csv")
+    paths = sample["total_screenshot_path"].tolist()
+    pd.DataFrame({"task_id": sample["task_id"][:1], "image_col": "total_screenshot_path", "image_path": paths[:1],
+                  "status": "flagged", "trufor_score": 0.8}).to_csv(results / "trufor_report_avg.csv", index=False)
+    pd.DataFrame({"task_id": sample["task_id"][2:3], "numbers_match": "No"}).to_csv(
+        results / "annotations_avg.csv", index=False)
+
+    monkeypatch.setenv("SIGHTENGINE_API_USER", "test_user")
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", "test_secret")
+    argv = ["21_run_detectors.py", "--team", "team_synth", "--wave", "baseline", "--types", "avg",
+            "--skip", "trufor,web,auto_validate", "--results_db", "", "--budget_usd", "0.006"]
+    with FakeSightengine(fixtures={}, unknown_score=0.9) as fake:
+        monkeypatch.setattr(sys, "argv", argv + ["--sightengine_endpoint", fake.endpoint])
+        assert run.main() == 0
+        assert fake.n_requests == 2
+
+    report = pd.read_csv(results / "sightengine_ai_report_avg.csv")
+    status = dict(zip(report["image_path"], report["status"]))
+    assert status[paths[0]] == "ok" and status[paths[2]] == "ok"  # TruFor-flagged, numbers mismatch
+    assert status[paths[1]] == DEFERRED and status[paths[3]] == DEFERRED
+    assert report.loc[report["status"] == DEFERRED, "error"].str.startswith("Deferred: run budget").all()
+
+    plan = pd.read_csv(results / "budget_plan.csv")
+    assert plan["risk_reasons"].tolist()[:2] == ["trufor_flagged", "numbers_mismatch"]
+    assert set(plan["content_hash"]) == set(manifest.loc[manifest["saved_path"].isin(paths), "sha256"])
+    assert "[budget] $0.006 of $0.006 planned (sightengine $0.006); deferred: sightengine 2" in capsys.readouterr().out
+
+    # A rerun with a higher cap only pays for what was deferred
+    with FakeSightengine(fixtures={}, unknown_score=0.9) as fake:
+        monkeypatch.setattr(sys, "argv", argv[:-1] + ["1", "--sightengine_endpoint", fake.endpoint])
+        assert run.main() == 0
+        assert fake.n_requests == 2
+    assert (pd.read_csv(results / "sightengine_ai_report_avg.csv")["status"] == "ok").all()
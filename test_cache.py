@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+test_cache.py
+
+Offline checks for gsme/cache.py: entries outlive the HashCache that wrote them,
+expire after ttl_s, and count as hits/misses.
+
+Usage:
+  python -m pytest test_cache.py
+"""
+
+import time
+
+from gsme.cache import HashCache, sha256_bytes, sha256_file
+
+KEY = sha256_bytes(b"screenshot")
+
+
+def test_entries_are_shared_across_runs(tmp_path):
+    HashCache(tmp_path).put(KEY, {"max_results": 10, "web_detection": {"full_matching_images": []}})
+    HashCache(tmp_path).put_bytes(KEY, b"shrunk")
+
+    rerun = HashCache(tmp_path)
+    assert rerun.get(KEY) == {"max_results": 10, "web_detection": {"full_matching_images": []}}
+    assert rerun.get_bytes(KEY) == b"shrunk"
+    assert rerun.get(sha256_bytes(b"other")) is None
+    assert (rerun.hits, rerun.misses, rerun.hit_rate) == (2, 1, 2 / 3)
+    assert sorted(p.name for p in (tmp_path / KEY[:2]).iterdir()) == [f"{KEY}.bin", f"{KEY}.json"]
+
+
+def test_ttl_expiry(monkeypatch, tmp_path):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    HashCache(tmp_path).put(KEY, "old")
+
+    monkeypatch.setattr(time, "time", lambda: now + 3600)
+    assert HashCache(tmp_path, ttl_s=7200).get(KEY) == "old"
+    assert HashCache(tmp_path).get(KEY) == "old"  # ttl_s=None never expires
+    expired = HashCache(tmp_path, ttl_s=1800)
+    assert expired.get(KEY) is None and expired.misses == 1
+
+    expired.put(KEY, "new")
+    assert expired.get(KEY) == "new"
+
+
+def test_sha256_file_matches_bytes(tmp_path):
+    path = tmp_path / "shot.png"
+    path.write_bytes(b"x" * 3000)
+    assert sha256_file(path, chunk_size=1024) == sha256_bytes(b"x" * 3000)
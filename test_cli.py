@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+test_cli.py
+
+Offline checks for gsme/cli.py (python -m gsme): --help imports none of the scripts,
+commands run the script's main() with the remaining arguments, and 11_/15_ load
+without an API key or OpenCV.
+
+Usage:
+  python -m pytest test_cli.py
+"""
+
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from gsme.cli import COMMANDS, main
+from gsme.scripts import REPO_ROOT, load_script
+
+
+def test_help_imports_no_script():
+    code = ("import sys\nfrom gsme.cli import main\ntry:\n    main(['--help'])\nexcept SystemExit:\n    pass\n"
+            "print(sorted(m for m in sys.modules if m.split('.')[0] in ('pandas', 'numpy', 'cv2', 'requests')"
+            " or m.startswith('gsme_script_')))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    assert "python -m gsme" in out.stdout and "trufor" in out.stdout
+    assert out.stdout.strip().endswith("[]")
+    assert all((REPO_ROOT / script).exists() for script, _ in COMMANDS.values())
+
+
+def test_script_help_without_heavy_dependencies(monkeypatch, capsys):
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    for command in ("trufor", "validate"):
+        with pytest.raises(SystemExit) as exc:
+            main([command, "--help"])
+        assert exc.value.code == 0
+        assert f"usage: python -m gsme {command}" in capsys.readouterr().out
+    monkeypatch.setattr(load_script("11_auto_validate.py"), "API_KEY", None)  # even if a local .env sets one
+    with pytest.raises(SystemExit) as exc:
+        main(["validate", "--team", "team_none"])
+    assert exc.value.code == 1 and "OPENROUTER_API_KEY not found" in capsys.readouterr().out
+
+
+def test_commands_run_scripts(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    argv = list(sys.argv)
+    assert main(["synth", "--n", "2", "--workers", "1"]) == 0
+    results = tmp_path / "data" / "qualtrics" / "team_synth" / "baseline" / "results"
+    assert main(["forensics", "--csv", str(results / "sample_avg.csv"), "--out_csv",
+                 str(results / "file_forensics_avg.csv"), "--workers", "1", "--results_db", ""]) == 0
+    assert sys.argv == argv
+    assert len(pd.read_csv(results / "file_forensics_avg.csv")) == 2
+    assert "[forensics] Summary:" in capsys.readouterr().out
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+test_dag.py
+
+Offline checks for gsme.dag.TaskGraph (used by 21_run_detectors.py).
+
+Usage:
+  python -m pytest test_dag.py
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from gsme.dag import DependencyError, TaskGraph
+
+
+def _square(x):
+    return x * x
+
+
+def _fail():
+    raise RuntimeError("boom")
+
+
+def test_results_follow_dependencies():
+    graph = TaskGraph()
+    for i in range(5):
+        graph.add(("sq", i), _square, i, pool="cpu")
+    graph.add("sum", lambda: sum(graph.results[("sq", i)] for i in range(5)), deps=[("sq", i) for i in range(5)])
+    with ProcessPoolExecutor(2) as cpu:
+        results = graph.run({"cpu": cpu})
+    assert results["sum"] == 30
+
+
+def test_pools_overlap():
+    graph = TaskGraph()
+    for i in range(4):
+        graph.add(("cpu", i), time.sleep, 0.2, pool="cpu")
+        graph.add(("io", i), time.sleep, 0.2, pool="io")
+    t0 = time.monotonic()
+    with ProcessPoolExecutor(4) as cpu, ThreadPoolExecutor(4) as io:
+        graph.run({"cpu": cpu, "io": io})
+    assert time.monotonic() - t0 < 0.6  # 8 x 0.2s of work, run side by side
+
+
+def test_failure_skips_dependents_only():
+    graph = TaskGraph()
+    graph.add("bad", _fail, pool="io")
+    graph.add("after_bad", _square, 2, deps=["bad"])
+    graph.add("good", _square, 3, pool="io")
+    seen = []
+    with ThreadPoolExecutor(2) as io:
+        results = graph.run({"io": io}, on_done=lambda k, r, e: seen.append(k))
+    assert results == {"good": 9}
+    assert isinstance(graph.errors["bad"], RuntimeError)
+    assert isinstance(graph.errors["after_bad"], DependencyError)
+    assert sorted(seen) == ["after_bad", "bad", "good"]
+
+
+def test_soft_node_runs_after_failed_dependency():
+    graph = TaskGraph()
+    graph.add("bad", _fail, pool="io")
+    graph.add("good", _square, 3, pool="io")
+    graph.add("report", lambda: (graph.results.get("good"), str(graph.errors.get("bad"))), deps=["bad", "good"],
+              soft=True)
+    with ThreadPoolExecutor(2) as io:
+        results = graph.run({"io": io})
+    assert results["report"] == (9, "boom") and "report" not in graph.errors
+
+
+def test_cycle_is_rejected():
+    graph = TaskGraph()
+    graph.add("a", _square, 1, deps=["b"])
+    graph.add("b", _square, 1, deps=["a"])
+    with pytest.raises(ValueError, match="cycle"):
+        graph.run({})
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+test_download_uploads.py
+
+Offline checks for 23_download_uploads.py against gsme.standins.FakeQualtricsFiles.
+
+Usage:
+  python -m pytest test_download_uploads.py
+"""
+
+import sys
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from pathlib import Path
+
+import pandas as pd
+
+from gsme.standins import FakeQualtricsFiles
+
+spec = spec_from_loader("download_uploads", SourceFileLoader("download_uploads", "23_download_uploads.py"))
+download_uploads = module_from_spec(spec)
+spec.loader.exec_module(download_uploads)
+
+TOKEN = "test_token"
+IMAGES = sorted(Path("data", "test_ai_images").glob("*"))
+
+
+def _files():
+    data = [p.read_bytes() for p in IMAGES]
+    return {
+        ("R_1", "F_a1"): ("shot.png", data[0]),
+        ("R_1", "F_a2"): ("shot.png", data[1]),  # same name as F_a1 in the same response
+        ("R_2", "F_b1"): ("avg week.jpg", data[1]),
+    }
+
+
+def _wave(tmp_path: Path) -> Path:
+    wave = tmp_path / "team_a" / "baseline"
+    wave.mkdir(parents=True)
+    pd.DataFrame([
+        {"ResponseId": "R_1", "avg_file_id": "F_a1", "app_file_id": "F_a2", "device": "iPhone"},
+        {"ResponseId": "R_2", "avg_file_id": "F_b1", "app_file_id": "F_gone", "device": "Android"},
+        {"ResponseId": "R_3", "avg_file_id": "", "app_file_id": "", "device": "Android"},
+    ]).to_csv(wave / "responses.csv", index=False)
+    return wave
+
+
+def _run(monkeypatch, wave: Path, fake: FakeQualtricsFiles) -> pd.DataFrame:
+    monkeypatch.setenv("QUALTRICS_API_KEY", TOKEN)
+    monkeypatch.setattr(sys, "argv", [
+        "23_download_uploads.py", "--team", "team_a", "--wave", "baseline", "--survey_id", "SV_1",
+        "--api_root", fake.api_root, "--out_dir", str(wave), "--workers", "4", "--retry_sleep_s", "0.01",
+    ])
+    assert download_uploads.main() == 1  # F_gone is a 404 every time
+    return pd.read_csv(wave / "uploaded_files_manifest.csv", dtype=str, keep_default_na=False)
+
+
+def test_parallel_resumable_download(monkeypatch, tmp_path):
+    files = _files()
+    wave = _wave(tmp_path)
+    with FakeQualtricsFiles(files, token=TOKEN, cut_after={"F_a1": 1000, "F_b1": 10},
+                            fail_first={"F_a2"}, latency_s=0.05) as fake:
+        manifest = _run(monkeypatch, wave, fake)
+        assert fake.n_range_requests == 2 and fake.max_in_flight > 1
+        assert manifest[["response_id", "file_id", "ok", "http_status"]].values.tolist() == [
+            ["R_1", "F_a1", "TRUE", "206"], ["R_1", "F_a2", "TRUE", "200"],
+            ["R_2", "F_b1", "TRUE", "206"], ["R_2", "F_gone", "FALSE", "404"],
+        ]
+        for row in manifest[manifest["ok"] == "TRUE"].itertuples():
+            assert Path(row.saved_path).read_bytes() == files[(row.response_id, row.file_id)][1]
+        names = {r.file_id: Path(r.saved_path).name for r in manifest.itertuples() if r.ok == "TRUE"}
+        assert names["F_b1"] == "avg week.jpg"
+        # Whichever of the two "shot.png" uploads finished second is prefixed with its file_id
+        assert sorted(names[f] for f in ("F_a1", "F_a2")) in (["F_a1_shot.png", "shot.png"],
+                                                               ["F_a2_shot.png", "shot.png"])
+        assert not list(wave.glob("uploads/*/*.part"))
+
+        # Rerun: files on disk that still match are skipped, only the failure is retried
+        n = fake.n_requests
+        assert _run(monkeypatch, wave, fake).equals(manifest)
+        assert fake.n_requests == n + 1
+
+        # A file damaged on disk is fetched again
+        damaged = Path(manifest.loc[2, "saved_path"])
+        damaged.write_bytes(b"truncated")
+        _run(monkeypatch, wave, fake)
+        assert fake.n_requests == n + 3
+        assert damaged.read_bytes() == files[("R_2", "F_b1")][1]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+test_export_parquet.py
+
+Offline checks for 22_export_parquet.py on the team_example data.
+
+Usage:
+  python -m pytest test_export_parquet.py
+"""
+
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+spec = spec_from_loader("export_parquet", SourceFileLoader("export_parquet", "22_export_parquet.py"))
+export_parquet = module_from_spec(spec)
+spec.loader.exec_module(export_parquet)
+
+ROOT = Path("data") / "qualtrics"
+
+
+@pytest.fixture(scope="module")
+def out_dir(tmp_path_factory):
+    out = tmp_path_factory.mktemp("parquet")
+    counts = export_parquet.export(ROOT, out)
+    assert counts["detector_results"] > 0 and counts["respondents"] > 0
+    return out
+
+
+def test_every_report_row_is_exported(out_dir):
+    df = pd.read_parquet(out_dir / "detector_results")
+    for team, wave, wave_dir in export_parquet.wave_dirs(ROOT):
+        for detector, (prefix, _, _) in export_parquet.DETECTOR_REPORTS.items():
+            n_csv = sum(len(pd.read_csv(p)) for p in (wave_dir / "results").glob(f"{prefix}_*.csv"))
+            part = df[(df["team"] == team) & (df["wave"] == wave) & (df["detector"] == detector)]
+            assert len(part) == n_csv, (team, wave, detector)
+
+
+def test_compact_dtypes_and_pushdown(out_dir):
+    flagged = pd.read_parquet(out_dir / "detector_results", dtype_backend="numpy_nullable",
+                              filters=[("detector", "==", "trufor"), ("status", "==", "flagged")])
+    assert len(flagged) > 0
+    assert set(flagged["status"]) == {"flagged"} and set(flagged["detector"]) == {"trufor"}
+    assert str(flagged["score"].dtype) == "Float32"
+    assert str(flagged["n_rois"].dtype) == "Int16"
+    assert isinstance(flagged["status"].dtype, pd.CategoricalDtype)
+    assert flagged["flagged"].eq(1).all()
+
+    respondents = pd.read_parquet(out_dir / "respondents", dtype_backend="numpy_nullable")
+    assert isinstance(respondents["device"].dtype, pd.CategoricalDtype)
+    assert str(respondents["avg_upload_sec"].dtype) == "Int16"
+    assert not respondents.duplicated(["team", "wave", "respondent_id"]).any()
+
+
+def test_reexport_replaces_partitions(out_dir):
+    before = pd.read_parquet(out_dir / "detector_results")
+    export_parquet.export(ROOT, out_dir, teams=["team_example"])
+    after = pd.read_parquet(out_dir / "detector_results")
+    assert len(after) == len(before)
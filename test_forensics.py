@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+test_forensics.py
+
+Offline checks for gsme/forensics.py and 27_file_forensics.py on synthetic screenshots:
+editor tags, non-native sizes and progressive JPEGs are flagged from the file headers,
+and clean phone screenshots are not.
+
+Usage:
+  python -m pytest test_forensics.py
+"""
+
+import io
+import sys
+
+import pandas as pd
+from PIL import Image
+
+from gsme.forensics import inspect_file, jpeg_quality
+from gsme.scripts import load_script
+from gsme.synth import random_spec, render_shot
+
+
+def _flags(row):
+    return set(row["flags"].split(";")) if row["flags"] else set()
+
+
+def test_header_flags(tmp_path):
+    def shot(name, device, width, height, fmt="PNG", **kw):
+        spec = random_spec(7, device, width, height, fmt=fmt)
+        for k, v in kw.items():
+            setattr(spec, k, v)
+        path = tmp_path / name
+        path.write_bytes(render_shot(spec)[0])
+        return path
+
+    clean = inspect_file(shot("clean.png", "iOS", 1179, 2556), "iOS")
+    assert clean["error"] == "" and clean["forensic_score"] == 0 and clean["bytes_read"] < 4096
+    assert (clean["format"], clean["width"], clean["height"]) == ("PNG", 1179, 2556)
+
+    edited = inspect_file(shot("edited.png", "iOS", 1179, 2556, editor_tag=True), "iOS")
+    assert _flags(edited) == {"editor_software"} and edited["software"]
+
+    jpeg = inspect_file(shot("edited.jpg", "Android", 1080, 2400, fmt="JPEG", editor_tag=True), "Android")
+    assert "editor_software" in _flags(jpeg) and jpeg["jpeg_quality"] == 92
+
+    assert _flags(inspect_file(shot("android.png", "Android", 1080, 2400), "iOS")) == {"size_not_ios"}
+    assert _flags(inspect_file(tmp_path / "android.png", "Android")) == set()
+
+    buf = io.BytesIO()
+    Image.open(tmp_path / "clean.png").convert("RGB").save(buf, format="JPEG", quality=90, progressive=True)
+    (tmp_path / "progressive.jpg").write_bytes(buf.getvalue())
+    progressive = inspect_file(tmp_path / "progressive.jpg", "iOS")
+    assert _flags(progressive) == {"progressive_jpeg"} and progressive["jpeg_quality"] == 90
+
+    assert inspect_file(tmp_path / "missing.png")["error"]
+    assert jpeg_quality([1] * 64) == (100, True)
+
+
+def test_file_forensics_on_synthetic_wave(monkeypatch, tmp_path, capsys):
+    forensics = load_script("27_file_forensics.py")
+    synth = load_script("26_synth_screenshots.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--n", "12", "--workers", "1",
+                                      "--tamper_rate", "0.5", "--jpeg_rate", "0.3"])
+    assert synth.main() == 0
+
+    results = tmp_path / "data" / "qualtrics" / "team_synth" / "baseline" / "results"
+    for workers in ("1", "2"):
+        monkeypatch.setattr(sys, "argv", ["27_file_forensics.py", "--csv", str(results / "sample_app.csv"),
+                                          "--out_csv", str(results / "file_forensics_app.csv"),
+                                          "--workers", workers, "--results_db", ""])
+        assert forensics.main() == 0
+
+    report = pd.read_csv(results / "file_forensics_app.csv", keep_default_na=False)
+    truth = pd.read_csv(results / "synth_truth.csv", keep_default_na=False).set_index("path")
+    assert len(report) == len(truth[truth["kind"] == "app"]) and (report["status"] != "error").all()
+    for row in report.to_dict("records"):
+        tagged = truth.loc[row["image_path"], "software"] != ""
+        assert (row["status"] == "flagged") == tagged, row
+        assert ("editor_software" in _flags(row)) == tagged
+        assert row["software"] == truth.loc[row["image_path"], "software"]
+    assert "[forensics] Summary:" in capsys.readouterr().out
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+test_incremental.py
+
+Offline checks for the --incremental mode (gsme/incremental.py), driven through
+17_sightengine_ai_detection.py against gsme.standins.FakeSightengine, and through
+11_auto_validate.py (no status column) with the OpenRouter call swapped for a stub.
+
+Usage:
+  python -m pytest test_incremental.py
+"""
+
+import hashlib
+import shutil
+import sys
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from pathlib import Path
+
+import pandas as pd
+
+from gsme.scripts import load_script
+from gsme.standins import FakeSightengine, load_sightengine_fixtures
+
+spec = spec_from_loader("sightengine", SourceFileLoader("sightengine", "17_sightengine_ai_detection.py"))
+sightengine = module_from_spec(spec)
+spec.loader.exec_module(sightengine)
+
+AUTH = ("test_user", "test_secret")
+FIXTURES = load_sightengine_fixtures()
+SOURCES = sorted(Path(e["file"]) for e in FIXTURES.values() if Path(e["file"]).exists())
+
+
+def _wave(tmp_path: Path, n: int) -> Path:
+    """A <team>/<wave> tree with n uploads, their manifest and a sample CSV; returns the CSV."""
+    wave = tmp_path / "qualtrics" / "team_a" / "baseline"
+    rows, manifest = [], []
+    for i, src in enumerate(SOURCES[:n]):
+        dst = wave / "uploads" / f"R_{i}" / src.name
+        if not dst.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(src, dst)
+        rows.append({"task_id": f"avg_R_{i}_{i + 1:04d}", "total_screenshot_file_id": f"F_{i}",
+                     "total_screenshot_path": str(dst)})
+        manifest.append({"response_id": f"R_{i}", "file_id": f"F_{i}", "ok": "TRUE", "http_status": 200,
+                         "saved_path": str(dst)})
+    pd.DataFrame(manifest).to_csv(wave / "uploaded_files_manifest.csv", index=False)
+    (wave / "results").mkdir(exist_ok=True)
+    pd.DataFrame(rows).to_csv(wave / "results" / "sample_avg.csv", index=False)
+    return wave / "results" / "sample_avg.csv"
+
+
+def _run(monkeypatch, csv: Path, fake: FakeSightengine) -> Path:
+    out = csv.parent / "sightengine_ai_report_avg.csv"
+    monkeypatch.setenv("SIGHTENGINE_API_USER", AUTH[0])
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", AUTH[1])
+    monkeypatch.setattr(sys, "argv", [
+        "17_sightengine_ai_detection.py", "--csv", str(csv), "--out_csv", str(out),
+        "--endpoint", fake.endpoint, "--rps", "0", "--no_cache", "--results_db", "", "--incremental",
+    ])
+    assert sightengine.main() == 0
+    return out
+
+
+def test_only_new_and_changed_uploads_are_scanned(monkeypatch, tmp_path):
+    fixtures = dict(FIXTURES)
+    with FakeSightengine(fixtures=fixtures, auth=AUTH) as fake:
+        csv = _wave(tmp_path, 3)
+        out = _run(monkeypatch, csv, fake)
+        assert fake.n_requests == 3
+        first = out.read_bytes()
+
+        # Rerun with nothing new: no requests, report untouched
+        _run(monkeypatch, csv, fake)
+        assert fake.n_requests == 3
+        assert out.read_bytes() == first
+
+        # Two more uploads arrive: only they are sent, and appended after the old rows
+        _run(monkeypatch, _wave(tmp_path, 5), fake)
+        assert fake.n_requests == 5
+        assert out.read_bytes().startswith(first)
+        report = pd.read_csv(out)
+        assert len(report) == 5 and (report["status"] == "ok").all()
+
+        # One file is replaced in place: only that row is rescanned
+        changed = Path(report.loc[1, "image_path"])
+        changed.write_bytes(changed.read_bytes() + b"\0")
+        fixtures[hashlib.sha256(changed.read_bytes()).hexdigest()] = {"response": {
+            "status": "success", "request": {"operations": 1}, "type": {"ai_generated": 0.99}}}
+        _run(monkeypatch, csv.parent / "sample_avg.csv", fake)
+        assert fake.n_requests == 6
+        after = pd.read_csv(out)
+    assert after["task_id"].tolist() == report["task_id"].tolist()
+    assert after.loc[1, "ai_generated_score"] == 0.99
+    pd.testing.assert_frame_equal(after.drop(index=1), report.drop(index=1))
+
+
+def test_errored_rows_are_retried(monkeypatch, tmp_path):
+    fixtures = dict(FIXTURES)
+    csv = _wave(tmp_path, 3)
+    failing = Path(pd.read_csv(csv)["total_screenshot_path"][1])
+    fixtures[hashlib.sha256(failing.read_bytes()).hexdigest()] = {"response": {
+        "status": "failure", "error": {"type": "usage_limit", "message": "Daily usage limit reached"}}}
+    with FakeSightengine(fixtures=fixtures, auth=AUTH) as fake:
+        out = _run(monkeypatch, csv, fake)
+        assert pd.read_csv(out)["status"].tolist() == ["ok", "error", "ok"]
+        assert fake.n_requests == 3
+
+        # The API recovers: only the errored row is sent again, and then it is done
+        del fixtures[hashlib.sha256(failing.read_bytes()).hexdigest()]
+        _run(monkeypatch, csv, fake)
+        assert fake.n_requests == 4
+        assert (pd.read_csv(out)["status"] == "ok").all()
+        _run(monkeypatch, csv, fake)
+        assert fake.n_requests == 4
+
+
+def test_auto_validate_retries_api_errors(monkeypatch, tmp_path):
+    av = load_script("11_auto_validate.py")
+    synth = load_script("26_synth_screenshots.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--n", "3", "--workers", "1"])
+    assert synth.main() == 0
+
+    for name in ("INCREMENTAL", "RESULTS_DB", "TEAM_SLUG", "WAVE", "ROOT_DIR", "RESULTS_DIR", "SAMPLE_AVG_PATH",
+                 "SAMPLE_APP_PATH", "AUTO_ANN_AVG_PATH", "AUTO_ANN_APP_PATH", "MANIFEST_PATH"):
+        monkeypatch.setattr(av, name, getattr(av, name))  # main() rebinds these; restored afterwards
+    monkeypatch.setattr(av, "API_KEY", "test_key")
+    monkeypatch.setattr(av, "rate_limit_sleep", lambda: None)
+    calls = []
+
+    def call(prompt, images, model=av.MODEL):
+        calls.append(prompt)
+        if len(calls) == 2:
+            raise RuntimeError("HTTP 502")
+        return '{"screenshot_correct": "Yes", "numbers_match": "Yes", "notes": "Week tab"}'
+
+    def run() -> pd.DataFrame:
+        monkeypatch.setattr(sys, "argv", ["11_auto_validate.py", "--team", "team_synth", "--wave", "baseline",
+                                          "--incremental", "--results_db", ""])
+        av.main()
+        return pd.read_csv(av.AUTO_ANN_AVG_PATH, keep_default_na=False)
+
+    monkeypatch.setattr(av, "call_openrouter_vision", call)
+    first = run()
+    n_first = len(calls)
+    assert list(first["screenshot_correct"]) == ["Yes", "", "Yes"]
+    assert first.loc[1, "notes"] == "API error: HTTP 502"
+
+    # The API recovers: only the failed task is validated again, and then it is done
+    after = run()
+    assert len(calls) == n_first + 1
+    assert list(after["screenshot_correct"]) == ["Yes"] * 3
+    assert list(after["task_id"]) == list(first["task_id"])
+    run()
+    assert len(calls) == n_first + 1
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+test_ingest.py
+
+Offline checks for gsme/ingest.py: the LRU stays within its memory budget, identical
+uploads share one hash, and the on-disk index saves re-reading files whose size and
+mtime are unchanged (and re-hashes those that changed).
+
+Usage:
+  python -m pytest test_ingest.py
+"""
+
+import os
+
+import pandas as pd
+
+from gsme.cache import sha256_bytes
+from gsme.ingest import ImageStore, LRUCache
+
+
+def test_lru_evicts_least_recently_used_within_budget():
+    lru = LRUCache(budget_bytes=100)
+    for key in "abc":
+        lru.put(key, key * 40, 40)  # 120 bytes: "a" goes
+    assert lru.get("a") is None and lru.used_bytes == 80 and lru.evictions == 1
+
+    assert lru.get("b") == "b" * 40  # now most recently used
+    lru.put("d", "d" * 40, 40)
+    assert lru.get("c") is None and lru.get("b") is not None and lru.get("d") is not None
+
+    lru.put("b", "small", 10)  # replacing an entry frees its old size
+    assert lru.used_bytes == 50
+    lru.put("huge", "x" * 500, 500)  # larger than the whole budget: not cached, nothing evicted
+    assert lru.get("huge") is None and lru.used_bytes == 50 and lru.evictions == 2
+    assert (lru.hits, lru.misses) == (3, 3)
+
+
+def test_store_memory_budget(tmp_path):
+    paths = []
+    for i in range(4):
+        paths.append(tmp_path / f"shot_{i}.png")
+        paths[-1].write_bytes(bytes([i]) * 400_000)
+    df = pd.DataFrame({"task_id": ["t0", "t1", "t2", "t3"], "total_screenshot_path": [str(p) for p in paths]})
+
+    store = ImageStore(memory_mb=1, index_path=None)
+    refs = store.scan(df, ["total_screenshot_path"])
+    assert store.files_read == 4 and store.lru.used_bytes <= 1024 * 1024 and store.lru.evictions == 2
+    assert store.read_bytes(refs[3].content_hash) == paths[3].read_bytes() and store.files_read == 4  # still held
+    assert store.read_bytes(refs[0].content_hash) == paths[0].read_bytes() and store.files_read == 5  # evicted
+
+
+def test_index_reuse_and_rehash(tmp_path):
+    index = tmp_path / "ingest_index.csv"
+    shot, copy = tmp_path / "shot.png", tmp_path / "copy.png"
+    shot.write_bytes(b"screenshot v1")
+    copy.write_bytes(b"screenshot v1")
+    df = pd.DataFrame({"task_id": ["t0", "t1", "t2"],
+                       "total_screenshot_path": [str(shot), str(copy), str(tmp_path / "missing.png")],
+                       "app_screenshot1_path": [str(shot), None, ""]})
+
+    first = ImageStore(index_path=index)
+    refs = first.scan(df, ["total_screenshot_path", "app_screenshot1_path"])
+    assert [(r.task_id, r.col) for r in refs] == [("t0", "total_screenshot_path"), ("t0", "app_screenshot1_path"),
+                                                  ("t1", "total_screenshot_path"), ("t2", "total_screenshot_path")]
+    assert refs[0].content_hash == refs[1].content_hash == refs[2].content_hash == sha256_bytes(b"screenshot v1")
+    assert refs[3].content_hash == "" and refs[3].error == "File not found"
+    assert list(ImageStore.unique(refs).values()) == [shot]
+    assert first.files_read == 2 and len(pd.read_csv(index)) == 2
+
+    rerun = ImageStore(index_path=index)
+    assert [r.content_hash for r in rerun.scan(df, ["total_screenshot_path"])][:2] == [refs[0].content_hash] * 2
+    assert rerun.files_read == 0  # size and mtime unchanged: hashes come from the index
+
+    st = shot.stat()
+    shot.write_bytes(b"screenshot v2")  # same size, new mtime
+    os.utime(shot, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    changed = ImageStore(index_path=index)
+    h = changed.hash_for(shot)
+    assert h == sha256_bytes(b"screenshot v2") and changed.files_read == 1
+    assert changed.hash_for(copy) == refs[0].content_hash and changed.files_read == 1
+    changed.save_index()
+    assert ImageStore(index_path=index).find(h) == shot
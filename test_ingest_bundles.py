@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+test_ingest_bundles.py
+
+Offline checks for 24_ingest_bundles.py on synthetic bundles.
+
+Usage:
+  python -m pytest test_ingest_bundles.py
+"""
+
+import sys
+import zipfile
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from pathlib import Path
+
+spec = spec_from_loader("ingest_bundles", SourceFileLoader("ingest_bundles", "24_ingest_bundles.py"))
+ingest_bundles = module_from_spec(spec)
+spec.loader.exec_module(ingest_bundles)
+
+PNG = (Path("data") / "test_ai_images" / "unnamed.png").resolve().read_bytes()
+SAMPLE = ("task_id,total_screenshot_path\n"
+          "avg_R_1_0001,data/qualtrics/team_a/baseline/uploads/R_1/a.png\n"
+          "avg_R_2_0002,data/qualtrics/team_a/baseline/uploads/R_2/b.png\n")
+
+
+def _bundle(inbox: Path, stamp: str, members: dict, listed=None) -> Path:
+    path = inbox / f"bundle_team_a_baseline_{stamp}.zip"
+    listed = list(members) if listed is None else listed
+    manifest = (f"TEAM_SLUG: team_a\nWAVE: baseline\nCREATED_AT: {stamp[:4]}-{stamp[4:6]}-{stamp[6:8]} 12:00:00\n\n"
+                "FILES_INCLUDED:\n" + "".join(f" - {n}\n" for n in listed))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+        zf.writestr("bundle_manifest.txt", manifest)
+    return path
+
+
+def _run(monkeypatch, inbox: Path, root: Path) -> int:
+    monkeypatch.setattr(sys, "argv", ["24_ingest_bundles.py", str(inbox), "--root", str(root), "--workers", "3"])
+    return ingest_bundles.main()
+
+
+def test_bundles_are_checked_deduplicated_and_newest_wins(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)  # the ingest index goes to ./data/cache
+    inbox, root = tmp_path / "inbox", tmp_path / "qualtrics"
+    inbox.mkdir()
+    _bundle(inbox, "20260101_120000", {
+        "sample_avg.csv": SAMPLE, "annotations_avg.csv": "task_id,label\navg_R_1_0001,old\n",
+        "uploads/R_1/a.png": PNG, "uploads/R_2/b.png": PNG, "notes.txt": "unlisted",
+    }, listed=["sample_avg.csv", "annotations_avg.csv", "uploads/R_1/a.png", "uploads/R_2/b.png"])
+    _bundle(inbox, "20260105_120000", {
+        "sample_avg.csv": SAMPLE, "annotations_avg.csv": "task_id,label\navg_R_1_0001,new\n",
+    })
+    _bundle(inbox, "20260109_120000", {"sample_avg.csv": SAMPLE}, listed=["sample_avg.csv", "sample_app.csv"])
+
+    assert _run(monkeypatch, inbox, root) == 1  # the last bundle is rejected (sample_app.csv missing)
+    wave = root / "team_a" / "baseline"
+    assert (wave / "results" / "annotations_avg.csv").read_text() == "task_id,label\navg_R_1_0001,new\n"
+    assert not (wave / "results" / "notes.txt").exists()
+    a, b = wave / "uploads" / "R_1" / "a.png", wave / "uploads" / "R_2" / "b.png"
+    assert a.read_bytes() == PNG and a.stat().st_ino == b.stat().st_ino  # one copy on disk
+
+    # Rerun: nothing to write
+    before = {p: p.stat().st_mtime_ns for p in wave.rglob("*") if p.is_file()}
+    _run(monkeypatch, inbox, root)
+    assert {p: p.stat().st_mtime_ns for p in wave.rglob("*") if p.is_file()} == before
+
+    # A local fix made after the bundles is not overwritten by them
+    (wave / "results" / "annotations_avg.csv").write_text("task_id,label\navg_R_1_0001,fixed\n")
+    _run(monkeypatch, inbox, root)
+    assert "fixed" in (wave / "results" / "annotations_avg.csv").read_text()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+test_near_duplicates.py
+
+Offline checks for the perceptual-hash index in 19_near_duplicates.py.
+
+Usage:
+  python -m pytest test_near_duplicates.py
+"""
+
+import random
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from pathlib import Path
+
+spec = spec_from_loader("near_duplicates", SourceFileLoader("near_duplicates", "19_near_duplicates.py"))
+near_duplicates = module_from_spec(spec)
+spec.loader.exec_module(near_duplicates)
+
+
+
+def test_bktree_matches_brute_force():
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    # plant a few near copies
+    hashes += [h ^ (1 << rng.randrange(64)) for h in hashes[:20]]
+
+    tree = near_duplicates.BKTree()
+    for h in hashes:
+        tree.add(h)
+
+    for q in hashes[:50]:
+        expected = {h for h in set(hashes) if near_duplicates.hamming(q, h) <= 4}
+        got = {h for h, _ in tree.query(q, 4)}
+        assert got == expected
+
+
+def test_example_uploads_cluster_across_respondents():
+    manifest = near_duplicates.load_manifests(Path("data/qualtrics"))
+    manifest = manifest[manifest["team"] == "team_example"]
+    rows = [near_duplicates.hash_file(p) for p in manifest["saved_path"]]
+    images = manifest.merge(
+        near_duplicates.pd.DataFrame(rows), left_on="saved_path", right_on="path", how="left"
+    )
+
+    clusters = near_duplicates.find_clusters(images, "phash", near_duplicates.DEFAULT_RADIUS)
+    same_name = clusters[clusters["saved_path"].str.endswith("Screenshot_20251218_155207.png")]
+
+    assert len(same_name) == 2
+    assert same_name["cluster_id"].nunique() == 1
+    assert (same_name["cluster_type"] == "exact").all()
+    assert (same_name["n_respondents"] == 2).all()
+
+
+def test_jpeg_dimensions_are_full_size(tmp_path):
+    from gsme.synth import random_spec, render_shot
+
+    png = tmp_path / "shot.png"
+    jpg = tmp_path / "shot.jpg"
+    png.write_bytes(render_shot(random_spec(3, "iOS", 1170, 2532))[0])
+    jpg.write_bytes(render_shot(random_spec(3, "iOS", 1170, 2532, fmt="JPEG"))[0])
+    png_row, jpg_row = near_duplicates.hash_file(str(png)), near_duplicates.hash_file(str(jpg))
+    assert jpg_row["error"] == "" and (jpg_row["width"], jpg_row["height"]) == (1170, 2532)
+    assert near_duplicates.hamming(int(png_row["phash"], 16), int(jpg_row["phash"], 16)) <= 8
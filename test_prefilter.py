@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+test_prefilter.py
+
+Offline checks for gsme/prefilter.py and 20_ai_prefilter.py: synthetic phone screenshots
+score below DEFAULT_MIN_SUSPICION and the known AI images in data/test_ai_images above it,
+and 20_ writes per-image scores and the evaluation against stored Sightengine reports.
+
+Usage:
+  python -m pytest test_prefilter.py
+"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from gsme.prefilter import DEFAULT_MIN_SUSPICION, FEATURE_WEIGHTS, suspicion_features, suspicion_score
+from gsme.scripts import load_script
+from gsme.synth import random_spec, render_shot
+
+KNOWN_AI = sorted(Path("data/test_ai_images").iterdir())
+
+
+def _shot(tmp_path: Path, name: str, device: str, width: int, height: int, fmt: str = "PNG") -> Path:
+    path = tmp_path / name
+    path.write_bytes(render_shot(random_spec(7, device, width, height, fmt=fmt))[0])
+    return path
+
+
+def test_screenshots_score_below_known_ai_images(tmp_path):
+    ios = _shot(tmp_path, "ios.png", "iOS", 1179, 2556)
+    android = _shot(tmp_path, "android.jpg", "Android", 1080, 2400, fmt="JPEG")
+
+    feats = suspicion_features(ios)
+    assert (feats["width"], feats["height"], feats["format"]) == (1179, 2556, "PNG")
+    assert feats["f_resolution"] == 0.0 and feats["f_format"] == 0.0
+    assert feats["suspicion"] == round(sum(w * feats[f"f_{k}"] for k, w in FEATURE_WEIGHTS.items()), 4)
+    assert suspicion_score(ios.read_bytes()) == feats["suspicion"]
+    assert suspicion_features(android)["f_format"] == 1.0
+
+    screenshots = [suspicion_score(p) for p in (ios, android)]
+    known_ai = [suspicion_score(p) for p in KNOWN_AI]
+    assert max(screenshots) < DEFAULT_MIN_SUSPICION <= min(known_ai)
+    assert all(0.0 <= s <= 1.0 for s in screenshots + known_ai)
+
+
+def test_prefilter_scores_csv_and_evaluates_reports(monkeypatch, tmp_path, capsys):
+    prefilter = load_script("20_ai_prefilter.py")
+    shot = _shot(tmp_path, "ios.png", "iOS", 1179, 2556)
+    results = tmp_path / "data" / "qualtrics" / "team_x" / "baseline" / "results"
+    results.mkdir(parents=True)
+    pd.DataFrame({"task_id": ["avg_R_1_1", "avg_R_2_1", "avg_R_3_1"],
+                  "total_screenshot_path": [str(shot), str(KNOWN_AI[0]), str(tmp_path / "missing.png")]}
+                 ).to_csv(results / "sample_avg.csv", index=False)
+
+    monkeypatch.setattr(sys, "argv", ["20_ai_prefilter.py", "--csv", str(results / "sample_avg.csv"),
+                                      "--out_csv", str(results / "ai_prefilter_report_avg.csv")])
+    assert prefilter.main() == 0
+    report = pd.read_csv(results / "ai_prefilter_report_avg.csv").fillna("")
+    assert list(report["status"]) == ["ok", "ok", "error"]
+    assert report.loc[0, "suspicion"] < DEFAULT_MIN_SUSPICION <= report.loc[1, "suspicion"]
+    assert report.loc[2, "error"] == "File not found"
+    assert "3 images, 1 at or above 0.3 (would be sent to Sightengine), 1 errors" in capsys.readouterr().out
+
+    pd.DataFrame({"task_id": ["avg_R_1_1", "avg_R_2_1", "avg_R_3_1"],
+                  "image_path": [str(shot), str(KNOWN_AI[0]), str(shot)],
+                  "ai_generated_score": [0.02, 0.97, ""]}
+                 ).to_csv(results / "sightengine_ai_report_avg.csv", index=False)
+    reports_glob = str(tmp_path / "data" / "qualtrics" / "*" / "*" / "results" / "sightengine_ai_report*.csv")
+    ev = prefilter.evaluate(reports_glob, tmp_path / "no_known_ai", 0.5, DEFAULT_MIN_SUSPICION)
+    assert list(ev["se_flagged"]) == [0, 1] and list(ev["sent"]) == [0, 1]
+
+    monkeypatch.setattr(sys, "argv", ["20_ai_prefilter.py", "--evaluate", "--reports_glob", reports_glob,
+                                      "--known_ai_dir", "data/test_ai_images", "--out_csv", str(tmp_path / "ev.csv")])
+    assert prefilter.main() == 0
+    ev = pd.read_csv(tmp_path / "ev.csv")
+    assert (len(ev), int(ev["known_ai"].sum()), int(ev["positive"].sum())) == (2 + len(KNOWN_AI), len(KNOWN_AI),
+                                                                               1 + len(KNOWN_AI))
+    out = capsys.readouterr().out
+    assert "with Sightengine scores" in out and "WARNING" not in out
+
+    monkeypatch.setattr(sys, "argv", ["20_ai_prefilter.py", "--evaluate", "--reports_glob", str(tmp_path / "none*.csv"),
+                                      "--known_ai_dir", str(tmp_path / "none")])
+    assert prefilter.main() == 1
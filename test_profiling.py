@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+test_profiling.py
+
+Offline checks for --profile (gsme/profiling.py) on 17_sightengine_ai_detection.py,
+run against gsme.standins.FakeSightengine.
+
+Usage:
+  python -m pytest test_profiling.py
+"""
+
+import sys
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from pathlib import Path
+
+import pandas as pd
+
+from gsme.profiling import StageProfiler
+from gsme.standins import FakeSightengine
+
+spec = spec_from_loader("sightengine", SourceFileLoader("sightengine", "17_sightengine_ai_detection.py"))
+sightengine = module_from_spec(spec)
+spec.loader.exec_module(sightengine)
+
+IMAGES = sorted(Path("data", "test_ai_images").glob("*"))
+
+
+def test_disabled_profiler_records_nothing():
+    prof = StageProfiler(enabled=False)
+    with prof.item("h"), prof.stage("http"):
+        prof.add("rate_limit_wait", 1.0)
+    assert prof.frame().empty and prof.write_csv("report.csv") is None
+
+
+def test_sightengine_profile_csv_and_dump(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(Path(__file__).parent)
+    csv = tmp_path / "input.csv"
+    pd.DataFrame({"task_id": [f"t{i}" for i in range(len(IMAGES) + 1)],
+                  "total_screenshot_path": [str(p) for p in IMAGES + IMAGES[:1]]}).to_csv(csv, index=False)
+    out_csv = tmp_path / "report.csv"
+    dump = tmp_path / "run.folded"
+    monkeypatch.setenv("SIGHTENGINE_API_USER", "test_user")
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", "test_secret")
+    with FakeSightengine(latency_s=0.05) as fake:
+        monkeypatch.setattr(sys, "argv", [
+            "17_sightengine_ai_detection.py", "--csv", str(csv), "--out_csv", str(out_csv),
+            "--responses_db", str(tmp_path / "responses.sqlite"), "--results_db", "",
+            "--endpoint", fake.endpoint, "--workers", "2", "--rps", "0", "--no_cache",
+            "--profile", "--profile_dump", str(dump),
+        ])
+        assert sightengine.main() == 0
+
+    timings = pd.read_csv(tmp_path / "report.csv.profile.csv")
+    assert len(timings) == len(IMAGES)  # one row per unique image
+    assert {"cache_lookup_s", "read_bytes_s", "rate_limit_wait_s", "http_s", "json_parse_s", "total_s"} <= set(timings)
+    assert (timings["http_s"] >= 0.05).all()
+    assert (timings["total_s"] >= timings["http_s"]).all()
+    assert "http" in capsys.readouterr().out
+    assert "detect_ai_generated" in dump.read_text()  # worker threads were sampled
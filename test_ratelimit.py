@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+test_ratelimit.py
+
+Offline checks for gsme/ratelimit.py: concurrent callers share one request rate, and
+pause() holds all of them back.
+
+Usage:
+  python -m pytest test_ratelimit.py
+"""
+
+import threading
+import time
+
+from gsme.ratelimit import RateLimiter
+
+
+def _start_times(limiter: RateLimiter, n_threads: int, per_thread: int) -> list:
+    starts, lock = [], threading.Lock()
+
+    def worker():
+        for _ in range(per_thread):
+            limiter.acquire()
+            with lock:
+                starts.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(starts)
+
+
+def test_threads_share_one_rate():
+    starts = _start_times(RateLimiter(50), n_threads=4, per_thread=5)
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    assert len(starts) == 20
+    assert min(gaps) >= 0.02 * 0.8  # 1/rate apart, whichever thread got the slot
+    assert starts[-1] - starts[0] >= 19 * 0.02 * 0.9
+
+
+def test_zero_rate_does_not_wait():
+    limiter = RateLimiter(0)
+    t0 = time.monotonic()
+    assert all(limiter.acquire() == 0.0 for _ in range(100))
+    assert time.monotonic() - t0 < 0.1
+
+
+def test_pause_holds_back_every_caller():
+    limiter = RateLimiter(0)
+    t0 = time.monotonic()
+    limiter.pause(0.15)
+    starts = _start_times(limiter, n_threads=3, per_thread=1)
+    limiter.pause(-1)  # negative pauses are ignored
+    assert starts[0] - t0 >= 0.14 and starts[-1] - starts[0] < 0.05
+    assert limiter.acquire() == 0.0
+    waited = RateLimiter(10)
+    waited.acquire()
+    waited.pause(0.2)
+    assert 0.15 < waited.acquire() < 0.3
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+test_results.py
+
+Offline checks for gsme.results.ResultStore (the study-wide results DB).
+
+Usage:
+  python -m pytest test_results.py
+"""
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from gsme.results import DETECTOR_REPORTS, ResultStore, team_wave_from_path
+
+QUALTRICS = Path("data") / "qualtrics"
+
+
+def _example_reports():
+    for path in sorted(QUALTRICS.glob("*/*/results/*.csv")):
+        for detector, prefix in DETECTOR_REPORTS.items():
+            if path.name.startswith(prefix + "_"):
+                yield detector, path
+
+
+def test_export_rewrites_reports_byte_for_byte(tmp_path):
+    reports = list(_example_reports())
+    assert reports
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        for detector, path in reports:
+            store.upsert_report(detector, "v1", path, pd.read_csv(path, float_precision="round_trip"))
+        written = store.export_all(tmp_path / "out")
+    assert len(written) == len(reports)
+    for _, path in reports:
+        out = tmp_path / "out" / path.relative_to(QUALTRICS)
+        assert out.read_bytes() == path.read_bytes(), path
+
+
+def test_upsert_drops_rows_no_longer_in_report(tmp_path):
+    report = tmp_path / "qualtrics" / "team_a" / "baseline" / "results" / "sightengine_ai_report_avg.csv"
+    assert team_wave_from_path(report) == ("team_a", "baseline")
+    df = pd.DataFrame({
+        "task_id": ["t1", "t2", "t3"],
+        "image_col": "total_screenshot_path",
+        "content_hash": ["h1", "h2", "h3"],
+        "status": "ok",
+        "ai_generated_score": [0.1, 0.9, None],
+        "flagged": [0, 1, 0],
+        "error": "",
+    })
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        store.upsert_report("sightengine", "genai", report, df)
+        store.upsert_report("sightengine", "genai", report, df.iloc[[1, 0]])
+        back = store.load_report("sightengine", "team_a", "baseline", report.name)
+        flagged = store.query("SELECT task_id FROM v_sightengine WHERE flagged = 1")
+    assert back["task_id"].tolist() == ["t2", "t1"]
+    assert flagged["task_id"].tolist() == ["t2"]
+
+
+def test_views_follow_latest_detector_version(tmp_path):
+    src = next(p for d, p in _example_reports() if d == "trufor")
+    report = tmp_path / "qualtrics" / "team_a" / "endline" / "results" / src.name
+    report.parent.mkdir(parents=True)
+    shutil.copy(src, report)
+    df = pd.read_csv(report)
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        store.upsert_report("trufor", "old", report, df)
+        store.upsert_report("trufor", "new", report, df.head(1))
+        versions = store.query("SELECT DISTINCT detector_version FROM v_trufor")
+        n = store.query("SELECT COUNT(*) AS n FROM v_trufor")["n"].iloc[0]
+    assert versions["detector_version"].tolist() == ["new"]
+    assert n == 1
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+test_run_detectors.py
+
+Offline checks for 21_run_detectors.py on a synthetic wave: a task that raises for one
+image (or one AI validation) becomes an error row in its report instead of dropping
+the report.
+
+Usage:
+  python -m pytest test_run_detectors.py
+"""
+
+import hashlib
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from gsme.scripts import load_script
+from gsme.standins import FakeSightengine
+
+RESULTS = Path("data") / "qualtrics" / "team_synth" / "baseline" / "results"
+
+
+def test_failed_image_task_gives_an_error_row(monkeypatch, tmp_path):
+    run = load_script("21_run_detectors.py")
+    synth = load_script("26_synth_screenshots.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--n", "3", "--workers", "1"])
+    assert synth.main() == 0
+
+    sample = pd.read_csv(RESULTS / "sample_avg.csv")
+    broken = sample.loc[1, "total_screenshot_path"]
+    broken_hash = hashlib.sha256(Path(broken).read_bytes()).hexdigest()
+    sightengine = run.Detectors.sightengine
+
+    def flaky(det, h):
+        if h == broken_hash:
+            raise RuntimeError("connection reset")
+        return sightengine(det, h)
+
+    def validate(det, type_, i, row, hashes):
+        if i == 2:
+            raise RuntimeError("HTTP 502")
+        return {"task_id": row.task_id, "respondent_id": row.respondent_id, "reviewer": "AI_OpenRouter",
+                "screenshot_correct": "Yes", "numbers_match": "Yes", "notes": "", "annotated_at": "",
+                "model_used": det.av.MODEL}
+
+    monkeypatch.setattr(run.Detectors, "sightengine", flaky)
+    monkeypatch.setattr(run.Detectors, "auto_validate", validate)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test_key")
+    monkeypatch.setenv("SIGHTENGINE_API_USER", "test_user")
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", "test_secret")
+    with FakeSightengine(fixtures={}, unknown_score=0.9) as fake:
+        monkeypatch.setattr(sys, "argv", [
+            "21_run_detectors.py", "--team", "team_synth", "--wave", "baseline", "--skip", "trufor,web",
+            "--results_db", "", "--sightengine_endpoint", fake.endpoint])
+        assert run.main() == 0
+
+    report = pd.read_csv(RESULTS / "sightengine_ai_report_avg.csv", keep_default_na=False)
+    assert list(report["task_id"]) == list(sample["task_id"])
+    assert list(report["status"]) == ["ok", "error", "ok"]
+    assert report.loc[1, "error"] == "connection reset" and report.loc[1, "flagged"] == ""
+    assert (RESULTS / "sightengine_ai_report_app.csv").exists()
+
+    annotations = pd.read_csv(RESULTS / "auto_annotations_avg.csv", keep_default_na=False)
+    assert list(annotations["task_id"]) == list(sample["task_id"])
+    assert list(annotations["screenshot_correct"]) == ["Yes", "", "Yes"]
+    assert annotations.loc[1, "notes"] == "API error: HTTP 502"
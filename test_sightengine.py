@@ -2,108 +2,378 @@
 """
 test_sightengine.py
 
-Quick test script to verify Sightengine AI detection on known AI-generated images.
+Offline regression and throughput checks for 17_sightengine_ai_detection.py.
 
-Usage:
-  python test_sightengine.py
+Requests go to gsme.standins.FakeSightengine, a local HTTP server that replays the
+recorded responses in data/test_fixtures/sightengine_responses.json with simulated
+latency and bursts of HTTP 429 -- no credentials or network needed.
 
-Expects test images in data/test_ai_images/
+Usage:
+  python -m pytest test_sightengine.py -s     # regression + benchmark table
+  python test_sightengine.py                  # benchmark table only
+  python test_sightengine.py --live           # old live check on data/test_ai_images (uses .env)
 """
 
-import os
+import argparse
+import hashlib
+import json
 import sys
+import time
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
 from pathlib import Path
+from typing import Any, Dict, List
 
+import pandas as pd
+import pytest
 from dotenv import load_dotenv
 
-# Import the detection function from our main script
-from importlib.util import spec_from_loader, module_from_spec
-from importlib.machinery import SourceFileLoader
+from gsme.standins import SIGHTENGINE_FIXTURES, FakeSightengine, load_sightengine_fixtures
 
-# Load the main module
 spec = spec_from_loader("sightengine", SourceFileLoader("sightengine", "17_sightengine_ai_detection.py"))
 sightengine = module_from_spec(spec)
 spec.loader.exec_module(sightengine)
 
-load_dotenv()
-
 TEST_DIR = Path("data/test_ai_images")
 THRESHOLD = 0.5
+AUTH = ("test_user", "test_secret")
+
+FIXTURES = load_sightengine_fixtures()
+FIXTURE_SCORES = {
+    Path(e["file"]): e["response"]["type"]["ai_generated"]
+    for e in FIXTURES.values() if Path(e["file"]).exists()
+}
+
+
+def _input_csv(tmp_path: Path, copies: int = 1, distinct: bool = True) -> Path:
+    """
+    One row per fixture image (repeated `copies` times), in the 17 input layout.
+
+    With distinct=True, copies after the first are new files with trailing padding bytes
+    (a different content hash, same decoded image) registered in FIXTURES under their own
+    hash, so 17 cannot dedupe them and every copy costs one request.
+    """
+    paths = sorted(FIXTURE_SCORES)
+    for k in range(1, copies):
+        for src in sorted(FIXTURE_SCORES):
+            if not distinct:
+                paths.append(src)
+                continue
+            dst = tmp_path / "copies" / f"{k}_{src.name}"
+            if not dst.exists():
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                dst.write_bytes(src.read_bytes() + b"\0" * k)
+                FIXTURES[hashlib.sha256(dst.read_bytes()).hexdigest()] = {"response": {
+                    "status": "success", "request": {"operations": 1},
+                    "type": {"ai_generated": FIXTURE_SCORES[src]}}}
+            paths.append(dst)
+    df = pd.DataFrame({
+        "task_id": [f"task_{i:03d}" for i in range(len(paths))],
+        "total_screenshot_path": [str(p) for p in paths],
+    })
+    out = tmp_path / "input.csv"
+    df.to_csv(out, index=False)
+    return out
+
+
+def _run_main(monkeypatch, tmp_path: Path, endpoint: str, workers: int, tag: str, copies: int = 1,
+              distinct: bool = True) -> Dict[str, Any]:
+    out_csv = tmp_path / f"report_{tag}.csv"
+    monkeypatch.setenv("SIGHTENGINE_API_USER", AUTH[0])
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", AUTH[1])
+    monkeypatch.setattr(sys, "argv", [
+        "17_sightengine_ai_detection.py",
+        "--csv", str(_input_csv(tmp_path, copies, distinct)),
+        "--out_csv", str(out_csv),
+        "--responses_db", str(tmp_path / f"responses_{tag}.sqlite"),
+        "--results_db", "",
+        "--endpoint", endpoint,
+        "--workers", str(workers),
+        "--rps", "0",
+        "--no_cache",
+    ])
+    t0 = time.perf_counter()
+    assert sightengine.main() == 0
+    return {"report": pd.read_csv(out_csv), "wall_s": time.perf_counter() - t0}
+
+
+def test_fixture_images_present():
+    # Every fixture must point at an image in the tree, or the regression checks shrink silently
+    assert len(FIXTURE_SCORES) == len(load_sightengine_fixtures()) >= 6
+
+
+def test_detect_returns_recorded_scores():
+    with FakeSightengine(auth=AUTH) as fake:
+        for path, expected in FIXTURE_SCORES.items():
+            result = sightengine.detect_ai_generated(path, *AUTH, endpoint=fake.endpoint)
+            assert result["status"] == "ok", result["error"]
+            assert result["ai_generated_score"] == pytest.approx(expected)
+            assert result["operations"] >= 1
+        assert fake.n_requests == len(FIXTURE_SCORES)
+
+
+def test_detect_retries_after_429():
+    path, expected = next(iter(FIXTURE_SCORES.items()))
+    with FakeSightengine(auth=AUTH, burst_429=(100, 2), retry_after="0.05") as fake:
+        result = sightengine.detect_ai_generated(path, *AUTH, endpoint=fake.endpoint, max_retries=2)
+        assert result["status"] == "ok"
+        assert result["ai_generated_score"] == pytest.approx(expected)
+        assert (fake.n_requests, fake.n_429) == (3, 2)
+
+
+def test_detect_gives_up_after_max_retries():
+    path = next(iter(FIXTURE_SCORES))
+    with FakeSightengine(auth=AUTH, burst_429=(100, 100), retry_after="0.01") as fake:
+        result = sightengine.detect_ai_generated(path, *AUTH, endpoint=fake.endpoint, max_retries=2)
+        assert result["status"] == "error"
+        assert result["http_status"] == "429"
+        assert fake.n_requests == 3
+
+
+def test_detect_auth_error_is_not_retried():
+    path = next(iter(FIXTURE_SCORES))
+    with FakeSightengine(auth=AUTH) as fake:
+        result = sightengine.detect_ai_generated(path, "wrong", "creds", endpoint=fake.endpoint)
+        assert result["status"] == "error"
+        assert result["http_status"] == "401"
+        assert fake.n_requests == 1
+
+
+def test_main_serial_and_concurrent_agree(monkeypatch, tmp_path):
+    with FakeSightengine(auth=AUTH, latency_s=0.01, burst_429=(7, 1), retry_after="0.05") as fake:
+        serial = _run_main(monkeypatch, tmp_path, fake.endpoint, workers=1, tag="serial")["report"]
+        concurrent = _run_main(monkeypatch, tmp_path, fake.endpoint, workers=8, tag="concurrent")["report"]
+
+    assert (serial["status"] == "ok").all()
+    cols = ["task_id", "image_path", "status", "ai_generated_score", "flagged"]
+    pd.testing.assert_frame_equal(serial[cols], concurrent[cols])
+
+    expected = serial["image_path"].map(lambda p: FIXTURE_SCORES[Path(p)])
+    assert serial["ai_generated_score"].tolist() == pytest.approx(expected.tolist())
+    assert serial["flagged"].tolist() == [int(s >= THRESHOLD) for s in expected]
+    assert serial["raw_response_ref"].str.match(r"^responses_serial\.sqlite:\d+$").all()
+
+
+def test_main_sends_duplicate_uploads_once(monkeypatch, tmp_path):
+    with FakeSightengine(fixtures=FIXTURES, auth=AUTH) as fake:
+        report = _run_main(monkeypatch, tmp_path, fake.endpoint, workers=4, tag="dupes", copies=3, distinct=False)["report"]
+        assert fake.n_requests == len(FIXTURE_SCORES)
+    assert len(report) == 3 * len(FIXTURE_SCORES)
+    assert (report["status"] == "ok").all()
+    # every copy shares the one stored response
+    assert report.groupby("content_hash")["raw_response_ref"].nunique().eq(1).all()
+
+
+def run_benchmark(monkeypatch, tmp_path: Path, copies: int = 4, latency_s: float = 0.05,
+                  workers: int = 8) -> List[Dict[str, Any]]:
+    """Serial vs concurrent main() against the stand-in; one row per mode."""
+    rows = []
+    for mode, n_workers in (("serial", 1), ("concurrent", workers)):
+        with FakeSightengine(fixtures=FIXTURES, auth=AUTH, latency_s=latency_s, burst_429=(16, 1), retry_after="0.1") as fake:
+            run = _run_main(monkeypatch, tmp_path, fake.endpoint, workers=n_workers, tag=mode, copies=copies)
+            n_images = len(run["report"])
+            rows.append({
+                "mode": mode,
+                "workers": n_workers,
+                "images": n_images,
+                "requests": fake.n_requests,
+                "retries": fake.n_429,
+                "max_in_flight": fake.max_in_flight,
+                "wall_s": round(run["wall_s"], 3),
+                "images_per_s": round(n_images / run["wall_s"], 2),
+                "n_ok": int((run["report"]["status"] == "ok").sum()),
+            })
+    return rows
+
+
+def test_benchmark_concurrent_beats_serial(monkeypatch, tmp_path, capsys):
+    rows = run_benchmark(monkeypatch, tmp_path)
+    with capsys.disabled():
+        print("\n" + pd.DataFrame(rows).to_string(index=False))
+    serial, concurrent = rows
+    assert serial["n_ok"] == serial["images"] and concurrent["n_ok"] == concurrent["images"]
+    assert serial["retries"] > 0 and concurrent["retries"] > 0
+    assert concurrent["max_in_flight"] > 1
+    assert concurrent["images_per_s"] > 2 * serial["images_per_s"]
 
 
-def main():
+def live_check() -> int:
+    """Original live check: scan data/test_ai_images with real credentials."""
+    load_dotenv()
     api_user, api_secret = sightengine.get_api_credentials()
     if not api_user or not api_secret:
         print("ERROR: Missing Sightengine credentials in .env")
         return 1
-
-    if not TEST_DIR.exists():
-        print(f"ERROR: Test directory not found: {TEST_DIR}")
-        return 1
-
-    # Find all images
-    image_extensions = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
-    images = [f for f in TEST_DIR.iterdir() if f.suffix.lower() in image_extensions]
-
+    images = sorted(f for f in TEST_DIR.iterdir() if f.suffix.lower() in {".jpg", ".jpeg", ".png", ".gif", ".webp"})
     if not images:
         print(f"No images found in {TEST_DIR}")
         return 1
 
-    print(f"Testing Sightengine AI detection on {len(images)} images")
-    print(f"Threshold for flagging: {THRESHOLD}")
-    print("=" * 60)
-
-    results = []
-    for img_path in sorted(images):
-        print(f"\nScanning: {img_path.name}")
-        result = sightengine.detect_ai_generated(
-            image_path=img_path,
-            api_user=api_user,
-            api_secret=api_secret,
-        )
-
-        status = result.get("status")
-        score = result.get("ai_generated_score", "")
-        error = result.get("error", "")
-
-        if status == "ok" and score != "":
-            score = float(score)
-            flagged = score >= THRESHOLD
-            flag_str = "🚨 FLAGGED" if flagged else "✓ OK"
-            print(f"  Score: {score:.3f} ({score*100:.1f}% AI) {flag_str}")
-            results.append({"image": img_path.name, "score": score, "flagged": flagged})
+    print(f"Testing Sightengine AI detection on {len(images)} images (threshold {THRESHOLD})")
+    n_flagged = 0
+    for img_path in images:
+        result = sightengine.detect_ai_generated(img_path, api_user, api_secret)
+        if result.get("status") == "ok" and result.get("ai_generated_score") != "":
+            score = float(result["ai_generated_score"])
+            n_flagged += score >= THRESHOLD
+            print(f"  {img_path.name}: {score:.3f} {'FLAGGED' if score >= THRESHOLD else 'ok'}")
         else:
-            print(f"  ERROR: {error}")
-            results.append({"image": img_path.name, "score": None, "flagged": None, "error": error})
-
-    # Summary
-    print("\n" + "=" * 60)
-    print("SUMMARY")
-    print("=" * 60)
-
-    successful = [r for r in results if r.get("score") is not None]
-    if successful:
-        avg_score = sum(r["score"] for r in successful) / len(successful)
-        n_flagged = sum(1 for r in successful if r["flagged"])
-        print(f"Images tested: {len(successful)}")
-        print(f"Average AI score: {avg_score:.3f} ({avg_score*100:.1f}%)")
-        print(f"Flagged as AI-generated: {n_flagged}/{len(successful)}")
-
-        if n_flagged == len(successful):
-            print("\n✓ All known AI images correctly detected!")
-        elif n_flagged > 0:
-            print(f"\n⚠ Only {n_flagged}/{len(successful)} AI images detected")
-        else:
-            print("\n✗ No AI images detected - detection may not be working")
+            print(f"  {img_path.name}: ERROR {result.get('error')}")
+    print(f"Flagged as AI-generated: {n_flagged}/{len(images)}")
+    return 0 if n_flagged == len(images) else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sightengine offline benchmark / live check")
+    parser.add_argument("--live", action="store_true", help="Call the real API on data/test_ai_images")
+    parser.add_argument("--copies", type=int, default=4, help="Times each fixture image is repeated")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated API latency (seconds)")
+    parser.add_argument("--workers", type=int, default=8, help="Workers for the concurrent run")
+    args = parser.parse_args()
+
+    if args.live:
+        return live_check()
 
-    errors = [r for r in results if r.get("error")]
-    if errors:
-        print(f"\nErrors: {len(errors)}")
-        for r in errors:
-            print(f"  - {r['image']}: {r.get('error')}")
+    import tempfile
+    from _pytest.monkeypatch import MonkeyPatch
 
+    with tempfile.TemporaryDirectory() as tmp, MonkeyPatch.context() as mp:
+        rows = run_benchmark(mp, Path(tmp), copies=args.copies, latency_s=args.latency, workers=args.workers)
+    print(f"\nFixtures: {SIGHTENGINE_FIXTURES}")
+    print(pd.DataFrame(rows).to_string(index=False))
     return 0
 
 
 if __name__ == "__main__":
     sys.exit(main())
+
+
+def test_rethreshold_updates_csv_and_results_db(monkeypatch, tmp_path):
+    from gsme.results import ResultStore
+
+    results = tmp_path / "qualtrics" / "team_a" / "baseline" / "results"
+    out_csv = results / "sightengine_ai_report_avg.csv"
+    db = tmp_path / "results.sqlite"
+    monkeypatch.setenv("SIGHTENGINE_API_USER", AUTH[0])
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", AUTH[1])
+    with FakeSightengine(fixtures=FIXTURES, auth=AUTH) as fake:
+        monkeypatch.setattr(sys, "argv", [
+            "17_sightengine_ai_detection.py", "--csv", str(_input_csv(tmp_path)), "--out_csv", str(out_csv),
+            "--responses_db", str(tmp_path / "responses.sqlite"), "--results_db", str(db),
+            "--endpoint", fake.endpoint, "--rps", "0", "--no_cache"])
+        assert sightengine.main() == 0
+    before = out_csv.read_text().splitlines()
+
+    monkeypatch.setattr(sys, "argv", ["17_sightengine_ai_detection.py", "--rethreshold", "--threshold", "0",
+                                      "--reports_glob", str(out_csv), "--results_db", str(db), "--no_cache"])
+    assert sightengine.main() == 0
+
+    after = pd.read_csv(out_csv, dtype=str, keep_default_na=False)
+    assert (after["flagged"] == "1").all() and (after["http_status"] == "200").all()
+    # Only the flagged column changed
+    i = before[0].split(",").index("flagged")
+    assert ([line.split(",")[:i] + line.split(",")[i + 1:] for line in out_csv.read_text().splitlines()]
+            == [line.split(",")[:i] + line.split(",")[i + 1:] for line in before])
+    with ResultStore(db) as store:
+        assert (store.query("SELECT flagged FROM v_sightengine")["flagged"] == 1).all()
+        store.export_all(tmp_path / "export")
+    assert (tmp_path / "export" / "team_a" / "baseline" / "results" / out_csv.name).read_bytes() == out_csv.read_bytes()
+
+
+def test_retry_after_seconds_and_http_date():
+    from email.utils import formatdate
+
+    assert sightengine._retry_after_seconds("3", default=9) == 3.0
+    assert sightengine._retry_after_seconds("-4", default=9) == 0.0
+    assert sightengine._retry_after_seconds(None, default=9) == 9
+    assert sightengine._retry_after_seconds("soon", default=9) == 9
+    assert 25 < sightengine._retry_after_seconds(formatdate(time.time() + 30, usegmt=True), default=9) <= 30
+    assert sightengine._retry_after_seconds(formatdate(time.time() - 30, usegmt=True), default=9) == 0.0
+
+
+def test_quota_reserve_is_atomic():
+    import threading
+
+    quota = sightengine.QuotaTracker(monthly_quota=50)
+    granted = []
+    threads = [threading.Thread(target=lambda: granted.append(sum(quota.reserve() for _ in range(20))))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(granted) == 50 and quota.used == 50
+    quota.settle(1, 0)  # a failed request gives its operation back
+    assert quota.used == 49 and quota.reserve() and not quota.reserve()
+    assert sightengine.QuotaTracker(monthly_quota=0).reserve(10 ** 9)  # 0 = no quota
+
+
+def test_quota_exhausted_images_are_deferred(monkeypatch, tmp_path):
+    out_csv = tmp_path / "report.csv"
+    monkeypatch.setenv("SIGHTENGINE_API_USER", AUTH[0])
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", AUTH[1])
+    with FakeSightengine(fixtures=FIXTURES, auth=AUTH, latency_s=0.02) as fake:
+        monkeypatch.setattr(sys, "argv", [
+            "17_sightengine_ai_detection.py", "--csv", str(_input_csv(tmp_path)), "--out_csv", str(out_csv),
+            "--responses_db", str(tmp_path / "responses.sqlite"), "--results_db", "", "--endpoint", fake.endpoint,
+            "--rps", "0", "--no_cache", "--workers", "8", "--monthly_quota", "3", "--quota_used", "1"])
+        assert sightengine.main() == 0
+        assert fake.n_requests == 2
+    report = pd.read_csv(out_csv)
+    assert (report["status"] == "ok").sum() == 2
+    deferred = report[report["status"] != "ok"]
+    assert len(deferred) == len(FIXTURE_SCORES) - 2
+    assert (deferred["status"] == "deferred").all() and deferred["flagged"].isna().all()
+    assert (deferred["error"] == "Deferred: monthly quota reached").all()
+
+
+def test_response_store_roundtrip(tmp_path):
+    store = sightengine.ResponseStore(tmp_path / "responses.sqlite")
+    raw = json.dumps({"status": "success", "type": {"ai_generated": 0.42}, "padding": "x" * 5000})
+    first = store.append("task_001", "total_screenshot_path", "abc", "genai", raw)
+    latest = store.append("task_002", "total_screenshot_path", "abc", "genai", raw.replace("0.42", "0.43"))
+    assert (first, latest) == ("responses.sqlite:1", "responses.sqlite:2")
+    assert store.find("abc", "genai") == latest and store.find("abc", "other") == "" and store.find("def", "genai") == ""
+    assert store.get(first) == json.loads(raw) and store.get(latest)["type"]["ai_generated"] == 0.43
+    assert store.get("responses.sqlite:99") is None
+    blob = store.con.execute("SELECT response FROM responses WHERE id = 1").fetchone()[0]
+    assert len(blob) < len(raw) // 10  # zlib-compressed
+    store.close()
+
+    assert sightengine.ResponseStore.read(str(tmp_path / "responses.sqlite"), first) == raw
+    assert sightengine.ResponseStore.read(str(tmp_path / "missing.sqlite"), first) is None
+    assert not (tmp_path / "missing.sqlite").exists()
+
+
+def test_score_cache_points_at_the_stored_response(monkeypatch, tmp_path):
+    monkeypatch.setenv("SIGHTENGINE_API_USER", AUTH[0])
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", AUTH[1])
+    csv = _input_csv(tmp_path)
+    cache_dir = tmp_path / "cache"
+
+    def run(tag):
+        monkeypatch.setattr(sys, "argv", [
+            "17_sightengine_ai_detection.py", "--csv", str(csv), "--out_csv", str(tmp_path / f"report_{tag}.csv"),
+            "--responses_db", str(tmp_path / f"responses_{tag}.sqlite"), "--results_db", "",
+            "--endpoint", fake.endpoint, "--rps", "0", "--cache_dir", str(cache_dir)])
+        assert sightengine.main() == 0
+        return pd.read_csv(tmp_path / f"report_{tag}.csv")
+
+    with FakeSightengine(fixtures=FIXTURES, auth=AUTH) as fake:
+        first = run("first")
+        rerun = run("rerun")  # another wave: its own sidecar, no requests
+        assert fake.n_requests == len(FIXTURE_SCORES)
+
+    entries = [json.loads(p.read_text())["value"] for p in cache_dir.rglob("*.json")]
+    assert len(entries) == len(FIXTURE_SCORES)
+    for entry in entries:
+        assert set(entry) == {"ai_generated_score", "responses_db", "raw_response_ref"}
+        assert Path(entry["responses_db"]).name == "responses_first.sqlite"
+
+    assert (rerun["from_cache"] == 1).all() and rerun["raw_response_ref"].str.startswith("responses_rerun.sqlite:").all()
+    pd.testing.assert_series_equal(rerun["ai_generated_score"], first["ai_generated_score"])
+    stores = {tag: sightengine.ResponseStore(tmp_path / f"responses_{tag}.sqlite") for tag in ("first", "rerun")}
+    for a, b in zip(first["raw_response_ref"], rerun["raw_response_ref"]):
+        assert stores["rerun"].get(b) == stores["first"].get(a) and "type" in stores["first"].get(a)
+    for store in stores.values():
+        store.close()
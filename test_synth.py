@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+test_synth.py
+
+Offline checks for 26_synth_screenshots.py and gsme/synth.py: the CSVs match the real
+pipeline's columns, the manifest matches the files and tampering changes only the
+recorded box.
+
+Usage:
+  python -m pytest test_synth.py
+"""
+
+import hashlib
+import io
+import sys
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from gsme.scripts import load_script
+from gsme.synth import ShotSpec, Tamper, render_shot
+
+synth = load_script("26_synth_screenshots.py")
+EXAMPLE = Path(__file__).parent / "data" / "qualtrics" / "team_example" / "baseline"
+
+
+def test_android_target_date_matches_wrangle():
+    end = datetime(2025, 12, 22, 11, 12, 39, tzinfo=timezone.utc)  # a Monday; P002 in team_example
+    assert synth.android_target_date(end, 5).strftime("%Y-%m-%d") == "2025-12-19"
+    assert synth.android_target_date(end, 1).strftime("%Y-%m-%d") == "2025-12-15"  # same weekday: a week back
+
+
+def test_synthetic_wave_csvs_and_manifest(monkeypatch, tmp_path):
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--root", str(tmp_path), "--n", "6", "--seed", "1",
+                                      "--tamper_rate", "0.5", "--jpeg_rate", "0.5", "--workers", "1"])
+    assert synth.main() == 0
+    wave = tmp_path / "team_synth" / "baseline"
+    for name in ("sample_avg.csv", "sample_app.csv"):
+        assert list(pd.read_csv(wave / "results" / name)) == list(pd.read_csv(EXAMPLE / "results" / name))
+
+    manifest = pd.read_csv(wave / "uploaded_files_manifest.csv")
+    assert len(manifest) == 12 and manifest["ok"].all()
+    for row in manifest.itertuples():
+        assert hashlib.sha256(Path(row.saved_path).read_bytes()).hexdigest() == row.sha256
+
+    truth = pd.read_csv(wave / "results" / "synth_truth.csv")
+    tampered = truth[truth["tampered"]]
+    assert len(tampered) and tampered["tamper_x"].notna().all()
+    assert (tampered["tamper_mode"].isin(["retype", "shifted"])).all()
+    avg = pd.read_csv(wave / "results" / "sample_avg.csv").merge(truth, on="task_id")
+    reported = avg["total_hours"] * 60 + avg["total_minutes"]
+    assert (reported == avg["reported_total_minutes"]).all()
+
+    # same arguments, same wave
+    monkeypatch.setattr(sys, "argv", sys.argv + ["--force"])
+    assert synth.main() == 0
+    assert pd.read_csv(wave / "uploaded_files_manifest.csv")["sha256"].tolist() == manifest["sha256"].tolist()
+
+
+def test_refuses_to_overwrite_real_wave(monkeypatch, tmp_path):
+    (tmp_path / "GB" / "baseline").mkdir(parents=True)
+    (tmp_path / "GB" / "baseline" / "responses.csv").write_text("ResponseId\n")
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--root", str(tmp_path), "--team", "GB", "--force"])
+    assert synth.main() == 1
+
+
+def test_tamper_changes_only_the_box():
+    for device, (w, h), field in (("iOS", (1170, 2532), "total"), ("Android", (1080, 2400), "tiktok")):
+        spec = ShotSpec(kind="avg" if field == "total" else "app", device=device, width=w, height=h,
+                        total_minutes=430, app_minutes={"instagram": 35, "tiktok": 95}, target_date="2026-01-09",
+                        seed=3)
+        clean, _ = render_shot(spec)
+        edited, info = render_shot(replace(spec, tamper=Tamper(field=field, new_minutes=250, mode="shifted")))
+        x, y, bw, bh = info["tamper_box"]
+        diff = np.any(np.asarray(Image.open(io.BytesIO(clean))) != np.asarray(Image.open(io.BytesIO(edited))), axis=2)
+        assert diff[y:y + bh, x:x + bw].any()
+        diff[y:y + bh, x:x + bw] = False
+        assert not diff.any()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+test_watch.py
+
+Offline checks for gsme/watch.py (the upload watcher behind 21_run_detectors.py --watch)
+and for watch mode itself writing its report to the results DB.
+
+Usage:
+  python -m pytest test_watch.py
+"""
+
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from gsme.results import ResultStore
+from gsme.scripts import load_script
+from gsme.standins import FakeSightengine
+from gsme.watch import UploadWatcher
+
+PNG = Path("data") / "test_ai_images" / "unnamed.png"
+
+
+def _collect(watcher: UploadWatcher, seconds: float) -> list:
+    stop = threading.Event()
+    threading.Timer(seconds, stop.set).start()
+    return list(watcher.stable_files(stop))
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_new_uploads_are_yielded_once_complete(tmp_path, use_inotify):
+    uploads = tmp_path / "uploads"
+    (uploads / "R_old").mkdir(parents=True)
+    shutil.copy(PNG, uploads / "R_old" / "a.png")
+
+    watcher = UploadWatcher([uploads], settle_s=0.2, poll_s=0.1, use_inotify=use_inotify)
+    assert watcher.prime() == 1
+
+    # A half-written PNG (no IEND trailer yet) and a complete one in a new response folder
+    data = PNG.read_bytes()
+    (uploads / "R_new").mkdir()
+    partial = uploads / "R_new" / "partial.png"
+    partial.write_bytes(data[: len(data) // 2])
+    done = uploads / "R_new" / "done.png"
+    done.write_bytes(data)
+    (uploads / "R_new" / "notes.txt").write_text("not an image")
+
+    # The rest of the partial upload only arrives after it has sat unchanged past settle_s
+    def finish():
+        with open(partial, "ab") as f:
+            f.write(data[len(data) // 2:])
+    threading.Timer(0.8, finish).start()
+
+    assert _collect(watcher, 1.6) == [done, partial]
+    assert watcher.seen[partial][0] == len(data)
+
+
+def test_run_detectors_watch_stores_report(monkeypatch, tmp_path):
+    run = load_script("21_run_detectors.py")
+    synth = load_script("26_synth_screenshots.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--n", "2", "--workers", "1"])
+    assert synth.main() == 0
+
+    monkeypatch.setenv("SIGHTENGINE_API_USER", "test_user")
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", "test_secret")
+    db = tmp_path / "results.sqlite"
+    with FakeSightengine(fixtures={}, unknown_score=0.9) as fake:
+        monkeypatch.setattr(sys, "argv", [
+            "21_run_detectors.py", "--team", "team_synth", "--wave", "baseline", "--watch", "--watch_existing",
+            "--watch_seconds", "1.5", "--settle_s", "0.1", "--poll_s", "0.1", "--skip", "trufor,web,auto_validate",
+            "--results_db", str(db), "--sightengine_endpoint", fake.endpoint])
+        assert run.main() == 0
+
+    report = pd.read_csv(tmp_path / "data" / "qualtrics" / "team_synth" / "baseline" / "results" / "watch_report.csv")
+    assert len(report) == 4 and (report["flagged_by"] == "sightengine").all()
+    with ResultStore(db) as store:
+        stored = store.query("SELECT response_id, image_path, flagged_by FROM v_watch WHERE team = 'team_synth'")
+    assert sorted(stored["image_path"]) == sorted(report["image_path"])
+    assert (stored["flagged_by"] == "sightengine").all()
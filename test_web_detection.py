@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+test_web_detection.py
+
+Offline checks for 16_web_detection_check.py against gsme.standins.FakeVisionClient:
+batches map each response (and per-image errors) back to its row, --batch_size 1
+sends the same --max_results as a batch (as does 21_run_detectors.py), and duplicate
+uploads and reruns are served from the response cache. shrink_payload/PayloadPreparer
+fit --shrink uploads under the Vision limits and reuse the shrunk bytes. Runs of main()
+swap the client for the fake (no credentials or network) and, where google-cloud-vision
+is not installed, the package for gsme.standins.fake_vision_module().
+
+Usage:
+  python -m pytest test_web_detection.py
+"""
+
+import hashlib
+import io
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+from gsme.ingest import ImageStore
+from gsme.scripts import load_script
+from gsme.standins import FakeVisionClient, fake_vision_module
+
+web = load_script("16_web_detection_check.py")
+
+
+def _images(tmp_path: Path, n: int) -> List[Path]:
+    paths = []
+    for i in range(n):
+        path = tmp_path / "images" / f"shot_{i}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (64, 128), (40 * i % 256, 80, 120)).save(path)
+        paths.append(path)
+    return paths
+
+
+def _input_csv(tmp_path: Path, paths: List[Path]) -> Path:
+    out = tmp_path / "input.csv"
+    pd.DataFrame({"task_id": [f"task_{i:03d}" for i in range(len(paths))],
+                  "total_screenshot_path": [str(p) for p in paths]}).to_csv(out, index=False)
+    return out
+
+
+@pytest.fixture
+def vision(monkeypatch) -> ModuleType:
+    """google.cloud.vision, or the stand-in module when the package is not installed."""
+    try:
+        from google.cloud import vision  # type: ignore
+    except ImportError:
+        vision = fake_vision_module()
+        for name in ("google", "google.cloud"):
+            if name not in sys.modules:
+                monkeypatch.setitem(sys.modules, name, ModuleType(name))
+        monkeypatch.setitem(sys.modules, "google.cloud.vision", vision)
+        monkeypatch.setattr(sys.modules["google.cloud"], "vision", vision, raising=False)
+    return vision
+
+
+def _run_main(monkeypatch, tmp_path: Path, vision: ModuleType, fake: FakeVisionClient, csv: Path, tag: str,
+              *extra: str) -> pd.DataFrame:
+    creds = tmp_path / "service_account.json"
+    creds.write_text("{}")
+    monkeypatch.setenv("GOOGLE_APPLICATION_CREDENTIALS", str(creds))
+    monkeypatch.setattr(vision, "ImageAnnotatorClient", lambda *a, **k: fake)
+    out_csv = tmp_path / f"report_{tag}.csv"
+    monkeypatch.setattr(sys, "argv", [
+        "16_web_detection_check.py", "--csv", str(csv), "--out_csv", str(out_csv),
+        "--path_cols", "total_screenshot_path", "--qps", "0", "--results_db", "",
+        "--cache_dir", str(tmp_path / "cache"), "--payload_cache_dir", str(tmp_path / "payloads"), *extra,
+    ])
+    assert web.main() == 0
+    return pd.read_csv(out_csv, keep_default_na=False)
+
+
+def _sha(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_batches_map_responses_and_errors_per_image(monkeypatch, tmp_path, vision):
+    paths = _images(tmp_path, 5)
+    csv = _input_csv(tmp_path, paths)
+    urls = [f"https://example.com/{k}.png" for k in range(4)]
+
+    def fake():
+        return FakeVisionClient(matches={_sha(paths[0]): urls, _sha(paths[3]): urls[:1]},
+                                errors={_sha(paths[2]): "Bad image data."})
+
+    batched = fake()
+    report = _run_main(monkeypatch, tmp_path, vision, batched, csv, "batch", "--batch_size", "2",
+                       "--max_results", "2", "--no_cache")
+    assert (batched.n_requests, batched.n_images) == (3, 5)
+    assert batched.max_results == [2] * 5
+    assert list(report["task_id"]) == [f"task_{i:03d}" for i in range(5)]
+    assert list(report["status"]) == ["match", "no_match", "error", "match", "no_match"]
+    assert list(report["n_full_matches"]) == [2, 0, 0, 1, 0]
+    assert report.loc[2, "error"] == "Bad image data." and (report.drop(index=2)["error"] == "").all()
+
+    single = fake()
+    one_by_one = _run_main(monkeypatch, tmp_path, vision, single, csv, "single", "--batch_size", "1",
+                           "--max_results", "2", "--no_cache")
+    assert (single.n_requests, single.n_images) == (5, 5)
+    assert single.max_results == [2] * 5
+    pd.testing.assert_frame_equal(one_by_one, report)
+
+
+def test_duplicates_and_reruns_come_from_the_cache(monkeypatch, tmp_path, vision, capsys):
+    paths = _images(tmp_path, 3)
+    csv = _input_csv(tmp_path, paths + paths[:2])  # two re-uploads of the same bytes
+    fake = FakeVisionClient(matches={_sha(paths[1]): ["https://example.com/1.png"]})
+
+    first = _run_main(monkeypatch, tmp_path, vision, fake, csv, "first")
+    assert (fake.n_requests, fake.n_images) == (1, 3)
+    assert list(first["status"]) == ["no_match", "match", "no_match", "no_match", "match"]
+    assert (first["from_cache"] == 0).all()
+    assert first.loc[3, "content_hash"] == first.loc[0, "content_hash"]
+
+    rerun = _run_main(monkeypatch, tmp_path, vision, fake, csv, "rerun")
+    assert (fake.n_requests, fake.n_images) == (1, 3)
+    assert (rerun["from_cache"] == 1).all()
+    pd.testing.assert_series_equal(rerun["status"], first["status"])
+    assert "cache hit rate 100% (3/3 unique images)" in capsys.readouterr().out
+
+    _run_main(monkeypatch, tmp_path, vision, fake, csv, "more_results", "--max_results", "20")
+    assert fake.n_images == 6  # entries cached with fewer results are re-queried
+
+
+def _noise_png(path: Path, width: int, height: int) -> Path:
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)).save(path, compress_level=1)
+    return path
+
+
+def test_shrink_payload_fits_limits_and_keeps_small_jpegs(tmp_path):
+    big = _noise_png(tmp_path / "big.png", 2800, 2600).read_bytes()
+    assert len(big) > web.MAX_IMAGE_BYTES
+    data, variant = web.shrink_payload(big, max_side=1600, max_bytes=1_500_000)
+    assert len(data) <= 1_500_000 < web.MAX_IMAGE_BYTES and variant.startswith("jpeg_q")
+    with Image.open(io.BytesIO(data)) as img:
+        assert (img.format, max(img.size)) == ("JPEG", 1600) and variant.endswith("_1600px")
+
+    buf = io.BytesIO()
+    Image.new("RGB", (300, 600), (20, 120, 200)).save(buf, "JPEG", quality=90)
+    small = buf.getvalue()
+    assert web.shrink_payload(small, max_side=1600, max_bytes=1_500_000) == (small, "original")
+
+
+def test_payload_preparer_reuses_shrunk_payloads(monkeypatch, tmp_path):
+    path = _noise_png(tmp_path / "shot.png", 1200, 900)
+    df = pd.DataFrame({"task_id": ["task_000"], "total_screenshot_path": [str(path)]})
+
+    def preparer(shrink: bool = True):
+        images = ImageStore(index_path=None)
+        h = images.scan(df, ["total_screenshot_path"])[0].content_hash
+        return web.PayloadPreparer(shrink, 800, 200_000, 85, tmp_path / "payloads", images), h
+
+    original, h = preparer(shrink=False)
+    assert original.prepare(h) == ("original", path.stat().st_size)
+    assert original.load(h, "original") == path.read_bytes()
+
+    first, h = preparer()
+    variant, size = first.prepare(h)
+    payload = first.load(h, variant)
+    assert variant.startswith("jpeg_q") and variant.endswith("_800px") and len(payload) == size <= 200_000
+
+    def no_shrink(*a, **k):
+        raise AssertionError("payload should come from the cache")
+
+    monkeypatch.setattr(web, "shrink_payload", no_shrink)
+    rerun, h = preparer()
+    assert rerun.prepare(h) == (variant, size)
+    assert rerun.load(h, variant) == payload
+    assert rerun.cache.hits == 2 and rerun.images.files_read == 1  # hashed once, never re-encoded
+
+
+def test_run_detectors_web_sends_max_results(monkeypatch, tmp_path, vision):
+    run = load_script("21_run_detectors.py")
+    synth = load_script("26_synth_screenshots.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--n", "2", "--workers", "1"])
+    assert synth.main() == 0
+
+    results = tmp_path / "data" / "qualtrics" / "team_synth" / "baseline" / "results"
+    shot = Path(pd.read_csv(results / "sample_avg.csv").loc[0, "total_screenshot_path"])
+    fake = FakeVisionClient(matches={_sha(shot): [f"https://example.com/{k}.png" for k in range(25)]})
+    creds = tmp_path / "service_account.json"
+    creds.write_text("{}")
+    monkeypatch.setenv("GOOGLE_APPLICATION_CREDENTIALS", str(creds))
+    monkeypatch.setattr(vision, "ImageAnnotatorClient", lambda *a, **k: fake)
+    monkeypatch.setattr(sys, "argv", [
+        "21_run_detectors.py", "--team", "team_synth", "--wave", "baseline",
+        "--skip", "trufor,sightengine,auto_validate", "--results_db", "", "--web_qps", "0", "--max_results", "20"])
+    assert run.main() == 0
+
+    assert fake.max_results and set(fake.max_results) == {20}
+    report = pd.read_csv(results / "web_detection_report_avg.csv")
+    assert report.loc[0, "n_full_matches"] == 20
+    entry = web.HashCache(web.DEFAULT_CACHE_DIR).get(_sha(shot))
+    assert entry["max_results"] == 20 and len(entry["web_detection"]["full_matching_images"]) == 20
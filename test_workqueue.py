@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+test_workqueue.py
+
+Offline checks for gsme/workqueue.py and 21_run_detectors.py --queue: leases of a dead
+worker are reclaimed, failures are retried then reported, and a queued run writes the
+same reports as a local one, with an error row for a task that ran out of attempts.
+
+Usage:
+  python -m pytest test_workqueue.py
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from gsme.scripts import load_script
+from gsme.standins import FakeSightengine
+from gsme.workqueue import TaskFailed, Worker, WorkQueue
+
+
+def test_dead_worker_leases_are_reclaimed(tmp_path):
+    db = tmp_path / "queue.sqlite"
+    q = WorkQueue(db, lease_s=0.3, max_attempts=2)
+    assert q.enqueue([(("web", str(i)), "web", {"i": i}, "v1") for i in range(12)]) == 12
+    dead = q.claim("dead-node:1", ["web"], 3)  # claims and never heartbeats
+
+    def web(payload):
+        if payload["i"] == 5:
+            raise ValueError("boom")
+        time.sleep(0.02)
+        return {"i": payload["i"], "score": float("nan")}
+
+    workers = [Worker(WorkQueue(db, lease_s=0.3, max_attempts=2), {"web": web}, lanes=[(("web",), 2)], poll_s=0.05)
+               for _ in range(2)]
+    threads = [threading.Thread(target=w.run) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+
+    assert sum(w.counts["done"] for w in workers) == 11
+    assert sum(w.counts["retried"] for w in workers) == 1 and sum(w.counts["failed"] for w in workers) == 1
+    for task in dead:  # the dead worker's tasks were finished by the others
+        assert q.result(task.key)["i"] == task.payload["i"]
+    assert not q.complete("dead-node:1", dead[0].key, {"late": True})  # lease lost: result kept
+    assert q.result(("web", "1"))["score"] is None
+    with pytest.raises(TaskFailed, match="boom"):
+        q.result(("web", "5"))
+    assert q.counts().loc["web"].to_dict() == {"pending": 0, "leased": 0, "done": 11, "failed": 1}
+
+    # Re-enqueueing runs only failed tasks and changed versions
+    assert q.enqueue([(("web", "1"), "web", {"i": 1}, "v1"), (("web", "2"), "web", {"i": 2}, "v2"),
+                      (("web", "5"), "web", {"i": 5}, "v1")]) == 2
+    assert "2 live worker(s)" not in q.status()  # both stopped cleanly
+
+
+def test_run_detectors_through_queue(monkeypatch, tmp_path, capsys):
+    run = load_script("21_run_detectors.py")
+    synth = load_script("26_synth_screenshots.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--n", "3", "--workers", "1"])
+    assert synth.main() == 0
+
+    monkeypatch.setenv("SIGHTENGINE_API_USER", "test_user")
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", "test_secret")
+    with FakeSightengine(fixtures={}, unknown_score=0.9) as fake:
+        argv = ["21_run_detectors.py", "--team", "team_synth", "--wave", "baseline",
+                "--skip", "trufor,web,auto_validate", "--results_db", "", "--sightengine_endpoint", fake.endpoint,
+                "--queue", str(tmp_path / "queue.sqlite"), "--io_workers", "2", "--status_s", "0"]
+        monkeypatch.setattr(sys, "argv", argv)
+        assert run.main() == 0
+        assert fake.n_requests == 6
+        monkeypatch.setattr(sys, "argv", argv)
+        assert run.main() == 0  # everything already in the queue
+
+    out = capsys.readouterr().out
+    assert "6 tasks in" in out and "0 to run" in out
+    report = pd.read_csv(tmp_path / "data" / "qualtrics" / "team_synth" / "baseline" / "results" /
+                         "sightengine_ai_report_avg.csv")
+    assert len(report) == 3 and (report["status"] == "ok").all() and (report["flagged"] == 1).all()
+    with WorkQueue(tmp_path / "queue.sqlite") as q:
+        assert q.counts().loc["sightengine", "done"] == 6
+        assert q.nodes()["done"].sum() == 6
+
+
+def test_run_detectors_through_queue_reports_failed_tasks(monkeypatch, tmp_path, capsys):
+    run = load_script("21_run_detectors.py")
+    synth = load_script("26_synth_screenshots.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["26_synth_screenshots.py", "--n", "3", "--workers", "1"])
+    assert synth.main() == 0
+
+    results = tmp_path / "data" / "qualtrics" / "team_synth" / "baseline" / "results"
+    broken = pd.read_csv(results / "sample_avg.csv").loc[0, "total_screenshot_path"]
+    sightengine = run.Detectors.sightengine
+
+    def flaky(det, h):
+        if det.images.path(h) == Path(broken):
+            raise RuntimeError("connection reset")
+        return sightengine(det, h)
+
+    monkeypatch.setattr(run.Detectors, "sightengine", flaky)
+    monkeypatch.setenv("SIGHTENGINE_API_USER", "test_user")
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", "test_secret")
+    with FakeSightengine(fixtures={}, unknown_score=0.9) as fake:
+        monkeypatch.setattr(sys, "argv", [
+            "21_run_detectors.py", "--team", "team_synth", "--wave", "baseline",
+            "--skip", "trufor,web,auto_validate", "--results_db", "", "--sightengine_endpoint", fake.endpoint,
+            "--queue", str(tmp_path / "queue.sqlite"), "--max_attempts", "2", "--status_s", "0"])
+        assert run.main() == 0
+
+    out = capsys.readouterr().out
+    assert "attempt 2 failed: RuntimeError: connection reset" in out and "attempt 3" not in out
+    assert "sightengine failed" not in out  # an error result by the time the graph sees it
+    report = pd.read_csv(results / "sightengine_ai_report_avg.csv", keep_default_na=False)
+    assert list(report["status"]) == ["error", "ok", "ok"]
+    assert "connection reset" in report.loc[0, "error"] and report.loc[0, "flagged"] == ""
+    with WorkQueue(tmp_path / "queue.sqlite") as q:
+        counts = q.counts().loc["sightengine"]
+        assert (counts["failed"], counts["done"]) == (1, 5)